@@ -1,10 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
 from datetime import datetime
+import hmac
+import io
+import json
 import logging
+import threading
+import time
 from predict_expiry_price import ExpiryPricePredictor
+from price_table import PriceTable
+from calendar_index import CalendarIndex, DEFAULT_START, DEFAULT_END
+from model_registry import ModelRegistry
+from columnar import ARROW_STREAM_MIMETYPE, COLUMNAR_MIMETYPES, decode_columns, encode_columns, predict_columnar
+from write_buffer import WriteBehindBuffer, BufferFull
+from prediction_history import DailyAverages, HistoryPage, build_query, ensure_indexes, parse_limit, stream_json
+from coalescer import PredictionCoalescer
+from model_watcher import ModelWatcher
+from metrics import metrics, start_trace, finish_trace, server_timing, PROMETHEUS_MIMETYPE
+from response_encoding import JSON_MIMETYPE, analysis_data, batch_data, dumps, parse_orient
 from flask_pymongo import PyMongo
 import os
 
@@ -20,14 +34,174 @@ MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/m5_prediction
 app.config["MONGO_URI"] = MONGO_URI
 mongo = PyMongo(app)
 
+# Write-behind buffer for /save-prediction (set MONGO_WRITE_BEHIND=0 to insert synchronously)
+MONGO_WRITE_BEHIND = os.environ.get('MONGO_WRITE_BEHIND', '1') != '0'
+write_buffer = WriteBehindBuffer(
+    mongo.db.predictions,
+    max_queue=int(os.environ.get('MONGO_WRITE_QUEUE_SIZE', 10000)),
+    batch_size=int(os.environ.get('MONGO_WRITE_BATCH_SIZE', 500)),
+    flush_interval=float(os.environ.get('MONGO_WRITE_FLUSH_INTERVAL', 0.5))
+) if MONGO_WRITE_BEHIND else None
+
+# Saved prediction history (/predictions/history): records per page by default and at most,
+# and documents read from MongoDB per round trip; set HISTORY_INDEXES=0 to skip creating indexes
+HISTORY_PAGE_SIZE = int(os.environ.get('HISTORY_PAGE_SIZE', 100))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get('HISTORY_MAX_PAGE_SIZE', 10000))
+HISTORY_BATCH_SIZE = int(os.environ.get('HISTORY_BATCH_SIZE', 1000))
+HISTORY_INDEXES = os.environ.get('HISTORY_INDEXES', '1') != '0'
+
+# Optional precomputed price table (see price_table.py)
+PRICE_TABLE_PATH = os.environ.get('PRICE_TABLE_PATH')
+
+# Calendar index for date features: event days (has_event) are read from an M5
+# calendar.csv at CALENDAR_PATH when it exists; CALENDAR_START/CALENDAR_END set the indexed range
+CALENDAR_PATH = os.environ.get('CALENDAR_PATH', 'calendar.csv')
+CALENDAR_START = os.environ.get('CALENDAR_START', DEFAULT_START)
+CALENDAR_END = os.environ.get('CALENDAR_END', DEFAULT_END)
+
+# Per-(department, store) models picked by the request's city (see model_registry.py), used
+# when STORE_MODEL_DIR exists: at most STORE_MODEL_MAX models / STORE_MODEL_MEMORY_MB of serving arrays
+# and deserialized boosters in memory;
+# STORE_MODEL_PRELOAD lists dept:store pairs to load at startup ('all' for every model)
+STORE_MODEL_DIR = os.environ.get('STORE_MODEL_DIR', 'Model/stores/')
+STORE_MODEL_MAX = int(os.environ.get('STORE_MODEL_MAX', 32))
+STORE_MODEL_MEMORY_MB = float(os.environ.get('STORE_MODEL_MEMORY_MB', 256))
+STORE_MODEL_PRELOAD = os.environ.get('STORE_MODEL_PRELOAD', '')
+
+# Rows scored per chunk in streaming (NDJSON) batch mode
+NDJSON_CHUNK_SIZE = int(os.environ.get('NDJSON_CHUNK_SIZE', 5000))
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson')
+
+# Largest grid accepted by /predict/analysis in grid mode
+ANALYSIS_MAX_DATES = int(os.environ.get('ANALYSIS_MAX_DATES', 366))
+ANALYSIS_MAX_DAYS = int(os.environ.get('ANALYSIS_MAX_DAYS', 365))
+
+# Opt-in micro-batching of single predictions (window in milliseconds, 0 disables)
+COALESCE_WINDOW_MS = float(os.environ.get('COALESCE_WINDOW_MS', 0))
+COALESCE_MAX_BATCH = int(os.environ.get('COALESCE_MAX_BATCH', 64))
+
+# Requests sending this header get their stage breakdown back in Server-Timing
+STAGE_TIMING_HEADER = 'X-Stage-Timing'
+
+# Hot model reload: poll Model/ every MODEL_WATCH_INTERVAL seconds (0 disables);
+# POST /model/reload requires X-Reload-Token when MODEL_RELOAD_TOKEN is set
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 0))
+MODEL_RELOAD_TOKEN = os.environ.get('MODEL_RELOAD_TOKEN')
+
+# When the XGBoost boosters used for larger batches are deserialized (importing XGBoost):
+# 'lazy' on the first large batch, 'background' after startup, 'eager' before serving.
+# With coalescing the default is 'background', so the first large coalesced batch does
+# not import XGBoost on the batching thread while every queued request waits
+BOOSTER_LOADING = os.environ.get('BOOSTER_LOADING', 'background' if COALESCE_WINDOW_MS > 0 else 'lazy')
+
+# Score each distinct feature row of a batch once (set BATCH_DEDUP=0 to score every row)
+BATCH_DEDUP = os.environ.get('BATCH_DEDUP', '1') != '0'
+
+# Binary prediction protocol for co-located clients on this Unix socket path (see binary_protocol.py)
+UDS_PATH = os.environ.get('UDS_PATH')
+
 # Initialize the predictor
 try:
-    predictor = ExpiryPricePredictor()
+    if os.path.exists(CALENDAR_PATH):
+        calendar = CalendarIndex.from_csv(CALENDAR_PATH, CALENDAR_START, CALENDAR_END)
+        logger.info(f"✅ Calendar loaded from {CALENDAR_PATH} ({calendar.info()['event_days']} event days)")
+    else:
+        calendar = CalendarIndex(CALENDAR_START, CALENDAR_END)
+    predictor = ExpiryPricePredictor(booster_loading=BOOSTER_LOADING, calendar=calendar, dedup_rows=BATCH_DEDUP)
+    if PRICE_TABLE_PATH:
+        try:
+            predictor.price_table = PriceTable.load(PRICE_TABLE_PATH, model_version=predictor.model_version)
+            logger.info(f"✅ Price table loaded from {PRICE_TABLE_PATH}")
+        except ValueError as e:
+            logger.warning(f"⚠️ Not using the price table: {str(e)}")
+    if os.path.isdir(STORE_MODEL_DIR):
+        predictor.store_models = ModelRegistry(predictor, STORE_MODEL_DIR, max_models=STORE_MODEL_MAX,
+                                               memory_budget_mb=STORE_MODEL_MEMORY_MB)
+        if STORE_MODEL_PRELOAD == 'all':
+            preloaded = predictor.store_models.preload()
+        else:
+            preloaded = predictor.store_models.preload(
+                tuple(pair.strip().split(':', 1)) for pair in STORE_MODEL_PRELOAD.split(',') if ':' in pair)
+        logger.info(f"✅ {predictor.store_models.stats()['available']} store models in {STORE_MODEL_DIR} "
+                    f"({len(preloaded)} preloaded)")
     logger.info("✅ Predictor initialized successfully")
 except Exception as e:
     logger.error(f"❌ Failed to initialize predictor: {str(e)}")
     predictor = None
 
+coalescer = None
+if predictor is not None and COALESCE_WINDOW_MS > 0:
+    coalescer = PredictionCoalescer(predictor, window=COALESCE_WINDOW_MS / 1000, max_batch=COALESCE_MAX_BATCH)
+    logger.info(f"✅ Coalescing single predictions ({COALESCE_WINDOW_MS} ms window)")
+
+model_watcher = None
+if predictor is not None and MODEL_WATCH_INTERVAL > 0:
+    model_watcher = ModelWatcher(predictor, interval=MODEL_WATCH_INTERVAL).start()
+    logger.info(f"✅ Watching model files every {MODEL_WATCH_INTERVAL} s")
+
+def start_binary_server(sock=None):
+    """Serve the binary protocol on UDS_PATH (or an inherited socket), answering like /predict/single"""
+    from binary_protocol import serve_in_background
+    server = serve_in_background(predictor, path=UDS_PATH, sock=sock, predict=_predict_price)
+    logger.info(f"✅ Binary protocol listening on {server.path}")
+    return server
+
+def ensure_history_indexes():
+    """Create the prediction history indexes in the background, so startup never waits on MongoDB"""
+    def create():
+        try:
+            names = ensure_indexes(mongo.db.predictions)
+            logger.info(f"✅ Prediction history indexes ready: {', '.join(names)}")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create prediction history indexes: {str(e)}")
+    
+    if HISTORY_INDEXES:
+        threading.Thread(target=create, name='history-indexes', daemon=True).start()
+
+def _reload_models():
+    """Reload the models in this process; serve.py workers replace this to reload every worker"""
+    return predictor.reload_models()
+
+def _json_response(payload, status=200):
+    """JSON response encoded by response_encoding, which writes NumPy arrays directly"""
+    return Response(dumps(payload), status=status, mimetype=JSON_MIMETYPE)
+
+def _predict_price(days_to_expiry, dept_id, date=None, **kwargs):
+    """Single-item prediction, batched with concurrent requests when the coalescer is enabled"""
+    if coalescer is not None:
+        return coalescer.predict_price(days_to_expiry, dept_id, date, **kwargs)
+    return predictor.predict_price(days_to_expiry, dept_id, date, **kwargs)
+
+@app.before_request
+def _start_request_timer():
+    """Time the request and start a stage trace if the client asked for one"""
+    g.request_started = time.perf_counter()
+    if request.headers.get(STAGE_TIMING_HEADER):
+        g.stage_trace = start_trace()
+
+@app.after_request
+def _record_request_metrics(response):
+    """
+    Record the request latency and attach the stage breakdown
+    
+    Streamed responses are measured up to the point their body starts.
+    """
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe_request(endpoint, request.method, response.status_code, elapsed)
+    
+    token = g.pop('stage_trace', None)
+    if token is not None:
+        response.headers['Server-Timing'] = server_timing(finish_trace(token), elapsed)
+    return response
+
+@app.teardown_request
+def _end_stage_trace(exc):
+    """Drop a stage trace left open by a request that failed before after_request"""
+    token = g.pop('stage_trace', None)
+    if token is not None:
+        finish_trace(token)
+
 @app.route('/')
 def home():
     """Home endpoint with API information"""
@@ -40,7 +214,11 @@ def home():
             '/predict/single': 'Single prediction',
             '/predict/batch': 'Batch prediction',
             '/model/info': 'Model information',
-            '/save-prediction': 'Save prediction to MongoDB'
+            '/model/reload': 'Reload models without downtime',
+            '/metrics': 'Prometheus metrics',
+            '/save-prediction': 'Save prediction to MongoDB',
+            '/predictions/history': 'Saved predictions, filtered and paginated',
+            '/predictions/daily-average': 'Average saved price per department and day'
         },
         'supported_departments': ['FOODS_1', 'FOODS_2', 'FOODS_3']
     })
@@ -54,11 +232,19 @@ def health_check():
             'message': 'Predictor not initialized'
         }), 500
     
-    return jsonify({
+    health = {
         'status': 'healthy',
         'message': 'API is running',
-        'models_loaded': len(predictor.models) if predictor else 0
-    })
+        'models_loaded': len(predictor.models) if predictor else 0,
+        'model_version': predictor.model_version
+    }
+    if write_buffer is not None:
+        health['write_buffer'] = write_buffer.stats()
+    if coalescer is not None:
+        health['coalescer'] = coalescer.stats()
+    if model_watcher is not None:
+        health['model_watcher'] = model_watcher.stats()
+    return jsonify(health)
 
 @app.route('/model/info')
 def model_info():
@@ -75,6 +261,53 @@ def model_info():
         'data': info
     })
 
+@app.route('/model/reload', methods=['POST'])
+def reload_models():
+    """
+    Reload the models from the model directory without downtime
+    
+    The new model set is loaded, validated and warmed up while the current
+    one keeps serving, then swapped in; in-flight requests finish on the
+    set they started with. On failure the current models stay in place.
+    """
+    if predictor is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Predictor not initialized'
+        }), 500
+    
+    if MODEL_RELOAD_TOKEN and not hmac.compare_digest(request.headers.get('X-Reload-Token', ''), MODEL_RELOAD_TOKEN):
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid reload token'
+        }), 403
+    
+    try:
+        result = _reload_models()
+    except Exception as e:
+        logger.error(f"Error reloading models: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Reload failed: {str(e)}',
+            'model_version': predictor.model_version
+        }), 500
+    
+    if result is None:
+        return jsonify({
+            'status': 'accepted',
+            'message': 'Reload scheduled'
+        }), 202
+    logger.info(f"✅ Models reloaded: {result['previous_version']} -> {result['version']}")
+    return jsonify({
+        'status': 'success',
+        'data': result
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Latency histograms, batch sizes and model call counts in Prometheus format"""
+    return Response(metrics.render(), content_type=PROMETHEUS_MIMETYPE)
+
 @app.route('/predict/single', methods=['POST'])
 def predict_single():
     """
@@ -93,7 +326,8 @@ def predict_single():
     }
     """
     try:
-        data = request.get_json()
+        with metrics.timer('parse'):
+            data = request.get_json()
         
         if not data:
             return jsonify({
@@ -138,9 +372,7 @@ def predict_single():
             prediction_params['city'] = city
         
         # Make prediction
-        result = predictor.predict_single(**prediction_params)
-        
-        predicted_price = result['predicted_price'].iloc[0]
+        predicted_price = _predict_price(**prediction_params)
         
         return jsonify({
             'status': 'success',
@@ -161,11 +393,138 @@ def predict_single():
             'message': f'Prediction failed: {str(e)}'
         }), 500
 
+def _validate_batch_item(item, i):
+    """Return the error message for an invalid batch item, or None if it is valid"""
+    if 'days_to_expiry' not in item or 'dept_id' not in item:
+        return f'Item {i} missing required fields'
+    
+    if item['dept_id'] not in ['FOODS_1', 'FOODS_2', 'FOODS_3']:
+        return f'Item {i} has invalid department'
+    
+    return None
+
+def _batch_row(item):
+    """Convert a validated batch item into a predict_batch input row"""
+    item_data = {
+        'days_to_expiry': int(item['days_to_expiry']),
+        'dept_id': item['dept_id'],
+        'date': item.get('date', datetime.now().strftime('%Y-%m-%d'))
+    }
+    # Add city if provided
+    if 'city' in item:
+        item_data['city'] = item['city']
+    return item_data
+
+def _predict_ndjson_chunk(rows):
+    """Score a chunk of batch rows and return them as NDJSON lines"""
+    import pandas as pd
+    results = predictor.predict_batch(pd.DataFrame(rows))
+    with metrics.timer('format'):
+        lines = []
+        for row, price in zip(rows, results['predicted_price'].to_numpy()):
+            row['predicted_price'] = None if np.isnan(price) else float(price)
+            lines.append(json.dumps(row))
+        return '\n'.join(lines) + '\n'
+
+def _stream_batch_predictions():
+    """
+    Streaming batch prediction over newline-delimited JSON
+    
+    Reads one item per line from the request body, scores fixed-size
+    chunks and writes each chunk's predictions as NDJSON as soon as it is
+    ready, so memory stays bounded by the chunk size. An invalid line ends
+    the stream with an error object naming the line.
+    """
+    chunk_size = max(1, request.args.get('chunk_size', NDJSON_CHUNK_SIZE, type=int))
+    
+    def error_line(message, line_number=None):
+        logger.error(f"Error in streaming batch prediction: {message}")
+        error = {'status': 'error', 'message': message}
+        if line_number is not None:
+            error['line'] = line_number
+        return json.dumps(error) + '\n'
+    
+    def generate():
+        chunk = []
+        total = 0
+        try:
+            # Buffer the raw input stream so lines are not read byte by byte
+            lines = io.BufferedReader(request.stream, buffer_size=1 << 16)
+            for line_number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    error = _validate_batch_item(item, line_number)
+                    if error:
+                        raise ValueError(error)
+                    chunk.append(_batch_row(item))
+                except (ValueError, TypeError) as e:
+                    yield error_line(str(e), line_number)
+                    return
+                
+                if len(chunk) >= chunk_size:
+                    total += len(chunk)
+                    yield _predict_ndjson_chunk(chunk)
+                    chunk = []
+            
+            if chunk:
+                total += len(chunk)
+                yield _predict_ndjson_chunk(chunk)
+            metrics.observe_batch_size('/predict/batch', 'ndjson', total)
+        except Exception as e:
+            yield error_line(f'Batch prediction failed: {str(e)}')
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _predict_columnar_batch():
+    """
+    Batch prediction over a columnar body (Arrow IPC stream or raw NumPy columns)
+    
+    The column buffers are decoded in place and handed to the predictor's
+    feature builder; predictions come back as a predicted_price column in
+    the request's format. See columnar.py for the layouts.
+    """
+    body_format = 'arrow' if request.mimetype == ARROW_STREAM_MIMETYPE else 'numpy'
+    try:
+        with metrics.timer('parse'):
+            columns = decode_columns(request.get_data(cache=False), request.mimetype)
+        predictions = predict_columnar(predictor, columns)
+        metrics.observe_batch_size('/predict/batch', body_format, len(predictions))
+    except ImportError:
+        return jsonify({
+            'status': 'error',
+            'message': 'Arrow IPC bodies require pyarrow on the server'
+        }), 415
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error in columnar batch prediction: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Batch prediction failed: {str(e)}'
+        }), 500
+    
+    with metrics.timer('format'):
+        body = encode_columns({'predicted_price': predictions}, request.mimetype)
+    return Response(body, mimetype=request.mimetype)
+
 @app.route('/predict/batch', methods=['POST'])
 def predict_batch():
     """
     Batch prediction endpoint
     
+    With Content-Type application/x-ndjson the body is one item per line
+    and predictions are streamed back as NDJSON in chunks of `chunk_size`
+    (query parameter, default NDJSON_CHUNK_SIZE).
+    
+    With Content-Type application/vnd.apache.arrow.stream or
+    application/x-numpy-columns the body holds column buffers and the
+    response is a predicted_price column in the same format.
+    
     Expected JSON:
     {
         "items": [
@@ -182,8 +541,22 @@ def predict_batch():
         ]
     }
     """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return _stream_batch_predictions()
+    if request.mimetype in COLUMNAR_MIMETYPES:
+        return _predict_columnar_batch()
+    
     try:
-        data = request.get_json()
+        orient = parse_orient(request.args.get('orient'))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    
+    try:
+        with metrics.timer('parse'):
+            data = request.get_json()
         
         if not data or 'items' not in data:
             return jsonify({
@@ -200,58 +573,39 @@ def predict_batch():
             }), 400
         
         # Validate all items
+        validate_started = time.perf_counter()
         for i, item in enumerate(items):
-            if 'days_to_expiry' not in item or 'dept_id' not in item:
+            error = _validate_batch_item(item, i)
+            if error:
                 return jsonify({
                     'status': 'error',
-                    'message': f'Item {i} missing required fields'
-                }), 400
-            
-            if item['dept_id'] not in ['FOODS_1', 'FOODS_2', 'FOODS_3']:
-                return jsonify({
-                    'status': 'error',
-                    'message': f'Item {i} has invalid department'
+                    'message': error
                 }), 400
         
         # Convert to DataFrame
-        df_data = []
-        for item in items:
-            item_data = {
-                'days_to_expiry': int(item['days_to_expiry']),
-                'dept_id': item['dept_id'],
-                'date': item.get('date', datetime.now().strftime('%Y-%m-%d'))
-            }
-            # Add city if provided
-            if 'city' in item:
-                item_data['city'] = item['city']
-            df_data.append(item_data)
+        import pandas as pd
+        df_data = [_batch_row(item) for item in items]
         
         input_df = pd.DataFrame(df_data)
+        metrics.observe_stage('validate', time.perf_counter() - validate_started)
+        metrics.observe_batch_size('/predict/batch', 'json', len(items))
         
         # Make predictions
         results = predictor.predict_batch(input_df)
         
-        # Format results
-        predictions = []
-        for idx, row in results.iterrows():
-            prediction_item = {
-                'days_to_expiry': int(row['days_to_expiry']),
-                'dept_id': row['dept_id'],
-                'date': row['date'],
-                'predicted_price': float(row['predicted_price']) if row['predicted_price'] is not None else None
-            }
-            # Add city if it exists in the data
-            if 'city' in row:
-                prediction_item['city'] = row['city']
-            predictions.append(prediction_item)
+        # Format results straight from the result columns
+        format_started = time.perf_counter()
+        columns = {name: results[name].to_numpy() for name in ('days_to_expiry', 'dept_id', 'date')}
+        # Add city if it exists in the data
+        if 'city' in results:
+            columns['city'] = results['city'].to_numpy()
         
-        return jsonify({
+        response = _json_response({
             'status': 'success',
-            'data': {
-                'predictions': predictions,
-                'total_items': len(predictions)
-            }
+            'data': batch_data(columns, results['predicted_price'].to_numpy(), orient)
         })
+        metrics.observe_stage('format', time.perf_counter() - format_started)
+        return response
         
     except Exception as e:
         logger.error(f"Error in batch prediction: {str(e)}")
@@ -271,9 +625,26 @@ def predict_analysis():
         "date": "2024-01-15",
         "max_days": 30
     }
+    
+    With ?orient=columns the curve is returned as data.columns (one array per
+    field) instead of data.analysis (one object per day).
+    
+    Grid mode - expiry curves for several departments over a date range:
+    {
+        "dept_ids": ["FOODS_1", "FOODS_2", "FOODS_3"],
+        "start_date": "2024-01-01",
+        "end_date": "2024-03-31",
+        "max_days": 30
+    }
+    returns data.prices as a dense [dept][date][days_to_expiry - 1] matrix
+    with the axis labels in data.dept_ids, data.dates and data.days_to_expiry.
     """
     try:
-        data = request.get_json()
+        with metrics.timer('parse'):
+            data = request.get_json()
+        
+        if data and 'dept_ids' in data:
+            return _predict_analysis_grid(data)
         
         if not data or 'dept_id' not in data:
             return jsonify({
@@ -283,42 +654,41 @@ def predict_analysis():
         
         dept_id = data['dept_id']
         date = data.get('date', datetime.now().strftime('%Y-%m-%d'))
-        max_days = data.get('max_days', 30)
         
         if dept_id not in ['FOODS_1', 'FOODS_2', 'FOODS_3']:
             return jsonify({
                 'status': 'error',
                 'message': 'Invalid department'
             }), 400
+        try:
+            max_days = int(data.get('max_days', 30))
+        except (ValueError, TypeError) as e:
+            return jsonify({
+                'status': 'error',
+                'message': f'Invalid max_days: {str(e)}'
+            }), 400
+        if not 1 <= max_days <= ANALYSIS_MAX_DAYS:
+            return jsonify({
+                'status': 'error',
+                'message': f'max_days must be between 1 and {ANALYSIS_MAX_DAYS}'
+            }), 400
+        try:
+            orient = parse_orient(request.args.get('orient'))
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
         
-        # Create analysis data
-        analysis_data = []
-        for days in range(1, max_days + 1):
-            analysis_data.append({
-                'days_to_expiry': days,
-                'dept_id': dept_id,
-                'date': date
-            })
-        
-        input_df = pd.DataFrame(analysis_data)
-        results = predictor.predict_batch(input_df)
-        
-        # Format results
-        analysis = []
-        for idx, row in results.iterrows():
-            analysis.append({
-                'days_to_expiry': int(row['days_to_expiry']),
-                'predicted_price': float(row['predicted_price']) if row['predicted_price'] is not None else None
-            })
+        # Score the whole curve in one call
+        days = np.arange(1, max_days + 1)
+        day = np.datetime64(predictor._parse_date(date).date(), 'D')
+        prices = predictor.predict_grid([dept_id], [day], days)[0, 0]
+        metrics.observe_batch_size('/predict/analysis', 'json', len(days))
         
-        return jsonify({
+        return _json_response({
             'status': 'success',
-            'data': {
-                'dept_id': dept_id,
-                'date': date,
-                'analysis': analysis,
-                'total_days': len(analysis)
-            }
+            'data': analysis_data(dept_id, date, days, prices, orient)
         })
         
     except Exception as e:
@@ -328,10 +698,74 @@ def predict_analysis():
             'message': f'Analysis failed: {str(e)}'
         }), 500
 
+def _predict_analysis_grid(data):
+    """
+    Grid mode of /predict/analysis: departments x dates x days_to_expiry
+    
+    The whole grid is scored by predictor.predict_grid and returned as
+    nested lists, without building an object per point.
+    """
+    dept_ids = data['dept_ids']
+    if isinstance(dept_ids, str):
+        dept_ids = [dept_ids]
+    if not dept_ids or not isinstance(dept_ids, list):
+        return jsonify({
+            'status': 'error',
+            'message': 'dept_ids must be a non-empty list'
+        }), 400
+    invalid = [dept for dept in dept_ids if dept not in ['FOODS_1', 'FOODS_2', 'FOODS_3']]
+    if invalid:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid departments: {invalid}'
+        }), 400
+    
+    try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        start = np.datetime64(predictor._parse_date(data.get('start_date', data.get('date', today))).date(), 'D')
+        end = np.datetime64(predictor._parse_date(data.get('end_date', str(start))).date(), 'D')
+        max_days = int(data.get('max_days', 30))
+    except (ValueError, TypeError) as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid analysis range: {str(e)}'
+        }), 400
+    
+    dates = np.arange(start, end + 1)
+    if not 1 <= len(dates) <= ANALYSIS_MAX_DATES:
+        return jsonify({
+            'status': 'error',
+            'message': f'Date range must cover 1 to {ANALYSIS_MAX_DATES} days'
+        }), 400
+    if not 1 <= max_days <= ANALYSIS_MAX_DAYS:
+        return jsonify({
+            'status': 'error',
+            'message': f'max_days must be between 1 and {ANALYSIS_MAX_DAYS}'
+        }), 400
+    
+    days = np.arange(1, max_days + 1)
+    prices = predictor.predict_grid(dept_ids, dates, days)
+    metrics.observe_batch_size('/predict/analysis', 'json', prices.size)
+    
+    return _json_response({
+        'status': 'success',
+        'data': {
+            'dept_ids': dept_ids,
+            'dates': dates.astype(str).tolist(),
+            'days_to_expiry': days,
+            'prices': prices,
+            'shape': list(prices.shape)
+        }
+    })
+
 @app.route('/save-prediction', methods=['POST'])
 def save_prediction():
     """
     Save a prediction result to MongoDB
+    
+    The document is queued and written in the background by the write-behind
+    buffer; when the queue is full the request is rejected with 503.
+    
     Expected JSON:
     {
         "days_to_expiry": 5,
@@ -361,8 +795,7 @@ def save_prediction():
             prediction_params['city'] = city
         
         # Predict
-        result = predictor.predict_single(**prediction_params)
-        predicted_price = result['predicted_price'].iloc[0]
+        predicted_price = _predict_price(**prediction_params)
         
         # Prepare document
         doc = {
@@ -377,13 +810,71 @@ def save_prediction():
         if city:
             doc['city'] = city
         
-        # Insert into MongoDB
-        mongo.db.predictions.insert_one(doc)
+        # Queue the insert for the write-behind buffer; the stored copy gets the _id
+        with metrics.timer('mongo'):
+            if write_buffer is not None:
+                write_buffer.put(dict(doc))
+            else:
+                mongo.db.predictions.insert_one(dict(doc))
         return jsonify({'status': 'success', 'data': doc})
+    except BufferFull as e:
+        logger.warning(f"Write buffer full, rejecting prediction: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         logger.error(f"Error saving prediction: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def _history_response(result):
+    """Stream a history result as JSON, or as NDJSON when the client accepts it"""
+    mimetype = request.accept_mimetypes.best_match((JSON_MIMETYPE,) + NDJSON_MIMETYPES, JSON_MIMETYPE)
+    ndjson = mimetype in NDJSON_MIMETYPES
+    
+    def on_error(e):
+        logger.error(f"Error reading prediction history: {str(e)}")
+    
+    return Response(stream_json(result, ndjson=ndjson, on_error=on_error),
+                    mimetype=NDJSON_MIMETYPES[0] if ndjson else JSON_MIMETYPE)
+
+@app.route('/predictions/history')
+def prediction_history():
+    """
+    Saved predictions, newest first, one page at a time
+    
+    Query parameters (all optional): dept_id (comma-separated for several),
+    city, start_date/end_date (prediction date, inclusive), since/until (save
+    time), days_to_expiry or min_days_to_expiry/max_days_to_expiry, limit
+    (records per page) and cursor (next_cursor of the previous page, sent
+    with the same filters).
+    
+    Response: {"data": [...], "count": 100, "next_cursor": "...", "status": "success"},
+    with next_cursor null on the last page. Clients accepting
+    application/x-ndjson get one record per line and a final summary line.
+    """
+    try:
+        query = build_query(request.args)
+        limit = parse_limit(request.args.get('limit'), HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+        page = HistoryPage(mongo.db.predictions, query, limit=limit, cursor=request.args.get('cursor'),
+                           batch_size=HISTORY_BATCH_SIZE)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return _history_response(page)
+
+@app.route('/predictions/daily-average')
+def prediction_daily_average():
+    """
+    Average saved price per department and prediction day, grouped by MongoDB
+    
+    Takes the same filters as /predictions/history. Response:
+    {"data": [{"dept_id": "FOODS_1", "day": "2024-01-15", "avg_price": 0.42,
+               "min_price": 0.31, "max_price": 0.55, "count": 12}, ...],
+     "count": 1, "status": "success"}
+    """
+    try:
+        query = build_query(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return _history_response(DailyAverages(mongo.db.predictions, query, batch_size=HISTORY_BATCH_SIZE))
+
 @app.route('/predict', methods=['POST'])
 def predict_for_backend():
     """
@@ -421,7 +912,7 @@ def predict_for_backend():
         d2 = datetime.fromisoformat(expiry_date.replace('Z', '')) if expiry_date else None
         days_to_expiry = (d2 - d1).days if d1 and d2 else None
         # Prepare features for model
-        prediction = predictor.predict_single(
+        predicted_price = _predict_price(
             days_to_expiry=days_to_expiry,
             dept_id=dept_id,
             date=date_added,
@@ -432,7 +923,6 @@ def predict_for_backend():
             unit=unit,
             brand=brand
         )
-        predicted_price = prediction['predicted_price'].iloc[0]
         # Dummy demandScore/seasonality for now
         return jsonify({
             "bestPrice": float(predicted_price) if predicted_price is not None else None,
@@ -445,4 +935,8 @@ def predict_for_backend():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    ensure_history_indexes()
+    # With the debug reloader only the serving child process listens
+    if UDS_PATH and predictor is not None and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_binary_server()
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
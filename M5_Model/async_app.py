@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+"""
+Asyncio variant of the M5 Expiry Price Prediction API
+Same routes and payloads as app.py, served over ASGI (Starlette + uvicorn).
+CPU-bound prediction runs on a bounded thread pool so the event loop keeps
+accepting requests. Single predictions use app.py's coalescer and saved
+predictions its write-behind buffer, when enabled; otherwise MongoDB writes
+use PyMongo's native async client.
+
+Usage:
+    python async_app.py [--host 0.0.0.0] [--port 5000]
+    uvicorn async_app:app --port 5000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import functools
+import hmac
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+from pymongo import AsyncMongoClient
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import ClientDisconnect
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import http_date, parse_accept_header
+
+# Shares the loaded predictor and request helpers with the Flask app
+from app import (predictor, coalescer, write_buffer, _predict_price, _validate_batch_item, _batch_row,
+                 _predict_ndjson_chunk, MONGO_URI,
+                 NDJSON_CHUNK_SIZE, NDJSON_MIMETYPES, ANALYSIS_MAX_DATES, ANALYSIS_MAX_DAYS, STAGE_TIMING_HEADER,
+                 MODEL_RELOAD_TOKEN, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE, HISTORY_BATCH_SIZE, HISTORY_INDEXES)
+from calendar_index import parse_date_column
+from columnar import COLUMNAR_MIMETYPES, decode_columns, encode_columns, predict_columnar
+from prediction_history import DailyAverages, HistoryPage, build_query, ensure_indexes, parse_limit, stream_json_async
+from metrics import metrics, start_trace, current_trace, finish_trace, server_timing, PROMETHEUS_MIMETYPE
+from response_encoding import JSON_MIMETYPE, analysis_data, batch_data, dumps, parse_orient
+from write_buffer import BufferFull
+
+logger = logging.getLogger(__name__)
+
+# Prediction threads and how many more predictions may wait for one
+PREDICT_THREADS = int(os.environ.get('ASYNC_PREDICT_THREADS', min(4, os.cpu_count() or 1)))
+PREDICT_QUEUE = int(os.environ.get('ASYNC_PREDICT_QUEUE', 64))
+
+# Created on first use and torn down by the lifespan handler
+executor = None
+_predict_slots = None
+_predict_pending = 0
+
+mongo_client = AsyncMongoClient(MONGO_URI)
+predictions_collection = mongo_client.get_default_database('m5_predictions').predictions
+
+
+async def run_predictor(func, *args, **kwargs):
+    """
+    Run CPU-bound work on the prediction thread pool
+
+    At most PREDICT_THREADS + PREDICT_QUEUE calls are submitted at once;
+    further callers wait on the event loop instead of growing the pool's queue.
+    The call runs in a copy of the caller's context so stage traces follow it.
+    """
+    global executor, _predict_slots, _predict_pending
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=PREDICT_THREADS, thread_name_prefix='predict')
+        _predict_slots = asyncio.Semaphore(PREDICT_THREADS + PREDICT_QUEUE)
+
+    _predict_pending += 1
+    try:
+        async with _predict_slots:
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+    finally:
+        _predict_pending -= 1
+
+
+def _json_default(value):
+    """Encode values the way Flask's jsonify does"""
+    if isinstance(value, datetime):
+        return http_date(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class APIResponse(JSONResponse):
+    """JSON response matching the Flask app's output"""
+
+    def render(self, content):
+        return json.dumps(content, default=_json_default).encode('utf-8')
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded by response_encoding (prediction arrays are written directly)"""
+    media_type = JSON_MIMETYPE
+
+    def render(self, content):
+        return dumps(content)
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    Streaming response whose body is generated while the request body is read
+
+    StreamingResponse listens for client disconnects by calling receive()
+    alongside the body iterator, which would consume the request body chunks
+    the iterator is waiting for. Here the iterator reads the request itself,
+    so a disconnect surfaces as ClientDisconnect from request.stream().
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+
+class RequestMetricsMiddleware:
+    """Record request latency per route and return stage breakdowns on request (see app.py)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        token = start_trace() if Headers(scope=scope).get(STAGE_TIMING_HEADER) else None
+
+        async def send_with_metrics(message):
+            if message['type'] == 'http.response.start':
+                elapsed = time.perf_counter() - started
+                endpoint = ROUTE_PATHS.get(scope.get('endpoint'), 'unmatched')
+                metrics.observe_request(endpoint, scope['method'], message['status'], elapsed)
+                if token is not None:
+                    MutableHeaders(scope=message).append('Server-Timing', server_timing(current_trace(), elapsed))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if token is not None:
+                finish_trace(token)
+
+
+def error(message, status_code):
+    """Error response in the API's format"""
+    return APIResponse({'status': 'error', 'message': message}, status_code=status_code)
+
+
+async def read_json(request):
+    """Parse the request body as JSON, returning None for an empty or invalid body"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def home(request):
+    """Home endpoint with API information"""
+    return APIResponse({
+        'message': 'M5 Expiry Price Prediction API',
+        'version': '1.0.0',
+        'endpoints': {
+            '/': 'API information',
+            '/health': 'Health check',
+            '/predict/single': 'Single prediction',
+            '/predict/batch': 'Batch prediction',
+            '/model/info': 'Model information',
+            '/model/reload': 'Reload models without downtime',
+            '/metrics': 'Prometheus metrics',
+            '/save-prediction': 'Save prediction to MongoDB',
+            '/predictions/history': 'Saved predictions, filtered and paginated',
+            '/predictions/daily-average': 'Average saved price per department and day'
+        },
+        'supported_departments': ['FOODS_1', 'FOODS_2', 'FOODS_3']
+    })
+
+
+async def health_check(request):
+    """Health check endpoint"""
+    if predictor is None:
+        return error('Predictor not initialized', 500)
+
+    health = {
+        'status': 'healthy',
+        'message': 'API is running',
+        'models_loaded': len(predictor.models),
+        'model_version': predictor.model_version,
+        'executor': {
+            'threads': PREDICT_THREADS,
+            'max_submitted': PREDICT_THREADS + PREDICT_QUEUE,
+            'pending': _predict_pending
+        }
+    }
+    if write_buffer is not None:
+        health['write_buffer'] = write_buffer.stats()
+    if coalescer is not None:
+        health['coalescer'] = coalescer.stats()
+    return APIResponse(health)
+
+
+async def model_info(request):
+    """Get model information"""
+    if predictor is None:
+        return error('Predictor not initialized', 500)
+
+    return APIResponse({
+        'status': 'success',
+        'data': predictor.get_model_info()
+    })
+
+
+async def reload_models(request):
+    """Reload the models without downtime (see app.py); loading runs off the event loop"""
+    if predictor is None:
+        return error('Predictor not initialized', 500)
+    if MODEL_RELOAD_TOKEN and not hmac.compare_digest(request.headers.get('x-reload-token', ''), MODEL_RELOAD_TOKEN):
+        return error('Invalid reload token', 403)
+
+    try:
+        result = await asyncio.to_thread(predictor.reload_models)
+    except Exception as e:
+        logger.error(f"Error reloading models: {str(e)}")
+        return APIResponse({
+            'status': 'error',
+            'message': f'Reload failed: {str(e)}',
+            'model_version': predictor.model_version
+        }, status_code=500)
+    return APIResponse({'status': 'success', 'data': result})
+
+
+async def prometheus_metrics(request):
+    """Latency histograms, batch sizes and model call counts in Prometheus format"""
+    return Response(metrics.render(), headers={'Content-Type': PROMETHEUS_MIMETYPE})
+
+
+async def predict_single(request):
+    """Single prediction endpoint (same payload as app.py)"""
+    try:
+        data = await read_json(request)
+        if not data:
+            return error('No data provided', 400)
+
+        missing_fields = [field for field in ['days_to_expiry', 'dept_id'] if field not in data]
+        if missing_fields:
+            return error(f'Missing required fields: {missing_fields}', 400)
+
+        days_to_expiry = int(data['days_to_expiry'])
+        dept_id = data['dept_id']
+        date = data.get('date', datetime.now().strftime('%Y-%m-%d'))
+        city = data.get('city', None)
+        additional_features = data.get('additional_features', {})
+
+        if dept_id not in ['FOODS_1', 'FOODS_2', 'FOODS_3']:
+            return error('Invalid department. Must be one of: FOODS_1, FOODS_2, FOODS_3', 400)
+
+        prediction_params = {'days_to_expiry': days_to_expiry, 'dept_id': dept_id, 'date': date,
+                             **additional_features}
+        if city:
+            prediction_params['city'] = city
+
+        predicted_price = await run_predictor(_predict_price, **prediction_params)
+
+        return APIResponse({
+            'status': 'success',
+            'data': {
+                'days_to_expiry': days_to_expiry,
+                'dept_id': dept_id,
+                'date': date,
+                'city': city,
+                'predicted_price': float(predicted_price) if predicted_price is not None else None,
+                'additional_features': additional_features
+            }
+        })
+    except Exception as e:
+        logger.error(f"Error in single prediction: {str(e)}")
+        return error(f'Prediction failed: {str(e)}', 500)
+
+
+def _score_batch(rows, orient='rows'):
+    """Score validated batch rows and build the response data like the Flask endpoint"""
+    columns = {
+        'days_to_expiry': np.array([row['days_to_expiry'] for row in rows], dtype=np.float64),
+        'dept_id': np.array([row['dept_id'] for row in rows]),
+        'date': parse_date_column([row['date'] for row in rows])
+    }
+    # A row's city selects its store model, as in predict_batch
+    store = np.array([row.get('city') for row in rows], dtype=object) if any('city' in row for row in rows) else None
+    prices = predictor.predict_columns(columns['days_to_expiry'], columns['dept_id'], columns['date'], store=store)
+
+    fields = {name: [row[name] for row in rows] for name in ('days_to_expiry', 'dept_id', 'date')}
+    if any('city' in row for row in rows):
+        fields['city'] = [row.get('city', float('nan')) for row in rows]
+    return batch_data(fields, prices, orient)
+
+
+async def _stream_batch_predictions(request):
+    """Streaming NDJSON batch prediction (see app.py)"""
+    # An unparsable chunk_size falls back to the default, like Flask's type=int
+    try:
+        chunk_size = max(1, int(request.query_params.get('chunk_size', NDJSON_CHUNK_SIZE)))
+    except ValueError:
+        chunk_size = NDJSON_CHUNK_SIZE
+
+    def error_line(message, line_number=None):
+        logger.error(f"Error in streaming batch prediction: {message}")
+        line = {'status': 'error', 'message': message}
+        if line_number is not None:
+            line['line'] = line_number
+        return json.dumps(line) + '\n'
+
+    async def lines():
+        pending = b''
+        async for data in request.stream():
+            pending += data
+            *complete, pending = pending.split(b'\n')
+            for line in complete:
+                yield line
+        if pending:
+            yield pending
+
+    async def generate():
+        chunk = []
+        line_number = 0
+        try:
+            async for line in lines():
+                line_number += 1
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    message = _validate_batch_item(item, line_number)
+                    if message:
+                        raise ValueError(message)
+                    chunk.append(_batch_row(item))
+                except (ValueError, TypeError) as e:
+                    yield error_line(str(e), line_number)
+                    return
+
+                if len(chunk) >= chunk_size:
+                    yield await run_predictor(_predict_ndjson_chunk, chunk)
+                    chunk = []
+
+            if chunk:
+                yield await run_predictor(_predict_ndjson_chunk, chunk)
+        except Exception as e:
+            yield error_line(f'Batch prediction failed: {str(e)}')
+
+    return RequestStreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+async def _predict_columnar_batch(request, mimetype):
+    """Columnar batch prediction (see columnar.py)"""
+    body = await request.body()
+
+    def score():
+        predictions = predict_columnar(predictor, decode_columns(body, mimetype))
+        return encode_columns({'predicted_price': predictions}, mimetype)
+
+    try:
+        return Response(await run_predictor(score), media_type=mimetype)
+    except ImportError:
+        return error('Arrow IPC bodies require pyarrow on the server', 415)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        logger.error(f"Error in columnar batch prediction: {str(e)}")
+        return error(f'Batch prediction failed: {str(e)}', 500)
+
+
+async def predict_batch(request):
+    """Batch prediction endpoint (JSON, NDJSON or columnar, as in app.py)"""
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if mimetype in NDJSON_MIMETYPES:
+        return await _stream_batch_predictions(request)
+    if mimetype in COLUMNAR_MIMETYPES:
+        return await _predict_columnar_batch(request, mimetype)
+
+    try:
+        orient = parse_orient(request.query_params.get('orient'))
+    except ValueError as e:
+        return error(str(e), 400)
+
+    try:
+        data = await read_json(request)
+        if not data or 'items' not in data:
+            return error('No items provided', 400)
+
+        items = data['items']
+        if not items:
+            return error('Empty items list', 400)
+
+        for i, item in enumerate(items):
+            message = _validate_batch_item(item, i)
+            if message:
+                return error(message, 400)
+
+        rows = [_batch_row(item) for item in items]
+        metrics.observe_batch_size('/predict/batch', 'json', len(rows))
+        return FastJSONResponse({
+            'status': 'success',
+            'data': await run_predictor(_score_batch, rows, orient)
+        })
+    except Exception as e:
+        logger.error(f"Error in batch prediction: {str(e)}")
+        return error(f'Batch prediction failed: {str(e)}', 500)
+
+
+async def predict_analysis(request):
+    """Analysis endpoint, single-department curve or department x date grid (as in app.py)"""
+    try:
+        data = await read_json(request)
+        if data and 'dept_ids' in data:
+            return await _predict_analysis_grid(data)
+
+        if not data or 'dept_id' not in data:
+            return error('Department ID required', 400)
+
+        dept_id = data['dept_id']
+        date = data.get('date', datetime.now().strftime('%Y-%m-%d'))
+
+        if dept_id not in ['FOODS_1', 'FOODS_2', 'FOODS_3']:
+            return error('Invalid department', 400)
+        try:
+            max_days = int(data.get('max_days', 30))
+        except (ValueError, TypeError) as e:
+            return error(f'Invalid max_days: {str(e)}', 400)
+        if not 1 <= max_days <= ANALYSIS_MAX_DAYS:
+            return error(f'max_days must be between 1 and {ANALYSIS_MAX_DAYS}', 400)
+        try:
+            orient = parse_orient(request.query_params.get('orient'))
+        except ValueError as e:
+            return error(str(e), 400)
+
+        days = np.arange(1, max_days + 1)
+        day = np.datetime64(predictor._parse_date(date).date(), 'D')
+        prices = await run_predictor(predictor.predict_grid, [dept_id], [day], days)
+
+        return FastJSONResponse({
+            'status': 'success',
+            'data': analysis_data(dept_id, date, days, prices[0, 0], orient)
+        })
+    except Exception as e:
+        logger.error(f"Error in analysis: {str(e)}")
+        return error(f'Analysis failed: {str(e)}', 500)
+
+
+async def _predict_analysis_grid(data):
+    """Grid mode of /predict/analysis"""
+    dept_ids = data['dept_ids']
+    if isinstance(dept_ids, str):
+        dept_ids = [dept_ids]
+    if not dept_ids or not isinstance(dept_ids, list):
+        return error('dept_ids must be a non-empty list', 400)
+    invalid = [dept for dept in dept_ids if dept not in ['FOODS_1', 'FOODS_2', 'FOODS_3']]
+    if invalid:
+        return error(f'Invalid departments: {invalid}', 400)
+
+    try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        start = np.datetime64(predictor._parse_date(data.get('start_date', data.get('date', today))).date(), 'D')
+        end = np.datetime64(predictor._parse_date(data.get('end_date', str(start))).date(), 'D')
+        max_days = int(data.get('max_days', 30))
+    except (ValueError, TypeError) as e:
+        return error(f'Invalid analysis range: {str(e)}', 400)
+
+    dates = np.arange(start, end + 1)
+    if not 1 <= len(dates) <= ANALYSIS_MAX_DATES:
+        return error(f'Date range must cover 1 to {ANALYSIS_MAX_DATES} days', 400)
+    if not 1 <= max_days <= ANALYSIS_MAX_DAYS:
+        return error(f'max_days must be between 1 and {ANALYSIS_MAX_DAYS}', 400)
+
+    days = np.arange(1, max_days + 1)
+    prices = await run_predictor(predictor.predict_grid, dept_ids, dates, days)
+
+    return FastJSONResponse({
+        'status': 'success',
+        'data': {
+            'dept_ids': dept_ids,
+            'dates': dates.astype(str).tolist(),
+            'days_to_expiry': days,
+            'prices': prices,
+            'shape': list(prices.shape)
+        }
+    })
+
+
+async def save_prediction(request):
+    """
+    Save a prediction result to MongoDB without blocking the event loop
+
+    Like app.py, the document is queued on the write-behind buffer (503 when
+    it is full); with MONGO_WRITE_BEHIND=0 the insert is awaited on the
+    async client instead.
+    """
+    try:
+        data = await read_json(request)
+        if not data:
+            return error('No data provided', 400)
+        days_to_expiry = int(data['days_to_expiry'])
+        dept_id = data['dept_id']
+        date = data.get('date', datetime.now().strftime('%Y-%m-%d'))
+        city = data.get('city', None)
+
+        prediction_params = {'days_to_expiry': days_to_expiry, 'dept_id': dept_id, 'date': date}
+        if city:
+            prediction_params['city'] = city
+
+        predicted_price = await run_predictor(_predict_price, **prediction_params)
+
+        doc = {
+            'days_to_expiry': days_to_expiry,
+            'dept_id': dept_id,
+            'date': date,
+            'predicted_price': float(predicted_price),
+            'timestamp': datetime.now()
+        }
+        if city:
+            doc['city'] = city
+
+        # The stored copy gets the _id, the response stays JSON-serializable
+        with metrics.timer('mongo'):
+            if write_buffer is not None:
+                # Never waits: the buffer either takes the document or raises BufferFull
+                write_buffer.put(dict(doc))
+            else:
+                await predictions_collection.insert_one(dict(doc))
+        return APIResponse({'status': 'success', 'data': doc})
+    except BufferFull as e:
+        logger.warning(f"Write buffer full, rejecting prediction: {str(e)}")
+        return APIResponse({'status': 'error', 'message': str(e)}, status_code=503, headers={'Retry-After': '1'})
+    except Exception as e:
+        logger.error(f"Error saving prediction: {str(e)}")
+        return APIResponse({'status': 'error', 'message': str(e)}, status_code=500)
+
+
+def _history_response(request, result):
+    """Stream a history result as JSON, or as NDJSON when the client accepts it (see app.py)"""
+    accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    ndjson = accept.best_match((JSON_MIMETYPE,) + NDJSON_MIMETYPES, JSON_MIMETYPE) in NDJSON_MIMETYPES
+
+    def on_error(e):
+        logger.error(f"Error reading prediction history: {str(e)}")
+
+    return StreamingResponse(stream_json_async(result, ndjson=ndjson, on_error=on_error),
+                             media_type=NDJSON_MIMETYPES[0] if ndjson else JSON_MIMETYPE)
+
+
+async def prediction_history(request):
+    """Saved predictions, newest first, one page at a time (same parameters as app.py)"""
+    try:
+        query = build_query(request.query_params)
+        limit = parse_limit(request.query_params.get('limit'), HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+        page = HistoryPage(predictions_collection, query, limit=limit, cursor=request.query_params.get('cursor'),
+                           batch_size=HISTORY_BATCH_SIZE)
+    except ValueError as e:
+        return error(str(e), 400)
+    return _history_response(request, page)
+
+
+async def prediction_daily_average(request):
+    """Average saved price per department and prediction day (same parameters as app.py)"""
+    try:
+        query = build_query(request.query_params)
+    except ValueError as e:
+        return error(str(e), 400)
+    return _history_response(request, DailyAverages(predictions_collection, query, batch_size=HISTORY_BATCH_SIZE))
+
+
+async def predict_for_backend(request):
+    """Unified prediction endpoint for the Node.js backend (same payload as app.py)"""
+    try:
+        data = await read_json(request)
+        category_id = data.get('categoryId', '')
+        dept_id = '_'.join(category_id.split('_')[:2]) if category_id else None
+        date_added = data.get('dateAdded')
+        expiry_date = data.get('expiryDate')
+        d1 = datetime.fromisoformat(date_added.replace('Z', '')) if date_added else None
+        d2 = datetime.fromisoformat(expiry_date.replace('Z', '')) if expiry_date else None
+
+        predicted_price = await run_predictor(
+            _predict_price,
+            days_to_expiry=(d2 - d1).days if d1 and d2 else None,
+            dept_id=dept_id,
+            date=date_added,
+            city=data.get('cityId'),
+            mrp=float(data.get('mrp', 0)),
+            weight=float(data.get('weight', 0)) if data.get('weight') is not None else None,
+            stock=int(data.get('stock', 0)) if data.get('stock') is not None else None,
+            unit=data.get('unit', 'grams'),
+            brand=data.get('brandName', '')
+        )
+        return APIResponse({
+            "bestPrice": float(predicted_price) if predicted_price is not None else None,
+            "demandScore": 0.85,
+            "seasonality": "year-round",
+            "marketTrend": "stable"
+        })
+    except Exception as e:
+        logger.error(f"Error in /predict: {str(e)}")
+        return APIResponse({"error": str(e)}, status_code=500)
+
+
+async def ensure_history_indexes():
+    """Create the prediction history indexes without holding up startup"""
+    try:
+        names = await ensure_indexes(predictions_collection)
+        logger.info(f"✅ Prediction history indexes ready: {', '.join(names)}")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not create prediction history indexes: {str(e)}")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Create the history indexes in the background; close the Mongo client and the prediction threads on shutdown"""
+    global executor
+    indexing = asyncio.create_task(ensure_history_indexes()) if HISTORY_INDEXES else None
+    yield
+    if indexing is not None:
+        indexing.cancel()
+    await mongo_client.close()
+    if executor is not None:
+        executor.shutdown(wait=True)
+        executor = None
+
+
+app = Starlette(
+    routes=[
+        Route('/', home),
+        Route('/health', health_check),
+        Route('/model/info', model_info),
+        Route('/model/reload', reload_models, methods=['POST']),
+        Route('/metrics', prometheus_metrics),
+        Route('/predict/single', predict_single, methods=['POST']),
+        Route('/predict/batch', predict_batch, methods=['POST']),
+        Route('/predict/analysis', predict_analysis, methods=['POST']),
+        Route('/save-prediction', save_prediction, methods=['POST']),
+        Route('/predictions/history', prediction_history),
+        Route('/predictions/daily-average', prediction_daily_average),
+        Route('/predict', predict_for_backend, methods=['POST'])
+    ],
+    middleware=[
+        Middleware(RequestMetricsMiddleware),
+        Middleware(CORSMiddleware, allow_origins=['http://localhost:5173'], allow_credentials=True,
+                   allow_methods=['*'], allow_headers=['*'])
+    ],
+    lifespan=lifespan
+)
+ROUTE_PATHS = {route.endpoint: route.path for route in app.routes}
+
+
+def main():
+    """Main function"""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Run the asyncio variant of the API')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to bind')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)), help='Port to bind')
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,938 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for M5 Expiry Price Predictor
+This script measures prediction throughput and latency for the predictor.
+
+Usage:
+    python benchmark.py batch [--sizes 1000 10000 100000] [--repeat 3]
+    python benchmark.py single [--requests 2000]
+    python benchmark.py engine [--rows 1 8 64 512 4096]
+    python benchmark.py stream [--sizes 1000 10000 100000]
+    python benchmark.py columnar [--sizes 1000 10000 100000] [--repeat 3]
+    python benchmark.py analysis [--repeat 3]
+    python benchmark.py encode [--sizes 1000 10000 100000] [--repeat 3]
+    python benchmark.py calendar [--sizes 1000 10000 100000] [--repeat 3]
+    python benchmark.py stores [--stores 10] [--capacities 5 15 30] [--requests 2000]
+    python benchmark.py parallel [--workers 1 2 4] [--sizes 1000000] [--repeat 3]
+    python benchmark.py dedup [--sizes 10000 100000] [--repeat 3]
+    python benchmark.py writes [--requests 2000]
+    python benchmark.py history [--sizes 1000 10000]
+    python benchmark.py workers [--workers 1 2 4] [--clients 8] [--requests 2000]
+    python benchmark.py uds [--requests 2000]
+    python benchmark.py coalesce [--windows 1 2 5] [--clients 8] [--requests 2000]
+    python benchmark.py async [--clients 8] [--requests 2000]
+    python benchmark.py metrics [--requests 2000]
+    python benchmark.py startup [--repeat 3]
+"""
+
+import argparse
+import json
+import pickle
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+from predict_expiry_price import ExpiryPricePredictor
+
+warnings.filterwarnings('ignore')
+
+DEPARTMENTS = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+
+
+def make_inventory(n_rows, seed=42, start_date='2024-01-01', n_dates=90):
+    """
+    Create a synthetic inventory extract
+
+    Args:
+        n_rows (int): Number of rows to generate
+        seed (int): Random seed
+        start_date (str): First date of the window
+        n_dates (int): Number of distinct dates in the window
+
+    Returns:
+        pd.DataFrame: Rows with days_to_expiry, dept_id and date columns
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, periods=n_dates).strftime('%Y-%m-%d').to_numpy()
+    return pd.DataFrame({
+        'days_to_expiry': rng.integers(0, 60, n_rows),
+        'dept_id': rng.choice(DEPARTMENTS, n_rows),
+        'date': rng.choice(dates, n_rows)
+    })
+
+
+def time_call(func, repeat):
+    """Run func `repeat` times and return the best wall-clock time in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_batch(predictor, args):
+    """Measure predict_batch throughput at several batch sizes"""
+    print("\n📦 predict_batch throughput")
+    print("-" * 50)
+    print(f"{'rows':>10} {'seconds':>10} {'rows/sec':>14}")
+
+    for size in args.sizes:
+        data = make_inventory(size)
+        elapsed = time_call(lambda: predictor.predict_batch(data), args.repeat)
+        print(f"{size:>10} {elapsed:>10.4f} {size / elapsed:>14,.0f}")
+
+
+def latency_summary(samples):
+    """Format p50/p99 of a list of latencies in seconds as milliseconds"""
+    samples = np.asarray(samples) * 1000
+    return f"p50 {np.percentile(samples, 50):.3f} ms   p99 {np.percentile(samples, 99):.3f} ms"
+
+
+def bench_single(predictor, args):
+    """Measure single-item latency of the DataFrame path and the scalar path with and without the cache"""
+    print("\n🎯 Single prediction latency")
+    print("-" * 50)
+    rng = np.random.default_rng(7)
+    cases = [
+        (int(rng.integers(0, 60)), DEPARTMENTS[i % 3], '2024-01-15')
+        for i in range(args.requests)
+    ]
+    cache_size = predictor.cache.maxsize
+
+    runs = [
+        ('predict_single', predictor.predict_single, 0),
+        ('predict_price', predictor.predict_price, 0),
+        ('predict_price (cached)', predictor.predict_price, cache_size)
+    ]
+    for name, func, maxsize in runs:
+        predictor.cache.maxsize = maxsize
+        predictor.cache.clear()
+        samples = []
+        for days, dept, date in cases:
+            start = time.perf_counter()
+            func(days, dept, date)
+            samples.append(time.perf_counter() - start)
+        print(f"{name:>24}: {latency_summary(samples)}")
+
+    predictor.cache.maxsize = cache_size
+    print(f"Cache: {predictor.cache.stats()}")
+
+
+def bench_engine(predictor, args):
+    """Compare the flat-array engine, the booster and the sklearn wrapper per matrix size"""
+    print("\n🌲 Model call latency by matrix size (FOODS_1)")
+    print("-" * 50)
+    print(f"{'rows':>8} {'engine':>12} {'booster':>12} {'sklearn':>12}")
+    rng = np.random.default_rng(3)
+    with open(f"{predictor.model_dir}model_FOODS_1_optimized.pkl", 'rb') as f:
+        model = pickle.load(f)
+    calls = [
+        predictor.engines['FOODS_1'].predict,
+        predictor._boosters['FOODS_1'].inplace_predict,
+        model.predict
+    ]
+
+    for rows in args.rows:
+        X = rng.normal(size=(rows, len(predictor._get_feature_columns())))
+        repeat = max(1, args.requests // rows)
+        timings = [time_call(lambda: call(X), repeat) for call in calls]
+        print(f"{rows:>8} " + " ".join(f"{t * 1e6:>9.0f} us" for t in timings))
+
+
+def bench_stream(predictor, args):
+    """Compare JSON and streaming NDJSON /predict/batch: time, peak memory and time to first byte"""
+    import app as api
+
+    print("\n🌊 /predict/batch JSON vs NDJSON streaming")
+    print("-" * 50)
+    print(f"{'rows':>10} {'format':>8} {'seconds':>10} {'first byte':>12} {'peak MB':>10}")
+    client = api.app.test_client()
+
+    for size in args.sizes:
+        items = make_inventory(size).to_dict('records')
+        requests = {
+            'json': dict(json={'items': items}),
+            'ndjson': dict(data=''.join(json.dumps(item) + '\n' for item in items),
+                           content_type='application/x-ndjson')
+        }
+        for name, kwargs in requests.items():
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = client.post('/predict/batch', buffered=False, **kwargs)
+            body = iter(response.response)
+            next(body)
+            first_byte = time.perf_counter() - start
+            for _ in body:
+                pass
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{size:>10} {name:>8} {elapsed:>10.3f} {first_byte:>10.3f} s {peak / 1e6:>10.1f}")
+
+
+def bench_columnar(predictor, args):
+    """Compare JSON, Arrow IPC and raw NumPy /predict/batch: request/response size and end-to-end rows/s"""
+    import pyarrow as pa
+    import app as api
+    from columnar import (ARROW_STREAM_MIMETYPE, NUMPY_COLUMNS_MIMETYPE, DictionaryColumn,
+                          encode_numpy_columns)
+
+    print("\n🧱 /predict/batch JSON vs columnar bodies")
+    print("-" * 50)
+    print(f"{'rows':>10} {'format':>8} {'request KB':>12} {'response KB':>12} {'seconds':>10} {'rows/s':>12}")
+    client = api.app.test_client()
+
+    for size in args.sizes:
+        inventory = make_inventory(size)
+        days = inventory['days_to_expiry'].to_numpy(dtype=np.int16)
+        dept_codes = pd.Categorical(inventory['dept_id'], categories=DEPARTMENTS).codes.astype(np.uint8)
+        dates = inventory['date'].to_numpy().astype('datetime64[D]')
+
+        batch = pa.record_batch({
+            'days_to_expiry': pa.array(days),
+            'dept_id': pa.DictionaryArray.from_arrays(pa.array(dept_codes), pa.array(DEPARTMENTS)),
+            'date': pa.array(dates)
+        })
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+
+        requests = {
+            'json': dict(data=json.dumps({'items': inventory.to_dict('records')}),
+                         content_type='application/json'),
+            'arrow': dict(data=sink.getvalue().to_pybytes(), content_type=ARROW_STREAM_MIMETYPE),
+            'numpy': dict(data=encode_numpy_columns({
+                'days_to_expiry': days,
+                'dept_id': DictionaryColumn(dept_codes, DEPARTMENTS),
+                'date': dates
+            }), content_type=NUMPY_COLUMNS_MIMETYPE)
+        }
+        for name, kwargs in requests.items():
+            response = client.post('/predict/batch', **kwargs)
+            assert response.status_code == 200, response.get_data(as_text=True)[:200]
+            seconds = time_call(lambda: client.post('/predict/batch', **kwargs).get_data(), args.repeat)
+            print(f"{size:>10} {name:>8} {len(kwargs['data']) / 1e3:>12.1f} "
+                  f"{len(response.get_data()) / 1e3:>12.1f} {seconds:>10.3f} {size / seconds:>12,.0f}")
+
+
+def bench_analysis(predictor, args):
+    """Compare a per-point DataFrame sweep with predict_grid for department x date x days grids"""
+    print("\n📈 Price analysis grid: predict_batch rows vs predict_grid")
+    print("-" * 50)
+    print(f"{'dates':>8} {'days':>6} {'points':>10} {'batch s':>10} {'grid s':>10} {'speedup':>9}")
+
+    for n_dates, max_days in [(1, 30), (30, 30), (90, 90)]:
+        dates = pd.date_range('2024-01-01', periods=n_dates)
+        days = np.arange(1, max_days + 1)
+        rows = pd.DataFrame(
+            [(d, dept, date) for dept in DEPARTMENTS for date in dates.strftime('%Y-%m-%d') for d in days],
+            columns=['days_to_expiry', 'dept_id', 'date']
+        )
+
+        batch_time = time_call(lambda: predictor.predict_batch(rows), args.repeat)
+        grid_time = time_call(lambda: predictor.predict_grid(DEPARTMENTS, dates.to_numpy(), days), args.repeat)
+        print(f"{n_dates:>8} {max_days:>6} {len(rows):>10} {batch_time:>10.4f} {grid_time:>10.4f} "
+              f"{batch_time / grid_time:>8.1f}x")
+
+
+def bench_encode(predictor, args):
+    """Compare encoding a batch response: per-row iterrows + json, row objects and columns via response_encoding"""
+    import response_encoding
+    from response_encoding import batch_data, dumps
+
+    backend = 'orjson' if response_encoding.orjson is not None else 'json'
+    print(f"\n🧾 Batch response encoding (backend: {backend})")
+    print("-" * 50)
+    print(f"{'rows':>10} {'encoder':>10} {'seconds':>10} {'peak MB':>10} {'body MB':>10}")
+
+    for size in args.sizes:
+        results = make_inventory(size)
+        results['predicted_price'] = predictor.predict_batch(results)['predicted_price']
+
+        def legacy():
+            predictions = [{
+                'days_to_expiry': int(row['days_to_expiry']),
+                'dept_id': row['dept_id'],
+                'date': row['date'],
+                'predicted_price': float(row['predicted_price'])
+            } for _, row in results.iterrows()]
+            return json.dumps({'predictions': predictions, 'total_items': len(predictions)}).encode()
+
+        def encoder(orient):
+            def encode():
+                columns = {name: results[name].to_numpy() for name in ('days_to_expiry', 'dept_id', 'date')}
+                return dumps(batch_data(columns, results['predicted_price'].to_numpy(), orient))
+            return encode
+
+        for name, encode in (('iterrows', legacy), ('rows', encoder('rows')), ('columns', encoder('columns'))):
+            seconds = time_call(encode, args.repeat)
+            tracemalloc.start()
+            body = encode()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{size:>10} {name:>10} {seconds:>10.4f} {peak / 1e6:>10.1f} {len(body) / 1e6:>10.2f}")
+
+
+def bench_calendar(predictor, args):
+    """Compare date parsing and calendar features: pandas datetime accessors vs the calendar index"""
+    from calendar_index import calendar_fields, parse_date_column
+
+    print("\n📅 Date features: pandas vs calendar index")
+    print("-" * 50)
+    print(f"{'rows':>10} {'parse pandas':>13} {'parse ISO':>11} {'fields pandas':>14} "
+          f"{'arithmetic':>11} {'index':>9}")
+
+    for size in args.sizes:
+        strings = make_inventory(size)['date']
+        dates = pd.to_datetime(strings)
+
+        def parse_iso():
+            return parse_date_column(strings)
+
+        def pandas_fields():
+            return (dates.dt.year, dates.dt.month, dates.dt.day, dates.dt.dayofweek,
+                    dates.dt.isocalendar().week)
+
+        days = parse_iso()
+        parse_pandas_time = time_call(lambda: pd.to_datetime(strings), args.repeat)
+        parse_iso_time = time_call(parse_iso, args.repeat)
+        pandas_time = time_call(pandas_fields, args.repeat)
+        arithmetic_time = time_call(lambda: calendar_fields(days), args.repeat)
+        index_time = time_call(lambda: predictor.calendar.lookup(days), args.repeat)
+        print(f"{size:>10} {parse_pandas_time * 1000:>10.2f} ms {parse_iso_time * 1000:>8.2f} ms "
+              f"{pandas_time * 1000:>11.2f} ms {arithmetic_time * 1000:>8.2f} ms {index_time * 1000:>6.2f} ms")
+
+
+def bench_stores(predictor, args):
+    """Per-store model registry under skewed traffic: hit rate, loads, evictions and latency per capacity"""
+    import shutil
+    import tempfile
+    from model_registry import ModelRegistry
+
+    stores = [f'S_{i}' for i in range(args.stores)]
+    keys = [(dept, store) for store in stores for dept in DEPARTMENTS]
+    store_dir = tempfile.mkdtemp(prefix='m5_stores_') + '/'
+    try:
+        # Every store reuses the department model files; exports are built up front
+        for dept, store in keys:
+            for kind in ('model', 'scaler'):
+                shutil.copy(f"{predictor.model_dir}{kind}_{dept}_optimized.pkl",
+                            f"{store_dir}{kind}_{dept}_{store}_optimized.pkl")
+        ModelRegistry(predictor, store_dir, max_models=len(keys)).preload()
+
+        # Zipf-like popularity: a few stores take most requests
+        rng = np.random.default_rng(0)
+        weights = 1 / np.arange(1, len(keys) + 1)
+        traffic = rng.choice(len(keys), args.requests, p=weights / weights.sum())
+        days = rng.integers(0, 60, args.requests)
+
+        print(f"\n🏬 Store model registry ({len(keys)} models, {args.requests} requests)")
+        print("-" * 50)
+        print(f"{'capacity':>9} {'hit rate':>9} {'loads':>7} {'evictions':>10} {'MB':>7}   latency")
+        for capacity in args.capacities:
+            predictor.store_models = ModelRegistry(predictor, store_dir, max_models=capacity)
+            predictor.cache.clear()
+            samples = []
+            for k, d in zip(traffic, days):
+                dept, store = keys[k]
+                start = time.perf_counter()
+                predictor.predict_price(int(d), dept, '2024-01-15', city=store)
+                samples.append(time.perf_counter() - start)
+            stats = predictor.store_models.stats()
+            print(f"{capacity:>9} {stats['hit_rate']:>9.1%} {stats['loads']:>7} {stats['evictions']:>10} "
+                  f"{stats['memory_mb']:>7.1f}   {latency_summary(samples)}")
+    finally:
+        predictor.store_models = None
+        shutil.rmtree(store_dir)
+
+
+def make_repricing_inventory(n_rows, scenario, seed=42):
+    """
+    Create an inventory extract with a realistic amount of repetition
+
+    Args:
+        n_rows (int): Number of rows to generate
+        scenario (str): 'nightly' (one date, common expiry horizons), 'promotions'
+            (nightly plus promotion levels and shelf price points), 'weekly'
+            (seven dates, days 0-59) or 'unique' (continuous features, no repetition)
+        seed (int): Random seed
+
+    Returns:
+        pd.DataFrame: Rows with days_to_expiry, dept_id, date and feature columns
+    """
+    rng = np.random.default_rng(seed)
+    # Most stock is a few days from expiry; few items have months left
+    horizon = np.minimum(rng.geometric(0.15, n_rows) - 1, 59)
+    data = pd.DataFrame({
+        'days_to_expiry': horizon,
+        'dept_id': rng.choice(DEPARTMENTS, n_rows, p=[0.2, 0.3, 0.5]),
+        'date': '2024-03-01'
+    })
+    if scenario == 'promotions':
+        data['promo_impact'] = rng.choice([0.0, 0.1, 0.2, 0.3], n_rows, p=[0.7, 0.1, 0.1, 0.1])
+        data['sell_price_lag_7'] = rng.choice(np.arange(0.99, 20, 1.0), n_rows)
+    elif scenario == 'weekly':
+        data['days_to_expiry'] = rng.integers(0, 60, n_rows)
+        data['date'] = rng.choice(pd.date_range('2024-03-01', periods=7).strftime('%Y-%m-%d').to_numpy(), n_rows)
+    elif scenario == 'unique':
+        data['sell_price_lag_7'] = rng.uniform(0.5, 20, n_rows)
+    return data
+
+
+def bench_dedup(predictor, args):
+    """predict_batch with and without in-batch deduplication on repetitive and unique batches"""
+    print("\n🧬 In-batch deduplication")
+    print("-" * 50)
+    print(f"{'scenario':>11} {'rows':>9} {'distinct':>9} {'dup rate':>9} {'off':>9} {'on':>9} {'speedup':>8}")
+    predictor.cache.clear()
+    dedup_rows = predictor.dedup_rows
+    try:
+        for size in args.sizes:
+            for scenario in ('nightly', 'promotions', 'weekly', 'unique'):
+                data = make_repricing_inventory(size, scenario)
+                predictor.dedup_rows = False
+                off = time_call(lambda: predictor.predict_batch(data), args.repeat)
+                predictor.dedup_rows = True
+                before = predictor.dedup_stats()
+                on = time_call(lambda: predictor.predict_batch(data), args.repeat)
+                after = predictor.dedup_stats()
+                distinct = (after['unique_rows'] - before['unique_rows']) // args.repeat
+                rate = 1 - distinct / size
+                print(f"{scenario:>11} {size:>9,} {distinct:>9,} {rate:>9.1%} {off * 1000:>6.0f} ms "
+                      f"{on * 1000:>6.0f} ms {off / on:>7.1f}x")
+    finally:
+        predictor.dedup_rows = dedup_rows
+
+
+def bench_parallel(predictor, args):
+    """predict_batch rows/sec in-process vs on a ParallelScorer pool of 1..N workers"""
+    import os
+    from parallel import ParallelScorer
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    print(f"\n🧵 Parallel scoring ({cpus} CPUs)")
+    print("-" * 50)
+    print(f"{'rows':>10} {'workers':>8} {'threads':>8} {'time':>9} {'rows/s':>12} {'speedup':>8}")
+    predictor.cache.clear()
+    for size in args.sizes:
+        data = make_inventory(size)
+        serial = time_call(lambda: predictor.predict_batch(data), args.repeat)
+        print(f"{size:>10,} {'-':>8} {'-':>8} {serial * 1000:>6.0f} ms {size / serial:>12,.0f} {1:>7.2f}x")
+        for workers in args.workers:
+            scorer = ParallelScorer(predictor, workers=workers, min_rows=1).start()
+            predictor.parallel = scorer
+            try:
+                elapsed = time_call(lambda: predictor.predict_batch(data), args.repeat)
+            finally:
+                predictor.parallel = None
+                scorer.close()
+            print(f"{size:>10,} {workers:>8} {scorer.threads:>8} {elapsed * 1000:>6.0f} ms "
+                  f"{size / elapsed:>12,.0f} {serial / elapsed:>7.2f}x")
+
+
+class LatencyCollection:
+    """mongomock collection that sleeps for a simulated network round trip per call"""
+
+    def __init__(self, round_trip=0.002):
+        import mongomock
+        self.round_trip = round_trip
+        self.collection = mongomock.MongoClient().db.predictions
+
+    def insert_one(self, doc):
+        time.sleep(self.round_trip)
+        return self.collection.insert_one(doc)
+
+    def insert_many(self, docs, ordered=True):
+        time.sleep(self.round_trip)
+        return self.collection.insert_many(docs, ordered=ordered)
+
+
+def bench_writes(predictor, args):
+    """Compare /save-prediction latency with synchronous inserts and the write-behind buffer"""
+    import app as api
+    from write_buffer import WriteBehindBuffer
+
+    print("\n🗄️ /save-prediction: insert_one vs write-behind buffer (2 ms simulated round trip)")
+    print("-" * 50)
+    client = api.app.test_client()
+    body = {'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15'}
+    original = api.write_buffer, api.mongo.db
+
+    class FakeDatabase:
+        predictions = LatencyCollection()
+
+    modes = {
+        'insert_one': None,
+        'write-behind': WriteBehindBuffer(LatencyCollection(), flush_interval=0.05)
+    }
+    try:
+        api.mongo.db = FakeDatabase()
+        for name, buffer in modes.items():
+            api.write_buffer = buffer
+            samples = []
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                client.post('/save-prediction', json=body)
+                samples.append(time.perf_counter() - start)
+            if buffer is not None:
+                buffer.flush()
+                round_trips = buffer.stats()['flushes']
+            else:
+                round_trips = args.requests
+            print(f"  {name:<14} {latency_summary(samples)}   {round_trips} round trips")
+    finally:
+        api.write_buffer, api.mongo.db = original
+
+
+def process_memory(pid):
+    """RSS, PSS and private (USS) memory of a process in MB, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return fields.get('Rss', 0), fields.get('Pss', 0), private
+
+
+def _client_requests(port, n_requests, path='/predict/single'):
+    """Send prediction requests over one keep-alive connection and return the latencies"""
+    import http.client
+
+    body = json.dumps({'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15'})
+    headers = {'Content-Type': 'application/json'}
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies = []
+    for i in range(n_requests):
+        start = time.perf_counter()
+        connection.request('POST', path, body=body, headers=headers)
+        connection.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+class AsyncLatencyCollection(LatencyCollection):
+    """Async counterpart of LatencyCollection, awaiting the simulated round trip"""
+
+    async def insert_one(self, doc):
+        import asyncio
+        await asyncio.sleep(self.round_trip)
+        return self.collection.insert_one(doc)
+
+
+def bench_history(predictor, args):
+    """Compare dumping the predictions collection with filtered history pages and streamed exports"""
+    import mongomock
+    import app as api
+    from datetime import datetime, timedelta
+
+    print("\n📜 Prediction history: recent FOODS_1 prices in CA_1 (mongomock, which has no indexes; best of --repeat)")
+    print("-" * 50)
+    print(f"{'documents':>10} {'method':>22} {'returned':>9} {'time':>10} {'peak memory':>12}")
+    client = api.app.test_client()
+    original = api.mongo.db, api.write_buffer
+    try:
+        for size in args.sizes:
+            rng = np.random.default_rng(0)
+            inventory = make_inventory(size)
+            start = datetime(2024, 6, 1)
+            database = mongomock.MongoClient().db
+            database.predictions.insert_many([
+                {'days_to_expiry': int(days), 'dept_id': dept, 'date': date, 'city': city,
+                 'predicted_price': float(price), 'timestamp': start + timedelta(seconds=i)}
+                for i, (days, dept, date, city, price) in enumerate(zip(
+                    inventory['days_to_expiry'], inventory['dept_id'], inventory['date'],
+                    rng.choice(['CA_1', 'CA_2', 'TX_1', 'WI_1'], size), rng.uniform(0.1, 0.9, size)))
+            ])
+            api.mongo.db, api.write_buffer = database, None
+
+            def dump():
+                # What analysts do today: read everything, filter and sort client-side
+                docs = [doc for doc in database.predictions.find()
+                        if doc['dept_id'] == 'FOODS_1' and doc.get('city') == 'CA_1']
+                docs.sort(key=lambda doc: doc['timestamp'], reverse=True)
+                return len(docs[:100])
+
+            methods = [
+                ('dump + filter', dump),
+                ('history page (100)', lambda: client.get(
+                    '/predictions/history?dept_id=FOODS_1&city=CA_1&limit=100').get_json()['count']),
+                ('daily averages', lambda: client.get(
+                    '/predictions/daily-average?dept_id=FOODS_1&city=CA_1').get_json()['count']),
+                ('NDJSON export', lambda: sum(1 for chunk in client.get(
+                    f'/predictions/history?dept_id=FOODS_1&city=CA_1&limit={api.HISTORY_MAX_PAGE_SIZE}',
+                    headers={'Accept': 'application/x-ndjson'}).response for _ in chunk.splitlines()) - 1)
+            ]
+            for name, func in methods:
+                elapsed = time_call(func, args.repeat)
+                tracemalloc.start()
+                returned = func()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{size:>10,} {name:>22} {returned:>9,} {elapsed * 1000:>7.1f} ms {peak / 1e6:>9.1f} MB")
+    finally:
+        api.mongo.db, api.write_buffer = original
+
+
+def bench_async(predictor, args):
+    """Side-by-side load test of the Flask app and the asyncio app (2 ms simulated Mongo round trip)"""
+    import asyncio
+    import threading
+    from concurrent.futures import ProcessPoolExecutor
+    import uvicorn
+    from werkzeug.serving import make_server
+    import app as api
+    import async_app
+    from serve import KeepAliveRequestHandler
+    from serve_process import free_port
+    from write_buffer import WriteBehindBuffer
+
+    print(f"\n⚡ Flask vs asyncio app ({args.clients} keep-alive clients, 2 ms simulated Mongo round trip)")
+    print("-" * 50)
+    print(f"{'server':>22} {'endpoint':>17} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    per_client = max(1, args.requests // args.clients)
+
+    class FakeDatabase:
+        predictions = LatencyCollection()
+
+    def flask_server(port):
+        server = make_server('127.0.0.1', port, api.app, threaded=True, request_handler=KeepAliveRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server.shutdown
+
+    def async_server(port):
+        server = uvicorn.Server(uvicorn.Config(async_app.app, host='127.0.0.1', port=port, log_level='warning'))
+        thread = threading.Thread(target=asyncio.run, args=(server.serve(),), daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+
+        def stop():
+            server.should_exit = True
+            thread.join()
+        return stop
+
+    servers = [
+        ('flask, insert_one', flask_server, None),
+        ('flask, write-behind', flask_server, WriteBehindBuffer(LatencyCollection(), flush_interval=0.05)),
+        ('asyncio', async_server, None)
+    ]
+    original = api.write_buffer, api.mongo.db, async_app.predictions_collection
+    # Client processes are forked before any server thread starts
+    with ProcessPoolExecutor(args.clients) as pool:
+        list(pool.map(time.sleep, [0] * args.clients))
+        try:
+            api.mongo.db = FakeDatabase()
+            async_app.predictions_collection = AsyncLatencyCollection()
+            for name, start_server, buffer in servers:
+                api.write_buffer = buffer
+                port = free_port()
+                stop = start_server(port)
+                try:
+                    for path in ['/predict/single', '/save-prediction']:
+                        ports, paths = [port] * args.clients, [path] * args.clients
+                        list(pool.map(_client_requests, ports, [10] * args.clients, paths))
+                        start = time.perf_counter()
+                        results = list(pool.map(_client_requests, ports, [per_client] * args.clients, paths))
+                        elapsed = time.perf_counter() - start
+                        latencies = np.concatenate(results) * 1000
+                        print(f"{name:>22} {path:>17} {latencies.size / elapsed:>10,.0f} "
+                              f"{np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f}")
+                finally:
+                    stop()
+                    if buffer is not None:
+                        buffer.close()
+        finally:
+            api.write_buffer, api.mongo.db, async_app.predictions_collection = original
+
+
+def bench_metrics(predictor, args):
+    """Instrumentation overhead: metrics disabled, enabled, and enabled with a per-request trace"""
+    import app as api
+    from metrics import metrics
+
+    print("\n📏 Instrumentation overhead")
+    print("-" * 50)
+    uncached = ExpiryPricePredictor(cache_size=0)
+    client = api.app.test_client()
+    items = [{'days_to_expiry': d % 60, 'dept_id': DEPARTMENTS[d % 3], 'date': '2024-01-15'} for d in range(100)]
+
+    cases = [
+        ('predict_price', lambda headers: uncached.predict_price(5, 'FOODS_1', '2024-01-15'), args.requests),
+        ('/predict/batch (100)', lambda headers: client.post('/predict/batch', json={'items': items},
+                                                             headers=headers), max(1, args.requests // 20))
+    ]
+    modes = [('disabled', False, {}), ('enabled', True, {}), ('traced', True, {api.STAGE_TIMING_HEADER: '1'})]
+    enabled = metrics.enabled
+    try:
+        for name, func, n in cases:
+            # Interleave the modes so drift on a busy machine hits all of them alike
+            samples = {mode: [] for mode, _, _ in modes}
+            for _ in range(n):
+                for mode, on, headers in modes:
+                    metrics.enabled = on
+                    start = time.perf_counter()
+                    func(headers)
+                    samples[mode].append(time.perf_counter() - start)
+            for mode, _, _ in modes:
+                print(f"  {name:<22} {mode:<9} {latency_summary(samples[mode])}")
+    finally:
+        metrics.enabled = enabled
+
+
+def bench_workers(predictor, args):
+    """Requests/sec and per-worker memory of serve.py for several worker counts"""
+    import os
+    import signal
+    from concurrent.futures import ProcessPoolExecutor
+    from serve_process import start_server, worker_pids
+
+    print(f"\n👷 serve.py workers ({os.cpu_count()} CPUs, {args.clients} keep-alive clients)")
+    print("-" * 50)
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'parent RSS':>11} {'worker RSS':>11} {'worker PSS':>11} {'worker USS':>11}")
+
+    per_client = max(1, args.requests // args.clients)
+    for workers in args.workers:
+        process, port = start_server(workers)
+        try:
+            with ProcessPoolExecutor(args.clients) as pool:
+                list(pool.map(_client_requests, [port] * args.clients, [10] * args.clients))
+                start = time.perf_counter()
+                results = list(pool.map(_client_requests, [port] * args.clients, [per_client] * args.clients))
+                elapsed = time.perf_counter() - start
+
+            latencies = np.concatenate(results) * 1000
+            parent_rss = process_memory(process.pid)[0]
+            memory = np.array([process_memory(pid) for pid in worker_pids(process.pid)])
+            rss, pss, uss = memory.mean(axis=0)
+            print(f"{workers:>8} {latencies.size / elapsed:>10,.0f} {np.percentile(latencies, 50):>8.2f} "
+                  f"{np.percentile(latencies, 99):>8.2f} {parent_rss:>8.1f} MB {rss:>8.1f} MB "
+                  f"{pss:>8.1f} MB {uss:>8.1f} MB")
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+
+
+def bench_uds(predictor, args):
+    """serve.py answering the Node backend's /predict over HTTP vs the binary protocol on a Unix socket"""
+    import http.client
+    import os
+    import signal
+    import tempfile
+    from binary_protocol import BinaryClient, encode_request
+    from serve_process import start_server
+
+    path = os.path.join(tempfile.mkdtemp(prefix='m5_uds_'), 'predict.sock')
+    process, port = start_server(workers=1, env={'UDS_PATH': path})
+    # The body backend/routes/grocery.js sends for one product
+    body = json.dumps({'categoryId': 'FOODS_1_001', 'cityId': 'CA_1', 'mrp': 99.99,
+                       'dateAdded': '2024-01-15T10:30:00.000Z', 'expiryDate': '2024-01-20T10:30:00.000Z',
+                       'weight': 500, 'stock': 100, 'productType': 'grocery', 'brandName': 'Organic Brand',
+                       'unit': 'grams'})
+    item = {'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15', 'city': 'CA_1'}
+
+    print(f"\n🔌 /predict over HTTP vs binary protocol over a Unix socket ({args.requests} requests)")
+    print("-" * 50)
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Content-Type': 'application/json'}
+
+        def http_request():
+            connection.request('POST', '/predict', body=body, headers=headers)
+            return connection.getresponse().read()
+
+        with BinaryClient(path, window=64) as client:
+            results = []
+            for name, call in (('HTTP /predict', http_request), ('UDS one at a time', lambda: client.predict(**item))):
+                for _ in range(50):
+                    call()
+                samples = []
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    call()
+                    samples.append(time.perf_counter() - start)
+                results.append((name, len(samples) / sum(samples), latency_summary(samples)))
+
+            client.predict_many([item] * 64)
+            start = time.perf_counter()
+            client.predict_many([item] * args.requests)
+            elapsed = time.perf_counter() - start
+            results.append(('UDS pipelined (64)', args.requests / elapsed, 'mean '
+                            f'{elapsed / args.requests * 1000:.3f} ms'))
+
+        for name, rate, latency in results:
+            print(f"{name:>20} {rate:>10,.0f} req/s   {latency}")
+        print(f"{'request bytes':>20}   HTTP body {len(body)} + headers, binary {len(encode_request(0, **item))}")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+def bench_coalesce(predictor, args):
+    """Load test concurrent single predictions with and without the request coalescer"""
+    import threading
+    from coalescer import PredictionCoalescer
+
+    print(f"\n🧺 Concurrent single predictions: direct vs coalesced ({args.clients} client threads)")
+    print("-" * 50)
+    print(f"{'mode':>14} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>10}")
+    uncached = ExpiryPricePredictor(cache_size=0)
+    rng = np.random.default_rng(0)
+    per_client = max(1, args.requests // args.clients)
+
+    def load(predict):
+        """Run the clients and return (requests/sec, latencies in ms)"""
+        latencies = [[] for _ in range(args.clients)]
+        barrier = threading.Barrier(args.clients + 1)
+
+        inputs = [(rng.integers(0, 365, per_client).tolist(), rng.choice(DEPARTMENTS, per_client))
+                  for _ in range(args.clients)]
+
+        def client(i):
+            barrier.wait()
+            for d, dept in zip(*inputs[i]):
+                start = time.perf_counter()
+                predict(d, dept, '2024-01-15')
+                latencies[i].append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        samples = np.concatenate(latencies) * 1000
+        return samples.size / elapsed, samples
+
+    modes = [('direct', uncached.predict_price, None)]
+    for window in args.windows:
+        coalescer = PredictionCoalescer(uncached, window=window / 1000)
+        modes.append((f'{window:g} ms window', coalescer.predict_price, coalescer))
+
+    for name, predict, coalescer in modes:
+        throughput, samples = load(predict)
+        batch = f"{coalescer.stats()['batch_size_avg']:.1f}" if coalescer else '1'
+        print(f"{name:>14} {throughput:>10,.0f} {np.percentile(samples, 50):>8.3f} "
+              f"{np.percentile(samples, 99):>8.3f} {batch:>10}")
+
+
+# Run in a fresh interpreter: times each startup phase and prints them as JSON
+_STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from predict_expiry_price import ExpiryPricePredictor
+imported = time.perf_counter()
+predictor = ExpiryPricePredictor(model_dir=sys.argv[1], booster_loading='lazy')
+loaded = time.perf_counter()
+predictor.predict_price(5, 'FOODS_1', '2024-01-15')
+first = time.perf_counter()
+heavy = [name for name in ('pandas', 'sklearn', 'xgboost') if name in sys.modules]
+import numpy as np
+rows = np.arange(1000)
+predictor.predict_columns(rows % 60, rows % 3, np.full(len(rows), np.datetime64('2024-01-15')))
+batch = time.perf_counter()
+print(json.dumps({'import': imported - started, 'load': loaded - imported, 'first': first - loaded,
+                  'batch': batch - first, 'heavy': heavy}))
+"""
+
+
+def bench_startup(predictor, args):
+    """Cold start in a fresh process: import, model load, first prediction and first large batch"""
+    import os
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+
+    print("\n🚀 Startup time (fresh process, best of --repeat)")
+    print("-" * 50)
+    print(f"{'models from':>14} {'import':>9} {'load':>9} {'1st single':>11} {'to 1st':>9} "
+          f"{'1st batch':>10}  modules imported before the batch")
+
+    model_dir = tempfile.mkdtemp(prefix='m5_startup_') + '/'
+    try:
+        runs = {'pickles': [], 'export': []}
+        for _ in range(args.repeat):
+            # Without an export the first start unpickles the models and writes one
+            for name in os.listdir(model_dir):
+                os.remove(os.path.join(model_dir, name))
+            for name in os.listdir(predictor.model_dir):
+                if name.endswith('_optimized.pkl'):
+                    shutil.copy(os.path.join(predictor.model_dir, name), model_dir)
+            for scenario in ('pickles', 'export'):
+                output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, model_dir], check=True,
+                                        capture_output=True, text=True,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+                runs[scenario].append(json.loads(output.strip().splitlines()[-1]))
+
+        for scenario, results in runs.items():
+            best = min(results, key=lambda r: r['import'] + r['load'] + r['first'])
+            to_first = best['import'] + best['load'] + best['first']
+            print(f"{scenario:>14} {best['import'] * 1000:>6.0f} ms {best['load'] * 1000:>6.0f} ms "
+                  f"{best['first'] * 1000:>8.1f} ms {to_first * 1000:>6.0f} ms {best['batch'] * 1000:>7.0f} ms  "
+                  f"{', '.join(best['heavy']) or 'none'}")
+    finally:
+        shutil.rmtree(model_dir)
+
+
+BENCHMARKS = {
+    'batch': bench_batch,
+    'single': bench_single,
+    'engine': bench_engine,
+    'stream': bench_stream,
+    'columnar': bench_columnar,
+    'analysis': bench_analysis,
+    'encode': bench_encode,
+    'calendar': bench_calendar,
+    'stores': bench_stores,
+    'parallel': bench_parallel,
+    'dedup': bench_dedup,
+    'writes': bench_writes,
+    'history': bench_history,
+    'workers': bench_workers,
+    'uds': bench_uds,
+    'coalesce': bench_coalesce,
+    'async': bench_async,
+    'metrics': bench_metrics,
+    'startup': bench_startup,
+}
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='M5 Expiry Price Predictor benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS) + ['all'], help='Benchmark to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Batch sizes to measure')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per measurement (best is reported)')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per latency measurement')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1, 8, 64, 512, 4096],
+                        help='Matrix sizes for the engine benchmark')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='Worker counts for the serve.py and parallel benchmarks')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='Concurrent clients for the server, coalescer and async benchmarks')
+    parser.add_argument('--windows', type=float, nargs='+', default=[1, 2, 5],
+                        help='Coalescing windows in milliseconds')
+    parser.add_argument('--stores', type=int, default=10, help='Stores for the store model benchmark')
+    parser.add_argument('--capacities', type=int, nargs='+', default=[5, 15, 30],
+                        help='Registry sizes (max_models) for the store model benchmark')
+    args = parser.parse_args()
+
+    print("🍽️ M5 Expiry Price Predictor - Benchmark")
+    print("=" * 50)
+    predictor = ExpiryPricePredictor()
+
+    selected = sorted(BENCHMARKS) if args.benchmark == 'all' else [args.benchmark]
+    for name in selected:
+        BENCHMARKS[name](predictor, args)
+
+
+if __name__ == "__main__":
+    main()
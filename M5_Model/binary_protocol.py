@@ -0,0 +1,434 @@
+"""
+Binary prediction protocol over a Unix domain socket
+Lets a co-located process (the Node backend) get single predictions without
+TCP, HTTP parsing or JSON: every request and response is a small
+length-prefixed binary frame, and a connection can carry any number of
+requests in flight (pipelining). Responses come back in request order.
+
+Framing (all integers little-endian):
+    frame       uint32 payload length, then the payload (at most MAX_FRAME bytes)
+
+Request payload:
+    uint8   message type: 1 = predict, 2 = info
+    uint32  request id, echoed in the response
+    float64 days_to_expiry
+    int32   date as days since 1970-01-01; NO_DATE (-2^31) means today
+    uint8   number of features (n)
+    uint8   dept_id length, uint8 city length (0 = no city)
+    bytes   dept_id (ASCII), then city (ASCII)
+    n x     (uint8 feature id, float64 value), ids indexing FEATURES
+An info request sends only the type and request id.
+
+Response payload:
+    uint8   message type of the request
+    uint32  request id
+    uint8   status: 0 = ok, 1 = no model for the department (price is NaN),
+            2 = bad request (the rest of the payload is a UTF-8 error message)
+    float64 predicted price
+    bytes   error message, or for info the JSON protocol description
+
+A predict request with a date and city is 35 bytes, against a few hundred for
+the JSON body and HTTP headers of /predict. A malformed payload gets a
+status 2 response and the connection stays usable; a frame longer than
+MAX_FRAME closes the connection, since the stream cannot be resynchronized.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+
+PROTOCOL_VERSION = 1
+MAX_FRAME = 65536
+
+MSG_PREDICT = 1
+MSG_INFO = 2
+
+STATUS_OK = 0
+STATUS_NO_MODEL = 1
+STATUS_ERROR = 2
+
+NO_DATE = -2 ** 31
+
+# Optional model features a request can set, by id
+FEATURES = (
+    'days_since_first_sale', 'has_event', 'promo_impact', 'price_diff', 'price_trend', 'price_elasticity',
+    'sales_lag_1', 'stock_turnover', 'expiry_price_elasticity', 'days_to_expiry_price_elasticity',
+    'days_to_expiry_price_trend', 'price_elasticity_trend_interaction', 'sell_price_lag_7',
+    'days_to_expiry_sales_interaction'
+)
+FEATURE_IDS = {name: i for i, name in enumerate(FEATURES)}
+
+FRAME = struct.Struct('<I')
+REQUEST = struct.Struct('<BIdiBBB')
+FEATURE = struct.Struct('<Bd')
+RESPONSE = struct.Struct('<BIBd')
+INFO_REQUEST = struct.Struct('<BI')
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_date(date):
+    """
+    Days since 1970-01-01 of a request date
+
+    Args:
+        date (str/date/datetime/None): ISO date or timestamp (timezone-aware
+            timestamps keep their local date); None means today
+
+    Returns:
+        int: Day number, or NO_DATE for None
+    """
+    if date is None:
+        return NO_DATE
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date.replace('Z', '+00:00'))
+    if isinstance(date, datetime):
+        date = date.date()
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+def encode_request(request_id, days_to_expiry, dept_id, date=None, city=None, **features):
+    """
+    Encode a predict request as a frame
+
+    Args:
+        request_id (int): Id echoed in the response (0 to 2^32 - 1)
+        days_to_expiry (float): Days until expiry
+        dept_id (str): Department ID
+        date (str/date/datetime): Date for prediction; None means today
+        city (str): Store, selecting its model when it has one
+        **features: Optional model features from FEATURES
+
+    Returns:
+        bytes: Frame
+
+    Raises:
+        ValueError: Unknown feature, or a dept_id or city longer than 255 bytes
+    """
+    dept = dept_id.encode('ascii')
+    store = (city or '').encode('ascii')
+    if len(dept) > 255 or len(store) > 255:
+        raise ValueError("dept_id and city must be at most 255 bytes")
+    unknown = [name for name in features if name not in FEATURE_IDS]
+    if unknown:
+        raise ValueError(f"Unknown features: {unknown}")
+
+    payload = b''.join([
+        REQUEST.pack(MSG_PREDICT, request_id, float(days_to_expiry), encode_date(date), len(features),
+                     len(dept), len(store)),
+        dept,
+        store,
+        *(FEATURE.pack(FEATURE_IDS[name], float(value)) for name, value in features.items())
+    ])
+    return FRAME.pack(len(payload)) + payload
+
+
+def decode_request(payload):
+    """
+    Decode a predict request payload
+
+    Returns:
+        tuple: (request_id, days_to_expiry, dept_id, date, kwargs) with date a datetime
+            or None and kwargs holding city and the features
+
+    Raises:
+        ValueError: The payload is malformed
+    """
+    try:
+        _, request_id, days, day, n_features, dept_len, city_len = REQUEST.unpack_from(payload)
+    except struct.error:
+        raise ValueError("Truncated predict request")
+    offset = REQUEST.size
+    if len(payload) != offset + dept_len + city_len + n_features * FEATURE.size:
+        raise ValueError("Predict request length does not match its header")
+
+    dept_id = bytes(payload[offset:offset + dept_len]).decode('ascii')
+    offset += dept_len
+    kwargs = {}
+    if city_len:
+        kwargs['city'] = bytes(payload[offset:offset + city_len]).decode('ascii')
+        offset += city_len
+    for _ in range(n_features):
+        feature, value = FEATURE.unpack_from(payload, offset)
+        offset += FEATURE.size
+        if feature >= len(FEATURES):
+            raise ValueError(f"Unknown feature id {feature}")
+        kwargs[FEATURES[feature]] = value
+
+    date = None if day == NO_DATE else EPOCH + timedelta(days=day)
+    return request_id, days, dept_id, date, kwargs
+
+
+def encode_response(message_type, request_id, status, price=float('nan'), body=b''):
+    """Encode a response frame"""
+    payload = RESPONSE.pack(message_type, request_id, status, price) + body
+    return FRAME.pack(len(payload)) + payload
+
+
+class BinaryPredictionServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Threaded Unix socket server answering binary prediction requests
+
+    Every connection gets a thread. Whatever requests have arrived
+    complete are answered together with one write, so a pipelining
+    client gets its responses in bursts.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, predictor, path=None, sock=None, predict=None, max_frame=MAX_FRAME):
+        """
+        Initialize the server
+
+        Args:
+            predictor (ExpiryPricePredictor): Predictor answering the requests
+            path (str): Socket path to bind (an existing socket file is replaced)
+            sock (socket.socket): Already bound, listening Unix socket to serve instead,
+                e.g. one inherited from serve.py's parent
+            predict (callable): Single prediction function with predict_price's
+                signature; defaults to predictor.predict_price
+            max_frame (int): Largest accepted payload in bytes
+        """
+        self.predictor = predictor
+        self.predict = predict or predictor.predict_price
+        self.max_frame = max_frame
+        # The socket file is only removed on close by the server that created it
+        self._owns_path = sock is None
+        if sock is None:
+            if os.path.exists(path):
+                os.unlink(path)
+            super().__init__(path, _ConnectionHandler)
+        else:
+            super().__init__(sock.getsockname(), _ConnectionHandler, bind_and_activate=False)
+            self.socket.close()
+            self.socket = sock
+        self.path = self.socket.getsockname()
+
+    def info(self):
+        """Protocol description returned to info requests"""
+        return {
+            'protocol_version': PROTOCOL_VERSION,
+            'max_frame': self.max_frame,
+            'features': list(FEATURES),
+            'supported_departments': self.predictor.departments,
+            'model_version': self.predictor.model_version
+        }
+
+    def handle_payload(self, payload):
+        """
+        Answer one request payload
+
+        Returns:
+            bytes: Response frame
+        """
+        message_type = payload[0] if len(payload) else 0
+        if message_type == MSG_INFO and len(payload) == INFO_REQUEST.size:
+            _, request_id = INFO_REQUEST.unpack_from(payload)
+            return encode_response(MSG_INFO, request_id, STATUS_OK, body=json.dumps(self.info()).encode())
+
+        request_id = struct.unpack_from('<I', payload, 1)[0] if len(payload) >= 5 else 0
+        try:
+            if message_type != MSG_PREDICT:
+                raise ValueError(f"Unknown message type {message_type}")
+            request_id, days, dept_id, date, kwargs = decode_request(payload)
+            price = self.predict(days, dept_id, date, **kwargs)
+        except Exception as e:
+            return encode_response(message_type, request_id, STATUS_ERROR, body=str(e).encode('utf-8'))
+        if price is None:
+            return encode_response(message_type, request_id, STATUS_NO_MODEL)
+        return encode_response(message_type, request_id, STATUS_OK, price)
+
+    def close(self):
+        """Stop serving and remove the socket file if this server created it"""
+        self.shutdown()
+        self.server_close()
+        if self._owns_path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    """Reads frames from one connection and writes back their responses"""
+
+    def handle(self):
+        server = self.server
+        connection = self.request
+        buffer = bytearray()
+        while True:
+            data = connection.recv(262144)
+            if not data:
+                return
+            buffer += data
+
+            responses = []
+            offset = 0
+            while len(buffer) - offset >= FRAME.size:
+                length, = FRAME.unpack_from(buffer, offset)
+                if length > server.max_frame:
+                    responses.append(encode_response(0, 0, STATUS_ERROR,
+                                                     body=f"Frame of {length} bytes exceeds {server.max_frame}".encode()))
+                    connection.sendall(b''.join(responses))
+                    return
+                end = offset + FRAME.size + length
+                if end > len(buffer):
+                    break
+                responses.append(server.handle_payload(bytes(buffer[offset + FRAME.size:end])))
+                offset = end
+            del buffer[:offset]
+
+            if responses:
+                connection.sendall(b''.join(responses))
+
+
+def listen(path):
+    """
+    Bind a listening Unix socket, replacing a stale socket file
+
+    Returns:
+        socket.socket: Listening socket (for BinaryPredictionServer's sock argument)
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(1024)
+    return sock
+
+
+def serve_in_background(predictor, path=None, sock=None, predict=None):
+    """
+    Start a BinaryPredictionServer on a daemon thread
+
+    Returns:
+        BinaryPredictionServer: The running server (close() stops it)
+    """
+    server = BinaryPredictionServer(predictor, path=path, sock=sock, predict=predict)
+    threading.Thread(target=server.serve_forever, name='binary-protocol', daemon=True).start()
+    return server
+
+
+class PredictionError(Exception):
+    """A request the server answered with status 2 (bad request)"""
+
+
+class BinaryClient:
+    """
+    Reference client for the binary protocol
+
+    predict() sends one request and waits for it; predict_many() pipelines
+    a list of requests, keeping up to `window` of them in flight.
+    """
+
+    def __init__(self, path, timeout=30, window=512):
+        """
+        Connect to a server
+
+        Args:
+            path (str): Server socket path
+            timeout (float): Socket timeout in seconds
+            window (int): Most requests predict_many has in flight
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.window = window
+        self._buffer = bytearray()
+        self._next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the connection"""
+        self.sock.close()
+
+    def _request_id(self):
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        return self._next_id
+
+    def _read_payload(self):
+        """Read the next response payload"""
+        while True:
+            if len(self._buffer) >= FRAME.size:
+                length, = FRAME.unpack_from(self._buffer)
+                if len(self._buffer) >= FRAME.size + length:
+                    payload = bytes(self._buffer[FRAME.size:FRAME.size + length])
+                    del self._buffer[:FRAME.size + length]
+                    return payload
+            data = self.sock.recv(262144)
+            if not data:
+                raise ConnectionError("Server closed the connection")
+            self._buffer += data
+
+    def _read_price(self, request_id):
+        """Read a predict response and turn it into a price"""
+        payload = self._read_payload()
+        _, response_id, status, price = RESPONSE.unpack_from(payload)
+        if status == STATUS_ERROR:
+            raise PredictionError(payload[RESPONSE.size:].decode('utf-8'))
+        if response_id != request_id:
+            raise ConnectionError(f"Response {response_id} does not match request {request_id}")
+        return None if status == STATUS_NO_MODEL else price
+
+    def predict(self, days_to_expiry, dept_id, date=None, city=None, **features):
+        """
+        Predict one price
+
+        Returns:
+            float: Predicted price, or None if the department has no model
+
+        Raises:
+            PredictionError: The server rejected the request
+        """
+        request_id = self._request_id()
+        self.sock.sendall(encode_request(request_id, days_to_expiry, dept_id, date, city, **features))
+        return self._read_price(request_id)
+
+    def predict_many(self, items):
+        """
+        Predict many prices over the connection with pipelining
+
+        Args:
+            items (list): Dicts with days_to_expiry, dept_id and optionally date,
+                city and features
+
+        Returns:
+            list: Prices (None where the department has no model), in item order
+
+        Raises:
+            PredictionError: The server rejected a request (remaining responses are
+                read first, so the connection stays usable)
+        """
+        prices, error = [], None
+        for start in range(0, len(items), self.window):
+            window = items[start:start + self.window]
+            ids = [self._request_id() for _ in window]
+            self.sock.sendall(b''.join(encode_request(request_id, **item) for request_id, item in zip(ids, window)))
+            for request_id in ids:
+                try:
+                    prices.append(self._read_price(request_id))
+                except PredictionError as e:
+                    prices.append(None)
+                    error = error or e
+        if error is not None:
+            raise error
+        return prices
+
+    def info(self):
+        """
+        Get the server's protocol description
+
+        Returns:
+            dict: Protocol version, frame limit, feature ids, departments and model version
+        """
+        request_id = self._request_id()
+        payload = INFO_REQUEST.pack(MSG_INFO, request_id)
+        self.sock.sendall(FRAME.pack(len(payload)) + payload)
+        return json.loads(self._read_payload()[RESPONSE.size:])
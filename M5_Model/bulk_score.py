@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Offline bulk scoring for the M5 Expiry Price Predictor
+Streams a CSV or Parquet inventory file through the predictor in fixed-size
+chunks and writes the predictions next to the input columns, without going
+through the HTTP API.
+
+Usage:
+    python bulk_score.py inventory.parquet predictions/ [--chunk-rows 200000] [--workers 4]
+    python bulk_score.py inventory.csv predictions/ --format csv
+    python bulk_score.py inventory.parquet predictions/ --resume
+    python bulk_score.py inventory.parquet predictions/ --start-chunk 12
+
+The input needs days_to_expiry, dept_id and date columns; city (for store
+models) and the optional feature columns are used when present. Chunk i is
+written to <output>/part-<i>.parquet (or .csv) through a temporary file, so
+a part either exists complete or not at all, and memory stays bounded by a
+few chunks whatever the file size. _manifest.json records the input and
+chunk size, so --resume picks up after the last part that was written. The
+parts read back as one table with pd.read_parquet(output).
+
+With more than one worker the chunks are scored on a ParallelScorer pool
+(see parallel.py) while the next chunk is read in the background.
+"""
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import warnings
+
+warnings.filterwarnings('ignore')
+
+FORMATS = ('parquet', 'csv')
+MANIFEST = '_manifest.json'
+
+# Read as text so pandas does not guess types chunk by chunk
+CSV_TEXT_COLUMNS = {'dept_id': str, 'date': str, 'city': str}
+
+
+def input_format(path):
+    """Format of an input file from its extension"""
+    name = path.lower()
+    if name.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    if name.endswith(('.csv', '.csv.gz', '.csv.bz2', '.csv.zip')):
+        return 'csv'
+    raise ValueError(f"Cannot tell the format of {path}; expected .csv or .parquet")
+
+
+def count_rows(path):
+    """
+    Rows in an input file, if known without reading it
+
+    Returns:
+        int: Row count from the Parquet metadata, or None for CSV
+    """
+    if input_format(path) != 'parquet':
+        return None
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def read_chunks(path, chunk_rows, start_chunk=0):
+    """
+    Read an input file as DataFrames of chunk_rows rows (the last may be shorter)
+
+    Args:
+        path (str): CSV or Parquet file
+        chunk_rows (int): Rows per chunk
+        start_chunk (int): Index of the first chunk to read; earlier rows are skipped
+
+    Yields:
+        tuple: (chunk index, pd.DataFrame)
+    """
+    skip_rows = start_chunk * chunk_rows
+    if input_format(path) == 'csv':
+        import pandas as pd
+        reader = pd.read_csv(path, chunksize=chunk_rows, dtype=CSV_TEXT_COLUMNS,
+                             skiprows=range(1, skip_rows + 1) if skip_rows else None)
+        for index, chunk in enumerate(reader, start_chunk):
+            yield index, chunk
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    # Row groups that end before the first chunk are not read at all
+    first_group, offset = 0, 0
+    while first_group < parquet.num_row_groups:
+        rows = parquet.metadata.row_group(first_group).num_rows
+        if offset + rows > skip_rows:
+            break
+        first_group += 1
+        offset += rows
+    if first_group == parquet.num_row_groups:
+        return
+    row_groups = list(range(first_group, parquet.num_row_groups))
+    drop = skip_rows - offset
+
+    # Record batches do not line up with chunks; re-slice them to chunk_rows
+    index, pending, pending_rows = start_chunk, [], 0
+    for batch in parquet.iter_batches(batch_size=chunk_rows, row_groups=row_groups):
+        if drop:
+            skipped = min(drop, batch.num_rows)
+            batch, drop = batch.slice(skipped), drop - skipped
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunk_rows:
+            table = pa.Table.from_batches(pending)
+            yield index, table.slice(0, chunk_rows).to_pandas()
+            index += 1
+            pending = table.slice(chunk_rows).to_batches()
+            pending_rows -= chunk_rows
+    if pending_rows:
+        yield index, pa.Table.from_batches(pending).to_pandas()
+
+
+def _prefetch(chunks, depth=1):
+    """Read chunks on a background thread, at most `depth` ahead of the consumer"""
+    items = queue.Queue(maxsize=depth)
+    done = object()
+
+    def reader():
+        try:
+            for item in chunks:
+                items.put(item)
+            items.put(done)
+        except BaseException as e:
+            items.put(e)
+
+    threading.Thread(target=reader, daemon=True).start()
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def part_path(output_dir, index, fmt):
+    """Path of chunk index's output part"""
+    return os.path.join(output_dir, f"part-{index:05d}.{fmt}")
+
+
+def write_part(result, path, fmt):
+    """Write a scored chunk through a temporary file, so the part appears complete or not at all"""
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    if fmt == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pandas(result, preserve_index=False), tmp_path)
+    else:
+        result.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _write_manifest(output_dir, manifest):
+    """Write the run's manifest through a temporary file"""
+    path = os.path.join(output_dir, MANIFEST)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def resume_chunk(output_dir, fmt):
+    """
+    First chunk without an output part
+
+    Returns:
+        int: Index of the first missing part (earlier parts all exist)
+    """
+    index = 0
+    while os.path.exists(part_path(output_dir, index, fmt)):
+        index += 1
+    return index
+
+
+def score_file(predictor, input_path, output_dir, chunk_rows=200000, fmt='parquet',
+               resume=False, start_chunk=None, overwrite=False, progress=print):
+    """
+    Score an inventory file chunk by chunk into output parts
+
+    Args:
+        predictor (ExpiryPricePredictor): Predictor to score with (attach a
+            ParallelScorer as predictor.parallel to use several cores)
+        input_path (str): CSV or Parquet file
+        output_dir (str): Directory for the parts and the manifest
+        chunk_rows (int): Rows per chunk; a resumed run uses the manifest's
+        fmt (str): Output format, 'parquet' or 'csv'
+        resume (bool): Continue after the last part written by an earlier run
+        start_chunk (int): Start from this chunk instead (implies resume)
+        overwrite (bool): Remove the parts of an earlier run and start over (also when
+            resuming a run scored with another model version)
+        progress (callable): Receives a progress line per chunk; None for silence
+
+    Returns:
+        dict: First chunk, chunks and rows scored by this run, total chunks, seconds and rows/sec
+
+    Raises:
+        ValueError: Bad settings, an output directory that belongs to another run, or
+            a resumed run scored with another model version (without overwrite)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Output format must be one of {FORMATS}")
+    if chunk_rows < 1:
+        raise ValueError("chunk_rows must be positive")
+    input_format(input_path)
+    progress = progress or (lambda line: None)
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    previous = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+
+    resuming = resume or start_chunk is not None
+    if resuming:
+        if previous is None:
+            raise ValueError(f"{output_dir} has no {MANIFEST} to resume from")
+        if os.path.abspath(previous['input']) != os.path.abspath(input_path) or previous['format'] != fmt:
+            raise ValueError(f"{output_dir} holds a {previous['format']} run of {previous['input']}")
+        chunk_rows = previous['chunk_rows']
+        # Parts scored by other models cannot be mixed with this run's
+        if previous.get('model_version') != predictor.model_version:
+            if not overwrite:
+                raise ValueError(f"{output_dir} was scored with model version {previous.get('model_version')}, "
+                                 f"not {predictor.model_version}; use overwrite to score it again")
+            progress("♻️ Model version changed since the earlier run, scoring from the start")
+            resuming = False
+        else:
+            first = resume_chunk(output_dir, fmt) if start_chunk is None else start_chunk
+    if not resuming:
+        existing = [name for name in os.listdir(output_dir) if name.startswith('part-') or name == MANIFEST]
+        if existing and not overwrite:
+            raise ValueError(f"{output_dir} already holds a run; use resume or overwrite")
+        for name in existing:
+            os.remove(os.path.join(output_dir, name))
+        first = 0
+
+    manifest = {
+        'input': os.path.abspath(input_path),
+        'format': fmt,
+        'chunk_rows': chunk_rows,
+        'model_version': predictor.model_version,
+        'completed': False
+    }
+    _write_manifest(output_dir, manifest)
+
+    total_rows = count_rows(input_path)
+    if first:
+        progress(f"⏩ Resuming at chunk {first} (row {first * chunk_rows:,})")
+
+    started = time.perf_counter()
+    chunks = rows = 0
+    next_chunk = first
+    for index, chunk in _prefetch(read_chunks(input_path, chunk_rows, first)):
+        try:
+            result = predictor.predict_batch(chunk)
+        except Exception as e:
+            raise RuntimeError(f"Chunk {index} (rows {index * chunk_rows:,}-{index * chunk_rows + len(chunk) - 1:,}) "
+                               f"failed: {str(e)}; rerun with --resume to continue from it") from e
+        write_part(result, part_path(output_dir, index, fmt), fmt)
+
+        chunks += 1
+        rows += len(chunk)
+        next_chunk = index + 1
+        elapsed = time.perf_counter() - started
+        done = index * chunk_rows + len(chunk)
+        line = f"📦 Chunk {index}: {done:,} rows"
+        if total_rows:
+            line += f" ({done / total_rows:.1%})"
+        line += f", {rows / elapsed:,.0f} rows/sec"
+        if total_rows and done < total_rows:
+            line += f", ETA {(total_rows - done) / (rows / elapsed):,.0f} s"
+        progress(line)
+
+    # Parts left over from an earlier run of a longer input are not part of this one
+    extra = next_chunk
+    while os.path.exists(part_path(output_dir, extra, fmt)):
+        os.remove(part_path(output_dir, extra, fmt))
+        extra += 1
+
+    seconds = time.perf_counter() - started
+    # Every chunk before the first one scored here was full
+    manifest.update(completed=True, chunks=next_chunk, rows=first * chunk_rows + rows if chunks else total_rows)
+    _write_manifest(output_dir, manifest)
+    return {
+        'first_chunk': first,
+        'chunks': chunks,
+        'rows': rows,
+        'total_chunks': next_chunk,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds else 0.0
+    }
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Score an inventory file without the HTTP API')
+    parser.add_argument('input', help='CSV or Parquet file with days_to_expiry, dept_id and date columns')
+    parser.add_argument('output', help='Directory for the prediction parts')
+    parser.add_argument('--format', choices=FORMATS, default='parquet', help='Output format')
+    parser.add_argument('--chunk-rows', type=int, default=200000, help='Rows read, scored and written at a time')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Scoring processes; 1 scores in this process')
+    parser.add_argument('--resume', action='store_true', help='Continue after the last part written')
+    parser.add_argument('--start-chunk', type=int, help='Continue from this chunk')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Replace an earlier run in the output directory (with --resume: one scored by other models)')
+    parser.add_argument('--model-dir', default='Model/', help='Directory containing model files')
+    parser.add_argument('--calendar', default='calendar.csv', help='M5 calendar.csv for event flags, if present')
+    parser.add_argument('--store-model-dir', default='Model/stores/', help='Per-store models, if present')
+    args = parser.parse_args()
+
+    from predict_expiry_price import ExpiryPricePredictor
+
+    print("🍽️ M5 Expiry Price Predictor - Bulk Scoring")
+    print("=" * 50)
+    calendar = None
+    if os.path.exists(args.calendar):
+        from calendar_index import CalendarIndex
+        calendar = CalendarIndex.from_csv(args.calendar)
+    predictor = ExpiryPricePredictor(model_dir=args.model_dir, cache_size=0, calendar=calendar)
+    if os.path.isdir(args.store_model_dir):
+        from model_registry import ModelRegistry
+        predictor.store_models = ModelRegistry(predictor, args.store_model_dir)
+    if args.workers > 1:
+        from parallel import ParallelScorer
+        predictor.parallel = ParallelScorer(predictor, workers=args.workers, min_rows=1,
+                                            chunk_rows=max(1024, args.chunk_rows // (2 * args.workers))).start()
+
+    try:
+        summary = score_file(predictor, args.input, args.output, chunk_rows=args.chunk_rows, fmt=args.format,
+                             resume=args.resume, start_chunk=args.start_chunk, overwrite=args.overwrite)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {str(e)}")
+        return 1
+    finally:
+        if predictor.parallel is not None:
+            predictor.parallel.close()
+
+    print(f"✅ Scored {summary['rows']:,} rows in {summary['chunks']} chunks "
+          f"({summary['seconds']:.1f} s, {summary['rows_per_sec']:,.0f} rows/sec) into {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
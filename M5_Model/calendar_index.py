@@ -0,0 +1,243 @@
+"""
+Calendar feature index for the M5 Expiry Price Predictor
+Precomputes every date-derived input for a range of days, so the dates of a
+batch resolve to features with one array lookup instead of pandas datetime
+accessors or per-row datetime calls.
+
+Event flags come from the M5 calendar.csv: as in training, a day has an
+event when its event_name_1 is set. Without a calendar file (and for days
+outside the index) has_event stays 0, the model's default.
+"""
+
+import csv
+from datetime import date as date_cls, datetime
+import numpy as np
+
+# Default range: the first M5 day to well past the models' expected lifetime
+DEFAULT_START = '2011-01-29'
+DEFAULT_END = '2035-12-31'
+
+FIELDS = ('year', 'month', 'day', 'day_of_week', 'week_of_year', 'has_event')
+
+
+def to_day(value):
+    """Convert a date, datetime or ISO string to a datetime64[D] value"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return np.datetime64(value, 'D')
+
+
+def calendar_fields(dates):
+    """
+    Compute the calendar fields of an array of dates arithmetically
+
+    Args:
+        dates (np.ndarray): datetime64[D] values; NaT rows get meaningless values
+
+    Returns:
+        dict: int64 arrays for year, month, day, day_of_week (Monday is 0) and week_of_year (ISO)
+    """
+    days = dates.astype(np.int64)
+    # 1970-01-01 was a Thursday
+    day_of_week = (days + 3) % 7
+    months = dates.astype('datetime64[M]')
+    # ISO week: weeks belong to the year of their Thursday
+    thursday = (days - day_of_week + 3).astype('datetime64[D]')
+    year_start = thursday.astype('datetime64[Y]').astype('datetime64[D]')
+    return {
+        'year': dates.astype('datetime64[Y]').astype(np.int64) + 1970,
+        'month': months.astype(np.int64) % 12 + 1,
+        'day': (dates - months.astype('datetime64[D]')).astype(np.int64) + 1,
+        'day_of_week': day_of_week,
+        'week_of_year': (thursday - year_start).astype(np.int64) // 7 + 1
+    }
+
+
+def parse_days(values):
+    """
+    Parse distinct date values, such as the uniques of a factorized column
+
+    Args:
+        values (iterable): ISO strings (a trailing Z is accepted), date/datetime
+            objects or None; timezone-aware timestamps keep their local date
+
+    Returns:
+        np.ndarray: datetime64[D] values, NaT for None
+
+    Raises:
+        ValueError, TypeError: A value is not an ISO date or timestamp
+    """
+    days = []
+    for value in values:
+        if value is None:
+            days.append(np.datetime64('NaT', 'D'))
+            continue
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        elif not isinstance(value, date_cls):
+            raise TypeError(f"Unsupported date value: {value!r}")
+        days.append(to_day(value))
+    return np.array(days, dtype='datetime64[D]')
+
+
+def parse_date_column(values):
+    """
+    Parse a batch's date column, each distinct value once
+
+    ISO values go through parse_days, keeping the local calendar date of
+    timezone-aware timestamps; pandas parses columns with anything else.
+
+    Args:
+        values (array-like): Date values of a batch (a Series, array or list)
+
+    Returns:
+        np.ndarray: datetime64 values, NaT for missing dates
+
+    Raises:
+        ValueError, TypeError: pandas cannot parse a value either
+    """
+    import pandas as pd
+
+    values = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values
+    codes, uniques = pd.factorize(values)
+    try:
+        return np.append(parse_days(uniques), np.datetime64('NaT', 'D'))[codes]
+    except (TypeError, ValueError):
+        dates = pd.to_datetime(values)
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+        return dates.to_numpy()
+
+
+class CalendarIndex:
+    """
+    Calendar features for every day of a date range, stored as compact arrays
+
+    arrays[field][offset] holds the field for day start + offset. Dates
+    outside the range are computed arithmetically and have no event.
+    """
+
+    def __init__(self, start=DEFAULT_START, end=DEFAULT_END, event_days=(), source=None):
+        """
+        Initialize the index
+
+        Args:
+            start (str/date): First day covered
+            end (str/date): Last day covered (inclusive)
+            event_days (iterable): Days with an event
+            source (str): Calendar file the events were read from, if any
+        """
+        self.start = to_day(start)
+        self.end = to_day(end)
+        if self.end < self.start:
+            raise ValueError("Calendar end must not be before its start")
+        self.source = source
+
+        days = np.arange(self.start, self.end + 1)
+        fields = calendar_fields(days)
+        self.arrays = {
+            'year': fields['year'].astype(np.int16),
+            'month': fields['month'].astype(np.int8),
+            'day': fields['day'].astype(np.int8),
+            'day_of_week': fields['day_of_week'].astype(np.int8),
+            'week_of_year': fields['week_of_year'].astype(np.int8),
+            'has_event': np.zeros(len(days), dtype=np.int8)
+        }
+
+        events = np.array([to_day(day) for day in event_days], dtype='datetime64[D]')
+        offsets = (events - self.start).astype(np.int64)
+        self.arrays['has_event'][offsets[(offsets >= 0) & (offsets < len(days))]] = 1
+
+    def __len__(self):
+        return len(self.arrays['has_event'])
+
+    @classmethod
+    def from_csv(cls, path, start=None, end=None):
+        """
+        Build the index from an M5 calendar.csv
+
+        Args:
+            path (str): CSV file with date and event_name_1 columns
+            start (str/date): First day covered; defaults to the file's first date
+            end (str/date): Last day covered; defaults to the file's last date
+
+        Returns:
+            CalendarIndex: Index with the file's event days flagged
+        """
+        dates, event_days = [], []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                day = np.datetime64(row['date'], 'D')
+                dates.append(day)
+                if row.get('event_name_1', '').strip():
+                    event_days.append(day)
+        if not dates:
+            raise ValueError(f"{path} has no calendar rows")
+        return cls(start if start is not None else min(dates),
+                   end if end is not None else max(dates),
+                   event_days, source=path)
+
+    def lookup(self, dates, fields=FIELDS):
+        """
+        Calendar fields for an array of dates
+
+        Args:
+            dates (np.ndarray): datetime64 values (any unit); NaT is allowed
+            fields (tuple): Fields to return
+
+        Returns:
+            dict: float64 array per field; NaN for NaT, except has_event which is 0
+        """
+        dates = np.asarray(dates).astype('datetime64[D]')
+        offsets = (dates - self.start).astype(np.int64)
+        covered = (offsets >= 0) & (offsets < len(self))
+        if covered.all():
+            return {field: self.arrays[field][offsets].astype(np.float64) for field in fields}
+
+        missing = np.isnat(dates)
+        outside = ~covered & ~missing
+        computed = calendar_fields(dates[outside]) if outside.any() else None
+        result = {}
+        for field in fields:
+            values = np.zeros(len(dates), dtype=np.float64)
+            values[covered] = self.arrays[field][offsets[covered]]
+            if computed is not None and field != 'has_event':
+                values[outside] = computed[field]
+            if field != 'has_event':
+                values[missing] = np.nan
+            result[field] = values
+        return result
+
+    def day(self, date):
+        """
+        Calendar fields for a single date
+
+        Args:
+            date (date/datetime): Date to look up
+
+        Returns:
+            dict: int per field
+        """
+        offset = int((to_day(date) - self.start).astype(np.int64))
+        if 0 <= offset < len(self):
+            return {field: int(values[offset]) for field, values in self.arrays.items()}
+        if isinstance(date, datetime):
+            date = date.date()
+        return {
+            'year': date.year,
+            'month': date.month,
+            'day': date.day,
+            'day_of_week': date.weekday(),
+            'week_of_year': date.isocalendar()[1],
+            'has_event': 0
+        }
+
+    def info(self):
+        """Get a summary of the index"""
+        return {
+            'start_date': str(self.start),
+            'end_date': str(self.end),
+            'days': len(self),
+            'event_days': int(self.arrays['has_event'].sum()),
+            'source': self.source
+        }
@@ -0,0 +1,174 @@
+"""
+Micro-batching request coalescer for the M5 Expiry Price Predictor
+Single-item predictions arriving within a short window are scored together
+with one model call per department, and each caller gets its own result.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import numpy as np
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class PredictionCoalescer:
+    """
+    Coalesces concurrent predict_price calls into batches
+
+    The first request of a batch waits at most `window` seconds for others
+    to join; a batch is scored as soon as it holds `max_batch` requests.
+    Price table and cache hits are answered directly without queueing, and a
+    caller whose batch is not scored within `timeout` seconds scores its
+    request itself. The batching thread starts on first use and is
+    recreated after a fork.
+    """
+
+    def __init__(self, predictor, window=0.002, max_batch=64, history=10000, timeout=5.0):
+        """
+        Initialize the coalescer
+
+        Args:
+            predictor (ExpiryPricePredictor): Loaded predictor
+            window (float): Seconds the first request of a batch waits for more
+            max_batch (int): Maximum requests per batch
+            history (int): Number of recent queueing delays kept for percentiles
+            timeout (float): Seconds a caller waits for its batch before scoring
+                its request directly
+        """
+        self.predictor = predictor
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._worker = None
+
+        self.requests = 0
+        self.batches = 0
+        self.timeouts = 0
+        self.batch_size_max = 0
+        self.batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._delays = deque(maxlen=history)
+
+    def _ensure_worker(self):
+        """Start the batching thread, recreating it after a fork"""
+        if self._pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._worker.is_alive():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name='prediction-coalescer', daemon=True)
+                self._worker.start()
+
+    def predict_price(self, days_to_expiry, dept_id, date=None, **kwargs):
+        """
+        Predict price for a single item, batched with concurrent calls
+
+        Same arguments and result as ExpiryPricePredictor.predict_price.
+
+        Returns:
+            float: Predicted price, or None if the department has no model
+        """
+        price, pending = self.predictor.prepare_price(days_to_expiry, dept_id, date, **kwargs)
+        if pending is None:
+            return price
+
+        model_set, key, x = pending
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((dept_id, x[0], future, time.perf_counter(), model_set))
+        try:
+            price = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # A stuck or dead batching thread must not hang the caller; score this one directly
+            with self._lock:
+                self.timeouts += 1
+            print(f"⚠️ Warning: Coalesced prediction not scored within {self.timeout} s, scoring it directly")
+            return self.predictor.predict_price(days_to_expiry, dept_id, date, **kwargs)
+
+        if key is not None:
+            self.predictor.cache.put(key, price)
+        return price
+
+    def _run(self):
+        """Batching loop: collect requests for up to `window` seconds and score them"""
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first[3] + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining <= 0:
+                        batch.append(self._queue.get_nowait())
+                    else:
+                        batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        """
+        Score a batch with one model call per department and resolve each caller's future
+
+        Requests queued on either side of a model reload are scored with the
+        model set they started on.
+        """
+        started = time.perf_counter()
+        groups = {}
+        for item in batch:
+            groups.setdefault((item[0], item[4]), []).append(item)
+
+        for (dept, model_set), items in groups.items():
+            try:
+                X = np.stack([item[1] for item in items])
+                prices = self.predictor._predict_matrix(dept, X, model_set)
+            except Exception as e:
+                for item in items:
+                    item[2].set_exception(e)
+                continue
+            for item, price in zip(items, prices.tolist()):
+                item[2].set_result(price)
+
+        with self._lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.batch_size_max = max(self.batch_size_max, len(batch))
+            self.batch_size_counts[np.searchsorted(BATCH_SIZE_BUCKETS, len(batch))] += 1
+            self._delays.extend(started - item[3] for item in batch)
+
+    def stats(self):
+        """
+        Get coalescer metrics
+
+        Returns:
+            dict: Settings, request/batch counts, batch size distribution and
+            queueing delay percentiles in milliseconds
+        """
+        with self._lock:
+            delays = np.array(self._delays) * 1000
+            buckets = [f'<={bound}' for bound in BATCH_SIZE_BUCKETS] + [f'>{BATCH_SIZE_BUCKETS[-1]}']
+            return {
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'requests': self.requests,
+                'batches': self.batches,
+                'timeouts': self.timeouts,
+                'batch_size_avg': self.requests / self.batches if self.batches else 0.0,
+                'batch_size_max': self.batch_size_max,
+                'batch_size_histogram': dict(zip(buckets, self.batch_size_counts)),
+                'queue_delay_ms': {
+                    'avg': float(delays.mean()) if delays.size else 0.0,
+                    'p50': float(np.percentile(delays, 50)) if delays.size else 0.0,
+                    'p99': float(np.percentile(delays, 99)) if delays.size else 0.0,
+                    'max': float(delays.max()) if delays.size else 0.0
+                }
+            }
@@ -0,0 +1,282 @@
+"""
+Columnar batch format for the M5 Expiry Price Predictor
+Decodes and encodes /predict/batch bodies sent as column buffers instead of JSON.
+
+Two formats are supported:
+
+Apache Arrow IPC stream (Content-Type: application/vnd.apache.arrow.stream)
+    One record batch stream with the columns below. dept_id may be a string
+    or a dictionary-encoded string column; date may be date32, timestamp or
+    ISO strings. Requires pyarrow.
+
+Raw NumPy columns (Content-Type: application/x-numpy-columns)
+    <uint32 little-endian header length>
+    <UTF-8 JSON header, padded with spaces to a multiple of 8 bytes>
+    <column buffers>
+
+    The header describes every column:
+        {"n_rows": 3,
+         "columns": {
+             "days_to_expiry": {"dtype": "<f8", "offset": 0},
+             "dept_id": {"dtype": "|u1", "offset": 24, "categories": ["FOODS_1", "FOODS_2", "FOODS_3"]},
+             "date": {"dtype": "<M8[D]", "offset": 32}}}
+
+    Offsets are relative to the first byte after the header. dtype is any
+    NumPy dtype string; a column with "categories" holds integer codes into
+    that list. Buffers are read in place with np.frombuffer.
+
+Required columns are days_to_expiry, dept_id and date; optional feature
+columns (promo_impact, has_event, ...) are used when present, and a city
+column selects per-store models (see model_registry.py). Responses use
+the request's format with a single predicted_price (float64) column in
+input order; NaN (or an Arrow null) marks rows that could not be predicted.
+"""
+
+import json
+import struct
+from collections import namedtuple
+import numpy as np
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+NUMPY_COLUMNS_MIMETYPE = 'application/x-numpy-columns'
+COLUMNAR_MIMETYPES = (ARROW_STREAM_MIMETYPE, NUMPY_COLUMNS_MIMETYPE)
+
+REQUIRED_COLUMNS = ('days_to_expiry', 'dept_id', 'date')
+
+# Integer codes into a list of category labels (Arrow dictionary or NumPy "categories")
+DictionaryColumn = namedtuple('DictionaryColumn', ['codes', 'categories'])
+
+_HEADER_LENGTH = struct.Struct('<I')
+_ALIGNMENT = 8
+
+
+def _padding(length):
+    """Bytes needed to pad `length` to the buffer alignment"""
+    return -length % _ALIGNMENT
+
+
+def decode_numpy_columns(body):
+    """
+    Decode a raw NumPy column body
+
+    Args:
+        body (bytes): Request body in the layout described above
+
+    Returns:
+        dict: Column name -> np.ndarray (read-only views into body) or DictionaryColumn
+    """
+    if len(body) < _HEADER_LENGTH.size:
+        raise ValueError('Body is too short for a column header')
+
+    (header_length,) = _HEADER_LENGTH.unpack_from(body)
+    data_start = _HEADER_LENGTH.size + header_length
+    if data_start > len(body):
+        raise ValueError('Column header length exceeds the body')
+    try:
+        header = json.loads(bytes(body[_HEADER_LENGTH.size:data_start]))
+        n_rows = int(header['n_rows'])
+        specs = header['columns']
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f'Invalid column header: {str(e)}')
+    if n_rows < 0:
+        raise ValueError(f'Invalid column header: n_rows is {n_rows}')
+
+    columns = {}
+    for name, spec in specs.items():
+        try:
+            dtype = np.dtype(spec['dtype'])
+            offset = data_start + int(spec['offset'])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Invalid spec for column {name}: {str(e)}')
+        if dtype.hasobject:
+            raise ValueError(f'Column {name} has an object dtype')
+        if offset < data_start or offset + n_rows * dtype.itemsize > len(body):
+            raise ValueError(f'Column {name} lies outside the body')
+
+        values = np.frombuffer(body, dtype=dtype, count=n_rows, offset=offset)
+        if 'categories' in spec:
+            if dtype.kind not in 'iu':
+                raise ValueError(f'Categorical column {name} must hold integer codes')
+            values = DictionaryColumn(values, list(spec['categories']))
+        columns[name] = values
+    return columns
+
+
+def encode_numpy_columns(columns):
+    """
+    Encode arrays in the raw NumPy column layout
+
+    Args:
+        columns (dict): Column name -> 1-D np.ndarray or DictionaryColumn, all the same length
+
+    Returns:
+        bytes: Encoded body
+    """
+    arrays = {}
+    specs = {}
+    for name, values in columns.items():
+        spec = {}
+        if isinstance(values, DictionaryColumn):
+            spec['categories'] = list(values.categories)
+            values = values.codes
+        arrays[name] = np.ascontiguousarray(values)
+        specs[name] = spec
+    n_rows = len(next(iter(arrays.values()))) if arrays else 0
+
+    offset = 0
+    for name, values in arrays.items():
+        if len(values) != n_rows:
+            raise ValueError(f'Column {name} has {len(values)} rows, expected {n_rows}')
+        specs[name].update(dtype=values.dtype.str, offset=offset)
+        offset += values.nbytes + _padding(values.nbytes)
+
+    header = json.dumps({'n_rows': n_rows, 'columns': specs}).encode()
+    header += b' ' * _padding(_HEADER_LENGTH.size + len(header))
+
+    parts = [_HEADER_LENGTH.pack(len(header)), header]
+    for values in arrays.values():
+        parts.append(values.tobytes())
+        parts.append(b'\0' * _padding(values.nbytes))
+    return b''.join(parts)
+
+
+def decode_arrow_stream(body):
+    """
+    Decode an Arrow IPC stream body
+
+    Args:
+        body (bytes): Arrow IPC stream
+
+    Returns:
+        dict: Column name -> np.ndarray or DictionaryColumn
+    """
+    import pyarrow as pa
+
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f'Invalid Arrow stream: {str(e)}')
+
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if name in REQUIRED_COLUMNS and column.null_count:
+            raise ValueError(f'Column {name} contains nulls')
+        column = column.combine_chunks() if column.num_chunks != 1 else column.chunk(0)
+
+        if pa.types.is_dictionary(column.type):
+            columns[name] = DictionaryColumn(column.indices.to_numpy(), column.dictionary.to_pylist())
+        elif pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            columns[name] = np.asarray(column.to_pylist())
+        else:
+            # Zero-copy for primitive columns without nulls
+            columns[name] = column.to_numpy(zero_copy_only=False)
+    return columns
+
+
+def encode_arrow_stream(columns):
+    """
+    Encode arrays as an Arrow IPC stream with one record batch
+
+    Args:
+        columns (dict): Column name -> 1-D np.ndarray; NaN floats become nulls
+
+    Returns:
+        bytes: Encoded body
+    """
+    import pyarrow as pa
+
+    batch = pa.record_batch({
+        name: pa.array(values, from_pandas=True) for name, values in columns.items()
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_columns(body, mimetype):
+    """Decode a columnar body of the given Content-Type"""
+    if mimetype == ARROW_STREAM_MIMETYPE:
+        return decode_arrow_stream(body)
+    return decode_numpy_columns(body)
+
+
+def encode_columns(columns, mimetype):
+    """Encode columns in the format of the given Content-Type"""
+    if mimetype == ARROW_STREAM_MIMETYPE:
+        return encode_arrow_stream(columns)
+    return encode_numpy_columns(columns)
+
+
+def _department_codes(dept_id, departments):
+    """
+    Map a dept_id column onto integer codes into `departments`
+
+    Args:
+        dept_id (np.ndarray or DictionaryColumn): Department IDs
+        departments (list): Supported department IDs
+
+    Returns:
+        np.ndarray: Codes into departments
+    """
+    if isinstance(dept_id, DictionaryColumn):
+        codes, categories = np.asarray(dept_id.codes), dept_id.categories
+        if len(codes) and (codes.min() < 0 or codes.max() >= len(categories)):
+            raise ValueError('dept_id codes must index its categories')
+    else:
+        categories, codes = np.unique(np.asarray(dept_id).astype(str), return_inverse=True)
+
+    unknown = [str(dept) for dept in categories if dept not in departments]
+    if unknown:
+        raise ValueError(f'Invalid departments: {unknown}')
+    remap = np.array([departments.index(dept) for dept in categories], dtype=np.intp)
+    return remap[codes]
+
+
+def _dates(values):
+    """Convert a date column to datetime64[D]"""
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values
+    try:
+        return values.astype('datetime64[s]').astype('datetime64[D]')
+    except ValueError as e:
+        raise ValueError(f'Invalid date column: {str(e)}')
+
+
+def predict_columnar(predictor, columns):
+    """
+    Score decoded columns with the predictor
+
+    Args:
+        predictor (ExpiryPricePredictor): Loaded predictor
+        columns (dict): Decoded columns
+
+    Returns:
+        np.ndarray: float64 predictions in input order
+    """
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f'Missing required columns: {missing}')
+
+    days_to_expiry = np.asarray(columns['days_to_expiry'])
+    if days_to_expiry.dtype.kind not in 'iuf':
+        raise ValueError('days_to_expiry must be numeric')
+    if days_to_expiry.size and days_to_expiry.min() < 0:
+        raise ValueError('days_to_expiry must be non-negative')
+
+    features = {
+        name: np.asarray(values, dtype=np.float64)
+        for name, values in columns.items()
+        if name in predictor._overridable_features and not isinstance(values, DictionaryColumn)
+    }
+    store = columns.get('city')
+    if isinstance(store, DictionaryColumn):
+        store = np.asarray(store.categories, dtype=object)[np.asarray(store.codes)]
+    return predictor.predict_columns(
+        days_to_expiry,
+        _department_codes(columns['dept_id'], predictor.departments),
+        _dates(columns['date']),
+        features,
+        store
+    )
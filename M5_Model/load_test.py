@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the M5 Expiry Price Prediction API
+Starts the Flask app in-process (MongoDB replaced by an in-memory stand-in),
+drives its endpoints from keep-alive client processes and reports latency
+percentiles, requests/sec and rows/sec per scenario. Results can be saved as
+a baseline and later runs compared against it to flag regressions.
+
+Usage:
+    python load_test.py [--scenarios single batch-100 ...] [--clients 4] [--requests 500]
+    python load_test.py --save-baseline load_baseline.json
+    python load_test.py --baseline load_baseline.json [--tolerance 0.2]
+
+Request bodies come from a seeded generator and every client sends a fixed
+number of requests after a warm-up, so two runs on the same machine send the
+same traffic. The exit status is 1 when a run regresses against the baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+import numpy as np
+
+warnings.filterwarnings('ignore')
+
+DEPARTMENTS = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+CITIES = ['CA_1', 'CA_2', 'TX_1', 'WI_1']
+BATCH_SIZES = (10, 100, 1000)
+ANALYSIS_MAX_DAYS = 30
+
+# A run regresses when p99 latency grows, or throughput drops, by more than the tolerance
+DEFAULT_TOLERANCE = 0.2
+
+
+def _item(rng):
+    """Random single-prediction item"""
+    day = date(2024, 1, 1) + timedelta(days=int(rng.integers(0, 366)))
+    return {
+        'days_to_expiry': int(rng.integers(0, 60)),
+        'dept_id': DEPARTMENTS[rng.integers(0, len(DEPARTMENTS))],
+        'date': day.isoformat(),
+        'city': CITIES[rng.integers(0, len(CITIES))]
+    }
+
+
+def _legacy_body(rng):
+    """Random body in the frontend's /predict format"""
+    added = date(2024, 1, 1) + timedelta(days=int(rng.integers(0, 366)))
+    expiry = added + timedelta(days=int(rng.integers(1, 60)))
+    return {
+        'categoryId': f"{DEPARTMENTS[rng.integers(0, len(DEPARTMENTS))]}_{int(rng.integers(1, 999)):03d}",
+        'cityId': CITIES[rng.integers(0, len(CITIES))],
+        'mrp': round(float(rng.uniform(1, 100)), 2),
+        'dateAdded': f'{added.isoformat()}T10:30:00.000Z',
+        'expiryDate': f'{expiry.isoformat()}T10:30:00.000Z'
+    }
+
+
+def _analysis_body(rng):
+    """Random single-department /predict/analysis body"""
+    item = _item(rng)
+    return {'dept_id': item['dept_id'], 'date': item['date'], 'max_days': ANALYSIS_MAX_DAYS}
+
+
+def _batch_body(size):
+    """Body builder for a /predict/batch request with `size` items"""
+    return lambda rng: {'items': [_item(rng) for _ in range(size)]}
+
+
+def build_scenarios(batch_sizes=BATCH_SIZES):
+    """
+    Define the load test scenarios
+
+    Args:
+        batch_sizes (list): Items per /predict/batch request, one scenario each
+
+    Returns:
+        dict: Scenario name -> (path, body builder taking an np.random.Generator, rows per request)
+    """
+    scenarios = {
+        'predict': ('/predict', _legacy_body, 1),
+        'single': ('/predict/single', _item, 1)
+    }
+    for size in batch_sizes:
+        scenarios[f'batch-{size}'] = ('/predict/batch', _batch_body(size), size)
+    scenarios['analysis'] = ('/predict/analysis', _analysis_body, ANALYSIS_MAX_DAYS)
+    scenarios['save'] = ('/save-prediction', _item, 1)
+    return scenarios
+
+
+def request_bodies(name, make_body, seed, clients, count):
+    """
+    Seeded, JSON-encoded request bodies for one scenario
+
+    Returns:
+        list: One list of `count` bodies per client
+    """
+    rng = np.random.default_rng([seed] + [ord(c) for c in name])
+    return [[json.dumps(make_body(rng)) for _ in range(count)] for _ in range(clients)]
+
+
+def _run_client(port, path, bodies):
+    """
+    Send pre-encoded bodies over one keep-alive connection
+
+    Returns:
+        tuple: (latencies in seconds, number of non-2xx responses)
+    """
+    import http.client
+
+    headers = {'Content-Type': 'application/json'}
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies = []
+    errors = 0
+    for body in bodies:
+        start = time.perf_counter()
+        connection.request('POST', path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if not 200 <= response.status < 300:
+            errors += 1
+    connection.close()
+    return latencies, errors
+
+
+def summarize(latencies, errors, elapsed, rows_per_request):
+    """
+    Summarize one scenario's run
+
+    Args:
+        latencies (np.ndarray): Per-request latencies in seconds
+        errors (int): Non-2xx responses
+        elapsed (float): Wall-clock seconds for the whole run
+        rows_per_request (int): Predictions per request
+
+    Returns:
+        dict: requests, errors, req_per_sec, rows_per_sec and p50/p95/p99/max latency in ms
+    """
+    ms = np.asarray(latencies) * 1000
+    requests = int(ms.size)
+    return {
+        'requests': requests,
+        'errors': int(errors),
+        'req_per_sec': requests / elapsed,
+        'rows_per_sec': requests * rows_per_request / elapsed,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max())
+    }
+
+
+def start_app(round_trip=0.002):
+    """
+    Serve app.py from a background thread with MongoDB replaced by a stand-in
+
+    The stand-in is an in-memory mongomock collection that sleeps for a
+    simulated network round trip per call. The write-behind buffer is kept
+    if app.py was configured with one.
+
+    Args:
+        round_trip (float): Simulated MongoDB round trip in seconds
+
+    Returns:
+        tuple: (port, stop function restoring the app's MongoDB handles)
+    """
+    from werkzeug.serving import make_server
+    import app as api
+    from benchmark import LatencyCollection
+    from serve import KeepAliveRequestHandler
+    from write_buffer import WriteBehindBuffer
+
+    class StandInDatabase:
+        predictions = LatencyCollection(round_trip)
+
+    original = api.write_buffer, api.mongo.db
+    api.mongo.db = StandInDatabase()
+    if api.write_buffer is not None:
+        api.write_buffer = WriteBehindBuffer(StandInDatabase.predictions, flush_interval=0.05)
+
+    server = make_server('127.0.0.1', 0, api.app, threaded=True, request_handler=KeepAliveRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        if api.write_buffer is not None:
+            api.write_buffer.close()
+        api.write_buffer, api.mongo.db = original
+
+    return server.server_port, stop
+
+
+def run_load_test(scenarios, names, clients=4, requests=500, warmup=20, seed=0, round_trip=0.002):
+    """
+    Run the selected scenarios against an in-process app
+
+    Args:
+        scenarios (dict): Output of build_scenarios
+        names (list): Scenario names to run, in order
+        clients (int): Concurrent client processes, one keep-alive connection each
+        requests (int): Measured requests per scenario, split over the clients
+        warmup (int): Unmeasured requests per client before each scenario
+        seed (int): Seed for the request bodies
+        round_trip (float): Simulated MongoDB round trip in seconds
+
+    Returns:
+        dict: Scenario name -> summarize() output
+    """
+    per_client = max(1, requests // clients)
+    results = {}
+    # Client processes are forked before the server thread starts
+    with ProcessPoolExecutor(clients) as pool:
+        list(pool.map(time.sleep, [0] * clients))
+        port, stop = start_app(round_trip)
+        try:
+            for name in names:
+                path, make_body, rows = scenarios[name]
+                bodies = request_bodies(name, make_body, seed, clients, warmup + per_client)
+
+                list(pool.map(_run_client, [port] * clients, [path] * clients, [b[:warmup] for b in bodies]))
+                start = time.perf_counter()
+                runs = list(pool.map(_run_client, [port] * clients, [path] * clients,
+                                     [b[warmup:] for b in bodies]))
+                elapsed = time.perf_counter() - start
+
+                latencies = np.concatenate([latencies for latencies, _ in runs])
+                results[name] = summarize(latencies, sum(errors for _, errors in runs), elapsed, rows)
+        finally:
+            stop()
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare a run against a baseline
+
+    Args:
+        results (dict): Scenario name -> summary of this run
+        baseline (dict): Scenario name -> summary of the baseline run
+        tolerance (float): Allowed relative p99 growth and throughput drop
+
+    Returns:
+        list: (scenario, metric, baseline value, current value) for every regression
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p99_ms'] > previous['p99_ms'] * (1 + tolerance):
+            regressions.append((name, 'p99_ms', previous['p99_ms'], current['p99_ms']))
+        if current['req_per_sec'] < previous['req_per_sec'] * (1 - tolerance):
+            regressions.append((name, 'req_per_sec', previous['req_per_sec'], current['req_per_sec']))
+        if current['errors'] > previous['errors']:
+            regressions.append((name, 'errors', previous['errors'], current['errors']))
+    return regressions
+
+
+def environment():
+    """Describe the machine and settings a run was made with"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def print_results(results, baseline=None):
+    """Print one line per scenario, with the change against the baseline when given"""
+    print(f"{'scenario':>12} {'req/s':>10} {'rows/s':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7}" + ("  vs baseline (req/s, p99)" if baseline else ''))
+    for name, r in results.items():
+        line = (f"{name:>12} {r['req_per_sec']:>10,.0f} {r['rows_per_sec']:>12,.0f} {r['p50_ms']:>8.2f} "
+                f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>7}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += (f"  {r['req_per_sec'] / previous['req_per_sec'] - 1:+7.1%}"
+                     f" {r['p99_ms'] / previous['p99_ms'] - 1:+7.1%}")
+        print(line)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Load test the prediction API')
+    parser.add_argument('--scenarios', nargs='+', help='Scenarios to run (default: all)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(BATCH_SIZES),
+                        help='Items per /predict/batch request')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent keep-alive clients')
+    parser.add_argument('--requests', type=int, default=500, help='Measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per client per scenario')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the request bodies')
+    parser.add_argument('--mongo-round-trip', type=float, default=2.0,
+                        help='Simulated MongoDB round trip in milliseconds')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--save-baseline', help='Write the results as a baseline JSON file')
+    parser.add_argument('--baseline', help='Compare against this baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed relative p99 growth / throughput drop before flagging a regression')
+    args = parser.parse_args()
+
+    scenarios = build_scenarios(args.batch_sizes)
+    names = args.scenarios or list(scenarios)
+    unknown = [name for name in names if name not in scenarios]
+    if unknown:
+        parser.error(f"Unknown scenarios {unknown}; choose from {list(scenarios)}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print("🍽️ M5 Expiry Price Predictor - Load Test")
+    print("=" * 50)
+    print(f"{args.clients} clients, {args.requests} requests per scenario, "
+          f"{args.mongo_round_trip:g} ms simulated Mongo round trip")
+    results = run_load_test(scenarios, names, clients=args.clients, requests=args.requests,
+                            warmup=args.warmup, seed=args.seed, round_trip=args.mongo_round_trip / 1000)
+    print()
+    print_results(results, baseline['results'] if baseline else None)
+
+    report = {
+        'environment': environment(),
+        'settings': {'clients': args.clients, 'requests': args.requests, 'warmup': args.warmup,
+                     'seed': args.seed, 'mongo_round_trip_ms': args.mongo_round_trip},
+        'results': results
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"\n💾 Results written to {path}")
+
+    if baseline:
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if baseline.get('settings') != report['settings']:
+            print("\n⚠️ Baseline was recorded with different settings; comparison may not be meaningful")
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for name, metric, before, after in regressions:
+                print(f"   {name}: {metric} {before:,.2f} -> {after:,.2f}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Latency instrumentation for the M5 Expiry Price Predictor
+Per-stage and per-endpoint latency histograms, batch size distributions and
+model call counts, rendered in the Prometheus text exposition format.
+
+Stage timings can also be collected for a single request: while a trace is
+active (see start_trace), every observed stage is appended to it as well.
+
+Under serve.py every worker also writes its metrics to a file in a shared
+directory (see Metrics.share), and /metrics adds up the files of all workers.
+"""
+
+import bisect
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144)
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stages recorded for the current request, or None when it did not ask for them
+_trace = contextvars.ContextVar('m5_stage_trace', default=None)
+
+
+def _escape(value):
+    """Escape a label value for the exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    """Render {name="value",...} for a series"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    """Render a sample value; integers without a decimal point"""
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    """Cumulative histogram with one series per combination of label values"""
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, label_values, value):
+        """Add one observation; the caller holds the registry lock"""
+        series = self._series.get(label_values)
+        if series is None:
+            # One count per bucket, one for +Inf, then the sum
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        """Exposition-format lines for this histogram"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_values, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+    def snapshot(self):
+        """Observation count and sum per series"""
+        return {label_values: (sum(series[:-1]), series[-1]) for label_values, series in self._series.items()}
+
+    def merge(self, label_values, series):
+        """Add another process's series; the caller holds the registry lock"""
+        current = self._series.get(label_values)
+        if current is None:
+            self._series[label_values] = list(series)
+        else:
+            for i, value in enumerate(series):
+                current[i] += value
+
+
+class Counter:
+    """Monotonic counter with one series per combination of label values"""
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._series = {}
+
+    def inc(self, label_values, amount=1):
+        """Increment a series; the caller holds the registry lock"""
+        self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        """Exposition-format lines for this counter"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}')
+        return lines
+
+    def snapshot(self):
+        """Value per series"""
+        return dict(self._series)
+
+    def merge(self, label_values, value):
+        """Add another process's series; the caller holds the registry lock"""
+        self.inc(label_values, value)
+
+
+class Metrics:
+    """
+    Registry of the predictor's and API's metrics
+
+    Aggregation can be switched off with `enabled` (METRICS_ENABLED=0);
+    per-request traces still work then, since they only cost anything for
+    requests that ask for them.
+    """
+
+    def __init__(self, enabled=True):
+        """
+        Initialize the registry
+
+        Args:
+            enabled (bool): Aggregate observations into the histograms and counters
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.requests = Histogram('m5_request_duration_seconds', 'HTTP request latency by endpoint',
+                                  ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+        self.stages = Histogram('m5_stage_duration_seconds', 'Time spent in each request and prediction stage',
+                                ('stage', 'dept'), LATENCY_BUCKETS)
+        self.batch_sizes = Histogram('m5_batch_size', 'Items per batch request by endpoint and body format',
+                                     ('endpoint', 'format'), BATCH_SIZE_BUCKETS)
+        self.model_rows = Histogram('m5_model_call_rows', 'Rows scored per model call',
+                                    ('dept', 'engine'), BATCH_SIZE_BUCKETS)
+        self.model_calls = Counter('m5_model_calls_total', 'Model calls by department and engine',
+                                   ('dept', 'engine'))
+        self.dedup_rows = Counter('m5_dedup_rows_total',
+                                  'Rows checked for duplicates (input) and distinct rows scored (unique)',
+                                  ('dept', 'kind'))
+
+        # Shared directory and this process's file in it, once share() is called
+        self.directory = None
+        self._path = None
+
+    def _metrics(self):
+        """All histograms and counters, in rendering order"""
+        return (self.requests, self.stages, self.batch_sizes, self.model_rows, self.model_calls, self.dedup_rows)
+
+    def observe_stage(self, stage, seconds, dept=''):
+        """
+        Record the duration of a stage
+
+        Args:
+            stage (str): Stage name (parse, features, scale, model, format, ...)
+            seconds (float): Duration
+            dept (str): Department the stage worked on, if any
+        """
+        if self.enabled:
+            with self._lock:
+                self.stages.observe((stage, dept), seconds)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((stage, dept, seconds))
+
+    def observe_model_call(self, dept, engine, rows, seconds):
+        """
+        Record one model call
+
+        Args:
+            dept (str): Department whose model was called
+            engine (str): 'flat' (tree_engine) or 'xgboost'
+            rows (int): Rows scored
+            seconds (float): Duration
+        """
+        if self.enabled:
+            with self._lock:
+                self.stages.observe(('model', dept), seconds)
+                self.model_rows.observe((dept, engine), rows)
+                self.model_calls.inc((dept, engine))
+        trace = _trace.get()
+        if trace is not None:
+            trace.append(('model', dept, seconds))
+
+    def observe_dedup(self, dept, rows, unique_rows):
+        """
+        Record one deduplicated model call
+
+        Args:
+            dept (str): Department whose model was called
+            rows (int): Rows in the matrix
+            unique_rows (int): Distinct rows actually scored
+        """
+        if self.enabled:
+            with self._lock:
+                self.dedup_rows.inc((dept, 'input'), rows)
+                self.dedup_rows.inc((dept, 'unique'), unique_rows)
+
+    def observe_batch_size(self, endpoint, body_format, size):
+        """Record the number of items in a batch request"""
+        if self.enabled:
+            with self._lock:
+                self.batch_sizes.observe((endpoint, body_format), size)
+
+    def observe_request(self, endpoint, method, status, seconds):
+        """Record an HTTP request's latency"""
+        if self.enabled:
+            with self._lock:
+                self.requests.observe((endpoint, method, str(status)), seconds)
+
+    def timer(self, stage, dept=''):
+        """Context manager timing a stage"""
+        return _StageTimer(self, stage, dept)
+
+    def share(self, directory, interval=1.0):
+        """
+        Aggregate metrics over the processes that share a directory
+
+        serve.py calls this in every worker it forks. Observations inherited
+        from the parent are dropped, a thread writes this process's metrics
+        to metrics_<pid>.json in `directory` every `interval` seconds, and
+        render() adds up every file there. Files of workers that have exited
+        are kept, so counters never go backwards.
+
+        Args:
+            directory (str): Directory shared by the processes
+            interval (float): Seconds between writes
+        """
+        with self._lock:
+            for metric in self._metrics():
+                metric._series.clear()
+        self.directory = directory
+        self._path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+        self.write()
+        threading.Thread(target=self._write_loop, args=(interval,), name='metrics-writer', daemon=True).start()
+
+    def _write_loop(self, interval):
+        """Write this process's metrics every `interval` seconds"""
+        while True:
+            time.sleep(interval)
+            try:
+                self.write()
+            except OSError:
+                pass
+
+    def write(self):
+        """Write this process's metrics to its file in the shared directory, if sharing"""
+        if self._path is None:
+            return
+        with self._lock:
+            data = json.dumps({metric.name: [[list(label_values), series]
+                                             for label_values, series in metric._series.items()]
+                               for metric in self._metrics()})
+        # Renamed into place, so readers never see a partial file
+        temporary = f'{self._path}.tmp'
+        with open(temporary, 'w') as f:
+            f.write(data)
+        os.replace(temporary, self._path)
+
+    def render(self):
+        """
+        Render all metrics
+
+        Returns:
+            str: Prometheus text exposition format, over every process when shared
+        """
+        registry = self
+        if self.directory is not None:
+            self.write()
+            registry = Metrics()
+            metrics_by_name = {metric.name: metric for metric in registry._metrics()}
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                try:
+                    with open(path) as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for name, series in state.items():
+                    metric = metrics_by_name.get(name)
+                    for label_values, values in series if metric is not None else ():
+                        metric.merge(tuple(label_values), values)
+
+        with registry._lock:
+            lines = []
+            for metric in registry._metrics():
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class _StageTimer:
+    """Times a `with` block as one stage"""
+    __slots__ = ('metrics', 'stage', 'dept', 'started')
+
+    def __init__(self, metrics, stage, dept):
+        self.metrics = metrics
+        self.stage = stage
+        self.dept = dept
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe_stage(self.stage, time.perf_counter() - self.started, self.dept)
+
+
+def start_trace():
+    """
+    Start collecting stage timings for the current request
+
+    Returns:
+        contextvars.Token: Token to pass to finish_trace
+    """
+    return _trace.set([])
+
+
+def current_trace():
+    """
+    Stage timings collected so far for the current request
+
+    Returns:
+        list: (stage, dept, seconds) tuples, or None when no trace is active
+    """
+    return _trace.get()
+
+
+def finish_trace(token):
+    """
+    Stop collecting stage timings
+
+    Args:
+        token (contextvars.Token): Token returned by start_trace
+
+    Returns:
+        list: (stage, dept, seconds) tuples in the order they finished
+    """
+    trace = _trace.get()
+    _trace.reset(token)
+    return trace or []
+
+
+def server_timing(trace, total=None):
+    """
+    Format a trace as a Server-Timing header value
+
+    Args:
+        trace (list): (stage, dept, seconds) tuples from finish_trace
+        total (float): Whole request duration in seconds, added as `total`
+
+    Returns:
+        str: Header value, durations in milliseconds
+    """
+    entries = []
+    for stage, dept, seconds in trace:
+        desc = f';desc="{dept}"' if dept else ''
+        entries.append(f'{stage}{desc};dur={seconds * 1000:.3f}')
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.3f}')
+    return ', '.join(entries)
+
+
+# Process-wide registry used by the predictor and the API
+metrics = Metrics(enabled=os.environ.get('METRICS_ENABLED', '1') != '0')
@@ -0,0 +1,106 @@
+"""
+Scaler fusion for the M5 Expiry Price Predictor
+Folds a RobustScaler into the split thresholds of a flat tree ensemble so the
+fused model can be scored directly on unscaled features.
+"""
+
+import numpy as np
+from tree_engine import FlatTreeEnsemble
+
+# Bump when the fused model layout changes so cached files are rebuilt
+FUSION_VERSION = '1'
+
+
+def fuse_scaler(ensemble, center, scale, feature_index):
+    """
+    Build an ensemble whose thresholds live in the scaler's input space
+
+    XGBoost sends a row left when float32(scaled x) < threshold, where the
+    scaled value is (x - center) / scale for scaler inputs and x otherwise.
+    That is monotonic in x, so each split is equivalent to x < T for the
+    smallest float64 T whose scaled value reaches the threshold. T is found by
+    bisection over the ordered float64 values, which makes the fused split
+    agree with the original one for every float64 input, including values
+    that are not representable in float32.
+
+    Args:
+        ensemble (FlatTreeEnsemble): Model trained on scaled features
+        center (np.ndarray): Scaler center_ per scaler input column
+        scale (np.ndarray): Scaler scale_ per scaler input column
+        feature_index (list): Model column index of each scaler input column
+
+    Returns:
+        FlatTreeEnsemble: Ensemble with float64 thresholds that takes unscaled features
+    """
+    n_features = int(ensemble.split_feature.max(initial=0)) + 1
+    n_features = max(n_features, max(feature_index) + 1)
+    feature_center = np.zeros(n_features)
+    feature_scale = np.ones(n_features)
+    feature_center[feature_index] = center
+    feature_scale[feature_index] = scale
+
+    is_leaf = ensemble.left_child == np.arange(ensemble.n_nodes)
+    threshold = ensemble.threshold.astype(np.float64)
+    splits = np.flatnonzero(~is_leaf)
+    features = ensemble.split_feature[splits]
+    threshold[splits] = _raw_thresholds(
+        ensemble.threshold[splits], feature_center[features], feature_scale[features]
+    )
+
+    return FlatTreeEnsemble(
+        split_feature=ensemble.split_feature,
+        threshold=threshold,
+        left_child=ensemble.left_child,
+        right_child=ensemble.right_child,
+        default_left=ensemble.default_left,
+        leaf_value=ensemble.leaf_value,
+        roots=ensemble.roots,
+        base_score=ensemble.base_score,
+        max_depth=ensemble.max_depth
+    )
+
+
+def _raw_thresholds(thresholds, center, scale):
+    """
+    Map float32 thresholds on (x - center) / scale back to float64 thresholds on x
+
+    Args:
+        thresholds (np.ndarray): float32 thresholds in scaled space
+        center (np.ndarray): Scaler center per threshold
+        scale (np.ndarray): Scaler scale per threshold (positive)
+
+    Returns:
+        np.ndarray: Smallest float64 x per threshold with scaled(x) >= threshold
+    """
+    def reached(keys):
+        # Probes far outside the float32 range are meant to saturate to +/-inf, as
+        # they would when the scaled features are cast for the model
+        with np.errstate(over='ignore', invalid='ignore'):
+            scaled = ((_from_ordered(keys) - center) / scale).astype(np.float32)
+        return scaled >= thresholds
+
+    # Invariant: scaled(lo) < threshold <= scaled(hi)
+    lo = np.full(len(thresholds), _to_ordered(-np.inf), dtype=np.int64)
+    hi = np.full(len(thresholds), _to_ordered(np.inf), dtype=np.int64)
+    while np.any(hi > lo + 1):
+        # Overflow-free midpoint of two int64 keys
+        mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)
+        done = hi <= lo + 1
+        mid = np.where(done, hi, mid)
+        hit = reached(mid)
+        hi = np.where(hit, mid, hi)
+        lo = np.where(hit | done, lo, mid)
+    return _from_ordered(hi)
+
+
+def _to_ordered(values):
+    """Map float64 values to int64 keys with the same ordering"""
+    bits = np.asarray(values, dtype=np.float64).view(np.int64)
+    return np.where(bits < 0, -(bits & 0x7FFFFFFFFFFFFFFF), bits)
+
+
+def _from_ordered(keys):
+    """Inverse of _to_ordered"""
+    keys = np.asarray(keys, dtype=np.int64)
+    bits = np.where(keys < 0, (-keys) | np.int64(-0x8000000000000000), keys)
+    return bits.view(np.float64)
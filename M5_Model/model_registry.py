@@ -0,0 +1,222 @@
+"""
+Per-store model registry for the M5 Expiry Price Predictor
+Serves (department, store) models that are loaded on first use and evicted
+least-recently-used, within a model count and memory budget.
+
+Store models live in their own directory, named like the department models:
+    model_<dept>_<store>_optimized.pkl, scaler_<dept>_<store>_optimized.pkl
+e.g. model_FOODS_1_CA_1_optimized.pkl. Each is loaded through the same
+serving export as the department models (model_<dept>_<store>_serving.bin,
+see model_store.py) into a ModelSet holding just that department, so it
+scores exactly like a department model. Requests for a store without a
+model are answered by the department model.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from model_store import export_path
+
+_MODEL_FILE = re.compile(r'^model_(?P<dept>[A-Z]+_\d+)_(?P<store>.+)_optimized\.pkl$')
+
+
+class ModelRegistry:
+    """
+    Thread-safe LRU registry of per-(department, store) models
+
+    At most `max_models` models are kept, and models are evicted oldest
+    first while their memory exceeds `memory_budget_mb` (a single model
+    larger than the budget is still kept, as it has to serve). A model's
+    memory is its serving arrays, plus the size of its serialized booster
+    once the booster is deserialized. Calls already holding an evicted
+    model finish on it.
+    """
+
+    def __init__(self, predictor, model_dir='Model/stores/', max_models=32, memory_budget_mb=256):
+        """
+        Initialize the registry
+
+        Args:
+            predictor (ExpiryPricePredictor): Predictor whose loading and scoring the models use
+            model_dir (str): Directory holding the per-store model and scaler files
+            max_models (int): Most models kept in memory
+            memory_budget_mb (float): Most megabytes of serving arrays and deserialized boosters kept in memory
+        """
+        self.predictor = predictor
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self._entries = OrderedDict()
+        self._memory = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self.refresh()
+
+    def refresh(self):
+        """
+        Rescan model_dir for store models
+
+        Returns:
+            list: (department, store) pairs that have a model and a scaler
+        """
+        available = set()
+        if os.path.isdir(self.model_dir):
+            for name in os.listdir(self.model_dir):
+                match = _MODEL_FILE.match(name)
+                if match and match['dept'] in self.predictor.departments:
+                    key = (match['dept'], match['store'])
+                    if os.path.exists(self._path('scaler', *key)):
+                        available.add(key)
+        self._available = available
+        return sorted(available)
+
+    def _path(self, kind, dept, store):
+        """Path of a store's model or scaler file"""
+        return f"{self.model_dir}{kind}_{dept}_{store}_optimized.pkl"
+
+    def __contains__(self, key):
+        return key in self._available
+
+    def get(self, dept, store):
+        """
+        Model set for a department's store, loading it if needed
+
+        Args:
+            dept (str): Department ID
+            store (str): Store ID (the request's city)
+
+        Returns:
+            ModelSet: The store's model, or None if it has none (or it failed to load)
+        """
+        key = (dept, store)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        if key not in self._available:
+            return None
+
+        with self._load_lock:
+            # Another caller may have loaded it while this one waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+            return self._load(key)
+
+    def _load(self, key):
+        """Load a store model and add it to the registry (caller holds _load_lock)"""
+        dept, store = key
+        started = time.perf_counter()
+        try:
+            contents = []
+            for kind in ('model', 'scaler'):
+                with open(self._path(kind, dept, store), 'rb') as f:
+                    contents.append(f.read())
+            model_set, size = self.predictor._load_store_model(
+                dept, *contents, export_path(self.model_dir, f'{dept}_{store}'),
+                hashlib.sha256(b''.join(contents)).hexdigest()[:12]
+            )
+        except Exception as e:
+            print(f"⚠️ Warning: Could not load model for {dept}/{store}, using the department model: {str(e)}")
+            with self._lock:
+                self.load_failures += 1
+            # Not retried until the next refresh()
+            self._available = self._available - {key}
+            return None
+
+        # A booster built with the serving export is in memory already; others count once loaded
+        size += model_set.boosters.loaded_bytes()
+        model_set.boosters.on_load = lambda dept, nbytes: self._grow(key, model_set, nbytes)
+
+        with self._lock:
+            self.loads += 1
+            self.load_seconds += time.perf_counter() - started
+            self._entries[key] = (model_set, size)
+            self._memory += size
+            self._evict()
+        return model_set
+
+    def _grow(self, key, model_set, nbytes):
+        """Add a booster deserialized after loading to its model's memory"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not model_set:
+                # Already evicted (or replaced after a reload)
+                return
+            self._entries[key] = (model_set, entry[1] + nbytes)
+            self._memory += nbytes
+            self._evict()
+
+    def _evict(self):
+        """Evict least recently used models past max_models or the memory budget (caller holds _lock)"""
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_models or self._memory > self.memory_budget):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._memory -= evicted_size
+            self.evictions += 1
+
+    def preload(self, keys=None):
+        """
+        Load models before they are first requested
+
+        Args:
+            keys (iterable): (department, store) pairs; defaults to every available model,
+                in which case only the most recently loaded fit the budget
+
+        Returns:
+            list: Pairs that are loaded
+        """
+        keys = sorted(self._available) if keys is None else list(keys)
+        return [key for key in keys if self.get(*key) is not None]
+
+    def clear(self):
+        """Drop every loaded model and rescan model_dir (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._memory = 0
+        self.refresh()
+
+    def loaded(self):
+        """(department, store) pairs in memory, least recently used first"""
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self):
+        """
+        Get registry counters
+
+        Returns:
+            dict: Sizes and limits, hits, misses, loads, load failures, evictions and load time
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model_dir': self.model_dir,
+                'available': len(self._available),
+                'loaded': len(self._entries),
+                'max_models': self.max_models,
+                'memory_mb': self._memory / 2 ** 20,
+                'memory_budget_mb': self.memory_budget / 2 ** 20,
+                'hits': self.hits,
+                'misses': self.misses,
+                'loads': self.loads,
+                'load_failures': self.load_failures,
+                'evictions': self.evictions,
+                'load_seconds': self.load_seconds,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
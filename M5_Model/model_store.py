@@ -0,0 +1,234 @@
+"""
+Serving export for the M5 Expiry Price Predictor
+Stores everything a department needs at serving time in one memory-mappable
+file, so startup reads arrays in place instead of unpickling sklearn objects.
+
+Layout of model_<dept>_serving.bin:
+    <8 byte magic b'M5SERVE\\0'>
+    <uint32 little-endian header length>
+    <UTF-8 JSON header, padded with spaces so the arrays start 64-byte aligned>
+    <array buffers, each 64-byte aligned>
+
+    The header holds string attributes and one entry per array:
+        {"attributes": {"fingerprint": "...", ...},
+         "arrays": {"center": {"dtype": "<f8", "shape": [16], "offset": 0}, ...}}
+
+    Offsets are relative to the first byte after the header.
+
+A department's export holds the scaler's center and scale, the flat tree
+engine (engine/*), its scaler-fused copy when fusion succeeded (fused/*) and
+the booster in XGBoost's native UBJSON format (booster). The booster is only
+deserialized, and XGBoost only imported, when it is first needed.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Mapping
+import numpy as np
+from model_fusion import FUSION_VERSION
+
+# Bump when the export layout changes so existing exports are rebuilt
+EXPORT_VERSION = '1'
+
+_MAGIC = b'M5SERVE\0'
+_HEADER_LENGTH = struct.Struct('<I')
+_ALIGNMENT = 64
+
+# Serializes the deferred XGBoost import (see import_xgboost)
+_import_lock = threading.Lock()
+
+
+def export_path(model_dir, dept):
+    """Path of a department's serving export"""
+    return f"{model_dir}model_{dept}_serving.bin"
+
+
+def fingerprint(*contents):
+    """
+    Fingerprint the model files an export is built from
+
+    Args:
+        *contents (bytes): Model and scaler file contents
+
+    Returns:
+        str: Hex digest covering the contents, EXPORT_VERSION and FUSION_VERSION
+    """
+    digest = hashlib.sha256(f'{EXPORT_VERSION}/{FUSION_VERSION}'.encode())
+    for content in contents:
+        digest.update(content)
+    return digest.hexdigest()
+
+
+def import_xgboost():
+    """
+    Import XGBoost, and the pandas and scikit-learn it pulls in, on first use
+
+    Threads that import XGBoost's modules concurrently, in a different
+    order (unpickling a model imports xgboost.sklearn first), can be handed
+    a partially initialized module; going through one lock avoids that.
+
+    Returns:
+        module: The xgboost module
+    """
+    with _import_lock:
+        import xgboost
+    return xgboost
+
+
+def _padding(length):
+    """Bytes needed to pad `length` to the array alignment"""
+    return -length % _ALIGNMENT
+
+
+def write_export(path, arrays, **attributes):
+    """
+    Write arrays and string attributes to an export file
+
+    The file is written next to `path` and renamed into place, so readers
+    (and processes that still map the previous file) never see a partial one.
+
+    Args:
+        path (str): Destination file
+        arrays (dict): Name -> array
+        **attributes: String metadata stored in the header
+    """
+    specs, buffers, offset = {}, [], 0
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        specs[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        data = array.tobytes()
+        buffers.append(data + b'\0' * _padding(len(data)))
+        offset += len(buffers[-1])
+
+    header = json.dumps({'attributes': {key: str(value) for key, value in attributes.items()},
+                         'arrays': specs}).encode()
+    header += b' ' * _padding(len(_MAGIC) + _HEADER_LENGTH.size + len(header))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_MAGIC)
+        f.write(_HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for data in buffers:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_export(path):
+    """
+    Memory-map an export file
+
+    Args:
+        path (str): File written by write_export
+
+    Returns:
+        tuple: (dict of read-only arrays backed by the mapping, dict of string attributes)
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    prefix = len(_MAGIC) + _HEADER_LENGTH.size
+    if len(buffer) < prefix or buffer[:len(_MAGIC)] != _MAGIC:
+        raise ValueError(f"{path} is not a serving export")
+    (header_length,) = _HEADER_LENGTH.unpack_from(buffer, len(_MAGIC))
+    data_start = prefix + header_length
+    header = json.loads(buffer[prefix:data_start])
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                     offset=data_start + spec['offset']).reshape(tuple(spec['shape']))
+    return arrays, header['attributes']
+
+
+def prefixed(arrays, prefix):
+    """
+    Select the arrays stored under `prefix/`, without the prefix
+
+    Args:
+        arrays (dict): Arrays from read_export
+        prefix (str): Group name (engine, fused)
+
+    Returns:
+        dict: Name -> array, empty when the group is absent
+    """
+    start = prefix + '/'
+    return {name[len(start):]: array for name, array in arrays.items() if name.startswith(start)}
+
+
+class LazyBoosters(Mapping):
+    """
+    Department -> xgboost.Booster, deserialized on first use
+
+    Holds each booster's native model bytes and only imports XGBoost and
+    builds the booster when a department is first looked up. Membership,
+    iteration and len() never load anything.
+    """
+
+    def __init__(self, raw_models=None):
+        """
+        Initialize the mapping
+
+        Args:
+            raw_models (dict): Department -> native (UBJSON) model bytes
+        """
+        self._raw = dict(raw_models or {})
+        self._boosters = {}
+        self._lock = threading.Lock()
+        # Called with (dept, model bytes) after a booster is deserialized
+        self.on_load = None
+
+    def __getitem__(self, dept):
+        booster = self._boosters.get(dept)
+        if booster is None:
+            with self._lock:
+                booster = self._boosters.get(dept)
+                if booster is None:
+                    raw = self._raw[dept]
+                    booster = import_xgboost().Booster(model_file=bytearray(raw))
+                    self._boosters[dept] = booster
+                    if self.on_load is not None:
+                        self.on_load(dept, len(raw))
+        return booster
+
+    def __contains__(self, dept):
+        return dept in self._raw
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __len__(self):
+        return len(self._raw)
+
+    def add(self, dept, raw, booster=None):
+        """
+        Register a department's model bytes
+
+        Args:
+            dept (str): Department ID
+            raw (bytes-like): Native model bytes
+            booster (xgboost.Booster): Already deserialized booster, if any
+        """
+        self._raw[dept] = raw
+        if booster is not None:
+            self._boosters[dept] = booster
+
+    def loaded(self):
+        """Departments whose booster has been deserialized"""
+        return [dept for dept in self._raw if dept in self._boosters]
+
+    def loaded_bytes(self):
+        """Serialized size of the boosters deserialized so far"""
+        return sum(len(self._raw[dept]) for dept in self.loaded())
+
+    def load_all(self):
+        """Deserialize every booster now"""
+        for dept in self._raw:
+            self[dept]
+        return self
@@ -0,0 +1,102 @@
+"""
+Model directory watcher for the M5 Expiry Price Predictor
+Polls the model and scaler files and reloads the predictor once a new
+version has been fully written.
+"""
+
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWatcher:
+    """
+    Reloads a predictor when its model files change
+
+    The files are polled every `interval` seconds by size and modification
+    time. A change is acted on once the files have stayed the same for one
+    more interval, so a model that is still being copied is not loaded
+    half-written. By default the predictor reloads itself; `on_change` can
+    replace that (serve.py uses it to reload and restart its workers).
+    """
+
+    def __init__(self, predictor, interval=5.0, on_change=None):
+        """
+        Initialize the watcher
+
+        Args:
+            predictor (ExpiryPricePredictor): Predictor whose model files to watch
+            interval (float): Seconds between polls
+            on_change (callable): Called instead of predictor.reload_models on a change
+        """
+        self.predictor = predictor
+        self.interval = interval
+        self.on_change = on_change
+        self.reloads = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _signature(self):
+        """Size and modification time of every model file, None for missing files"""
+        signature = []
+        for path in self.predictor.model_sources():
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def start(self):
+        """Start polling in a background thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop polling"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        """Polling loop"""
+        current = self._signature()
+        pending = None
+        while not self._stop.wait(self.interval):
+            signature = self._signature()
+            if signature == current:
+                pending = None
+                continue
+            if signature != pending or None in signature:
+                # Changed since the last poll (or a file is missing): wait for it to settle
+                pending = signature
+                continue
+
+            current, pending = signature, None
+            logger.info("🔄 Model files changed, reloading")
+            try:
+                if self.on_change is not None:
+                    self.on_change()
+                else:
+                    result = self.predictor.reload_models()
+                    logger.info(f"✅ Models reloaded: {result['previous_version']} -> {result['version']} "
+                                f"in {result['seconds']:.2f} s")
+                self.reloads += 1
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Model reload failed, keeping the current models: {str(e)}")
+
+    def stats(self):
+        """
+        Get watcher state
+
+        Returns:
+            dict: Poll interval and reload/failure counts
+        """
+        return {'interval': self.interval, 'reloads': self.reloads, 'failures': self.failures}
@@ -0,0 +1,227 @@
+"""
+Parallel batch scoring for the M5 Expiry Price Predictor
+Splits very large batches into chunks scored by a pool of worker processes.
+
+The parent builds the feature matrix once, directly into shared memory, with
+rows sorted by department so every chunk is a contiguous block of one
+department's rows. Workers map the matrix and an output array by name (no
+pickling of either) and write their predictions in place; the parent then
+scatters them back into input order.
+
+Workers are spawned, not forked, and start their own predictor from the
+memory-mapped serving export (see model_store.py), so they share the model
+arrays through the page cache. Each worker limits XGBoost to
+cores // workers threads so the pool does not oversubscribe the CPU.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+import numpy as np
+
+# The worker process's predictor, created by _init_worker
+_worker = None
+
+
+def _init_worker(model_dir, engine_max_rows, fuse_scalers, threads):
+    """Start a worker's predictor with XGBoost limited to `threads` threads"""
+    global _worker
+    # Read by OpenMP when XGBoost is first imported
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    from predict_expiry_price import ExpiryPricePredictor
+    _worker = ExpiryPricePredictor(model_dir=model_dir, engine_max_rows=engine_max_rows,
+                                   fuse_scalers=fuse_scalers, cache_size=0, booster_loading='eager')
+    _worker.threads = threads
+    _limit_threads(_worker)
+
+
+def _limit_threads(predictor):
+    """Set every booster's prediction thread count to the worker's share of the cores"""
+    for dept in predictor.models:
+        predictor.models[dept].set_param({'nthread': predictor.threads})
+
+
+def _worker_pid():
+    """Report which worker ran the task, holding it briefly so other workers take the next ones"""
+    time.sleep(0.01)
+    return os.getpid()
+
+
+def _score_chunk(version, dept, start, stop, shape, features_name, output_name):
+    """
+    Score rows [start, stop) of the shared feature matrix into the shared output
+
+    Returns:
+        int: Rows scored
+    """
+    if _worker.model_version != version:
+        # The parent reloaded its models; load the same files
+        _worker.reload_models()
+        _worker.load_boosters()
+        _limit_threads(_worker)
+        if _worker.model_version != version:
+            raise RuntimeError(f"Worker has models {_worker.model_version}, batch needs {version}")
+
+    features = shared_memory.SharedMemory(name=features_name)
+    output = shared_memory.SharedMemory(name=output_name)
+    try:
+        X = np.ndarray(shape, dtype=np.float64, buffer=features.buf)
+        predictions = np.ndarray(shape[0], dtype=np.float64, buffer=output.buf)
+        predictions[start:stop] = _worker._predict_matrix(dept, X[start:stop])
+        del X, predictions
+    finally:
+        features.close()
+        output.close()
+    return stop - start
+
+
+class ParallelScorer:
+    """
+    Scores large column batches for a predictor on a process pool
+
+    Attach it as predictor.parallel: predict_columns (and so predict_batch
+    and columnar batches) then hands batches of at least `min_rows` rows to
+    the pool. The pool is started on first use.
+    """
+
+    def __init__(self, predictor, workers=None, min_rows=200000, chunk_rows=65536):
+        """
+        Initialize the scorer
+
+        Args:
+            predictor (ExpiryPricePredictor): Predictor whose batches to score
+            workers (int): Worker processes; defaults to the usable CPU count
+            min_rows (int): Smallest batch sent to the pool; smaller ones are scored in-process
+            chunk_rows (int): Most rows per task
+        """
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+        self.predictor = predictor
+        self.workers = workers or cpus
+        self.threads = max(1, cpus // self.workers)
+        self.min_rows = min_rows
+        self.chunk_rows = chunk_rows
+        self._pool = None
+        self.batches = 0
+        self.chunks = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def _get_pool(self):
+        """Start the worker pool on first use"""
+        if self._pool is None:
+            predictor = self.predictor
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(os.path.abspath(predictor.model_dir) + os.sep, predictor.engine_max_rows,
+                          predictor.fuse_scalers, self.threads)
+            )
+        return self._pool
+
+    def start(self):
+        """
+        Start the workers now and wait until each has loaded its models
+
+        Returns:
+            ParallelScorer: self
+        """
+        pool = self._get_pool()
+        pids = set()
+        while len(pids) < self.workers:
+            pids.update(future.result() for future in [pool.submit(_worker_pid) for _ in range(self.workers)])
+        return self
+
+    def close(self):
+        """Stop the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def predict_columns(self, days_to_expiry, codes, date, features=None):
+        """
+        Score a batch on the pool
+
+        Args:
+            days_to_expiry (np.ndarray): Days until expiry
+            codes (np.ndarray): Department codes into predictor.departments; other
+                codes (departments without a model) are left as NaN
+            date (np.ndarray): datetime64 dates
+            features (dict): Optional feature columns by name
+
+        Returns:
+            np.ndarray: float64 predictions in input order, NaN where no model exists
+        """
+        predictor = self.predictor
+        model_set = predictor.model_set
+        started = time.perf_counter()
+
+        # Sort rows by department so every chunk is one department's contiguous block
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        n_rows, n_features = len(order), len(predictor._feature_template)
+        shape = (n_rows, n_features)
+
+        features_shm = shared_memory.SharedMemory(create=True, size=max(1, n_rows * n_features * 8))
+        output_shm = shared_memory.SharedMemory(create=True, size=max(1, n_rows * 8))
+        try:
+            X = np.ndarray(shape, dtype=np.float64, buffer=features_shm.buf)
+            output = np.ndarray(n_rows, dtype=np.float64, buffer=output_shm.buf)
+            output[:] = np.nan
+            predictor._build_feature_matrix(
+                np.asarray(days_to_expiry)[order], np.asarray(date)[order],
+                {name: np.asarray(values)[order] for name, values in (features or {}).items()},
+                out=X
+            )
+
+            tasks = []
+            bounds = np.searchsorted(sorted_codes, np.arange(len(predictor.departments) + 1))
+            for code, dept in enumerate(predictor.departments):
+                start, stop = int(bounds[code]), int(bounds[code + 1])
+                if start == stop:
+                    continue
+                if dept not in model_set.models:
+                    print(f"⚠️ Warning: No model found for department {dept}")
+                    continue
+                X[start:stop, predictor._feature_index[f'dept_{dept}']] = 1
+                for chunk in range(start, stop, self.chunk_rows):
+                    tasks.append((model_set.version, dept, chunk, min(chunk + self.chunk_rows, stop), shape,
+                                  features_shm.name, output_shm.name))
+
+            pool = self._get_pool()
+            for future in [pool.submit(_score_chunk, *task) for task in tasks]:
+                future.result()
+
+            predictions = np.empty(n_rows, dtype=np.float64)
+            predictions[order] = output
+            del X, output
+        finally:
+            features_shm.close()
+            features_shm.unlink()
+            output_shm.close()
+            output_shm.unlink()
+
+        self.batches += 1
+        self.chunks += len(tasks)
+        self.rows += n_rows
+        self.seconds += time.perf_counter() - started
+        return predictions
+
+    def stats(self):
+        """
+        Get pool settings and counters
+
+        Returns:
+            dict: Workers, threads per worker, thresholds, batches, chunks, rows and rows/sec
+        """
+        return {
+            'workers': self.workers,
+            'threads_per_worker': self.threads,
+            'min_rows': self.min_rows,
+            'chunk_rows': self.chunk_rows,
+            'batches': self.batches,
+            'chunks': self.chunks,
+            'rows': self.rows,
+            'rows_per_sec': self.rows / self.seconds if self.seconds else 0.0
+        }
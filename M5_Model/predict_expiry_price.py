@@ -1,97 +1,406 @@
-import pandas as pd
 import numpy as np
+import hashlib
+import os
 import pickle
-import joblib
+import threading
+import time
 from datetime import datetime, timedelta
 import warnings
+from tree_engine import FlatTreeEnsemble
+from calendar_index import CalendarIndex, parse_date_column
+from model_fusion import fuse_scaler
+from model_store import LazyBoosters, export_path, fingerprint, import_xgboost, prefixed, read_export, write_export
+from prediction_cache import PredictionCache
+from row_dedup import unique_rows
+from metrics import metrics
 warnings.filterwarnings('ignore')
 
+# pandas is imported when a DataFrame is first needed, scikit-learn and
+# XGBoost when a serving export is rebuilt or a booster is first used
+
+BOOSTER_LOADING = ('lazy', 'background', 'eager')
+
+class ModelSet:
+    """
+    One loaded version of the department models
+    
+    Everything derived from the model and scaler files lives here, so a
+    reload builds a complete new set and swaps it in with one assignment.
+    Calls holding a reference to a set finish on it even if a newer set is
+    swapped in meanwhile.
+    """
+    
+    def __init__(self, version):
+        self.version = version
+        self.loaded_at = datetime.now()
+        self.scaling = {}
+        self.boosters = LazyBoosters()
+        self.engines = {}
+        # Export engines on scaled features for fused departments, to check the fused ones
+        self.unfused_engines = {}
+        self.fused_departments = []
+    
+    # Departments with a model (boosters load on first use) and their scaler arrays
+    models = property(lambda self: self.boosters)
+    scalers = property(lambda self: self.scaling)
+
+
 class ExpiryPricePredictor:
     """
     M5 Forecasting Model for predicting prices based on expiry dates
     Supports FOODS_1, FOODS_2, FOODS_3 categories
     """
     
-    def __init__(self, model_dir='Model/'):
+    def __init__(self, model_dir='Model/', engine_max_rows=16, fuse_scalers=True,
+                 cache_size=4096, cache_ttl=3600, price_table=None, booster_loading='lazy',
+                 calendar=None, dedup_rows=True):
         """
         Initialize the predictor with trained models
         
         Args:
             model_dir (str): Directory containing model files
+            engine_max_rows (int): Largest matrix scored with the flat-array tree engine
+            fuse_scalers (bool): Fold each RobustScaler into its model's thresholds
+            cache_size (int): Entries in the predict_price cache; 0 disables it
+            cache_ttl (float): Seconds a cached prediction stays valid
+            price_table (PriceTable): Precomputed prices answered without model inference
+            booster_loading (str): When XGBoost boosters are deserialized: 'lazy' (first
+                matrix larger than engine_max_rows), 'background' (in a thread after each
+                load) or 'eager' (before the model set is swapped in)
+            calendar (CalendarIndex): Date features and event flags; defaults to an
+                index without events covering DEFAULT_START to DEFAULT_END
+            dedup_rows (bool): Score each distinct feature row of a matrix larger than
+                engine_max_rows once and broadcast the result to its duplicates
         """
+        if booster_loading not in BOOSTER_LOADING:
+            raise ValueError(f"booster_loading must be one of {BOOSTER_LOADING}")
         self.model_dir = model_dir
-        self.models = {}
-        self.scalers = {}
+        self.engine_max_rows = engine_max_rows
+        self.fuse_scalers = fuse_scalers
+        self.booster_loading = booster_loading
+        self.cache = PredictionCache(maxsize=cache_size, ttl=cache_ttl)
+        self.price_table = price_table
+        self.calendar = calendar if calendar is not None else CalendarIndex()
+        self.dedup_rows = dedup_rows
+        self._dedup_lock = threading.Lock()
+        self._dedup_counts = [0, 0]
+        # Optional per-(department, store) models (see model_registry.py)
+        self.store_models = None
+        # Optional process pool for very large batches (see parallel.py)
+        self.parallel = None
+        self.model_set = None
         self.departments = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+        self._reload_lock = threading.Lock()
         
         # Load all models and scalers
+        self._prepare_fast_path()
         self._load_models()
+    
+    # The current model set's contents
+    models = property(lambda self: self.model_set.models)
+    scalers = property(lambda self: self.model_set.scalers)
+    engines = property(lambda self: self.model_set.engines)
+    fused_departments = property(lambda self: self.model_set.fused_departments)
+    _boosters = property(lambda self: self.model_set.boosters)
+    _scaling = property(lambda self: self.model_set.scaling)
+    
+    @property
+    def model_version(self):
+        """Version (content hash) of the current model set"""
+        return self.model_set.version
         
     def _load_models(self):
-        """Load all trained models and scalers"""
+        """Load, validate and warm up all trained models and scalers, then swap them in"""
         try:
-            for dept in self.departments:
-                # Load model
-                model_path = f"{self.model_dir}model_{dept}_optimized.pkl"
-                with open(model_path, 'rb') as f:
-                    self.models[dept] = pickle.load(f)
-                
-                # Load scaler
-                scaler_path = f"{self.model_dir}scaler_{dept}_optimized.pkl"
-                with open(scaler_path, 'rb') as f:
-                    self.scalers[dept] = pickle.load(f)
-                    
-            print(f"✅ Successfully loaded {len(self.models)} models")
+            model_set = self._load_model_set()
+            if self.booster_loading == 'eager':
+                model_set.boosters.load_all()
+            self._warm_up(model_set)
+            
+            # A price table holds the previous models' prices: detach it before the swap
+            # so no single prediction is answered from it after the new models serve
+            table = self.price_table
+            if table is not None and table.model_version != model_set.version:
+                self.price_table = None
+                print(f"⚠️ Price table computed with model version {table.model_version} detached; "
+                      f"materialize it again for version {model_set.version}")
+            self.model_set = model_set
+            # Cached predictions belong to the previous models
+            self.cache.clear()
+            if self.store_models is not None:
+                self.store_models.clear()
+            print(f"✅ Successfully loaded {len(model_set.models)} models (version {model_set.version})")
             
         except Exception as e:
             print(f"❌ Error loading models: {str(e)}")
             raise
+        
+        if self.booster_loading == 'background':
+            threading.Thread(target=model_set.boosters.load_all, name='booster-loader', daemon=True).start()
+    
+    def load_boosters(self):
+        """
+        Deserialize the current model set's boosters now instead of on first use
+        
+        serve.py calls this before forking, so every worker shares them.
+        """
+        self.model_set.boosters.load_all()
+    
+    def reload_models(self):
+        """
+        Load a new model set from model_dir and atomically swap it in
+        
+        The new set is loaded, validated and warmed up while the current
+        one keeps serving; requests already running finish on the set they
+        started with. If anything fails the current set stays in place.
+        
+        Returns:
+            dict: New and previous version and the reload time in seconds
+        """
+        with self._reload_lock:
+            started = time.perf_counter()
+            previous = self.model_set.version
+            self._load_models()
+            return {
+                'version': self.model_set.version,
+                'previous_version': previous,
+                'seconds': time.perf_counter() - started
+            }
+    
+    def model_sources(self):
+        """Model and scaler file paths, in load order"""
+        return [
+            path
+            for dept in self.departments
+            for path in (f"{self.model_dir}model_{dept}_optimized.pkl", f"{self.model_dir}scaler_{dept}_optimized.pkl")
+        ]
     
-    def _create_features(self, data):
+    def _load_model_set(self):
+        """
+        Load every department's serving export into a new ModelSet
+        
+        The version is a hash of the .pkl files, which are read but only
+        unpickled when a department's export is missing or stale.
+        
+        Returns:
+            ModelSet: Loaded set with scaling arrays, tree engines and (lazy) boosters
         """
-        Create features for prediction
+        digest = hashlib.sha256()
+        contents = {}
+        for path in self.model_sources():
+            with open(path, 'rb') as f:
+                contents[path] = f.read()
+            digest.update(contents[path])
+        model_set = ModelSet(digest.hexdigest()[:12])
+        
+        for dept in self.departments:
+            arrays, booster = self._load_export(
+                dept,
+                contents[f"{self.model_dir}model_{dept}_optimized.pkl"],
+                contents[f"{self.model_dir}scaler_{dept}_optimized.pkl"]
+            )
+            self._add_department(model_set, dept, arrays, booster)
+        return model_set
+    
+    def _add_department(self, model_set, dept, arrays, booster):
+        """Add a department's export arrays (and booster, if already built) to a model set"""
+        model_set.scaling[dept] = (arrays['center'], arrays['scale'])
+        model_set.engines[dept] = FlatTreeEnsemble.from_arrays(prefixed(arrays, 'engine'))
+        fused = prefixed(arrays, 'fused')
+        if self.fuse_scalers and fused:
+            model_set.unfused_engines[dept] = model_set.engines[dept]
+            model_set.engines[dept] = FlatTreeEnsemble.from_arrays(fused)
+            model_set.fused_departments.append(dept)
+        model_set.boosters.add(dept, arrays['booster'], booster)
+    
+    def _load_store_model(self, dept, model_bytes, scaler_bytes, path, version):
+        """
+        Load a per-store model into a model set of its own (see model_registry.py)
         
         Args:
-            data (pd.DataFrame): Input data with required columns
-            
+            dept (str): Department the model was trained for
+            model_bytes (bytes): Pickled model file contents
+            scaler_bytes (bytes): Pickled scaler file contents
+            path (str): Serving export path for the store model
+            version (str): Version of the store model files
+        
         Returns:
-            pd.DataFrame: Feature matrix
+            tuple: (ModelSet holding only `dept`, size in bytes of its serving arrays)
         """
-        # Ensure required columns exist
-        required_cols = ['days_to_expiry', 'dept_id', 'date']
-        missing_cols = [col for col in required_cols if col not in data.columns]
-        if missing_cols:
-            raise ValueError(f"Missing required columns: {missing_cols}")
+        arrays, booster = self._load_export(dept, model_bytes, scaler_bytes, path)
+        model_set = ModelSet(version)
+        self._add_department(model_set, dept, arrays, booster)
+        return model_set, sum(array.nbytes for array in arrays.values())
+    
+    def _load_export(self, dept, model_bytes, scaler_bytes, path=None):
+        """
+        Memory-map a department's serving export, rebuilding it if stale
         
-        # Create feature dataframe
-        features_df = data.copy()
+        The export lives next to the .pkl files as model_<dept>_serving.bin
+        (see model_store.py) and records a fingerprint of the model and
+        scaler it was built from.
         
-        # Date features
-        features_df['date'] = pd.to_datetime(features_df['date'])
-        features_df['year'] = features_df['date'].dt.year
-        features_df['month'] = features_df['date'].dt.month
-        features_df['day'] = features_df['date'].dt.day
-        features_df['day_of_week'] = features_df['date'].dt.dayofweek
-        features_df['week_of_year'] = features_df['date'].dt.isocalendar().week
+        Args:
+            dept (str): Department ID
+            model_bytes (bytes): Pickled model file contents
+            scaler_bytes (bytes): Pickled scaler file contents
+            path (str): Export path; defaults to the department's in model_dir
         
-        # Days to expiry features
-        features_df['days_to_expiry_squared'] = features_df['days_to_expiry'] ** 2
-        features_df['days_to_expiry_cubed'] = features_df['days_to_expiry'] ** 3
-        features_df['log_days_to_expiry'] = np.log1p(features_df['days_to_expiry'])
+        Returns:
+            tuple: (dict of arrays, xgboost.Booster if the export was just built, else None)
+        """
+        if path is None:
+            path = export_path(self.model_dir, dept)
+        expected = fingerprint(model_bytes, scaler_bytes)
+        if os.path.exists(path):
+            try:
+                arrays, attributes = read_export(path)
+                if attributes.get('fingerprint') == expected:
+                    return arrays, None
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Warning: Could not read serving export for {dept}: {str(e)}")
+        
+        arrays, booster = self._build_export(dept, model_bytes, scaler_bytes)
+        try:
+            write_export(path, arrays, fingerprint=expected, dept=dept)
+        except Exception as e:
+            print(f"⚠️ Warning: Could not write serving export for {dept}: {str(e)}")
+        return arrays, booster
+    
+    def _build_export(self, dept, model_bytes, scaler_bytes):
+        """
+        Build a department's serving arrays from its pickled model and scaler
+        
+        Unpickling needs scikit-learn and XGBoost. The tree engine must give
+        finite predictions matching the booster's on the probe rows, or the
+        model is rejected.
+        
+        Returns:
+            tuple: (dict of arrays for write_export, xgboost.Booster)
+        """
+        import_xgboost()
+        model = pickle.loads(model_bytes)
+        scaler = pickle.loads(scaler_bytes)
+        
+        # RobustScaler parameters: transform is (x - center_) / scale_
+        center = np.asarray(scaler.center_ if scaler.with_centering else 0.0, dtype=np.float64)
+        scale = np.asarray(scaler.scale_ if scaler.with_scaling else 1.0, dtype=np.float64)
+        booster = model.get_booster()
+        engine = FlatTreeEnsemble.from_booster(booster)
+        
+        probe = self._fusion_probe(dept)
+        scaled = probe.copy()
+        scaled[:, self._numerical_index] = (scaled[:, self._numerical_index] - center) / scale
+        expected = booster.inplace_predict(scaled)
+        if not np.all(np.isfinite(expected)):
+            raise ValueError(f"Model for {dept} returned non-finite predictions")
+        unfused = engine.predict(scaled)
+        if not np.allclose(unfused, expected, rtol=1e-5, atol=1e-5):
+            raise ValueError(f"Tree engine and booster disagree for {dept}")
+        
+        arrays = {
+            'center': center,
+            'scale': scale,
+            'booster': np.frombuffer(booster.save_raw(raw_format='ubj'), dtype=np.uint8)
+        }
+        arrays.update({f'engine/{name}': value for name, value in engine.to_arrays().items()})
+        fused = self._fuse_engine(dept, engine, center, scale, probe, unfused)
+        if fused is not None:
+            arrays.update({f'fused/{name}': value for name, value in fused.to_arrays().items()})
+        return arrays, booster
+    
+    def _fuse_engine(self, dept, engine, center, scale, probe, expected):
+        """
+        Fold a department's scaler into its tree engine
         
-        # Department encoding
+        A fused engine takes unscaled features, so rows it scores skip scaling.
+        It is checked against scaler + engine on the probe rows; a department
+        that fails the check keeps scaling.
+        
+        Returns:
+            FlatTreeEnsemble: Engine that takes unscaled features, or None
+        """
+        try:
+            fused = fuse_scaler(engine, center, scale, list(self._numerical_index))
+        except Exception as e:
+            print(f"⚠️ Warning: Could not fuse scaler for {dept}: {str(e)}")
+            return None
+        
+        actual = fused.predict(probe)
+        if not np.allclose(actual, expected, rtol=1e-6, atol=1e-6):
+            mismatches = int(np.sum(~np.isclose(actual, expected, rtol=1e-6, atol=1e-6)))
+            print(f"⚠️ Warning: Fused model for {dept} differs on {mismatches} probe rows, keeping scaler")
+            return None
+        return fused
+    
+    def _warm_up(self, model_set):
+        """
+        Validate a model set and prime its scoring paths
+        
+        Every department's tree engine scores a few rows, which must be
+        finite; boosters that are already deserialized score them too and
+        must agree, and a fused engine must match scaling plus the export's
+        unfused engine, also when the export was reused from disk. This runs
+        the first calls before the set serves requests. The full check
+        against the booster runs when the serving export is built.
+        """
+        missing = [dept for dept in self.departments if dept not in model_set.models]
+        if missing:
+            raise ValueError(f"Model set {model_set.version} is missing departments: {missing}")
+        
+        loaded = model_set.boosters.loaded()
         for dept in self.departments:
-            features_df[f'dept_{dept}'] = (features_df['dept_id'] == dept).astype(int)
+            X = np.vstack([self._build_feature_vector(days, dept, '2024-01-15', {}) for days in range(0, 365, 23)])
+            scaled = self._scale_features(dept, X, model_set)
+            engine = model_set.engines[dept].predict(X if dept in model_set.fused_departments else scaled)
+            if not np.all(np.isfinite(engine)):
+                raise ValueError(f"Model for {dept} returned non-finite predictions")
+            if dept in model_set.fused_departments:
+                unfused = model_set.unfused_engines[dept].predict(scaled)
+                if not np.allclose(engine, unfused, rtol=1e-6, atol=1e-6):
+                    raise ValueError(f"Fused model for {dept} disagrees with scaler + model")
+            if dept in loaded:
+                booster = model_set.boosters[dept].inplace_predict(scaled)
+                if not np.allclose(engine, booster, rtol=1e-5, atol=1e-5):
+                    raise ValueError(f"Tree engine and booster disagree for {dept}")
+    
+    def _prepare_fast_path(self):
+        """Precompute feature positions and default values for predict_price"""
+        feature_cols = self._get_feature_columns()
+        self._feature_index = {col: i for i, col in enumerate(feature_cols)}
+        self._numerical_index = np.array(
+            [self._feature_index[col] for col in self._get_numerical_features()]
+        )
         
-        # City encoding (if city column exists) - but don't use in prediction
-        if 'city' in features_df.columns:
-            # Store city info for response but don't use in model features
-            features_df['_city_info'] = features_df['city']
-            # Remove city column to avoid feature mismatch
-            features_df = features_df.drop('city', axis=1)
+        # Template holding the default feature values
+        default_features = self._get_default_features()
+        self._default_features = default_features
+        self._overridable_features = set(default_features)
+        self._feature_template = np.zeros(len(feature_cols), dtype=np.float64)
+        for feature, default_value in default_features.items():
+            self._feature_template[self._feature_index[feature]] = default_value
+    
+    def _fusion_probe(self, dept):
+        """
+        Unscaled feature rows used to check a fused model
         
-        # Default values for missing features (set to 0 for simplicity)
-        default_features = {
+        Covers every days_to_expiry from 0 to 365, plus rows with random
+        values for the optional features.
+        """
+        X = np.vstack([
+            self._build_feature_vector(days, dept, '2024-01-15', {})
+            for days in range(366)
+        ])
+        
+        rng = np.random.default_rng(0)
+        extra = X[rng.integers(0, len(X), 1000)]
+        for feature in self._overridable_features:
+            extra[:, self._feature_index[feature]] = rng.normal(scale=3.0, size=len(extra))
+        return np.vstack([X, extra])
+    
+    def _get_default_features(self):
+        """Get the default values for features not supplied by the caller"""
+        return {
             'days_since_first_sale': 0,
             'has_event': 0,
             'promo_impact': 0,
@@ -107,12 +416,6 @@ class ExpiryPricePredictor:
             'sell_price_lag_7': 0,
             'days_to_expiry_sales_interaction': 0
         }
-        
-        for feature, default_value in default_features.items():
-            if feature not in features_df.columns:
-                features_df[feature] = default_value
-        
-        return features_df
     
     def _get_feature_columns(self):
         """Get the list of feature columns used by the models"""
@@ -126,6 +429,16 @@ class ExpiryPricePredictor:
             'dept_FOODS_1', 'dept_FOODS_2', 'dept_FOODS_3'
         ]
     
+    def _get_numerical_features(self):
+        """Get the feature columns that are scaled by the RobustScaler"""
+        return [
+            'days_to_expiry', 'days_to_expiry_squared', 'days_to_expiry_cubed', 'log_days_to_expiry',
+            'days_since_first_sale', 'price_diff', 'price_trend', 'price_elasticity',
+            'sales_lag_1', 'stock_turnover', 'expiry_price_elasticity',
+            'days_to_expiry_price_elasticity', 'days_to_expiry_price_trend',
+            'price_elasticity_trend_interaction', 'sell_price_lag_7', 'days_to_expiry_sales_interaction'
+        ]
+    
     def predict_single(self, days_to_expiry, dept_id, date=None, **kwargs):
         """
         Predict price for a single item
@@ -139,6 +452,8 @@ class ExpiryPricePredictor:
         Returns:
             float: Predicted price
         """
+        import pandas as pd
+        
         if date is None:
             date = datetime.now()
         
@@ -155,91 +470,529 @@ class ExpiryPricePredictor:
         
         return self.predict_batch(data)
     
-    def predict_batch(self, data):
+    def _scale_features(self, dept, X, model_set=None):
         """
-        Predict prices for multiple items
+        Scale the numerical columns of a feature matrix
+        
+        Same arithmetic as RobustScaler.transform, on the stored arrays.
         
         Args:
-            data (pd.DataFrame): DataFrame with columns: days_to_expiry, dept_id, date
+            dept (str): Department whose scaler to apply
+            X (np.ndarray): Unscaled feature matrix of shape (n_rows, n_features)
+            model_set (ModelSet): Set whose scaler to use; defaults to the current one
             
         Returns:
-            pd.DataFrame: Original data with predicted prices
+            np.ndarray: Scaled copy of X
         """
-        if data.empty:
-            return data
+        scaling = (model_set or self.model_set).scaling
+        X = X.copy()
+        if dept in scaling:
+            center, scale = scaling[dept]
+            X[:, self._numerical_index] = (X[:, self._numerical_index] - center) / scale
+        return X
+    
+    def _predict_matrix(self, dept, X, model_set=None):
+        """
+        Score an unscaled feature matrix with a department's model
         
-        # Create features
-        features_df = self._create_features(data)
-        feature_cols = self._get_feature_columns()
+        With dedup_rows, a matrix larger than engine_max_rows is reduced to
+        its distinct rows first: only those are scored, and each prediction
+        is broadcast back to the rows that share it.
         
-        # Ensure all feature columns exist
-        for col in feature_cols:
-            if col not in features_df.columns:
-                features_df[col] = 0
+        Args:
+            dept (str): Department whose model to use
+            X (np.ndarray): Unscaled feature matrix of shape (n_rows, n_features)
+            model_set (ModelSet): Set to score with; defaults to the current one
+            
+        Returns:
+            np.ndarray: Predictions of shape (n_rows,)
+        """
+        if not self.dedup_rows or len(X) <= self.engine_max_rows:
+            return self._score_matrix(dept, X, model_set)
         
-        # Select only the required features
-        X = features_df[feature_cols]
+        started = time.perf_counter()
+        first, inverse = unique_rows(X)
+        metrics.observe_stage('dedup', time.perf_counter() - started, dept)
+        metrics.observe_dedup(dept, len(X), len(first))
+        with self._dedup_lock:
+            self._dedup_counts[0] += len(X)
+            self._dedup_counts[1] += len(first)
+        if len(first) == len(X):
+            return self._score_matrix(dept, X, model_set)
+        return self._score_matrix(dept, X[first], model_set)[inverse]
+    
+    def _score_matrix(self, dept, X, model_set=None):
+        """
+        Score every row of an unscaled feature matrix with a department's model
         
-        # Make predictions for each department
-        predictions = []
+        Small matrices go through the flat-array tree engine, which has almost
+        no fixed cost and, when fused, needs no scaling. Larger ones are scaled
+        in one vectorized step and go through XGBoost's compiled predictor,
+        which is faster per row. Neither uses the sklearn wrapper or a DMatrix.
         
-        for idx, row in features_df.iterrows():
-            dept = row['dept_id']
+        Args:
+            dept (str): Department whose model to use
+            X (np.ndarray): Unscaled feature matrix of shape (n_rows, n_features)
+            model_set (ModelSet): Set to score with; defaults to the current one
             
-            if dept not in self.models:
-                print(f"⚠️ Warning: No model found for department {dept}")
-                predictions.append(None)
-                continue
+        Returns:
+            np.ndarray: Predictions of shape (n_rows,)
+        """
+        if model_set is None:
+            model_set = self.model_set
+        started = time.perf_counter()
+        if len(X) <= self.engine_max_rows:
+            if dept not in model_set.fused_departments:
+                X = self._scale_features(dept, X, model_set)
+            predictions = model_set.engines[dept].predict(X)
+            metrics.observe_model_call(dept, 'flat', len(X), time.perf_counter() - started)
+            return predictions
+        
+        X = self._scale_features(dept, X, model_set)
+        scaled = time.perf_counter()
+        metrics.observe_stage('scale', scaled - started, dept)
+        predictions = model_set.boosters[dept].inplace_predict(X)
+        metrics.observe_model_call(dept, 'xgboost', len(X), time.perf_counter() - scaled)
+        return predictions
+    
+    def _parse_date(self, date):
+        """
+        Convert a request date into a datetime without going through pandas
+        
+        Args:
+            date (str/datetime/None): ISO date or timestamp; None means now
+            
+        Returns:
+            datetime: Parsed date
+        """
+        if date is None:
+            return datetime.now()
+        if isinstance(date, datetime):
+            return date
+        if isinstance(date, str):
+            try:
+                return datetime.fromisoformat(date.replace('Z', '+00:00'))
+            except ValueError:
+                pass
+        import pandas as pd
+        return pd.to_datetime(date).to_pydatetime()
+    
+    def _build_feature_vector(self, days_to_expiry, dept_id, date, features):
+        """
+        Build the model feature vector for a single item
+        
+        The one-row counterpart of _build_feature_matrix: expiry features
+        and the calendar features of the date (has_event from the calendar
+        index) are filled in, supplied features override the defaults and
+        anything else (city, mrp, ...) is ignored.
+        
+        Returns:
+            np.ndarray: Unscaled feature vector of shape (1, n_features)
+        """
+        index = self._feature_index
+        date = self._parse_date(date)
+        
+        calendar = self.calendar.day(date)
+        
+        x = self._feature_template.copy()
+        x[index['has_event']] = calendar['has_event']
+        for feature, value in features.items():
+            if feature in self._overridable_features:
+                x[index[feature]] = value
+        
+        x[index['days_to_expiry']] = days_to_expiry
+        x[index['days_to_expiry_squared']] = days_to_expiry ** 2
+        x[index['days_to_expiry_cubed']] = days_to_expiry ** 3
+        x[index['log_days_to_expiry']] = np.log1p(days_to_expiry)
+        x[index['day_of_week']] = calendar['day_of_week']
+        x[index['week_of_year']] = calendar['week_of_year']
+        x[index['month']] = calendar['month']
+        x[index[f'dept_{dept_id}']] = 1
+        
+        return x.reshape(1, -1)
+    
+    def _lookup_price_table(self, days_to_expiry, dept_id, date, features):
+        """
+        Answer a single prediction from the price table when possible
+        
+        Only items whose optional features are all at their defaults (apart
+        from has_event, which the table covers) are answered from the table.
+        
+        Returns:
+            float: Table price, or None if the item is not covered
+        """
+        for feature, value in features.items():
+            if feature in self._overridable_features and feature != 'has_event':
+                if value != self._default_features[feature]:
+                    return None
+        
+        date = self._parse_date(date)
+        has_event = features.get('has_event', self.calendar.day(date)['has_event'])
+        return self.price_table.lookup(dept_id, days_to_expiry, date, has_event)
+    
+    def _select_model_set(self, dept_id, store=None):
+        """
+        Model set to score a department's item with
+        
+        Args:
+            dept_id (str): Department ID
+            store (str): Store ID (the request's city), if any
             
-            # Get features for this row
-            row_features = X.iloc[idx:idx+1]
+        Returns:
+            tuple: (ModelSet, whether it is the store's own model); the current
+            department models unless the store registry has a model for the store
+        """
+        if self.store_models is not None and isinstance(store, str):
+            store_set = self.store_models.get(dept_id, store)
+            if store_set is not None:
+                return store_set, True
+        return self.model_set, False
+    
+    def predict_price(self, days_to_expiry, dept_id, date=None, **kwargs):
+        """
+        Predict price for a single item without building DataFrames
+        
+        Same inputs and result as predict_single, but the feature vector is
+        built directly in NumPy, scaled with the stored RobustScaler arrays
+        and scored with a single model call. Results are cached on the
+        department and the effective feature vector, so inputs that only
+        differ in ignored fields (mrp, ...) share an entry. With a price
+        table attached, covered items are answered by an array lookup. With
+        store models attached, `city` selects the store's model when it has one.
+        
+        Args:
+            days_to_expiry (int): Days until expiry
+            dept_id (str): Department ID (FOODS_1, FOODS_2, FOODS_3)
+            date (str/datetime): Date for prediction
+            **kwargs: Additional features
             
-            # Scale features
-            numerical_features = [
-                'days_to_expiry', 'days_to_expiry_squared', 'days_to_expiry_cubed', 'log_days_to_expiry',
-                'days_since_first_sale', 'price_diff', 'price_trend', 'price_elasticity',
-                'sales_lag_1', 'stock_turnover', 'expiry_price_elasticity',
-                'days_to_expiry_price_elasticity', 'days_to_expiry_price_trend',
-                'price_elasticity_trend_interaction', 'sell_price_lag_7', 'days_to_expiry_sales_interaction'
-            ]
+        Returns:
+            float: Predicted price, or None if the department has no model
+        """
+        price, pending = self.prepare_price(days_to_expiry, dept_id, date, **kwargs)
+        if pending is None:
+            return price
+        
+        model_set, key, x = pending
+        price = float(self._predict_matrix(dept_id, x, model_set)[0])
+        if key is not None:
+            self.cache.put(key, price)
+        return price
+    
+    def prepare_price(self, days_to_expiry, dept_id, date=None, **kwargs):
+        """
+        Answer a single prediction without the model, or prepare it for scoring
+        
+        The fast path of predict_price up to the model call: store model
+        selection, price table lookup, feature vector and cache lookup. The
+        coalescer uses it to score the remaining rows in batches.
+        
+        Args:
+            days_to_expiry (int): Days until expiry
+            dept_id (str): Department ID (FOODS_1, FOODS_2, FOODS_3)
+            date (str/datetime): Date for prediction
+            **kwargs: Additional features
             
-            # Scale numerical features
-            row_features_scaled = row_features.copy()
-            if dept in self.scalers:
-                row_features_scaled[numerical_features] = self.scalers[dept].transform(
-                    row_features[numerical_features]
-                )
+        Returns:
+            tuple: (price, None) when answered, price being None if the department
+            has no model; otherwise (None, (model_set, cache key or None, 1-row
+            feature matrix)) to be scored with model_set and put in the cache
+        """
+        model_set, store_model = self._select_model_set(dept_id, kwargs.get('city'))
+        if dept_id not in model_set.models:
+            print(f"⚠️ Warning: No model found for department {dept_id}")
+            return None, None
+        
+        if self.price_table is not None and not store_model:
+            price = self._lookup_price_table(days_to_expiry, dept_id, date, kwargs)
+            if price is not None:
+                return price, None
+        
+        started = time.perf_counter()
+        x = self._build_feature_vector(days_to_expiry, dept_id, date, kwargs)
+        built = time.perf_counter()
+        
+        key = None
+        if self.cache.enabled:
+            # Keyed on the version so a price computed during a reload is not served by the new set
+            key = (model_set.version, dept_id, x.tobytes())
+            price = self.cache.get(key)
+            if price is not None:
+                return price, None
+        metrics.observe_stage('features', built - started)
+        return None, (model_set, key, x)
+    
+    def _build_feature_matrix(self, days_to_expiry, date, features=None, out=None):
+        """
+        Build the unscaled feature matrix from column arrays
+        
+        Calendar features (and has_event, unless supplied) come from one
+        lookup in the calendar index. Department one-hot columns are left
+        at 0; they are set per department when the rows are scored.
+        
+        Args:
+            days_to_expiry (np.ndarray): Days until expiry
+            date (np.ndarray): datetime64 dates
+            features (dict): Optional feature columns by name; others are ignored
+            out (np.ndarray): float64 (n_rows, n_features) array to fill instead of
+                allocating one, e.g. a shared memory buffer
             
-            # Make prediction
+        Returns:
+            np.ndarray: float64 matrix of shape (n_rows, n_features)
+        """
+        started = time.perf_counter()
+        index = self._feature_index
+        days = np.asarray(days_to_expiry, dtype=np.float64)
+        
+        X = np.empty((len(days), len(self._feature_template)), dtype=np.float64) if out is None else out
+        X[:] = self._feature_template
+        calendar = self.calendar.lookup(date, ('day_of_week', 'week_of_year', 'month', 'has_event'))
+        for feature in ('day_of_week', 'week_of_year', 'month', 'has_event'):
+            X[:, index[feature]] = calendar[feature]
+        for feature, values in (features or {}).items():
+            if feature in self._overridable_features:
+                X[:, index[feature]] = values
+        
+        X[:, index['days_to_expiry']] = days
+        X[:, index['days_to_expiry_squared']] = days ** 2
+        X[:, index['days_to_expiry_cubed']] = days ** 3
+        X[:, index['log_days_to_expiry']] = np.log1p(days)
+        metrics.observe_stage('features', time.perf_counter() - started)
+        return X
+    
+    def predict_columns(self, days_to_expiry, dept_id, date, features=None, store=None):
+        """
+        Predict prices from column arrays without building a DataFrame
+        
+        Columnar inputs (NumPy or Arrow buffers) go straight into the
+        feature builder; rows are grouped by department (and by store, for
+        stores with their own model) and each group is scored with one
+        model call. With a ParallelScorer attached, batches of at least its
+        min_rows rows are scored in chunks on its process pool.
+        
+        Args:
+            days_to_expiry (np.ndarray): Days until expiry
+            dept_id (np.ndarray): Department IDs, or integer codes into self.departments
+            date (np.ndarray): datetime64 dates
+            features (dict): Optional feature columns by name
+            store (np.ndarray): Store IDs (city), used when store models are attached
+            
+        Returns:
+            np.ndarray: float64 predictions in input order, NaN where no model exists
+        """
+        dept_id = np.asarray(dept_id)
+        if self._use_parallel(len(dept_id), store):
             try:
-                pred = self.models[dept].predict(row_features_scaled)[0]
-                predictions.append(pred)
+                return self.parallel.predict_columns(days_to_expiry, self._department_codes(dept_id), date, features)
+            except ValueError:
+                raise
             except Exception as e:
-                print(f"❌ Error predicting for {dept}: {str(e)}")
-                predictions.append(None)
+                print(f"⚠️ Warning: Parallel scoring failed, scoring in-process: {str(e)}")
+        
+        model_set = self.model_set
+        X = self._build_feature_matrix(days_to_expiry, date, features)
+        predictions = np.full(len(X), np.nan)
+        if len(X) == 0:
+            return predictions
+        
+        if dept_id.dtype.kind in 'iu':
+            if dept_id.min() < 0 or dept_id.max() >= len(self.departments):
+                raise ValueError("Department codes must index supported_departments")
+            labels, codes = self.departments, dept_id
+        else:
+            labels, codes = np.unique(dept_id, return_inverse=True)
+        
+        for code, dept in enumerate(labels):
+            rows = np.flatnonzero(codes == code)
+            if len(rows) == 0:
+                continue
+            
+            if dept not in model_set.models:
+                print(f"⚠️ Warning: No model found for department {dept}")
+                continue
+            
+            # Predict this department's rows and scatter back into input order
+            for group, group_set in self._store_groups(dept, rows, store, model_set):
+                try:
+                    dept_features = X[group]
+                    dept_features[:, self._feature_index[f'dept_{dept}']] = 1
+                    predictions[group] = self._predict_matrix(dept, dept_features, group_set)
+                except Exception as e:
+                    print(f"❌ Error predicting for {dept}: {str(e)}")
+        
+        return predictions
+    
+    def _use_parallel(self, n_rows, store):
+        """Whether a batch goes to the process pool: large enough, and not split across store models"""
+        if self.parallel is None or n_rows < self.parallel.min_rows:
+            return False
+        return store is None or self.store_models is None
+    
+    def _department_codes(self, dept_id):
+        """
+        Department IDs (or codes) as integer codes into self.departments
+        
+        Returns:
+            np.ndarray: Codes; unknown departments get len(self.departments)
+        """
+        if dept_id.dtype.kind in 'iu':
+            if len(dept_id) and (dept_id.min() < 0 or dept_id.max() >= len(self.departments)):
+                raise ValueError("Department codes must index supported_departments")
+            return dept_id
+        labels, codes = np.unique(dept_id, return_inverse=True)
+        for dept in labels:
+            if dept not in self.departments:
+                print(f"⚠️ Warning: No model found for department {dept}")
+        remap = np.array([self.departments.index(dept) if dept in self.departments else len(self.departments)
+                          for dept in labels], dtype=np.intp)
+        return remap[codes]
+    
+    def _store_groups(self, dept, rows, store, model_set):
+        """
+        Split a department's rows by the model set that scores them
+        
+        Returns:
+            list: (row indices, ModelSet) pairs; rows of stores without their
+            own model are scored with `model_set`
+        """
+        if store is None or self.store_models is None:
+            return [(rows, model_set)]
+        
+        stores = np.asarray(store, dtype=object)[rows]
+        remaining = np.ones(len(rows), dtype=bool)
+        groups = []
+        for name in set(stores.tolist()):
+            store_set = self.store_models.get(dept, name) if isinstance(name, str) else None
+            if store_set is not None:
+                in_store = stores == name
+                groups.append((rows[in_store], store_set))
+                remaining &= ~in_store
+        if remaining.any():
+            groups.append((rows[remaining], model_set))
+        return groups
+    
+    def predict_grid(self, dept_ids, dates, days_to_expiry, features=None):
+        """
+        Predict a dense price grid for every department x date x days_to_expiry
+        
+        The dates x days block of the feature matrix is built once and
+        reused for every department, which only changes its one-hot column;
+        each department is then scored in a single model call.
+        
+        Args:
+            dept_ids (list): Department IDs
+            dates (np.ndarray): datetime64 dates
+            days_to_expiry (np.ndarray): Days until expiry values
+            features (dict): Optional scalar feature values applied to every point
+            
+        Returns:
+            np.ndarray: float64 array of shape (len(dept_ids), len(dates), len(days_to_expiry)),
+            NaN for departments without a model
+        """
+        model_set = self.model_set
+        dates = np.asarray(dates).astype('datetime64[D]')
+        days = np.asarray(days_to_expiry, dtype=np.float64)
+        grid = np.full((len(dept_ids), len(dates), len(days)), np.nan)
+        if grid.size == 0:
+            return grid
+        
+        grid_dates, grid_days = np.meshgrid(dates, days, indexing='ij')
+        X = self._build_feature_matrix(grid_days.ravel(), grid_dates.ravel(), features)
+        dept_columns = [self._feature_index[f'dept_{dept}'] for dept in self.departments]
+        
+        for i, dept in enumerate(dept_ids):
+            if dept not in model_set.models:
+                print(f"⚠️ Warning: No model found for department {dept}")
+                continue
+            
+            X[:, dept_columns] = 0
+            X[:, self._feature_index[f'dept_{dept}']] = 1
+            grid[i] = self._predict_matrix(dept, X, model_set).reshape(grid.shape[1:])
+        
+        return grid
+    
+    def predict_batch(self, data):
+        """
+        Predict prices for multiple items
+        
+        Args:
+            data (pd.DataFrame): DataFrame with columns: days_to_expiry, dept_id, date;
+                an optional city column selects store models when they are attached
+            
+        Returns:
+            pd.DataFrame: Original data with a float64 predicted_price column,
+            NaN for rows whose department has no model (null in JSON responses)
+        """
+        if data.empty:
+            return data
+        
+        # Ensure required columns exist
+        required_cols = ['days_to_expiry', 'dept_id', 'date']
+        missing_cols = [col for col in required_cols if col not in data.columns]
+        if missing_cols:
+            raise ValueError(f"Missing required columns: {missing_cols}")
+        
+        started = time.perf_counter()
+        dates = parse_date_column(data['date'])
+        
+        features = {
+            col: data[col].to_numpy(dtype=np.float64)
+            for col in self._overridable_features if col in data.columns
+        }
+        days_to_expiry = data['days_to_expiry'].to_numpy(dtype=np.float64)
+        dept_id = data['dept_id'].to_numpy()
+        metrics.observe_stage('prepare', time.perf_counter() - started)
+        
+        store = data['city'].to_numpy() if 'city' in data.columns else None
+        predictions = self.predict_columns(days_to_expiry, dept_id, dates, features, store)
         
         # Add predictions to original data
         result = data.copy()
         result['predicted_price'] = predictions
         
-        # Add city info back if it exists
-        if '_city_info' in features_df.columns:
-            result['city'] = features_df['_city_info']
-        
         return result
     
+    def dedup_stats(self):
+        """
+        Get counters of in-batch deduplication
+        
+        Returns:
+            dict: Whether it is enabled, rows checked, distinct rows scored and
+            the fraction of rows that were duplicates
+        """
+        with self._dedup_lock:
+            rows, unique = self._dedup_counts
+        return {
+            'enabled': self.dedup_rows,
+            'rows': rows,
+            'unique_rows': unique,
+            'duplicate_rate': 1 - unique / rows if rows else 0.0
+        }
+    
     def get_model_info(self):
         """Get information about loaded models"""
+        model_set = self.model_set
         info = {
-            'loaded_models': list(self.models.keys()),
-            'model_count': len(self.models),
-            'scaler_count': len(self.scalers),
+            'model_version': model_set.version,
+            'loaded_at': model_set.loaded_at.isoformat(timespec='seconds'),
+            'loaded_models': list(model_set.models.keys()),
+            'model_count': len(model_set.models),
+            'scaler_count': len(model_set.scalers),
+            'engine_trees': {dept: engine.n_trees for dept, engine in model_set.engines.items()},
+            'fused_departments': model_set.fused_departments,
+            'cache': self.cache.stats(),
+            'price_table': self.price_table.info() if self.price_table is not None else None,
+            'calendar': self.calendar.info(),
+            'store_models': self.store_models.stats() if self.store_models is not None else None,
+            'dedup': self.dedup_stats(),
             'supported_departments': self.departments
         }
         return info
 
 # Example usage and testing
 if __name__ == "__main__":
+    import pandas as pd
+    
     # Initialize predictor
     predictor = ExpiryPricePredictor()
     
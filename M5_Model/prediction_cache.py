@@ -0,0 +1,109 @@
+"""
+Prediction cache for the M5 Expiry Price Predictor
+Bounded LRU cache with a time-to-live, keyed on the effective feature vector.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with per-entry expiry
+
+    Entries are evicted least-recently-used first once `maxsize` is reached
+    and are treated as missing once older than `ttl` seconds.
+    """
+
+    def __init__(self, maxsize=4096, ttl=3600):
+        """
+        Initialize the cache
+
+        Args:
+            maxsize (int): Maximum number of entries; 0 disables the cache
+            ttl (float): Seconds an entry stays valid; None keeps entries until evicted
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        """Whether the cache stores anything"""
+        return self.maxsize > 0
+
+    def get(self, key):
+        """
+        Look up a cached value
+
+        Args:
+            key (hashable): Cache key
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entry if full
+
+        Args:
+            key (hashable): Cache key
+            value: Value to store (None is not cached)
+        """
+        if not self.enabled or value is None:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: size, maxsize, ttl, hits, misses, evictions, expirations and hit_rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,432 @@
+"""
+Prediction history queries for the M5 Expiry Price Predictor
+Reads back the documents /save-prediction writes to the predictions
+collection, without ever holding a full result in memory.
+
+Pages are newest first and use keyset pagination: the cursor token names the
+(timestamp, _id) of a page's last document and the next page continues
+strictly after it, so deep pages cost the same as the first one and
+documents saved while paging do not shift the pages. A cursor only records
+a position; send it back with the same filters.
+
+Documents are read from the MongoDB cursor one batch at a time and encoded
+as they arrive, as a JSON object (summary fields after the data array) or
+as NDJSON lines ending with a summary line.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+from response_encoding import dumps
+
+# Compound indexes matching the history queries; each is (name, keys)
+HISTORY_INDEXES = (
+    # Pages for a department and city, newest first
+    ('dept_city_recent', [('dept_id', 1), ('city', 1), ('timestamp', -1), ('_id', -1)]),
+    # Prediction date ranges and days_to_expiry filters, and the daily averages
+    ('dept_city_date', [('dept_id', 1), ('city', 1), ('date', 1), ('days_to_expiry', 1)]),
+    # Pages across all departments
+    ('recent', [('timestamp', -1), ('_id', -1)])
+)
+
+# Newest first, with _id breaking ties between documents saved at the same time
+SORT = [('timestamp', -1), ('_id', -1)]
+
+
+def ensure_indexes(collection):
+    """
+    Create the history indexes (a no-op for indexes that already exist)
+
+    Args:
+        collection: pymongo-compatible collection, sync or async
+
+    Returns:
+        list: Names of the indexes (an awaitable for an async collection)
+    """
+    from pymongo import IndexModel
+    return collection.create_indexes([IndexModel(keys, name=name) for name, keys in HISTORY_INDEXES])
+
+
+def _parse_day(value, name):
+    """Calendar day of an ISO date parameter"""
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r} (expected an ISO date)")
+
+
+def _parse_time(value, name):
+    """Naive local datetime of an ISO timestamp parameter, comparable with the saved timestamps"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r} (expected an ISO timestamp)")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def _parse_int(value, name):
+    """Integer value of a parameter"""
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r} (expected an integer)")
+
+
+def build_query(args):
+    """
+    MongoDB filter for the history query parameters
+
+    Parameters (all optional):
+        dept_id: Department, or several separated by commas
+        city: Store city, e.g. CA_1
+        start_date, end_date: Inclusive range of the prediction date
+        since, until: Range of the save timestamp (since inclusive, until exclusive)
+        days_to_expiry: Exact days to expiry
+        min_days_to_expiry, max_days_to_expiry: Inclusive days to expiry range
+
+    Args:
+        args: Mapping of parameter names to strings (e.g. request.args)
+
+    Returns:
+        dict: Filter for find() or a $match stage
+
+    Raises:
+        ValueError: If a parameter cannot be parsed
+    """
+    query = {}
+    if args.get('dept_id'):
+        depts = [dept.strip() for dept in args['dept_id'].split(',') if dept.strip()]
+        query['dept_id'] = depts[0] if len(depts) == 1 else {'$in': depts}
+    if args.get('city'):
+        query['city'] = args['city']
+
+    # Prediction dates are stored as ISO strings, which sort by day; the end
+    # bound is the next day so values with a time part are included
+    date = {}
+    if args.get('start_date'):
+        date['$gte'] = _parse_day(args['start_date'], 'start_date').isoformat()
+    if args.get('end_date'):
+        date['$lt'] = (_parse_day(args['end_date'], 'end_date') + timedelta(days=1)).isoformat()
+    if date:
+        query['date'] = date
+
+    timestamp = {}
+    if args.get('since'):
+        timestamp['$gte'] = _parse_time(args['since'], 'since')
+    if args.get('until'):
+        timestamp['$lt'] = _parse_time(args['until'], 'until')
+    if timestamp:
+        query['timestamp'] = timestamp
+
+    if args.get('days_to_expiry'):
+        query['days_to_expiry'] = _parse_int(args['days_to_expiry'], 'days_to_expiry')
+    else:
+        days = {}
+        if args.get('min_days_to_expiry'):
+            days['$gte'] = _parse_int(args['min_days_to_expiry'], 'min_days_to_expiry')
+        if args.get('max_days_to_expiry'):
+            days['$lte'] = _parse_int(args['max_days_to_expiry'], 'max_days_to_expiry')
+        if days:
+            query['days_to_expiry'] = days
+    return query
+
+
+def parse_limit(value, default, maximum):
+    """
+    Page size from the `limit` parameter
+
+    Args:
+        value (str): Parameter value, or None for `default`
+        default (int): Page size when no limit is given
+        maximum (int): Largest accepted page size
+
+    Returns:
+        int: Page size
+
+    Raises:
+        ValueError: If the limit is not an integer between 1 and `maximum`
+    """
+    limit = default if value is None else _parse_int(value, 'limit')
+    if not 1 <= limit <= maximum:
+        raise ValueError(f'limit must be between 1 and {maximum}')
+    return limit
+
+
+def encode_cursor(doc):
+    """Opaque token for the position after `doc`"""
+    from bson import ObjectId
+    _id = doc['_id']
+    position = [doc['timestamp'].isoformat(), str(_id) if isinstance(_id, ObjectId) else _id,
+                isinstance(_id, ObjectId)]
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """
+    Position encoded by encode_cursor
+
+    Returns:
+        tuple: (timestamp, _id)
+
+    Raises:
+        ValueError: If the token is not a cursor
+    """
+    from bson import ObjectId
+    try:
+        timestamp, _id, is_object_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return datetime.fromisoformat(timestamp), ObjectId(_id) if is_object_id else _id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _after(query, cursor):
+    """`query` restricted to documents after the cursor position in SORT order"""
+    timestamp, _id = decode_cursor(cursor)
+    # The $lte bound lets the index scan start at the cursor
+    after = {'$or': [{'timestamp': {'$lt': timestamp}}, {'timestamp': timestamp, '_id': {'$lt': _id}}]}
+    return {'$and': [query, {'timestamp': {'$lte': timestamp}}, after]}
+
+
+def _record(doc):
+    """JSON-ready history record of a stored document"""
+    record = {'id': str(doc['_id'])}
+    for key, value in doc.items():
+        if key != '_id':
+            record[key] = value.isoformat() if isinstance(value, datetime) else value
+    return record
+
+
+class HistoryPage:
+    """
+    One page of saved predictions, iterated straight from the MongoDB cursor
+
+    Iterating yields the page's records in batches (lists of at most
+    `batch_size` records, one per cursor batch); afterwards `count` and
+    `next_cursor` (None on the last page) describe the page. Pages over an
+    async collection (PyMongo's AsyncMongoClient) are read with `async for`.
+    """
+
+    def __init__(self, collection, query, limit=100, cursor=None, batch_size=500):
+        """
+        Initialize the page
+
+        Args:
+            collection: pymongo-compatible collection, sync or async
+            query (dict): Filter from build_query
+            limit (int): Maximum documents on the page
+            cursor (str): Token from a previous page's next_cursor, or None for the first page
+            batch_size (int): Documents fetched from MongoDB per round trip
+
+        Raises:
+            ValueError: If the cursor is invalid
+        """
+        self.collection = collection
+        self.query = _after(query, cursor) if cursor else query
+        self.limit = limit
+        self.batch_size = max(1, min(batch_size, limit + 1))
+        self.count = 0
+        self.next_cursor = None
+        self._last = None
+
+    def summary(self):
+        """Fields following the records once the page has been read"""
+        return {'count': self.count, 'next_cursor': self.next_cursor}
+
+    def _find(self):
+        # One document past the page tells whether there is a next page
+        return self.collection.find(self.query).sort(SORT).limit(self.limit + 1).batch_size(self.batch_size)
+
+    def _add(self, doc):
+        """Record of `doc`, or None once `doc` is the one past the page"""
+        if self.count == self.limit:
+            self.next_cursor = encode_cursor(self._last)
+            return None
+        self._last = doc
+        self.count += 1
+        return _record(doc)
+
+    def __iter__(self):
+        documents = self._find()
+        batch = []
+        try:
+            for doc in documents:
+                record = self._add(doc)
+                if record is None:
+                    break
+                batch.append(record)
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+        finally:
+            documents.close()
+        if batch:
+            yield batch
+
+    async def __aiter__(self):
+        documents = self._find()
+        batch = []
+        try:
+            async for doc in documents:
+                record = self._add(doc)
+                if record is None:
+                    break
+                batch.append(record)
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+        finally:
+            await documents.close()
+        if batch:
+            yield batch
+
+
+class DailyAverages:
+    """
+    Average predicted price per department and prediction day, grouped by MongoDB
+
+    Iterating yields batches of {'dept_id', 'day', 'avg_price', 'min_price',
+    'max_price', 'count'} rows ordered by day, then department (with
+    `async for` over an async collection).
+    """
+
+    def __init__(self, collection, query, batch_size=500):
+        """
+        Initialize the aggregation
+
+        Args:
+            collection: pymongo-compatible collection, sync or async
+            query (dict): Filter from build_query
+            batch_size (int): Rows fetched from MongoDB per round trip
+        """
+        self.collection = collection
+        self.query = query
+        self.batch_size = max(1, batch_size)
+        self.count = 0
+
+    def pipeline(self):
+        """Aggregation pipeline grouping the matching documents"""
+        return [
+            {'$match': self.query},
+            {'$group': {
+                '_id': {'dept_id': '$dept_id', 'day': {'$substr': ['$date', 0, 10]}},
+                'avg_price': {'$avg': '$predicted_price'},
+                'min_price': {'$min': '$predicted_price'},
+                'max_price': {'$max': '$predicted_price'},
+                'count': {'$sum': 1}
+            }},
+            {'$sort': {'_id.day': 1, '_id.dept_id': 1}}
+        ]
+
+    def summary(self):
+        """Fields following the rows once they have been read"""
+        return {'count': self.count}
+
+    def _aggregate(self):
+        return self.collection.aggregate(self.pipeline(), batchSize=self.batch_size, allowDiskUse=True)
+
+    def _add(self, row):
+        self.count += 1
+        group = row.pop('_id')
+        return {'dept_id': group['dept_id'], 'day': group['day'], **row}
+
+    def __iter__(self):
+        rows = self._aggregate()
+        batch = []
+        try:
+            for row in rows:
+                batch.append(self._add(row))
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+        finally:
+            rows.close()
+        if batch:
+            yield batch
+
+    async def __aiter__(self):
+        rows = await self._aggregate()
+        batch = []
+        try:
+            async for row in rows:
+                batch.append(self._add(row))
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+        finally:
+            await rows.close()
+        if batch:
+            yield batch
+
+
+class _Encoder:
+    """Encodes batches of records and the closing summary as JSON or NDJSON"""
+
+    def __init__(self, ndjson):
+        self.ndjson = ndjson
+        self.first = True
+
+    def start(self):
+        return b'{"data":['
+
+    def batch(self, records):
+        if self.ndjson:
+            return b''.join(dumps(record) + b'\n' for record in records)
+        chunk = b','.join(dumps(record) for record in records)
+        if self.first:
+            self.first = False
+            return chunk
+        return b',' + chunk
+
+    def end(self, summary):
+        if self.ndjson:
+            return dumps(summary) + b'\n'
+        # The summary's fields follow the data array in the same object
+        return b'],' + dumps(summary)[1:]
+
+
+def stream_json(result, ndjson=False, on_error=None):
+    """
+    Encode a HistoryPage or DailyAverages as it is read
+
+    JSON output is {"data": [...], <summary fields>, "status": "success"};
+    NDJSON output is one line per record and a final summary line. A failure
+    part way ends the output with "status": "error" and a message instead.
+
+    Args:
+        result: HistoryPage or DailyAverages over a sync collection
+        ndjson (bool): Write NDJSON lines instead of one JSON object
+        on_error (callable): Called with the exception of a failure part way
+
+    Yields:
+        bytes: One chunk per batch of records
+    """
+    encoder = _Encoder(ndjson)
+    if not ndjson:
+        yield encoder.start()
+    try:
+        for batch in result:
+            yield encoder.batch(batch)
+        summary = {**result.summary(), 'status': 'success'}
+    except Exception as e:
+        if on_error is not None:
+            on_error(e)
+        summary = {'status': 'error', 'message': str(e)}
+    yield encoder.end(summary)
+
+
+async def stream_json_async(result, ndjson=False, on_error=None):
+    """stream_json for a HistoryPage or DailyAverages over an async collection"""
+    encoder = _Encoder(ndjson)
+    if not ndjson:
+        yield encoder.start()
+    try:
+        async for batch in result:
+            yield encoder.batch(batch)
+        summary = {**result.summary(), 'status': 'success'}
+    except Exception as e:
+        if on_error is not None:
+            on_error(e)
+        summary = {'status': 'error', 'message': str(e)}
+    yield encoder.end(summary)
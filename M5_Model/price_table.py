@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Precomputed price lookup table for the M5 Expiry Price Predictor
+Materializes every department x days_to_expiry x calendar x has_event
+combination reachable in a date window into a memory-mapped NumPy table.
+
+Usage:
+    python price_table.py materialize --start 2024-01-01 --end 2024-12-31 --out Model/price_table
+    python price_table.py check --table Model/price_table [--samples 2000]
+"""
+
+import argparse
+import json
+import sys
+import numpy as np
+from datetime import date as date_cls, datetime, timedelta
+
+
+class PriceTable:
+    """
+    Lookup table of predicted prices
+
+    prices[dept, days_to_expiry, calendar_combo, has_event] holds the model
+    output for items whose optional features are all at their defaults.
+    Dates in the window map to a calendar combination (day_of_week,
+    week_of_year, month), since that is all the model sees of a date.
+    """
+
+    def __init__(self, prices, departments, start_date, date_combo, combos, model_version=None):
+        """
+        Initialize the table
+
+        Args:
+            prices (np.ndarray): float32 array (n_departments, max_days + 1, n_combos, 2)
+            departments (list): Department ID for each first-axis entry
+            start_date (date): First date of the window
+            date_combo (list): Calendar combination index for each date in the window
+            combos (list): (day_of_week, week_of_year, month) per combination
+            model_version (str): Version of the model set the prices were computed with
+        """
+        self.prices = prices
+        self.departments = list(departments)
+        self.start_date = start_date
+        self.date_combo = list(date_combo)
+        self.combos = [tuple(combo) for combo in combos]
+        self.model_version = model_version
+        self.max_days = prices.shape[1] - 1
+        self._dept_index = {dept: i for i, dept in enumerate(self.departments)}
+
+    @property
+    def end_date(self):
+        """Last date of the window"""
+        return self.start_date + timedelta(days=len(self.date_combo) - 1)
+
+    def lookup(self, dept_id, days_to_expiry, date, has_event=0):
+        """
+        Look up a price
+
+        Args:
+            dept_id (str): Department ID
+            days_to_expiry (int): Days until expiry
+            date (date/datetime): Prediction date
+            has_event (int): Event flag (0 or 1)
+
+        Returns:
+            float: Predicted price, or None if the inputs are outside the table
+        """
+        dept = self._dept_index.get(dept_id)
+        if dept is None or has_event not in (0, 1):
+            return None
+        if isinstance(days_to_expiry, float):
+            if not days_to_expiry.is_integer():
+                return None
+            days_to_expiry = int(days_to_expiry)
+        if not isinstance(days_to_expiry, (int, np.integer)) or not 0 <= days_to_expiry <= self.max_days:
+            return None
+
+        if isinstance(date, datetime):
+            date = date.date()
+        offset = (date - self.start_date).days
+        if not 0 <= offset < len(self.date_combo):
+            return None
+
+        return float(self.prices[dept, days_to_expiry, self.date_combo[offset], int(has_event)])
+
+    def info(self):
+        """Get a summary of the table"""
+        return {
+            'departments': self.departments,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'max_days': self.max_days,
+            'calendar_combinations': len(self.combos),
+            'entries': int(self.prices.size),
+            'model_version': self.model_version
+        }
+
+    def save(self, path):
+        """
+        Write the table as <path>.npy plus <path>.json metadata
+
+        Args:
+            path (str): Output path without extension
+        """
+        np.save(f"{path}.npy", np.ascontiguousarray(self.prices, dtype=np.float32))
+        with open(f"{path}.json", 'w') as f:
+            json.dump({
+                'departments': self.departments,
+                'start_date': self.start_date.isoformat(),
+                'date_combo': self.date_combo,
+                'combos': self.combos,
+                'model_version': self.model_version
+            }, f)
+
+    @classmethod
+    def load(cls, path, model_version=None):
+        """
+        Load a table written by save(), memory-mapping the prices
+
+        Args:
+            path (str): Table path without extension
+            model_version (str): Refuse the table unless it was computed with this model version
+
+        Returns:
+            PriceTable: Loaded table
+
+        Raises:
+            ValueError: If the table was computed with other models (or records no version)
+        """
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        if model_version is not None and meta.get('model_version') != model_version:
+            raise ValueError(f"Price table {path} was computed with model version "
+                             f"{meta.get('model_version')}, not {model_version}; materialize it again")
+        return cls(
+            prices=np.load(f"{path}.npy", mmap_mode='r'),
+            departments=meta['departments'],
+            start_date=date_cls.fromisoformat(meta['start_date']),
+            date_combo=meta['date_combo'],
+            combos=meta['combos'],
+            model_version=meta.get('model_version')
+        )
+
+
+def materialize(predictor, start_date, end_date, max_days=365):
+    """
+    Evaluate the predictor over every reachable input combination
+
+    Args:
+        predictor (ExpiryPricePredictor): Loaded predictor
+        start_date (date): First date of the window
+        end_date (date): Last date of the window (inclusive)
+        max_days (int): Largest days_to_expiry in the table
+
+    Returns:
+        PriceTable: Materialized table
+    """
+    dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    combo_index = {}
+    date_combo = []
+    for day in dates:
+        combo = (day.weekday(), day.isocalendar()[1], day.month)
+        date_combo.append(combo_index.setdefault(combo, len(combo_index)))
+    combos = list(combo_index)
+
+    days = np.arange(max_days + 1)
+    departments = list(predictor.models)
+    prices = np.empty((len(departments), len(days), len(combos), 2), dtype=np.float32)
+    index = predictor._feature_index
+
+    # Rows ordered as (days, combo, has_event) to match the table layout
+    grid_days, grid_combo, grid_event = np.meshgrid(days, np.arange(len(combos)), [0, 1], indexing='ij')
+    combo_array = np.asarray(combos)
+    for i, dept in enumerate(departments):
+        X = np.tile(predictor._feature_template, (grid_days.size, 1))
+        d = grid_days.ravel().astype(np.float64)
+        X[:, index['days_to_expiry']] = d
+        X[:, index['days_to_expiry_squared']] = d ** 2
+        X[:, index['days_to_expiry_cubed']] = d ** 3
+        X[:, index['log_days_to_expiry']] = np.log1p(d)
+        X[:, index['day_of_week']] = combo_array[grid_combo.ravel(), 0]
+        X[:, index['week_of_year']] = combo_array[grid_combo.ravel(), 1]
+        X[:, index['month']] = combo_array[grid_combo.ravel(), 2]
+        X[:, index['has_event']] = grid_event.ravel()
+        X[:, index[f'dept_{dept}']] = 1
+
+        prices[i] = predictor._predict_matrix(dept, X).reshape(grid_days.shape)
+
+    return PriceTable(prices, departments, start_date, date_combo, combos, model_version=predictor.model_version)
+
+
+def check(predictor, table, samples=2000, tolerance=1e-4, seed=0):
+    """
+    Compare table lookups against live predictions
+
+    Args:
+        predictor (ExpiryPricePredictor): Predictor without a table attached
+        table (PriceTable): Table to check
+        samples (int): Random inputs to compare
+        tolerance (float): Largest allowed absolute difference
+        seed (int): Random seed
+
+    Returns:
+        dict: samples, max_abs_diff and mismatches
+    """
+    rng = np.random.default_rng(seed)
+    n_dates = len(table.date_combo)
+    max_diff = 0.0
+    mismatches = 0
+
+    for _ in range(samples):
+        dept = table.departments[rng.integers(len(table.departments))]
+        days = int(rng.integers(table.max_days + 1))
+        day = table.start_date + timedelta(days=int(rng.integers(n_dates)))
+        has_event = int(rng.integers(2))
+
+        expected = predictor.predict_price(days, dept, day.isoformat(), has_event=has_event)
+        actual = table.lookup(dept, days, day, has_event)
+        diff = abs(actual - expected)
+        max_diff = max(max_diff, diff)
+        if diff > tolerance:
+            mismatches += 1
+
+    return {'samples': samples, 'max_abs_diff': max_diff, 'mismatches': mismatches}
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Materialize or check the price lookup table')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('materialize', help='Build the table for a date window')
+    build.add_argument('--start', required=True, help='First date (YYYY-MM-DD)')
+    build.add_argument('--end', required=True, help='Last date (YYYY-MM-DD)')
+    build.add_argument('--max-days', type=int, default=365, help='Largest days_to_expiry')
+    build.add_argument('--out', default='Model/price_table', help='Output path without extension')
+
+    verify = subparsers.add_parser('check', help='Compare the table with live predictions')
+    verify.add_argument('--table', default='Model/price_table', help='Table path without extension')
+    verify.add_argument('--samples', type=int, default=2000, help='Random inputs to compare')
+    verify.add_argument('--tolerance', type=float, default=1e-4, help='Largest allowed absolute difference')
+
+    parser.add_argument('--model-dir', default='Model/', help='Directory containing model files')
+    args = parser.parse_args()
+
+    from predict_expiry_price import ExpiryPricePredictor
+    predictor = ExpiryPricePredictor(model_dir=args.model_dir, cache_size=0)
+
+    if args.command == 'materialize':
+        start = date_cls.fromisoformat(args.start)
+        end = date_cls.fromisoformat(args.end)
+        print(f"🧮 Materializing prices for {start} to {end}...")
+        table = materialize(predictor, start, end, max_days=args.max_days)
+        table.save(args.out)
+        print(f"✅ Saved {table.prices.size:,} prices to {args.out}.npy")
+        for key, value in table.info().items():
+            print(f"  {key}: {value}")
+        return 0
+
+    table = PriceTable.load(args.table)
+    print(f"🔍 Checking {args.table} against live predictions...")
+    result = check(predictor, table, samples=args.samples, tolerance=args.tolerance)
+    print(f"  samples: {result['samples']}")
+    print(f"  max abs diff: {result['max_abs_diff']:.2e}")
+    print(f"  mismatches: {result['mismatches']}")
+    if result['mismatches']:
+        print("❌ Table is inconsistent with the models")
+        return 1
+    print("✅ Table matches live predictions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+JSON response encoding for the M5 Expiry Price Predictor
+Encodes batch and analysis responses straight from the prediction arrays,
+with orjson when it is installed and the standard library otherwise.
+
+Batch and analysis responses come in two orientations, chosen per request
+with the `orient` query parameter:
+
+rows (default)
+    One object per prediction, as the API has always returned:
+        {"predictions": [{"days_to_expiry": 5, "dept_id": "FOODS_1", "date": "2024-01-15",
+                          "predicted_price": 0.42}, ...], "total_items": 2}
+
+columns
+    One array per field, encoded from the NumPy columns without an object per row:
+        {"columns": {"days_to_expiry": [5, 10], "dept_id": ["FOODS_1", "FOODS_2"],
+                     "date": ["2024-01-15", "2024-01-15"], "predicted_price": [0.42, 0.37]},
+         "total_items": 2}
+
+NaN (a row that could not be predicted) is encoded as null in both.
+"""
+
+import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_MIMETYPE = 'application/json'
+ORIENTATIONS = ('rows', 'columns')
+
+
+def _default(value):
+    """Encode values neither backend handles natively"""
+    if isinstance(value, np.ndarray):
+        return _as_list(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _nullable(values):
+    """Replace NaN in a (possibly nested) list of floats with None"""
+    if values and isinstance(values[0], list):
+        return [_nullable(inner) for inner in values]
+    return [None if value != value else value for value in values]
+
+
+def _as_list(values):
+    """Column as a Python list; float arrays get None for NaN"""
+    if isinstance(values, np.ndarray):
+        return _nullable(values.tolist()) if values.dtype.kind == 'f' else values.tolist()
+    return values
+
+
+def dumps(payload):
+    """
+    Encode a response payload
+
+    NumPy arrays and scalars are encoded directly (with orjson, without
+    converting them to Python lists first).
+
+    Args:
+        payload: JSON-compatible object, possibly holding NumPy arrays
+
+    Returns:
+        bytes: Compact UTF-8 JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def parse_orient(value):
+    """
+    Validate the `orient` query parameter
+
+    Args:
+        value (str): Parameter value, or None
+
+    Returns:
+        str: 'rows' or 'columns'
+    """
+    orient = value or 'rows'
+    if orient not in ORIENTATIONS:
+        raise ValueError(f"orient must be one of {list(ORIENTATIONS)}")
+    return orient
+
+
+def batch_data(columns, prices, orient='rows'):
+    """
+    Build the data object of a /predict/batch response
+
+    Args:
+        columns (dict): Input fields in response order (days_to_expiry, dept_id, date,
+            optionally city), each an array or list with one value per item
+        prices (np.ndarray): float64 predictions, NaN where no model exists
+        orient (str): 'rows' or 'columns'
+
+    Returns:
+        dict: predictions (rows) or columns, and total_items
+    """
+    fields = {}
+    for name, values in columns.items():
+        fields[name] = values
+        if name == 'date':
+            # predicted_price has always followed date in the row objects
+            fields['predicted_price'] = prices
+    fields.setdefault('predicted_price', prices)
+
+    if orient == 'columns':
+        return {'columns': fields, 'total_items': len(prices)}
+
+    names = list(fields)
+    predictions = [dict(zip(names, row)) for row in zip(*map(_as_list, fields.values()))]
+    return {'predictions': predictions, 'total_items': len(predictions)}
+
+
+def analysis_data(dept_id, date, days, prices, orient='rows'):
+    """
+    Build the data object of a single-department /predict/analysis response
+
+    Args:
+        dept_id (str): Department ID
+        date (str): Requested date
+        days (np.ndarray): days_to_expiry values
+        prices (np.ndarray): Predicted price per days_to_expiry value
+        orient (str): 'rows' or 'columns'
+
+    Returns:
+        dict: dept_id, date, analysis (rows) or columns, and total_days
+    """
+    data = {'dept_id': dept_id, 'date': date}
+    if orient == 'columns':
+        data['columns'] = {'days_to_expiry': days, 'predicted_price': prices}
+    else:
+        data['analysis'] = [
+            {'days_to_expiry': d, 'predicted_price': price}
+            for d, price in zip(days.tolist(), _nullable(prices.tolist()))
+        ]
+    data['total_days'] = len(days)
+    return data
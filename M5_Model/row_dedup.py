@@ -0,0 +1,63 @@
+"""
+Duplicate feature row detection for the M5 Expiry Price Predictor
+Batches from inventory extracts are highly repetitive: every SKU of a
+department on the same date with the same days_to_expiry (and default
+optional features) has the same feature vector. Scoring only the distinct
+rows and broadcasting the results back gives identical predictions for far
+fewer model rows.
+
+Rows are hashed to one 64-bit value each and factorized, which is linear in
+the number of rows; the grouping is then verified bit for bit, with an exact
+sort-based fallback should two different rows ever share a hash.
+"""
+
+import numpy as np
+
+# Odd multipliers (golden ratio increments) mixing each column's bits into the row hash
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _row_hashes(bits):
+    """64-bit hash of each row of a uint64 matrix"""
+    multipliers = (np.arange(1, bits.shape[1] + 1, dtype=np.uint64) * _GOLDEN) | np.uint64(1)
+    # Float bits vary mostly in the high bits, which multiplication only moves
+    # upwards; fold them down before mixing, and the products' high bits back
+    mixed = (bits ^ (bits >> np.uint64(32))) * multipliers
+    mixed ^= mixed >> np.uint64(29)
+    return mixed.sum(axis=1, dtype=np.uint64)
+
+
+def unique_rows(X):
+    """
+    Find the distinct rows of a matrix
+
+    Rows are compared bit for bit, so NaN matches NaN with the same bits
+    and 0.0 does not match -0.0.
+
+    Args:
+        X (np.ndarray): float64 matrix of shape (n_rows, n_features)
+
+    Returns:
+        tuple: (first, inverse) where X[first] holds each distinct row once,
+            in order of first appearance, and X[first][inverse] equals X
+    """
+    import pandas as pd
+
+    bits = np.ascontiguousarray(X).view(np.uint64)
+    inverse, uniques = pd.factorize(_row_hashes(bits))
+    if len(uniques) == len(bits):
+        # Every hash differs, so every row does
+        return inverse.astype(np.intp, copy=False), inverse.astype(np.intp, copy=False)
+    first = np.empty(len(uniques), dtype=np.intp)
+    # Reversed assignment leaves each group's first row
+    first[inverse[::-1]] = np.arange(len(inverse) - 1, -1, -1)
+
+    if not np.array_equal(bits[first][inverse], bits):
+        # A hash collision: group the raw rows exactly instead
+        rows = bits.view(np.dtype((np.void, bits.itemsize * bits.shape[1]))).ravel()
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        first, inverse = first[order], rank[inverse.ravel()]
+    return first, inverse.astype(np.intp, copy=False)
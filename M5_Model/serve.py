@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Production server for the M5 Expiry Price Predictor
+Loads the models once in a parent process, then forks worker processes that
+share the loaded model pages copy-on-write and accept connections from one
+listening socket. Unix only.
+
+Usage:
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 5000]
+
+Workers write their metrics to METRICS_MULTIPROC_DIR (default: a temporary
+directory), so /metrics on any worker reports all of them.
+
+Signals (sent to the parent):
+    SIGHUP           reload the models, then replace the workers one by one
+                     (POST /model/reload and MODEL_WATCH_INTERVAL do the same)
+    SIGTERM, SIGINT  stop accepting, finish in-flight requests and exit
+"""
+
+import argparse
+import gc
+import glob
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(process)d - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 handler that keeps idle connections open for `timeout` seconds"""
+    protocol_version = 'HTTP/1.1'
+    timeout = 5
+
+
+class WorkerServer(ThreadedWSGIServer):
+    """Threaded WSGI server whose request threads are joined on close"""
+    daemon_threads = False
+
+
+class PreforkServer:
+    """
+    Parent process managing forked workers
+
+    The parent loads the application, freezes the loaded objects out of the
+    garbage collector so collections do not touch (and copy) their pages,
+    binds the listening socket and forks the workers. Workers that exit
+    unexpectedly are replaced.
+    """
+
+    def __init__(self, host='0.0.0.0', port=5000, workers=None, keepalive=5,
+                 graceful_timeout=30, threads_per_worker=None):
+        """
+        Initialize the server
+
+        Args:
+            host (str): Address to bind
+            port (int): Port to bind (0 picks a free port)
+            workers (int): Number of worker processes; defaults to WEB_CONCURRENCY or the CPU count
+            keepalive (float): Seconds an idle keep-alive connection stays open
+            graceful_timeout (float): Seconds a stopping worker gets before it is killed
+            threads_per_worker (int): XGBoost threads per worker; defaults to CPUs / workers
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers or int(os.environ.get('WEB_CONCURRENCY', 0)) or os.cpu_count() or 1
+        self.keepalive = keepalive
+        self.graceful_timeout = graceful_timeout
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+
+        self.api = None
+        self.socket = None
+        # Unix socket for the binary protocol, when UDS_PATH is set
+        self.uds_socket = None
+        self.children = {}
+        # Directory the workers share their metrics through (see metrics.py)
+        self.metrics_dir = None
+        self._stopping = False
+        self._reload_requested = False
+
+    def load(self):
+        """Import the application (loading the models) and bind the listening socket"""
+        import app as api
+        self.api = api
+        if api.predictor is None:
+            raise RuntimeError('Predictor failed to initialize')
+        if api.model_watcher is not None:
+            # Model changes restart the workers instead of reloading only the parent
+            api.model_watcher.on_change = self._request_reload
+        # Deserialize the boosters before forking so every worker shares them
+        api.predictor.load_boosters()
+
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        # Non-blocking so a worker that loses an accept race goes back to select()
+        self.socket.setblocking(False)
+        self.port = self.socket.getsockname()[1]
+        if api.UDS_PATH:
+            from binary_protocol import listen
+            self.uds_socket = listen(api.UDS_PATH)
+            self.uds_socket.setblocking(False)
+        self._freeze()
+
+    def _freeze(self):
+        """Move everything loaded so far out of the garbage collector's generations"""
+        gc.collect()
+        gc.freeze()
+
+    def run(self):
+        """Fork the workers and supervise them until stopped"""
+        if self.api is None:
+            self.load()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        logger.info(f"🚀 Serving on http://{self.host}:{self.port} with {self.workers} workers "
+                    f"(parent {os.getpid()})")
+        if self.uds_socket is not None:
+            logger.info(f"🚀 Binary protocol on {self.api.UDS_PATH}")
+        self._prepare_metrics_dir()
+        for _ in range(self.workers):
+            self._spawn()
+
+        while not self._stopping:
+            if self._reload_requested:
+                self._reload_requested = False
+                self._reload()
+            self._reap(respawn=True)
+            time.sleep(0.2)
+
+        self._stop_workers(list(self.children))
+        self.socket.close()
+        if self.uds_socket is not None:
+            self.uds_socket.close()
+            if os.path.exists(self.api.UDS_PATH):
+                os.unlink(self.api.UDS_PATH)
+        if not os.environ.get('METRICS_MULTIPROC_DIR'):
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        logger.info("🛑 Server stopped")
+
+    def _prepare_metrics_dir(self):
+        """Create the metrics directory, removing files left by an earlier run"""
+        self.metrics_dir = os.environ.get('METRICS_MULTIPROC_DIR') or tempfile.mkdtemp(prefix='m5_metrics_')
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(self.metrics_dir, 'metrics_*.json')):
+            os.unlink(path)
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _request_reload(self):
+        self._reload_requested = True
+
+    def _spawn(self):
+        """Fork one worker"""
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._worker_main()
+            except BaseException as e:
+                logger.error(f"❌ Worker failed: {str(e)}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+        return pid
+
+    def _reap(self, respawn=False):
+        """Collect exited workers, replacing them if `respawn` is set"""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            logger.warning(f"⚠️ Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+            if respawn and not self._stopping:
+                # Back off a little when workers die right after starting
+                if time.monotonic() - started < 1:
+                    time.sleep(1)
+                self._spawn()
+
+    def _reload(self):
+        """Reload the models in the parent, then replace the workers one at a time"""
+        logger.info("🔄 Reloading models")
+        try:
+            gc.unfreeze()
+            result = self.api.predictor.reload_models()
+            self.api.predictor.load_boosters()
+        except Exception as e:
+            logger.error(f"❌ Reload failed, keeping the current workers: {str(e)}")
+            return
+        finally:
+            self._freeze()
+
+        for pid in list(self.children):
+            self._spawn()
+            self._stop_workers([pid])
+        logger.info(f"✅ Workers restarted with models {result['version']}")
+
+    def _stop_workers(self, pids):
+        """Ask workers to finish in-flight requests and exit, killing them after graceful_timeout"""
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + self.graceful_timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            for pid in list(remaining):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    remaining.discard(pid)
+                    self.children.pop(pid, None)
+            time.sleep(0.05)
+
+        for pid in remaining:
+            logger.warning(f"⚠️ Worker {pid} did not stop in time, killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self.children.pop(pid, None)
+
+    def _worker_main(self):
+        """Serve requests from the shared socket until SIGTERM"""
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # /model/reload asks the parent, which reloads and replaces every worker
+        self.api._reload_models = lambda: os.kill(os.getppid(), signal.SIGHUP)
+
+        for booster in self.api.predictor._boosters.values():
+            booster.set_param({'nthread': self.threads_per_worker})
+        # In the workers rather than the parent, whose MongoDB client must stay unused before forking
+        self.api.ensure_history_indexes()
+        if self.api.metrics.enabled:
+            self.api.metrics.share(self.metrics_dir)
+
+        handler = type('WorkerRequestHandler', (KeepAliveRequestHandler,), {'timeout': self.keepalive})
+        server = WorkerServer(self.host, self.port, self.api.app, handler=handler, fd=self.socket.fileno())
+        binary_server = None
+        if self.uds_socket is not None:
+            binary_server = self.api.start_binary_server(sock=self.uds_socket)
+
+        def shutdown(signum, frame):
+            threading.Thread(target=server.shutdown, daemon=True).start()
+            if binary_server is not None:
+                threading.Thread(target=binary_server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        logger.info(f"👷 Worker {os.getpid()} ready")
+        server.serve_forever()
+        # Joins the request threads, so in-flight requests complete
+        server.server_close()
+
+        if self.api.write_buffer is not None:
+            self.api.write_buffer.close()
+        # Keep this worker's final counts for the workers that remain
+        self.api.metrics.write()
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Run the API with forked worker processes')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to bind')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)), help='Port to bind')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: WEB_CONCURRENCY or the CPU count)')
+    parser.add_argument('--keepalive', type=float, default=5, help='Idle keep-alive timeout in seconds')
+    parser.add_argument('--graceful-timeout', type=float, default=30,
+                        help='Seconds a worker gets to finish in-flight requests')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='XGBoost threads per worker (default: CPUs / workers)')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        logger.error("❌ serve.py needs os.fork; use app.py on this platform")
+        return 1
+
+    server = PreforkServer(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        keepalive=args.keepalive,
+        graceful_timeout=args.graceful_timeout,
+        threads_per_worker=args.threads_per_worker
+    )
+    server.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Run serve.py in a subprocess
+Used by the serve.py tests and by the worker, asyncio and Unix socket benchmarks.
+"""
+
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+def free_port():
+    """Find a free TCP port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers=2, env=None):
+    """
+    Start serve.py and wait until /health answers
+
+    Args:
+        workers (int): Number of worker processes
+        env (dict): Extra environment variables for the server
+
+    Returns:
+        tuple: (subprocess.Popen, port)
+
+    Raises:
+        RuntimeError: If /health does not answer within 60 seconds
+    """
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--workers', str(workers), '--host', '127.0.0.1',
+         '--port', str(port), '--graceful-timeout', '10'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=dict(os.environ, **(env or {}))
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('serve.py did not start')
+
+
+def worker_pids(parent):
+    """PIDs of the server's worker processes (Linux)"""
+    with open(f'/proc/{parent}/task/{parent}/children') as f:
+        return set(map(int, f.read().split()))
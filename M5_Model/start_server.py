@@ -4,6 +4,7 @@ M5 Expiry Price Predictor - Server Starter Script
 This script sets up the environment and starts the Flask API server.
 """
 
+import argparse
 import os
 import sys
 import subprocess
@@ -92,13 +93,20 @@ def install_dependencies():
         logger.error(f"❌ Failed to install dependencies: {e}")
         return False
 
-def start_server():
-    """Start the Flask server"""
+def start_server(workers=None):
+    """Start the Flask server, or the multi-worker server when `workers` is given"""
     logger.info("🚀 Starting M5 Expiry Price Predictor server...")
     
+    if workers:
+        from serve import PreforkServer
+        logger.info(f"👷 Production mode with {workers} workers")
+        PreforkServer(workers=workers, port=5000).run()
+        return True
+    
     try:
         # Import and run the Flask app
-        from app import app
+        from app import app, ensure_history_indexes
+        ensure_history_indexes()
         logger.info("✅ Server started successfully")
         logger.info("🌐 Web interface: http://localhost:5000")
         logger.info("📊 API documentation: http://localhost:5000/")
@@ -115,6 +123,15 @@ def start_server():
 
 def main():
     """Main function to set up and start the server"""
+    parser = argparse.ArgumentParser(description='Set up and start the API server')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Run the production server (serve.py) with this many worker processes')
+    parser.add_argument('--production', action='store_true',
+                        help='Run the production server with WEB_CONCURRENCY or one worker per CPU')
+    args = parser.parse_args()
+    workers = args.workers or ((int(os.environ.get('WEB_CONCURRENCY', 0)) or os.cpu_count() or 1)
+                               if args.production else None)
+    
     logger.info("🍽️ M5 Expiry Price Predictor - Server Setup")
     logger.info("=" * 50)
     
@@ -137,7 +154,7 @@ def main():
     
     # Start server
     logger.info("=" * 50)
-    start_server()
+    start_server(workers)
 
 if __name__ == "__main__":
     try:
@@ -56,4 +56,4 @@ echo "Press Ctrl+C to stop the server"
 echo
 
 # Start the server
-python start_server.py 
\ No newline at end of file
+python start_server.py "$@" 
\ No newline at end of file
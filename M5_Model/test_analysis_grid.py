@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for the vectorized price analysis
+Checks predict_grid and both modes of /predict/analysis against per-item predictions.
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+from app import app, predictor
+
+warnings.filterwarnings('ignore')
+
+DEPARTMENTS = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+
+
+def test_predict_grid_matches_predict_price():
+    """Every grid point matches predict_price for the same inputs"""
+    dates = np.arange(np.datetime64('2023-12-28'), np.datetime64('2024-01-04'))
+    days = np.arange(1, 31)
+    grid = predictor.predict_grid(DEPARTMENTS, dates, days, features={'has_event': 1})
+    assert grid.shape == (3, len(dates), len(days))
+
+    for i, dept in enumerate(DEPARTMENTS):
+        for j, date in enumerate(dates.astype(str)):
+            for k in [0, 6, 29]:
+                expected = predictor.predict_price(int(days[k]), dept, date, has_event=1)
+                assert abs(grid[i, j, k] - expected) < 1e-6
+    print("   ✅ predict_grid matches predict_price")
+
+
+def test_legacy_analysis_matches_batch():
+    """The single-department response is unchanged"""
+    client = app.test_client()
+    response = client.post('/predict/analysis', json={'dept_id': 'FOODS_2', 'date': '2024-01-15', 'max_days': 20})
+    data = response.get_json()['data']
+
+    expected = predictor.predict_batch(pd.DataFrame({
+        'days_to_expiry': range(1, 21), 'dept_id': 'FOODS_2', 'date': '2024-01-15'
+    }))['predicted_price'].to_numpy()
+
+    assert data['dept_id'] == 'FOODS_2' and data['date'] == '2024-01-15'
+    assert data['total_days'] == 20
+    assert [point['days_to_expiry'] for point in data['analysis']] == list(range(1, 21))
+    np.testing.assert_allclose([point['predicted_price'] for point in data['analysis']], expected, atol=1e-6)
+    print("   ✅ Legacy analysis response")
+
+
+def test_grid_analysis_response():
+    """Grid mode returns a dense dept x date x days matrix with axis labels"""
+    client = app.test_client()
+    response = client.post('/predict/analysis', json={
+        'dept_ids': DEPARTMENTS, 'start_date': '2024-01-01', 'end_date': '2024-01-31', 'max_days': 45
+    })
+    assert response.status_code == 200
+    data = response.get_json()['data']
+
+    assert data['shape'] == [3, 31, 45]
+    assert data['dates'][0] == '2024-01-01' and data['dates'][-1] == '2024-01-31'
+    assert data['days_to_expiry'] == list(range(1, 46))
+    prices = np.array(data['prices'])
+    assert prices.shape == (3, 31, 45)
+    expected = predictor.predict_price(10, 'FOODS_3', '2024-01-20')
+    assert abs(prices[2, 19, 9] - expected) < 1e-6
+    print("   ✅ Grid analysis response")
+
+
+def test_grid_analysis_validation():
+    """Invalid departments and ranges are rejected with 400, in both modes"""
+    client = app.test_client()
+    bad_requests = [
+        {'dept_ids': ['FOODS_1', 'TOYS_1']},
+        {'dept_ids': []},
+        {'dept_ids': ['FOODS_1'], 'start_date': '2024-02-01', 'end_date': '2024-01-01'},
+        {'dept_ids': ['FOODS_1'], 'start_date': '2020-01-01', 'end_date': '2024-01-01'},
+        {'dept_ids': ['FOODS_1'], 'start_date': 'not a date'},
+        {'dept_ids': ['FOODS_1'], 'max_days': 0},
+        {'dept_id': 'FOODS_1', 'max_days': 'thirty'},
+        {'dept_id': 'FOODS_1', 'max_days': 1e9},
+        {'dept_id': 'FOODS_1', 'max_days': 0},
+        {'dept_id': 'FOODS_1', 'max_days': None}
+    ]
+    for body in bad_requests:
+        response = client.post('/predict/analysis', json=body)
+        assert response.status_code == 400, body
+    response = client.post('/predict/analysis', json={'dept_id': 'FOODS_1', 'date': '2024-01-15', 'max_days': '30'})
+    assert response.status_code == 200 and response.get_json()['data']['total_days'] == 30
+    print("   ✅ Grid analysis validation")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing price analysis")
+    print("=" * 60)
+    test_predict_grid_matches_predict_price()
+    test_legacy_analysis_matches_batch()
+    test_grid_analysis_response()
+    test_grid_analysis_validation()
+    print("\n🎉 All price analysis tests passed!")
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Test script for the asyncio variant of the API
+Checks that async_app.py answers like app.py, using an in-process async Mongo stand-in.
+"""
+
+import asyncio
+import json
+import time
+import warnings
+import mongomock
+from starlette.testclient import TestClient
+import app as flask_api
+import async_app
+from coalescer import PredictionCoalescer
+from write_buffer import WriteBehindBuffer
+
+warnings.filterwarnings('ignore')
+
+
+class AsyncCollectionStandIn:
+    """Async collection backed by mongomock, with an optional simulated round trip"""
+
+    def __init__(self, round_trip=0.0, collection=None):
+        self.round_trip = round_trip
+        self.collection = collection if collection is not None else mongomock.MongoClient().db.predictions
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(self.round_trip)
+        return self.collection.insert_one(doc)
+
+    def find(self, query):
+        return AsyncCursorStandIn(self.collection.find(query))
+
+    async def aggregate(self, pipeline, **kwargs):
+        return AsyncCursorStandIn(self.collection.aggregate(pipeline))
+
+
+class AsyncCursorStandIn:
+    """Async cursor over a mongomock cursor, like PyMongo's AsyncCursor"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, keys):
+        self.cursor = self.cursor.sort(keys)
+        return self
+
+    def limit(self, n):
+        self.cursor = self.cursor.limit(n)
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    async def close(self):
+        pass
+
+    async def __aiter__(self):
+        for doc in self.cursor:
+            await asyncio.sleep(0)
+            yield doc
+
+
+REQUESTS = [
+    ('GET', '/', None),
+    ('GET', '/model/info', None),
+    ('POST', '/predict/single', {'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15', 'city': 'CA_1',
+                                 'additional_features': {'has_event': 1}}),
+    ('POST', '/predict/single', {'days_to_expiry': 5}),
+    ('POST', '/predict/single', {'days_to_expiry': 5, 'dept_id': 'TOYS_1'}),
+    ('POST', '/predict/batch', {'items': [
+        {'days_to_expiry': d, 'dept_id': f'FOODS_{d % 3 + 1}', 'date': '2024-01-15'} for d in range(30)
+    ]}),
+    # Repeated ISO dates and timestamps, then dates only pandas can parse
+    ('POST', '/predict/batch', {'items': [
+        {'days_to_expiry': d, 'dept_id': 'FOODS_2', 'date': ['2024-01-15', '2024-03-02T23:30:00-05:00',
+                                                             '2024-12-24T10:30:00.000Z'][d % 3]} for d in range(12)
+    ]}),
+    ('POST', '/predict/batch', {'items': [
+        {'days_to_expiry': d, 'dept_id': 'FOODS_1', 'date': ['01/15/2024', '02/10/2024'][d % 2]} for d in range(6)
+    ]}),
+    ('POST', '/predict/batch', {'items': [{'days_to_expiry': 3, 'dept_id': 'FOODS_9'}]}),
+    ('POST', '/predict/analysis', {'dept_id': 'FOODS_2', 'date': '2024-01-15', 'max_days': 10}),
+    ('POST', '/predict/analysis', {'dept_id': 'FOODS_2', 'date': '2024-01-15', 'max_days': '12'}),
+    ('POST', '/predict/analysis', {'dept_id': 'FOODS_2', 'max_days': 'twelve'}),
+    ('POST', '/predict/analysis', {'dept_id': 'FOODS_2', 'max_days': 1e9}),
+    ('POST', '/predict/analysis', {'dept_ids': ['FOODS_1', 'FOODS_3'], 'start_date': '2024-01-01',
+                                   'end_date': '2024-01-05', 'max_days': 7}),
+    ('POST', '/predict', {'categoryId': 'FOODS_3_090', 'cityId': 'CA_1', 'mrp': 50,
+                          'dateAdded': '2024-01-15T10:30:00.000Z', 'expiryDate': '2024-01-22T10:30:00.000Z'})
+]
+
+
+def test_routes_match_flask():
+    """Every route returns the same status and payload as the Flask app"""
+    flask_client = flask_api.app.test_client()
+    with TestClient(async_app.app) as async_client:
+        for method, path, body in REQUESTS:
+            expected = flask_client.open(path, method=method, json=body)
+            got = async_client.request(method, path, json=body)
+            assert got.status_code == expected.status_code, path
+            assert got.json() == expected.get_json(), path
+    print("   ✅ Routes match the Flask app")
+
+
+def test_ndjson_stream_matches_flask():
+    """Streamed NDJSON batches give the same lines as the Flask app"""
+    items = [{'days_to_expiry': d, 'dept_id': 'FOODS_2', 'date': '2024-02-01'} for d in range(12)]
+    body = ''.join(json.dumps(item) + '\n' for item in items) + '{"days_to_expiry": 1}\n'
+
+    # An unparsable chunk_size falls back to the default in both apps
+    for query in ('chunk_size=5', 'chunk_size=abc'):
+        expected = flask_api.app.test_client().post(f'/predict/batch?{query}', data=body,
+                                                    content_type='application/x-ndjson')
+        with TestClient(async_app.app) as client:
+            got = client.post(f'/predict/batch?{query}', content=body,
+                              headers={'Content-Type': 'application/x-ndjson'})
+        assert got.status_code == expected.status_code == 200, query
+        assert got.text.splitlines() == expected.get_data(as_text=True).splitlines(), query
+    print("   ✅ NDJSON stream matches the Flask app")
+
+
+def test_save_prediction_uses_async_collection():
+    """Without the write buffer, /save-prediction awaits the async collection"""
+    original, original_buffer = async_app.predictions_collection, async_app.write_buffer
+    async_app.predictions_collection = AsyncCollectionStandIn(round_trip=0.2)
+    async_app.write_buffer = None
+    try:
+        with TestClient(async_app.app) as client:
+            response = client.post('/save-prediction', json={
+                'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15', 'city': 'CA_1'
+            })
+            assert response.status_code == 200
+            data = response.json()['data']
+            assert '_id' not in data and data['city'] == 'CA_1'
+
+            saved = async_app.predictions_collection.collection.find_one()
+            assert saved['predicted_price'] == data['predicted_price']
+    finally:
+        async_app.predictions_collection, async_app.write_buffer = original, original_buffer
+    print("   ✅ /save-prediction uses the async collection")
+
+
+def test_save_prediction_uses_write_buffer():
+    """With the write buffer, /save-prediction queues like app.py and answers 503 when it is full"""
+    from test_write_buffer import SlowCollection
+    slow = SlowCollection()
+    original = async_app.write_buffer
+    async_app.write_buffer = WriteBehindBuffer(slow, max_queue=1, batch_size=1, flush_interval=0.05)
+    body = {'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15'}
+    try:
+        with TestClient(async_app.app) as client:
+            assert client.post('/save-prediction', json=body).status_code == 200
+            time.sleep(0.1)  # the worker is now blocked writing the first document
+            assert client.post('/save-prediction', json=body).status_code == 200
+            response = client.post('/save-prediction', json=body)
+            assert response.status_code == 503 and response.headers['retry-after'] == '1'
+            assert client.get('/health').json()['write_buffer']['rejected'] == 1
+        slow.release.set()
+        async_app.write_buffer.close(timeout=5)
+        assert slow.collection.count_documents({}) == 2
+    finally:
+        async_app.write_buffer = original
+    print("   ✅ /save-prediction uses the write buffer")
+
+
+def test_single_predictions_use_coalescer():
+    """/predict/single and /predict go through app.py's coalescer when it is enabled"""
+    original = flask_api.coalescer, async_app.coalescer
+    flask_api.coalescer = async_app.coalescer = PredictionCoalescer(flask_api.predictor, window=0.001)
+    flask_api.predictor.cache.clear()
+    try:
+        with TestClient(async_app.app) as client:
+            response = client.post('/predict/single', json={'days_to_expiry': 7, 'dept_id': 'FOODS_2',
+                                                            'date': '2024-02-01'})
+            assert response.status_code == 200
+            response = client.post('/predict', json={'categoryId': 'FOODS_3_001', 'cityId': 'CA_1',
+                                                     'dateAdded': '2024-01-15T10:30:00.000Z',
+                                                     'expiryDate': '2024-01-20T10:30:00.000Z'})
+            assert response.status_code == 200
+            assert client.get('/health').json()['coalescer']['requests'] == 2
+    finally:
+        flask_api.coalescer, async_app.coalescer = original
+    print("   ✅ Single predictions use the coalescer")
+
+
+def test_history_matches_flask():
+    """History pages (JSON and NDJSON) and daily averages read like the Flask app's"""
+    from test_prediction_history import make_history
+    db = mongomock.MongoClient().db
+    db.predictions.insert_many(make_history(200))
+    original = async_app.predictions_collection, flask_api.mongo.db
+    async_app.predictions_collection, flask_api.mongo.db = AsyncCollectionStandIn(collection=db.predictions), db
+    try:
+        flask_client = flask_api.app.test_client()
+        with TestClient(async_app.app) as async_client:
+            cursor = None
+            for _ in range(3):
+                path = '/predictions/history?dept_id=FOODS_2,FOODS_3&min_days_to_expiry=10&limit=25'
+                path += f'&cursor={cursor}' if cursor else ''
+                expected = flask_client.get(path).get_json()
+                assert async_client.get(path).json() == expected and expected['count'] == 25
+                cursor = expected['next_cursor']
+
+            headers = {'Accept': 'application/x-ndjson'}
+            for path in ('/predictions/history?city=CA_1&limit=30', '/predictions/daily-average?city=TX_2',
+                         '/predictions/history?limit=0', '/predictions/daily-average?end_date=soon'):
+                expected = flask_client.get(path, headers=headers)
+                got = async_client.get(path, headers=headers)
+                assert got.status_code == expected.status_code, path
+                assert got.headers['content-type'].split(';')[0] == expected.mimetype, path
+                assert got.text == expected.get_data(as_text=True), path
+    finally:
+        async_app.predictions_collection, flask_api.mongo.db = original
+    print("   ✅ History matches the Flask app")
+
+
+def test_event_loop_not_blocked():
+    """Concurrent slow inserts overlap instead of running one after another"""
+    original, original_buffer = async_app.predictions_collection, async_app.write_buffer
+    async_app.predictions_collection = AsyncCollectionStandIn(round_trip=0.3)
+    async_app.write_buffer = None
+    body = {'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15'}
+
+    async def run():
+        import httpx
+        transport = httpx.ASGITransport(app=async_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            responses = await asyncio.gather(*[client.post('/save-prediction', json=body) for _ in range(10)])
+            return loop.time() - start, responses
+
+    try:
+        elapsed, responses = asyncio.run(run())
+    finally:
+        async_app.predictions_collection, async_app.write_buffer = original, original_buffer
+    assert all(response.status_code == 200 for response in responses)
+    assert elapsed < 1.5, elapsed
+    print(f"   ✅ 10 inserts with a 300 ms round trip took {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing asyncio API variant")
+    print("=" * 60)
+    test_routes_match_flask()
+    test_ndjson_stream_matches_flask()
+    test_save_prediction_uses_async_collection()
+    test_save_prediction_uses_write_buffer()
+    test_single_predictions_use_coalescer()
+    test_history_matches_flask()
+    test_event_loop_not_blocked()
+    print("\n🎉 All async API tests passed!")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming NDJSON batch prediction
+Runs /predict/batch in-process with the Flask test client.
+"""
+
+import json
+import warnings
+from app import app
+
+warnings.filterwarnings('ignore')
+
+
+def make_items(n_items):
+    """Batch items across all departments, half of them with a city"""
+    departments = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+    items = []
+    for i in range(n_items):
+        item = {'days_to_expiry': i % 40, 'dept_id': departments[i % 3], 'date': '2024-01-15'}
+        if i % 2:
+            item['city'] = 'CA_1'
+        items.append(item)
+    return items
+
+
+def post_ndjson(client, body, chunk_size=3):
+    """POST an NDJSON body and return the parsed response lines"""
+    response = client.post(f'/predict/batch?chunk_size={chunk_size}', data=body,
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_ndjson_matches_json_batch():
+    """Streamed predictions match the JSON endpoint in order"""
+    client = app.test_client()
+    items = make_items(10)
+    body = ''.join(json.dumps(item) + '\n' for item in items)
+
+    streamed = post_ndjson(client, body)
+    expected = client.post('/predict/batch', json={'items': items}).get_json()['data']['predictions']
+
+    assert len(streamed) == len(items)
+    for got, want, item in zip(streamed, expected, items):
+        assert got['days_to_expiry'] == item['days_to_expiry']
+        assert got.get('city') == item.get('city')
+        assert abs(got['predicted_price'] - want['predicted_price']) < 1e-9
+    print("   ✅ NDJSON predictions match JSON batch")
+
+
+def test_ndjson_invalid_line_ends_stream():
+    """An invalid line produces an error object naming the line"""
+    client = app.test_client()
+    body = json.dumps(make_items(1)[0]) + '\n\n' + '{"days_to_expiry": 3}\n' + json.dumps(make_items(1)[0]) + '\n'
+
+    lines = post_ndjson(client, body, chunk_size=1)
+    assert 'predicted_price' in lines[0]
+    assert lines[-1]['status'] == 'error'
+    assert lines[-1]['line'] == 3
+    assert len(lines) == 2
+    print("   ✅ Invalid line ends the stream with an error")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing streaming batch prediction")
+    print("=" * 60)
+    test_ndjson_matches_json_batch()
+    test_ndjson_invalid_line_ends_stream()
+    print("\n🎉 All streaming tests passed!")
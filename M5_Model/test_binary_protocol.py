@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script for the Unix socket binary protocol
+Checks the framing, that answers match predict_price (single and pipelined),
+that bad requests do not break the connection, and serve.py with UDS_PATH.
+"""
+
+import http.client
+import json
+import os
+import signal
+import tempfile
+import warnings
+from binary_protocol import (BinaryClient, FEATURES, FRAME, MAX_FRAME, PredictionError, decode_request,
+                             encode_request, serve_in_background)
+from predict_expiry_price import ExpiryPricePredictor
+from serve_process import start_server
+
+warnings.filterwarnings('ignore')
+
+
+def socket_path():
+    """Unused socket path in a temporary directory"""
+    return os.path.join(tempfile.mkdtemp(prefix='m5_uds_'), 'predict.sock')
+
+
+def test_request_round_trip():
+    """Requests decode to predict_price arguments; dates keep their local day"""
+    frame = encode_request(7, 12, 'FOODS_2', '2024-03-10T23:30:00-08:00', city='CA_1', promo_impact=0.25,
+                           has_event=1)
+    assert FRAME.unpack_from(frame)[0] == len(frame) - FRAME.size
+    request_id, days, dept_id, date, kwargs = decode_request(frame[FRAME.size:])
+    assert (request_id, days, dept_id, date.isoformat()) == (7, 12.0, 'FOODS_2', '2024-03-10T00:00:00')
+    assert kwargs == {'city': 'CA_1', 'promo_impact': 0.25, 'has_event': 1.0}
+
+    plain = encode_request(1, 5, 'FOODS_1')
+    assert len(encode_request(1, 5, 'FOODS_1', '2024-01-15', city='CA_1')) == 35
+    assert decode_request(plain[FRAME.size:])[3] is None
+    for bad in (plain[FRAME.size:-1], plain[FRAME.size:] + b'x'):
+        try:
+            decode_request(bad)
+            assert False, "Expected a malformed request to be rejected"
+        except ValueError:
+            pass
+    try:
+        encode_request(1, 5, 'FOODS_1', sell_price=3.0)
+        assert False, "Expected an unknown feature to be rejected"
+    except ValueError:
+        pass
+    print("   ✅ Requests round-trip")
+
+
+def test_server_answers_like_predict_price():
+    """Single and pipelined requests get predict_price's answers in order"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    path = socket_path()
+    server = serve_in_background(predictor, path)
+    try:
+        items = [{'days_to_expiry': days, 'dept_id': dept, 'date': date}
+                 for days in (0, 3, 14, 45) for dept in ('FOODS_1', 'FOODS_2', 'FOODS_3', 'TOYS_1')
+                 for date in ('2024-01-15', '2024-07-04')]
+        items.append({'days_to_expiry': 5, 'dept_id': 'FOODS_3', 'date': '2024-01-15', 'promo_impact': 0.3})
+        expected = [predictor.predict_price(item['days_to_expiry'], item['dept_id'], item['date'],
+                                            **{k: v for k, v in item.items() if k in FEATURES})
+                    for item in items]
+
+        with BinaryClient(path, window=7) as client:
+            assert client.predict(3, 'FOODS_1', '2024-01-15') == expected[8]
+            assert client.predict(3, 'TOYS_1', '2024-01-15') is None
+            assert client.predict_many(items * 3) == expected * 3
+            info = client.info()
+            assert info['features'] == list(FEATURES) and info['model_version'] == predictor.model_version
+    finally:
+        server.close()
+    assert not os.path.exists(path)
+    print("   ✅ Server answers like predict_price")
+
+
+def test_bad_requests_keep_connection():
+    """A malformed request is answered with an error; an oversized frame closes the connection"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    path = socket_path()
+    server = serve_in_background(predictor, path)
+    try:
+        with BinaryClient(path) as client:
+            client.sock.sendall(FRAME.pack(3) + b'\x01ab')
+            try:
+                client.predict(5, 'FOODS_1', '2024-01-15')
+                assert False, "Expected the malformed request's error first"
+            except PredictionError as e:
+                assert 'Truncated' in str(e)
+            # The valid request's response is still in the stream
+            client._read_payload()
+            assert client.predict(5, 'FOODS_1', '2024-01-15') == predictor.predict_price(5, 'FOODS_1', '2024-01-15')
+
+        with BinaryClient(path) as client:
+            client.sock.sendall(FRAME.pack(MAX_FRAME + 1))
+            payload = client._read_payload()
+            assert b'exceeds' in payload
+            assert client.sock.recv(1) == b''
+    finally:
+        server.close()
+    print("   ✅ Bad requests keep the connection")
+
+
+def test_serve_listens_on_uds_path():
+    """serve.py workers answer binary requests on UDS_PATH like /predict/single"""
+    path = socket_path()
+    process, port = start_server(workers=2, env={'UDS_PATH': path})
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        connection.request('POST', '/predict/single', body=json.dumps(
+            {'days_to_expiry': 9, 'dept_id': 'FOODS_3', 'date': '2024-05-01', 'city': 'WI_2'}),
+            headers={'Content-Type': 'application/json'})
+        http_price = json.loads(connection.getresponse().read())['data']['predicted_price']
+
+        for _ in range(4):
+            with BinaryClient(path) as client:
+                assert client.predict(9, 'FOODS_3', '2024-05-01', city='WI_2') == http_price
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+    assert not os.path.exists(path)
+    print("   ✅ serve.py listens on UDS_PATH")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the binary protocol")
+    print("=" * 60)
+    test_request_round_trip()
+    test_server_answers_like_predict_price()
+    test_bad_requests_keep_connection()
+    test_serve_listens_on_uds_path()
+    print("\n🎉 All binary protocol tests passed!")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test script for offline bulk scoring
+Checks that chunked CSV and Parquet scoring matches predict_batch on the
+whole file, in order, that a failed run resumes from its first missing chunk,
+and the command line on a process pool.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bulk_score import read_chunks, score_file
+from predict_expiry_price import ExpiryPricePredictor
+
+warnings.filterwarnings('ignore')
+
+
+def make_inventory(n_rows, seed=0):
+    """Random inventory with a city and a feature column"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'days_to_expiry': rng.integers(0, 60, n_rows),
+        'dept_id': rng.choice(['FOODS_1', 'FOODS_2', 'FOODS_3'], n_rows),
+        'date': rng.choice(['2024-01-15', '2024-02-29', '2024-07-04T10:00:00'], n_rows),
+        'city': rng.choice(['CA_1', 'TX_2', 'WI_3'], n_rows),
+        'sell_price': rng.uniform(1, 20, n_rows).round(2)
+    })
+
+
+def test_chunks_match_whole_file():
+    """CSV and Parquet inputs (any row groups) score like one predict_batch call, in order"""
+    work_dir = tempfile.mkdtemp(prefix='m5_bulk_')
+    try:
+        predictor = ExpiryPricePredictor(cache_size=0)
+        inventory = make_inventory(2500)
+        expected = predictor.predict_batch(inventory)['predicted_price'].to_numpy()
+
+        csv_path = os.path.join(work_dir, 'inventory.csv')
+        inventory.to_csv(csv_path, index=False)
+        parquet_path = os.path.join(work_dir, 'inventory.parquet')
+        pq.write_table(pa.Table.from_pandas(inventory, preserve_index=False), parquet_path, row_group_size=333)
+
+        for path, fmt in ((csv_path, 'parquet'), (parquet_path, 'csv')):
+            output_dir = os.path.join(work_dir, f'out_{fmt}')
+            summary = score_file(predictor, path, output_dir, chunk_rows=400, fmt=fmt, progress=None)
+            assert (summary['chunks'], summary['rows']) == (7, 2500)
+            parts = sorted(name for name in os.listdir(output_dir) if name.startswith('part-'))
+            assert len(parts) == 7
+            scored = pd.concat([pd.read_csv(os.path.join(output_dir, name)) if fmt == 'csv'
+                                else pd.read_parquet(os.path.join(output_dir, name)) for name in parts])
+            np.testing.assert_array_equal(scored['days_to_expiry'], inventory['days_to_expiry'])
+            np.testing.assert_allclose(scored['predicted_price'], expected, rtol=1e-5)
+
+        # Resumed reads skip whole row groups and re-slice to the same chunks
+        chunks = dict(read_chunks(parquet_path, 400, start_chunk=3))
+        assert list(chunks) == [3, 4, 5, 6] and len(chunks[6]) == 100
+        pd.testing.assert_frame_equal(chunks[4].reset_index(drop=True),
+                                      inventory.iloc[1600:2000].reset_index(drop=True))
+    finally:
+        shutil.rmtree(work_dir)
+    print("   ✅ Chunks match the whole file")
+
+
+def test_failed_run_resumes():
+    """A run that fails part way keeps its finished parts and resumes from the failed chunk"""
+    work_dir = tempfile.mkdtemp(prefix='m5_bulk_')
+    try:
+        predictor = ExpiryPricePredictor(cache_size=0)
+        inventory = make_inventory(1000, seed=1)
+        expected = predictor.predict_batch(inventory)['predicted_price'].to_numpy()
+        path = os.path.join(work_dir, 'inventory.parquet')
+        output_dir = os.path.join(work_dir, 'out')
+
+        broken = inventory.copy()
+        broken.loc[650, 'date'] = 'not a date'
+        broken.to_parquet(path, index=False)
+        try:
+            score_file(predictor, path, output_dir, chunk_rows=300, progress=None)
+            assert False, "Expected the bad date to fail chunk 2"
+        except RuntimeError as e:
+            assert 'Chunk 2' in str(e)
+        assert sorted(os.listdir(output_dir)) == ['_manifest.json', 'part-00000.parquet', 'part-00001.parquet']
+
+        # A new run into the same directory has to resume or overwrite
+        try:
+            score_file(predictor, path, output_dir, chunk_rows=300, progress=None)
+            assert False, "Expected the earlier run to be protected"
+        except ValueError:
+            pass
+
+        inventory.to_parquet(path, index=False)
+        lines = []
+        summary = score_file(predictor, path, output_dir, chunk_rows=999, resume=True, progress=lines.append)
+        assert (summary['first_chunk'], summary['chunks'], summary['rows'], summary['total_chunks']) == (2, 2, 400, 4)
+        assert lines[0].startswith('⏩ Resuming at chunk 2') and '100.0%' in lines[-1]
+        scored = pd.read_parquet(output_dir)
+        np.testing.assert_allclose(scored['predicted_price'], expected, rtol=1e-5)
+
+        manifest = pd.read_json(os.path.join(output_dir, '_manifest.json'), typ='series')
+        assert manifest['completed'] and manifest['rows'] == 1000 and manifest['chunk_rows'] == 300
+    finally:
+        shutil.rmtree(work_dir)
+    print("   ✅ Failed run resumes from its first missing chunk")
+
+
+def test_resume_refuses_other_model_version():
+    """Resuming a run scored with other models fails unless it is overwritten"""
+    work_dir = tempfile.mkdtemp(prefix='m5_bulk_')
+    try:
+        predictor = ExpiryPricePredictor(cache_size=0)
+        inventory = make_inventory(900, seed=3)
+        path = os.path.join(work_dir, 'inventory.parquet')
+        output_dir = os.path.join(work_dir, 'out')
+        inventory.to_parquet(path, index=False)
+        score_file(predictor, path, output_dir, chunk_rows=300, progress=None)
+
+        # The earlier run as if it had been scored before a model deploy
+        manifest_path = os.path.join(output_dir, '_manifest.json')
+        manifest = pd.read_json(manifest_path, typ='series').to_dict()
+        manifest['model_version'] = '0123456789ab'
+        pd.Series(manifest).to_json(manifest_path)
+        os.remove(os.path.join(output_dir, 'part-00002.parquet'))
+        for kwargs in ({'resume': True}, {'start_chunk': 1}):
+            try:
+                score_file(predictor, path, output_dir, progress=None, **kwargs)
+                assert False, "Expected parts from other models to be refused"
+            except ValueError as e:
+                assert '0123456789ab' in str(e)
+
+        summary = score_file(predictor, path, output_dir, resume=True, overwrite=True, progress=None)
+        assert (summary['first_chunk'], summary['chunks']) == (0, 3)
+        manifest = pd.read_json(manifest_path, typ='series')
+        assert manifest['model_version'] == predictor.model_version and manifest['completed']
+    finally:
+        shutil.rmtree(work_dir)
+    print("   ✅ Resume refuses parts from other model versions")
+
+
+def test_command_line_with_workers():
+    """The CLI scores on a process pool and writes CSV parts"""
+    work_dir = tempfile.mkdtemp(prefix='m5_bulk_')
+    try:
+        inventory = make_inventory(3000, seed=2)
+        path = os.path.join(work_dir, 'inventory.csv')
+        inventory.to_csv(path, index=False)
+        output_dir = os.path.join(work_dir, 'out')
+
+        process = subprocess.run(
+            [sys.executable, 'bulk_score.py', path, output_dir, '--format', 'csv', '--chunk-rows', '1000',
+             '--workers', '2', '--store-model-dir', os.path.join(work_dir, 'no_stores')],
+            capture_output=True, text=True, timeout=600
+        )
+        assert process.returncode == 0, process.stdout + process.stderr
+        assert 'Scored 3,000 rows in 3 chunks' in process.stdout
+
+        scored = pd.concat(pd.read_csv(os.path.join(output_dir, f'part-{i:05d}.csv')) for i in range(3))
+        expected = ExpiryPricePredictor(cache_size=0).predict_batch(inventory)['predicted_price'].to_numpy()
+        np.testing.assert_allclose(scored['predicted_price'], expected, rtol=1e-5)
+    finally:
+        shutil.rmtree(work_dir)
+    print("   ✅ Command line scores on a process pool")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing bulk scoring")
+    print("=" * 60)
+    test_chunks_match_whole_file()
+    test_failed_run_resumes()
+    test_resume_refuses_other_model_version()
+    test_command_line_with_workers()
+    print("\n🎉 All bulk scoring tests passed!")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for the calendar feature index
+Checks the indexed fields against Python's calendar, event flags read from an
+M5 calendar.csv, and that predictions pick up has_event from the calendar.
+"""
+
+import os
+import tempfile
+import warnings
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from calendar_index import CalendarIndex, parse_date_column, parse_days
+from predict_expiry_price import ExpiryPricePredictor
+
+warnings.filterwarnings('ignore')
+
+# Excerpt in the layout of the M5 calendar.csv
+CALENDAR_CSV = """date,wm_yr_wk,weekday,wday,month,year,d,event_name_1,event_type_1,event_name_2,event_type_2,snap_CA,snap_TX,snap_WI
+2024-01-13,12449,Saturday,1,1,2024,d_1,,,,,0,0,0
+2024-01-14,12449,Sunday,2,1,2024,d_2,,,,,0,0,0
+2024-01-15,12449,Monday,3,1,2024,d_3,MartinLutherKingDay,National,,,1,0,1
+2024-01-16,12449,Tuesday,4,1,2024,d_4,,,,,1,1,0
+2024-02-11,12453,Sunday,2,2,2024,d_30,SuperBowl,Sporting,,,0,0,0
+"""
+
+
+def write_calendar():
+    """Write the excerpt to a temporary file"""
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w') as f:
+        f.write(CALENDAR_CSV)
+    return path
+
+
+def test_fields_match_python_calendar():
+    """Indexed and computed (out-of-range) fields agree with date.weekday/isocalendar"""
+    index = CalendarIndex('2020-01-01', '2022-12-31')
+    days = [date(2019, 12, 1) + timedelta(days=i) for i in range(0, 1200, 3)]
+    dates = np.array(days + [None], dtype='datetime64[D]')
+    fields = index.lookup(dates)
+
+    for i, day in enumerate(days):
+        expected = {'year': day.year, 'month': day.month, 'day': day.day, 'day_of_week': day.weekday(),
+                    'week_of_year': day.isocalendar()[1], 'has_event': 0}
+        assert {field: fields[field][i] for field in expected} == expected, day
+        assert index.day(day) == expected, day
+
+    assert np.isnan(fields['month'][-1]) and fields['has_event'][-1] == 0
+    assert index.info()['days'] == 3 * 365 + 1
+    print("   ✅ Fields match Python's calendar")
+
+
+def test_events_from_csv():
+    """Days with event_name_1 set are flagged; the range defaults to the file's dates"""
+    path = write_calendar()
+    try:
+        index = CalendarIndex.from_csv(path)
+        wide = CalendarIndex.from_csv(path, '2023-01-01', '2025-12-31')
+    finally:
+        os.remove(path)
+
+    assert (str(index.start), str(index.end)) == ('2024-01-13', '2024-02-11')
+    assert index.info()['event_days'] == wide.info()['event_days'] == 2
+    dates = np.array(['2024-01-14', '2024-01-15', '2024-02-11', '2024-02-12', '2023-06-01'], dtype='datetime64[D]')
+    np.testing.assert_array_equal(index.lookup(dates)['has_event'], [0, 1, 1, 0, 0])
+    np.testing.assert_array_equal(wide.lookup(dates)['has_event'], [0, 1, 1, 0, 0])
+    assert wide.day(date(2024, 1, 15))['has_event'] == 1
+    print("   ✅ Event days read from calendar.csv")
+
+
+def test_predictions_use_calendar_events():
+    """has_event comes from the calendar unless the caller supplies it, in every prediction path"""
+    path = write_calendar()
+    try:
+        calendar = CalendarIndex.from_csv(path, '2023-01-01', '2025-12-31')
+    finally:
+        os.remove(path)
+    plain = ExpiryPricePredictor(cache_size=0)
+    with_events = ExpiryPricePredictor(cache_size=0, calendar=calendar)
+
+    for dept in ('FOODS_1', 'FOODS_2', 'FOODS_3'):
+        event = with_events.predict_price(5, dept, '2024-01-15')
+        assert event == plain.predict_price(5, dept, '2024-01-15', has_event=1)
+        assert with_events.predict_price(5, dept, '2024-01-15', has_event=0) == plain.predict_price(5, dept, '2024-01-15')
+        assert with_events.predict_price(5, dept, '2024-01-16') == plain.predict_price(5, dept, '2024-01-16')
+
+    batch = pd.DataFrame({'days_to_expiry': [5, 5, 40], 'dept_id': ['FOODS_2', 'FOODS_2', 'FOODS_3'],
+                          'date': ['2024-01-15', '2024-01-16', '2024-02-11T18:30:00Z']})
+    expected = [with_events.predict_price(d, dept, day)
+                for d, dept, day in batch.itertuples(index=False)]
+    np.testing.assert_allclose(with_events.predict_batch(batch)['predicted_price'], expected, rtol=1e-6)
+
+    grid = with_events.predict_grid(['FOODS_1'], np.array(['2024-01-15', '2024-01-16'], dtype='datetime64[D]'),
+                                    np.array([3]))
+    assert abs(grid[0, 0, 0] - plain.predict_price(3, 'FOODS_1', '2024-01-15', has_event=1)) < 1e-6
+    assert abs(grid[0, 1, 0] - plain.predict_price(3, 'FOODS_1', '2024-01-16')) < 1e-6
+    assert with_events.get_model_info()['calendar']['event_days'] == 2
+    print("   ✅ Predictions use calendar events")
+
+
+def test_batch_dates_parsed_like_pandas():
+    """Batch dates resolve to the local calendar day pandas gives them, including time zones"""
+    values = ['2024-01-15', '2024-03-10T23:30:00', '2024-03-10T23:30:00-08:00', '2024-06-30T01:00:00Z', None,
+              '2024-01-15', '2024-12-31']
+    expected = [None if value is None else pd.Timestamp(value).date() for value in values]
+    np.testing.assert_array_equal(parse_days(values), np.array(expected, dtype='datetime64[D]'))
+    # The batch column parser gives the same days for a list, an array or a Series
+    for column in (values, np.array(values, dtype=object), pd.Series(values)):
+        np.testing.assert_array_equal(parse_date_column(column), np.array(expected, dtype='datetime64[D]'))
+    fallback = parse_date_column(['01/15/2024', '02/10/2024', '01/15/2024'])
+    np.testing.assert_array_equal(fallback.astype('datetime64[D]'),
+                                  np.array(['2024-01-15', '2024-02-10', '2024-01-15'], dtype='datetime64[D]'))
+
+    predictor = ExpiryPricePredictor(cache_size=0)
+    batch = pd.DataFrame({'days_to_expiry': np.arange(len(values)), 'dept_id': 'FOODS_1', 'date': values})
+    prices = predictor.predict_batch(batch)['predicted_price'].to_numpy()
+    for i, value in enumerate(values):
+        if value is not None:
+            assert abs(prices[i] - predictor.predict_price(i, 'FOODS_1', value)) < 1e-6, value
+
+    # Formats the ISO parser rejects fall back to pandas
+    legacy = pd.DataFrame({'days_to_expiry': [5], 'dept_id': ['FOODS_1'], 'date': ['01/15/2024']})
+    assert abs(predictor.predict_batch(legacy)['predicted_price'][0] -
+               predictor.predict_price(5, 'FOODS_1', '2024-01-15')) < 1e-6
+    print("   ✅ Batch dates parsed like pandas")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing calendar feature index")
+    print("=" * 60)
+    test_fields_match_python_calendar()
+    test_events_from_csv()
+    test_predictions_use_calendar_events()
+    test_batch_dates_parsed_like_pandas()
+    print("\n🎉 All calendar index tests passed!")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script for the micro-batching request coalescer
+Checks that batched results match single predictions and that metrics are recorded.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import warnings
+from predict_expiry_price import ExpiryPricePredictor
+from coalescer import PredictionCoalescer
+import app as api
+
+warnings.filterwarnings('ignore')
+
+DEPARTMENTS = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+
+
+def run_concurrently(func, args_list):
+    """Call func for every argument tuple from its own thread, released at the same time"""
+    results = [None] * len(args_list)
+    barrier = threading.Barrier(len(args_list))
+
+    def call(i, args):
+        barrier.wait()
+        results[i] = func(*args)
+
+    threads = [threading.Thread(target=call, args=(i, args)) for i, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_batched_results_match_predict_price():
+    """Concurrent calls are scored together and each caller gets its own price"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    coalescer = PredictionCoalescer(predictor, window=0.05, max_batch=64)
+    inputs = [(days, DEPARTMENTS[days % 3], '2024-01-15', {'has_event': days % 2}) for days in range(40)]
+
+    results = run_concurrently(
+        lambda days, dept, date, features: coalescer.predict_price(days, dept, date, **features), inputs
+    )
+    for (days, dept, date, features), price in zip(inputs, results):
+        assert abs(price - predictor.predict_price(days, dept, date, **features)) < 1e-6
+
+    stats = coalescer.stats()
+    assert stats['requests'] == 40
+    assert stats['batches'] < 40 and stats['batch_size_max'] > 1
+    assert sum(stats['batch_size_histogram'].values()) == stats['batches']
+    assert stats['queue_delay_ms']['max'] < 1000
+    print(f"   ✅ Batched results match ({stats['batches']} batches for 40 requests)")
+
+
+def test_max_batch_and_window():
+    """Batches never exceed max_batch and a lone request waits about one window"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    coalescer = PredictionCoalescer(predictor, window=0.02, max_batch=4)
+
+    run_concurrently(lambda days: coalescer.predict_price(days, 'FOODS_1', '2024-01-15'), [(d,) for d in range(12)])
+    assert coalescer.stats()['batch_size_max'] <= 4
+
+    start = time.perf_counter()
+    coalescer.predict_price(3, 'FOODS_2', '2024-01-15')
+    elapsed = time.perf_counter() - start
+    assert 0.015 <= elapsed < 0.5
+    print("   ✅ max_batch and window are respected")
+
+
+def test_unknown_department_and_cache():
+    """Unknown departments return None without queueing; cache hits skip the queue"""
+    predictor = ExpiryPricePredictor()
+    coalescer = PredictionCoalescer(predictor, window=0.01)
+
+    assert coalescer.predict_price(5, 'TOYS_1', '2024-01-15') is None
+    first = coalescer.predict_price(5, 'FOODS_3', '2024-01-15')
+    assert coalescer.predict_price(5, 'FOODS_3', '2024-01-15', city='CA_1') == first
+    assert coalescer.stats()['requests'] == 1
+    print("   ✅ Unknown departments and cache hits")
+
+
+def test_stuck_batching_thread_times_out():
+    """A caller whose batch is never scored falls back to predict_price after the timeout"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    coalescer = PredictionCoalescer(predictor, window=0.001, timeout=0.2)
+    # The batching thread takes requests but never resolves them
+    coalescer._score = lambda batch: None
+
+    start = time.perf_counter()
+    price = coalescer.predict_price(9, 'FOODS_3', '2024-03-01')
+    elapsed = time.perf_counter() - start
+    assert price == predictor.predict_price(9, 'FOODS_3', '2024-03-01')
+    assert 0.2 <= elapsed < 2.0, elapsed
+    assert coalescer.stats()['timeouts'] == 1
+    print("   ✅ Stuck batching thread times out")
+
+
+def test_endpoint_uses_coalescer():
+    """/predict/single goes through the coalescer when it is enabled"""
+    original = api.coalescer
+    api.coalescer = PredictionCoalescer(api.predictor, window=0.001)
+    try:
+        client = api.app.test_client()
+        response = client.post('/predict/single', json={
+            'days_to_expiry': 7, 'dept_id': 'FOODS_2', 'date': '2024-02-01',
+            'additional_features': {'promo_impact': 0.3}
+        })
+        price = response.get_json()['data']['predicted_price']
+        assert abs(price - api.predictor.predict_price(7, 'FOODS_2', '2024-02-01', promo_impact=0.3)) < 1e-6
+        assert client.get('/health').get_json()['coalescer']['requests'] == 1
+    finally:
+        api.coalescer = original
+    print("   ✅ /predict/single uses the coalescer")
+
+
+def test_coalescing_loads_boosters_in_background():
+    """With coalescing on, the API loads boosters in the background unless BOOSTER_LOADING says otherwise"""
+    script = "import app; print(app.coalescer is not None, app.predictor.booster_loading)"
+    for extra, expected in [({}, 'True background'), ({'BOOSTER_LOADING': 'eager'}, 'True eager')]:
+        env = {name: value for name, value in os.environ.items() if name != 'BOOSTER_LOADING'}
+        env.update(COALESCE_WINDOW_MS='2', **extra)
+        output = subprocess.run([sys.executable, '-c', script], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        assert output.strip().splitlines()[-1] == expected, output
+    print("   ✅ Coalescing loads boosters in the background")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing request coalescer")
+    print("=" * 60)
+    test_batched_results_match_predict_price()
+    test_max_batch_and_window()
+    test_unknown_department_and_cache()
+    test_stuck_batching_thread_times_out()
+    test_endpoint_uses_coalescer()
+    test_coalescing_loads_boosters_in_background()
+    print("\n🎉 All coalescer tests passed!")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for fast cold start
+Checks that models served from the memory-mapped export match the pickled ones,
+the booster loading modes, and that small predictions never import pandas,
+scikit-learn or XGBoost.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+import numpy as np
+from predict_expiry_price import ExpiryPricePredictor
+from model_store import export_path
+
+warnings.filterwarnings('ignore')
+
+DEPARTMENTS = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+HEAVY_MODULES = ('pandas', 'sklearn', 'xgboost')
+
+# Imports the API in a fresh interpreter, serves small requests, then one large batch
+SERVING_SCRIPT = """
+import json, sys
+import numpy as np
+import app
+from columnar import DictionaryColumn, encode_numpy_columns
+client = app.app.test_client()
+assert client.post('/predict/single', json={'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15'}).status_code == 200
+assert client.post('/predict/analysis', json={'dept_id': 'FOODS_2', 'date': '2024-01-15', 'max_days': 10}).status_code == 200
+small = [name for name in %(heavy)r if name in sys.modules]
+rows = np.arange(200)
+body = encode_numpy_columns({'days_to_expiry': rows %% 60,
+                             'dept_id': DictionaryColumn((rows %% 3).astype(np.uint8), ['FOODS_1', 'FOODS_2', 'FOODS_3']),
+                             'date': np.full(len(rows), np.datetime64('2024-01-15'))})
+assert client.post('/predict/batch', data=body, content_type='application/x-numpy-columns').status_code == 200
+print(json.dumps({'small': small, 'large': [name for name in %(heavy)r if name in sys.modules]}))
+""" % {'heavy': HEAVY_MODULES}
+
+
+def copy_models():
+    """Copy only the .pkl model files to a temporary directory"""
+    model_dir = tempfile.mkdtemp(prefix='m5_models_') + '/'
+    for name in os.listdir('Model'):
+        if name.endswith('_optimized.pkl'):
+            shutil.copy(os.path.join('Model', name), model_dir)
+    return model_dir
+
+
+def test_export_matches_pickles():
+    """A predictor started from the export answers exactly like the one that built it from the pickles"""
+    model_dir = copy_models()
+    try:
+        built = ExpiryPricePredictor(model_dir=model_dir)
+        mapped = ExpiryPricePredictor(model_dir=model_dir)
+        assert mapped.model_version == built.model_version
+        assert mapped.fused_departments == built.fused_departments == DEPARTMENTS
+
+        # Engine arrays are read in place from the mapped file
+        for dept in DEPARTMENTS:
+            assert not mapped.engines[dept].threshold.flags.writeable
+
+        rng = np.random.default_rng(0)
+        days = rng.integers(0, 365, 3000)
+        depts = rng.integers(0, 3, 3000)
+        dates = np.datetime64('2024-01-01') + rng.integers(0, 366, 3000)
+        np.testing.assert_array_equal(mapped.predict_columns(days, depts, dates),
+                                      built.predict_columns(days, depts, dates))
+        for d in (0, 1, 7, 30, 365):
+            for dept in DEPARTMENTS:
+                assert mapped.predict_price(d, dept, '2024-01-15') == built.predict_price(d, dept, '2024-01-15')
+    finally:
+        shutil.rmtree(model_dir)
+    print("   ✅ Export matches the pickled models")
+
+
+def test_unreadable_export_rebuilt():
+    """A damaged export is rebuilt from the pickles instead of failing startup"""
+    model_dir = copy_models()
+    try:
+        price = ExpiryPricePredictor(model_dir=model_dir).predict_price(9, 'FOODS_3', '2024-03-01')
+        with open(export_path(model_dir, 'FOODS_3'), 'wb') as f:
+            f.write(b'not an export')
+        assert ExpiryPricePredictor(model_dir=model_dir).predict_price(9, 'FOODS_3', '2024-03-01') == price
+        with open(export_path(model_dir, 'FOODS_3'), 'rb') as f:
+            assert f.read(8) == b'M5SERVE\0'
+    finally:
+        shutil.rmtree(model_dir)
+    print("   ✅ Unreadable export is rebuilt")
+
+
+def test_booster_loading_modes():
+    """Lazy boosters load per department on first use; eager and background load all of them"""
+    lazy = ExpiryPricePredictor(booster_loading='lazy')
+    assert lazy._boosters.loaded() == []
+    assert len(lazy.models) == 3 and 'FOODS_2' in lazy.models
+    assert lazy._boosters.loaded() == []
+
+    lazy.predict_columns(np.arange(100), np.full(100, 1), np.full(100, np.datetime64('2024-01-15')))
+    assert lazy._boosters.loaded() == ['FOODS_2']
+
+    assert ExpiryPricePredictor(booster_loading='eager')._boosters.loaded() == DEPARTMENTS
+
+    background = ExpiryPricePredictor(booster_loading='background')
+    deadline = time.time() + 60
+    while background._boosters.loaded() != DEPARTMENTS and time.time() < deadline:
+        time.sleep(0.05)
+    assert background._boosters.loaded() == DEPARTMENTS
+
+    try:
+        ExpiryPricePredictor(booster_loading='sometimes')
+        assert False, 'unknown booster_loading should be rejected'
+    except ValueError:
+        pass
+    print("   ✅ Booster loading modes")
+
+
+def test_small_predictions_skip_heavy_imports():
+    """Serving single and grid predictions imports none of pandas, scikit-learn or XGBoost"""
+    # Make sure Model/ has a current export, so the fresh process does not rebuild it
+    ExpiryPricePredictor()
+    env = dict(os.environ, BOOSTER_LOADING='lazy', MODEL_WATCH_INTERVAL='0', COALESCE_WINDOW_MS='0')
+    output = subprocess.run([sys.executable, '-c', SERVING_SCRIPT], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    modules = json.loads(output.strip().splitlines()[-1])
+    assert modules['small'] == [], modules
+    assert 'xgboost' in modules['large'], modules
+    print(f"   ✅ Small predictions import none of {', '.join(HEAVY_MODULES)}")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing fast cold start")
+    print("=" * 60)
+    test_export_matches_pickles()
+    test_unreadable_export_rebuilt()
+    test_booster_loading_modes()
+    test_small_predictions_skip_heavy_imports()
+    print("\n🎉 All cold start tests passed!")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test script for columnar batch prediction
+Round-trips Arrow IPC and raw NumPy column bodies through /predict/batch with the Flask test client.
+"""
+
+import json
+import struct
+import warnings
+import numpy as np
+import pyarrow as pa
+from app import app, predictor
+from columnar import (ARROW_STREAM_MIMETYPE, NUMPY_COLUMNS_MIMETYPE, DictionaryColumn,
+                      decode_numpy_columns, encode_numpy_columns, decode_arrow_stream)
+
+warnings.filterwarnings('ignore')
+
+DEPARTMENTS = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+
+
+def make_items(n_items):
+    """JSON batch items across all departments and a few dates"""
+    dates = ['2024-01-15', '2024-06-30', '2024-12-31']
+    return [
+        {'days_to_expiry': i % 40, 'dept_id': DEPARTMENTS[i % 3], 'date': dates[i % len(dates)]}
+        for i in range(n_items)
+    ]
+
+
+def json_predictions(client, items):
+    """Predictions for the items from the JSON endpoint"""
+    response = client.post('/predict/batch', json={'items': items})
+    return np.array([p['predicted_price'] for p in response.get_json()['data']['predictions']])
+
+
+def numpy_body(items):
+    """Encode items as raw NumPy columns with dept_id as category codes"""
+    return encode_numpy_columns({
+        'days_to_expiry': np.array([item['days_to_expiry'] for item in items], dtype=np.int32),
+        'dept_id': DictionaryColumn(
+            np.array([DEPARTMENTS.index(item['dept_id']) for item in items], dtype=np.uint8),
+            DEPARTMENTS
+        ),
+        'date': np.array([item['date'] for item in items], dtype='datetime64[D]')
+    })
+
+
+def arrow_body(items):
+    """Encode items as an Arrow IPC stream with a dictionary dept_id and date32 dates"""
+    batch = pa.record_batch({
+        'days_to_expiry': pa.array([item['days_to_expiry'] for item in items], pa.int16()),
+        'dept_id': pa.array([item['dept_id'] for item in items]).dictionary_encode(),
+        'date': pa.array(np.array([item['date'] for item in items], dtype='datetime64[D]'))
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def test_numpy_columns_round_trip():
+    """Raw NumPy buffers are read in place and written back losslessly"""
+    columns = {
+        'days_to_expiry': np.arange(5, dtype=np.float64),
+        'dept_id': DictionaryColumn(np.array([0, 1, 2, 0, 1], dtype=np.uint8), DEPARTMENTS),
+        'date': np.array(['2024-01-15'] * 5, dtype='datetime64[D]')
+    }
+    decoded = decode_numpy_columns(encode_numpy_columns(columns))
+
+    np.testing.assert_array_equal(decoded['days_to_expiry'], columns['days_to_expiry'])
+    np.testing.assert_array_equal(decoded['dept_id'].codes, columns['dept_id'].codes)
+    assert decoded['dept_id'].categories == DEPARTMENTS
+    np.testing.assert_array_equal(decoded['date'], columns['date'])
+    assert not decoded['days_to_expiry'].flags.owndata
+    print("   ✅ NumPy column round trip")
+
+
+def test_numpy_columns_match_json():
+    """Predictions from NumPy columns match the JSON endpoint"""
+    client = app.test_client()
+    items = make_items(30)
+
+    response = client.post('/predict/batch', data=numpy_body(items), content_type=NUMPY_COLUMNS_MIMETYPE)
+    assert response.status_code == 200
+    assert response.mimetype == NUMPY_COLUMNS_MIMETYPE
+    predictions = decode_numpy_columns(response.get_data())['predicted_price']
+    np.testing.assert_allclose(predictions, json_predictions(client, items), rtol=0, atol=1e-9)
+    print("   ✅ NumPy column predictions match JSON batch")
+
+
+def test_arrow_stream_matches_json():
+    """Predictions from an Arrow IPC stream match the JSON endpoint"""
+    client = app.test_client()
+    items = make_items(30)
+
+    response = client.post('/predict/batch', data=arrow_body(items), content_type=ARROW_STREAM_MIMETYPE)
+    assert response.status_code == 200
+    assert response.mimetype == ARROW_STREAM_MIMETYPE
+    predictions = decode_arrow_stream(response.get_data())['predicted_price']
+    np.testing.assert_allclose(predictions, json_predictions(client, items), rtol=0, atol=1e-9)
+    print("   ✅ Arrow predictions match JSON batch")
+
+
+def test_columnar_optional_features():
+    """Optional feature columns change predictions like the single-item endpoint"""
+    client = app.test_client()
+    columns = {
+        'days_to_expiry': np.array([5, 5], dtype=np.float64),
+        'dept_id': np.array(['FOODS_1', 'FOODS_1']),
+        'date': np.array(['2024-01-15', '2024-01-15'], dtype='datetime64[D]'),
+        'has_event': np.array([0, 1], dtype=np.int8)
+    }
+    response = client.post('/predict/batch', data=encode_numpy_columns(columns),
+                           content_type=NUMPY_COLUMNS_MIMETYPE)
+    predictions = decode_numpy_columns(response.get_data())['predicted_price']
+
+    expected = [predictor.predict_price(5, 'FOODS_1', '2024-01-15', has_event=flag) for flag in (0, 1)]
+    np.testing.assert_allclose(predictions, expected, rtol=0, atol=1e-6)
+    print("   ✅ Optional feature columns")
+
+
+def test_columnar_invalid_bodies():
+    """Malformed bodies and invalid departments are rejected with 400"""
+    client = app.test_client()
+    items = make_items(3)
+
+    bad_department = encode_numpy_columns({
+        'days_to_expiry': np.array([1, 2, 3]),
+        'dept_id': np.array(['FOODS_1', 'TOYS_1', 'FOODS_2']),
+        'date': np.array(['2024-01-15'] * 3, dtype='datetime64[D]')
+    })
+    missing_column = encode_numpy_columns({'days_to_expiry': np.array([1, 2, 3])})
+    # Same columns, but a header claiming a negative number of rows
+    body = numpy_body(items)
+    (header_length,) = struct.unpack_from('<I', body)
+    header = json.loads(body[4:4 + header_length])
+    header['n_rows'] = -3
+    header = json.dumps(header).encode()
+    negative_rows = struct.pack('<I', len(header)) + header + body[4 + header_length:]
+    try:
+        decode_numpy_columns(negative_rows)
+        assert False, 'expected a negative n_rows to be rejected'
+    except ValueError as e:
+        assert 'Invalid column header' in str(e)
+
+    for body, content_type in [(bad_department, NUMPY_COLUMNS_MIMETYPE),
+                               (missing_column, NUMPY_COLUMNS_MIMETYPE),
+                               (negative_rows, NUMPY_COLUMNS_MIMETYPE),
+                               (numpy_body(items)[:20], NUMPY_COLUMNS_MIMETYPE),
+                               (b'not arrow', ARROW_STREAM_MIMETYPE)]:
+        response = client.post('/predict/batch', data=body, content_type=content_type)
+        assert response.status_code == 400, response.get_json()
+        assert response.get_json()['status'] == 'error'
+    print("   ✅ Invalid bodies are rejected")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing columnar batch prediction")
+    print("=" * 60)
+    test_numpy_columns_round_trip()
+    test_numpy_columns_match_json()
+    test_arrow_stream_matches_json()
+    test_columnar_optional_features()
+    test_columnar_invalid_bodies()
+    print("\n🎉 All columnar batch tests passed!")
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Test script for the scalar prediction path
+Checks that predict_price, with and without its cache, gives the same price
+as predict_single for single items.
+"""
+
+import warnings
+from predict_expiry_price import ExpiryPricePredictor
+
+warnings.filterwarnings('ignore')
+
+CASES = [
+    (5, 'FOODS_1', '2024-01-15', {}),
+    (12, 'FOODS_2', '2024-12-30T10:30:00.000Z', {'city': 'CA_1', 'mrp': 99.99}),
+    (30, 'FOODS_3', '2025-03-02', {'has_event': 1, 'promo_impact': 0.1}),
+    (0, 'FOODS_1', '2024-02-29T23:59:00', {'price_trend': -0.4, 'sales_lag_1': 3}),
+    (365, 'FOODS_2', '2030-06-15', {'unit': 'grams', 'brand': 'Organic Brand'})
+]
+
+
+def test_fast_path_matches_predict_single():
+    """predict_price matches predict_single, on a cache miss and on a cache hit"""
+    for cache_size in (0, 64):
+        predictor = ExpiryPricePredictor(cache_size=cache_size)
+        for days, dept, date, features in CASES:
+            expected = predictor.predict_single(days, dept, date, **features)['predicted_price'].iloc[0]
+            for _ in range(2):
+                actual = predictor.predict_price(days, dept, date, **features)
+                assert isinstance(actual, float)
+                assert abs(actual - expected) < 1e-6, (dept, days, actual, expected)
+    assert predictor.predict_price(5, 'TOYS_1', '2024-01-15') is None
+    print(f"   ✅ Fast path matches predict_single for {len(CASES)} cases")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing scalar prediction path")
+    print("=" * 60)
+    test_fast_path_matches_predict_single()
+    print("\n🎉 All fast path tests passed!")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test script for the HTTP load test suite
+Checks reproducible request bodies, a short in-process run and the baseline comparison.
+"""
+
+import warnings
+from load_test import build_scenarios, compare, request_bodies, run_load_test
+
+warnings.filterwarnings('ignore')
+
+
+def summary(req_per_sec, p99_ms, errors=0):
+    """Minimal scenario summary for compare()"""
+    return {'req_per_sec': req_per_sec, 'p99_ms': p99_ms, 'errors': errors}
+
+
+def test_request_bodies_are_reproducible():
+    """The same seed gives the same traffic; another seed does not"""
+    scenarios = build_scenarios([5])
+    for name, (_, make_body, _) in scenarios.items():
+        first = request_bodies(name, make_body, 0, 2, 10)
+        assert first == request_bodies(name, make_body, 0, 2, 10), name
+        assert first != request_bodies(name, make_body, 1, 2, 10), name
+    print("   ✅ Request bodies are reproducible")
+
+
+def test_short_run_reports_every_scenario():
+    """Every scenario runs against the in-process app without errors"""
+    scenarios = build_scenarios([5])
+    results = run_load_test(scenarios, list(scenarios), clients=2, requests=20, warmup=2)
+
+    assert list(results) == ['predict', 'single', 'batch-5', 'analysis', 'save']
+    for name, result in results.items():
+        assert result['requests'] == 20 and result['errors'] == 0, (name, result)
+        assert 0 < result['p50_ms'] <= result['p95_ms'] <= result['p99_ms'] <= result['max_ms']
+    batch = results['batch-5']
+    assert abs(batch['rows_per_sec'] - batch['req_per_sec'] * 5) < 1e-9 * batch['rows_per_sec']
+    print("   ✅ Short run reports every scenario")
+
+
+def test_compare_flags_regressions():
+    """Slower p99, lower throughput and new errors beyond the tolerance are flagged"""
+    baseline = {'single': summary(1000, 5.0), 'batch-100': summary(50, 40.0), 'save': summary(400, 8.0)}
+    results = {
+        'single': summary(900, 5.9),        # within 20%
+        'batch-100': summary(35, 52.0),     # both worse than 20%
+        'save': summary(400, 8.0, errors=3),
+        'analysis': summary(10, 500.0)      # not in the baseline
+    }
+    regressions = compare(results, baseline, tolerance=0.2)
+    assert [(name, metric) for name, metric, _, _ in regressions] == [
+        ('batch-100', 'p99_ms'), ('batch-100', 'req_per_sec'), ('save', 'errors')
+    ]
+    assert compare(results, baseline, tolerance=0.5) == [('save', 'errors', 0, 3)]
+    print("   ✅ Baseline comparison flags regressions")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing load test suite")
+    print("=" * 60)
+    test_request_bodies_are_reproducible()
+    test_short_run_reports_every_scenario()
+    test_compare_flags_regressions()
+    print("\n🎉 All load test suite tests passed!")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for latency instrumentation and the /metrics endpoint
+Checks the exposition format, per-request stage breakdowns and the recorded counts.
+"""
+
+import warnings
+from starlette.testclient import TestClient
+from metrics import Metrics, metrics, start_trace, finish_trace, server_timing
+import app as api
+import async_app
+
+warnings.filterwarnings('ignore')
+
+ITEMS = [{'days_to_expiry': d, 'dept_id': f'FOODS_{d % 3 + 1}', 'date': '2024-01-15'} for d in range(30)]
+
+
+def parse_server_timing(header):
+    """Stage names from a Server-Timing header, in order"""
+    return [entry.split(';')[0].strip() for entry in header.split(',')]
+
+
+def test_exposition_format():
+    """Histograms render cumulative buckets, sum and count with escaped labels"""
+    registry = Metrics()
+    for seconds in (0.0004, 0.003, 0.003, 20.0):
+        registry.observe_request('/predict/batch', 'POST', 200, seconds)
+    registry.observe_model_call('FOODS_1', 'flat', 8, 0.0002)
+    registry.observe_stage('parse', 0.001, dept='a"b')
+
+    lines = registry.render().splitlines()
+    assert '# TYPE m5_request_duration_seconds histogram' in lines
+    series = 'endpoint="/predict/batch",method="POST",status="200"'
+    assert f'm5_request_duration_seconds_bucket{{{series},le="0.0005"}} 1' in lines
+    assert f'm5_request_duration_seconds_bucket{{{series},le="0.005"}} 3' in lines
+    assert f'm5_request_duration_seconds_bucket{{{series},le="10"}} 3' in lines
+    assert f'm5_request_duration_seconds_bucket{{{series},le="+Inf"}} 4' in lines
+    assert f'm5_request_duration_seconds_count{{{series}}} 4' in lines
+    assert 'm5_model_calls_total{dept="FOODS_1",engine="flat"} 1' in lines
+    assert 'm5_model_call_rows_bucket{dept="FOODS_1",engine="flat",le="8"} 1' in lines
+    assert 'm5_stage_duration_seconds_count{stage="parse",dept="a\\"b"} 1' in lines
+    print("   ✅ Exposition format")
+
+
+def test_disabled_registry_still_traces():
+    """With aggregation off nothing is recorded, but an active trace still collects stages"""
+    registry = Metrics(enabled=False)
+    token = start_trace()
+    registry.observe_stage('features', 0.001)
+    registry.observe_model_call('FOODS_2', 'xgboost', 100, 0.002)
+    trace = finish_trace(token)
+
+    assert [stage for stage, _, _ in trace] == ['features', 'model']
+    assert registry.stages.snapshot() == {} and registry.model_calls.snapshot() == {}
+    assert server_timing(trace, 0.005).endswith('total;dur=5.000')
+    print("   ✅ Disabled registry still traces")
+
+
+def test_stage_timing_header():
+    """Opt-in requests get a Server-Timing breakdown; others do not"""
+    client = api.app.test_client()
+
+    response = client.post('/predict/batch', json={'items': ITEMS}, headers={api.STAGE_TIMING_HEADER: '1'})
+    assert response.status_code == 200
+    stages = parse_server_timing(response.headers['Server-Timing'])
+    assert stages[0] == 'parse' and stages[-1] == 'total'
+    for stage in ('validate', 'prepare', 'features', 'model', 'format'):
+        assert stage in stages
+    assert stages.count('model') == 3  # one call per department
+
+    response = client.post('/predict/batch', json={'items': ITEMS})
+    assert 'Server-Timing' not in response.headers
+    print("   ✅ Stage timing header")
+
+
+def test_metrics_endpoint_counts():
+    """/metrics reflects requests, batch sizes and model calls"""
+    client = api.app.test_client()
+    before = metrics.model_calls.snapshot()
+    batches = metrics.batch_sizes.snapshot().get(('/predict/batch', 'json'), (0, 0))
+
+    client.post('/predict/batch', json={'items': ITEMS})
+    after = metrics.model_calls.snapshot()
+    engine = 'flat' if len(ITEMS) // 3 <= api.predictor.engine_max_rows else 'xgboost'
+    for dept in ('FOODS_1', 'FOODS_2', 'FOODS_3'):
+        assert after[(dept, engine)] == before.get((dept, engine), 0) + 1
+    count, total = metrics.batch_sizes.snapshot()[('/predict/batch', 'json')]
+    assert (count, total) == (batches[0] + 1, batches[1] + len(ITEMS))
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert 'm5_request_duration_seconds_count{endpoint="/predict/batch",method="POST",status="200"}' in body
+    assert 'm5_stage_duration_seconds_sum{stage="model",dept="FOODS_3"}' in body
+    print("   ✅ /metrics counts")
+
+
+def test_async_app_traces_executor_stages():
+    """The asyncio app carries the trace into the prediction threads and serves /metrics"""
+    with TestClient(async_app.app) as client:
+        response = client.post('/predict/batch', json={'items': ITEMS}, headers={api.STAGE_TIMING_HEADER: '1'})
+        stages = parse_server_timing(response.headers['server-timing'])
+        assert 'features' in stages and stages.count('model') == 3
+
+        body = client.get('/metrics').text
+        assert 'm5_request_duration_seconds_count{endpoint="/predict/batch",method="POST",status="200"}' in body
+    print("   ✅ Asyncio app traces executor stages")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing metrics")
+    print("=" * 60)
+    test_exposition_format()
+    test_disabled_registry_still_traces()
+    test_stage_timing_header()
+    test_metrics_endpoint_counts()
+    test_async_app_traces_executor_stages()
+    print("\n🎉 All metrics tests passed!")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for scaler fusion
+Checks that fused models match scaler + model and that the serving export is reused and rebuilt.
+"""
+
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+from predict_expiry_price import ExpiryPricePredictor
+from model_fusion import _raw_thresholds
+from model_store import export_path, prefixed, read_export, write_export
+
+warnings.filterwarnings('ignore')
+
+DEPARTMENTS = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+
+
+def copy_models():
+    """Copy the model files to a temporary directory so cache files stay out of Model/"""
+    model_dir = tempfile.mkdtemp() + '/'
+    for name in os.listdir('Model'):
+        if name.endswith('_optimized.pkl'):
+            shutil.copy(os.path.join('Model', name), model_dir)
+    return model_dir
+
+
+def test_fused_matches_unfused():
+    """Fused models on raw features match scaling + the original model"""
+    model_dir = copy_models()
+    fused = ExpiryPricePredictor(model_dir=model_dir)
+    unfused = ExpiryPricePredictor(model_dir=model_dir, fuse_scalers=False)
+
+    assert fused.fused_departments == DEPARTMENTS
+    assert unfused.fused_departments == []
+
+    for dept in DEPARTMENTS:
+        probe = fused._fusion_probe(dept)
+        expected = unfused.engines[dept].predict(unfused._scale_features(dept, probe))
+        np.testing.assert_array_equal(fused.engines[dept].predict(probe), expected)
+
+        # log1p values are not representable in float32, the fused float64 thresholds must still agree
+        for days in [1, 2, 7, 30, 365]:
+            assert fused.predict_price(days, dept, '2024-01-15') == unfused.predict_price(days, dept, '2024-01-15')
+    print("   ✅ Fused models match scaler + model")
+
+
+def test_raw_thresholds_without_overflow_warnings():
+    """Threshold search saturates far probes to inf silently and finds the smallest raw value"""
+    thresholds = np.array([0.5, -3.0, 1e30, 3e38], dtype=np.float32)
+    center = np.array([1.0, -2.0, 0.0, 5.0])
+    scale = np.array([1e-3, 2.0, 1e-3, 1e5])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        raw = _raw_thresholds(thresholds, center, scale)
+
+    def scaled(x):
+        return ((x - center) / scale).astype(np.float32)
+    assert np.all(scaled(raw) >= thresholds)
+    assert np.all(scaled(np.nextafter(raw, -np.inf)) < thresholds)
+    print("   ✅ Threshold search without overflow warnings")
+
+
+def test_serving_export_reused_and_rebuilt():
+    """The fused engine is stored in the serving export, rebuilt when a source changes and checked when reused"""
+    model_dir = copy_models()
+    ExpiryPricePredictor(model_dir=model_dir)
+    path = export_path(model_dir, 'FOODS_1')
+    assert os.path.exists(path)
+
+    arrays, attributes = read_export(path)
+    assert prefixed(arrays, 'fused')
+    fingerprint = attributes['fingerprint']
+
+    # An export with a stale fingerprint is replaced
+    write_export(path, arrays, fingerprint='stale')
+    ExpiryPricePredictor(model_dir=model_dir)
+    arrays, attributes = read_export(path)
+    assert attributes['fingerprint'] == fingerprint
+
+    # A reused export whose fused engine no longer matches scaler + model is refused
+    arrays = {name: np.array(value) for name, value in arrays.items()}
+    arrays['fused/leaf_value'] = arrays['fused/leaf_value'] + np.float32(0.05)
+    write_export(path, arrays, fingerprint=fingerprint)
+    try:
+        ExpiryPricePredictor(model_dir=model_dir)
+        assert False, 'expected the corrupted fused engine to be refused'
+    except ValueError as e:
+        assert 'Fused model for FOODS_1' in str(e)
+    print("   ✅ Serving export is reused and rebuilt")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing scaler fusion")
+    print("=" * 60)
+    test_fused_matches_unfused()
+    test_raw_thresholds_without_overflow_warnings()
+    test_serving_export_reused_and_rebuilt()
+    print("\n🎉 All scaler fusion tests passed!")
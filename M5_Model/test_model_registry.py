@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-store model registry
+Checks that a request's city selects its store model, fallback to the
+department model, LRU eviction by count and memory budget, preloading,
+concurrent first use and the counters.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+from predict_expiry_price import ExpiryPricePredictor
+from model_registry import ModelRegistry
+import app as api
+
+warnings.filterwarnings('ignore')
+
+# Store models made from the shipped department models: (dept, store) -> source department
+STORES = {('FOODS_1', 'CA_1'): 'FOODS_3', ('FOODS_1', 'TX_2'): 'FOODS_2', ('FOODS_2', 'CA_1'): 'FOODS_1'}
+
+
+def make_store_dir():
+    """Write store model files into a temporary directory"""
+    store_dir = tempfile.mkdtemp(prefix='m5_stores_') + '/'
+    for (dept, store), source in STORES.items():
+        for kind in ('model', 'scaler'):
+            shutil.copy(f"Model/{kind}_{source}_optimized.pkl", f"{store_dir}{kind}_{dept}_{store}_optimized.pkl")
+    return store_dir
+
+
+def test_city_selects_store_model():
+    """Stores with a model get its prices in every path; other cities get the department model"""
+    store_dir = make_store_dir()
+    try:
+        predictor = ExpiryPricePredictor(cache_size=0)
+        department = predictor.predict_price(5, 'FOODS_1', '2024-01-15')
+        predictor.store_models = ModelRegistry(predictor, store_dir)
+        assert predictor.store_models.refresh() == sorted(STORES)
+
+        # A FOODS_1 store model built from FOODS_3's files scores like a FOODS_3 model with FOODS_1's one-hot
+        x = predictor._build_feature_vector(5, 'FOODS_1', '2024-01-15', {})
+        ca_1 = float(predictor._predict_matrix('FOODS_3', x)[0])
+        assert predictor.predict_price(5, 'FOODS_1', '2024-01-15', city='CA_1') == ca_1 != department
+        assert predictor.predict_price(5, 'FOODS_1', '2024-01-15', city='WI_3') == department
+        assert predictor.predict_price(5, 'FOODS_1', '2024-01-15') == department
+
+        batch = pd.DataFrame({
+            'days_to_expiry': [5, 5, 5, 12, 40, 5],
+            'dept_id': ['FOODS_1', 'FOODS_1', 'FOODS_1', 'FOODS_2', 'FOODS_2', 'FOODS_3'],
+            'date': '2024-01-15',
+            'city': ['CA_1', 'TX_2', 'WI_3', 'CA_1', None, 'CA_1']
+        })
+        expected = [predictor.predict_price(d, dept, day, city=city)
+                    for d, dept, day, city in batch.itertuples(index=False)]
+        np.testing.assert_allclose(predictor.predict_batch(batch)['predicted_price'], expected, rtol=1e-6)
+        assert len(set(np.round(expected[:3], 6))) == 3
+    finally:
+        shutil.rmtree(store_dir)
+    print("   ✅ City selects the store model")
+
+
+def test_lru_eviction_and_budget():
+    """The least recently used model is evicted past max_models or the memory budget"""
+    store_dir = make_store_dir()
+    try:
+        predictor = ExpiryPricePredictor()
+        registry = ModelRegistry(predictor, store_dir, max_models=2)
+        assert registry.preload([('FOODS_1', 'CA_1'), ('FOODS_1', 'TX_2')]) == [('FOODS_1', 'CA_1'), ('FOODS_1', 'TX_2')]
+        registry.get('FOODS_1', 'CA_1')
+        registry.get('FOODS_2', 'CA_1')
+        assert registry.loaded() == [('FOODS_1', 'CA_1'), ('FOODS_2', 'CA_1')]
+        stats = registry.stats()
+        assert (stats['loads'], stats['hits'], stats['misses'], stats['evictions']) == (3, 1, 3, 1)
+        assert registry.get('FOODS_3', 'CA_1') is None
+
+        # A budget smaller than two models keeps only the latest one
+        tight = ModelRegistry(predictor, store_dir, memory_budget_mb=stats['memory_mb'] * 0.9)
+        assert len(tight.preload()) == len(STORES)
+        assert tight.loaded() == [sorted(STORES)[-1]]
+        assert tight.stats()['evictions'] == len(STORES) - 1
+        assert tight.stats()['memory_mb'] <= stats['memory_mb']
+    finally:
+        shutil.rmtree(store_dir)
+    print("   ✅ LRU eviction by count and memory budget")
+
+
+def test_budget_counts_boosters_loaded_later():
+    """A booster deserialized after its model loaded counts toward the memory budget"""
+    store_dir = make_store_dir()
+    try:
+        predictor = ExpiryPricePredictor(cache_size=0)
+        # Build the exports first, so the registries below load models without boosters
+        ModelRegistry(predictor, store_dir).preload()
+
+        pair = [('FOODS_1', 'CA_1'), ('FOODS_1', 'TX_2')]
+        registry = ModelRegistry(predictor, store_dir)
+        registry.preload(pair)
+        model_set = registry.get('FOODS_1', 'TX_2')
+        assert model_set.boosters.loaded() == []
+        before = registry.stats()['memory_mb']
+        model_set.boosters['FOODS_1']
+        grown = registry.stats()['memory_mb'] - before
+        assert abs(grown - model_set.boosters.loaded_bytes() / 2 ** 20) < 1e-9 and grown > 0
+
+        # Both models fit the budget until one deserializes its booster
+        tight = ModelRegistry(predictor, store_dir, memory_budget_mb=before + grown / 2)
+        tight.preload(pair)
+        assert tight.loaded() == pair
+        tight.get('FOODS_1', 'TX_2').boosters['FOODS_1']
+        assert tight.loaded() == [('FOODS_1', 'TX_2')] and tight.stats()['evictions'] == 1
+    finally:
+        shutil.rmtree(store_dir)
+    print("   ✅ Budget counts boosters loaded later")
+
+
+def test_concurrent_first_use_loads_once():
+    """Threads asking for the same cold model share one load"""
+    store_dir = make_store_dir()
+    try:
+        registry = ModelRegistry(ExpiryPricePredictor(), store_dir)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get('FOODS_1', 'TX_2')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 8 and all(result is results[0] for result in results)
+        assert registry.stats()['loads'] == 1
+    finally:
+        shutil.rmtree(store_dir)
+    print("   ✅ Concurrent first use loads once")
+
+
+def test_failed_load_falls_back():
+    """A store model that does not load is reported and served by the department model"""
+    store_dir = make_store_dir()
+    try:
+        predictor = ExpiryPricePredictor(cache_size=0)
+        department = predictor.predict_price(5, 'FOODS_1', '2024-01-15')
+        with open(f"{store_dir}model_FOODS_1_CA_1_optimized.pkl", 'wb') as f:
+            f.write(b'not a model')
+        predictor.store_models = ModelRegistry(predictor, store_dir)
+        assert predictor.predict_price(5, 'FOODS_1', '2024-01-15', city='CA_1') == department
+        assert predictor.predict_price(5, 'FOODS_1', '2024-01-15', city='CA_1') == department
+        assert predictor.store_models.stats()['load_failures'] == 1
+        assert ('FOODS_1', 'CA_1') not in predictor.store_models
+    finally:
+        shutil.rmtree(store_dir)
+    print("   ✅ Failed load falls back to the department model")
+
+
+def test_api_uses_store_models():
+    """/predict/single answers with the store model and /model/info reports the registry"""
+    store_dir = make_store_dir()
+    original = api.predictor.store_models
+    try:
+        api.predictor.store_models = ModelRegistry(api.predictor, store_dir)
+        client = api.app.test_client()
+        body = {'days_to_expiry': 7, 'dept_id': 'FOODS_1', 'date': '2024-01-15'}
+        prices = {city: client.post('/predict/single', json=dict(body, city=city)).get_json()['data']['predicted_price']
+                  for city in ('CA_1', 'TX_2', 'WI_1')}
+        assert prices['CA_1'] == api.predictor.predict_price(7, 'FOODS_1', '2024-01-15', city='CA_1')
+        assert len(set(prices.values())) == 3
+        info = client.get('/model/info').get_json()['data']['store_models']
+        assert info['available'] == len(STORES) and info['loaded'] == 2
+    finally:
+        api.predictor.store_models = original
+        shutil.rmtree(store_dir)
+    print("   ✅ API uses store models")
+
+
+def test_async_batch_uses_store_models():
+    """async_app's JSON /predict/batch scores each city with its store model, like the Flask app"""
+    from starlette.testclient import TestClient
+    import async_app
+    store_dir = make_store_dir()
+    original = api.predictor.store_models
+    try:
+        api.predictor.store_models = ModelRegistry(api.predictor, store_dir)
+        items = [{'days_to_expiry': 7, 'dept_id': 'FOODS_1', 'date': '2024-01-15', 'city': city}
+                 for city in ('CA_1', 'TX_2', 'WI_1')]
+        items.append({'days_to_expiry': 3, 'dept_id': 'FOODS_2', 'date': '2024-01-15'})
+        expected = api.app.test_client().post('/predict/batch', json={'items': items}).get_json()
+        with TestClient(async_app.app) as client:
+            got = client.post('/predict/batch', json={'items': items}).json()
+        assert got == expected
+        prices = [row['predicted_price'] for row in got['data']['predictions']]
+        assert prices[0] == api.predictor.predict_price(7, 'FOODS_1', '2024-01-15', city='CA_1')
+        assert len(set(prices[:3])) == 3
+    finally:
+        api.predictor.store_models = original
+        shutil.rmtree(store_dir)
+    print("   ✅ Async batches use store models")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing per-store model registry")
+    print("=" * 60)
+    test_city_selects_store_model()
+    test_lru_eviction_and_budget()
+    test_budget_counts_boosters_loaded_later()
+    test_concurrent_first_use_loads_once()
+    test_failed_load_falls_back()
+    test_api_uses_store_models()
+    test_async_batch_uses_store_models()
+    print("\n🎉 All model registry tests passed!")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test script for hot model reload
+Checks the atomic model set swap, failed reloads, the admin endpoint, the
+Model/ watcher, and that requests keep succeeding during a swap under load.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from datetime import date
+from predict_expiry_price import ExpiryPricePredictor
+from price_table import materialize
+from model_watcher import ModelWatcher
+import app as api
+
+warnings.filterwarnings('ignore')
+
+# Latency allowed while a reload runs: p99 within this factor of the steady-state p99
+# (or under the floor, whichever is larger), and no single request slower than the cap
+RELOAD_P99_FACTOR = 5
+RELOAD_P99_FLOOR_MS = 100
+RELOAD_MAX_MS = 2000
+
+ITEMS = [{'days_to_expiry': d, 'dept_id': f'FOODS_{d % 3 + 1}', 'date': '2024-01-15'} for d in range(30)]
+
+
+def make_model_dir():
+    """Copy the shipped models into a temporary model directory"""
+    model_dir = tempfile.mkdtemp(prefix='m5_models_') + '/'
+    for name in os.listdir('Model'):
+        shutil.copy(os.path.join('Model', name), model_dir)
+    return model_dir
+
+
+def deploy_retrained_model(model_dir):
+    """Replace FOODS_1's model files (with FOODS_3's) the way a deploy would: write, then rename"""
+    for kind in ('model', 'scaler'):
+        source = f"{model_dir}{kind}_FOODS_3_optimized.pkl"
+        target = f"{model_dir}{kind}_FOODS_1_optimized.pkl"
+        shutil.copy(source, target + '.tmp')
+        os.replace(target + '.tmp', target)
+
+
+def test_reload_swaps_models_and_version():
+    """reload_models loads the new files, changes the version, detaches the price table and serves the new predictions"""
+    model_dir = make_model_dir()
+    try:
+        predictor = ExpiryPricePredictor(model_dir=model_dir)
+        old_version = predictor.model_version
+        old_set = predictor.model_set
+        old_price = predictor.predict_price(5, 'FOODS_1', '2024-01-15')
+        predictor.price_table = materialize(predictor, date(2024, 1, 1), date(2024, 1, 31), max_days=10)
+        assert abs(predictor.predict_price(5, 'FOODS_1', '2024-01-15') - old_price) < 1e-5
+
+        deploy_retrained_model(model_dir)
+        result = predictor.reload_models()
+        assert result['previous_version'] == old_version
+        assert result['version'] == predictor.model_version != old_version
+        assert predictor.get_model_info()['model_version'] == result['version']
+
+        # The old models' price table no longer answers single predictions
+        assert predictor.price_table is None
+        new_price = predictor.predict_price(5, 'FOODS_1', '2024-01-15')
+        assert new_price != old_price
+        assert new_price == ExpiryPricePredictor(model_dir=model_dir, cache_size=0).predict_price(
+            5, 'FOODS_1', '2024-01-15')
+
+        # A caller still holding the old set keeps getting the old model's answers
+        x = predictor._build_feature_vector(5, 'FOODS_1', '2024-01-15', {})
+        assert float(predictor._predict_matrix('FOODS_1', x, old_set)[0]) == old_price
+    finally:
+        shutil.rmtree(model_dir)
+    print("   ✅ Reload swaps models and version")
+
+
+def test_failed_reload_keeps_current_models():
+    """A model file that does not load leaves the current set in place"""
+    model_dir = make_model_dir()
+    try:
+        predictor = ExpiryPricePredictor(model_dir=model_dir)
+        version = predictor.model_version
+        price = predictor.predict_price(9, 'FOODS_2', '2024-03-01')
+
+        with open(f"{model_dir}model_FOODS_2_optimized.pkl", 'wb') as f:
+            f.write(b'not a model')
+        try:
+            predictor.reload_models()
+            assert False, 'reload should fail'
+        except Exception:
+            pass
+        assert predictor.model_version == version
+        assert predictor.predict_price(9, 'FOODS_2', '2024-03-01') == price
+    finally:
+        shutil.rmtree(model_dir)
+    print("   ✅ Failed reload keeps the current models")
+
+
+def test_reload_endpoint_and_token():
+    """POST /model/reload reports the version shown by /health and /model/info"""
+    client = api.app.test_client()
+    original = api.MODEL_RELOAD_TOKEN
+    try:
+        api.MODEL_RELOAD_TOKEN = 'secret'
+        assert client.post('/model/reload').status_code == 403
+        response = client.post('/model/reload', headers={'X-Reload-Token': 'secret'})
+        assert response.status_code == 200
+        version = response.get_json()['data']['version']
+    finally:
+        api.MODEL_RELOAD_TOKEN = original
+
+    assert client.get('/health').get_json()['model_version'] == version
+    assert client.get('/model/info').get_json()['data']['model_version'] == version
+    print("   ✅ Reload endpoint and token")
+
+
+def test_watcher_reloads_changed_files():
+    """The watcher picks up rewritten model files and reloads once"""
+    model_dir = make_model_dir()
+    try:
+        predictor = ExpiryPricePredictor(model_dir=model_dir)
+        version = predictor.model_version
+        watcher = ModelWatcher(predictor, interval=0.1).start()
+        try:
+            time.sleep(0.3)
+            deploy_retrained_model(model_dir)
+            deadline = time.time() + 60
+            while predictor.model_version == version and time.time() < deadline:
+                time.sleep(0.1)
+            time.sleep(0.5)
+        finally:
+            watcher.stop()
+        assert predictor.model_version != version
+        assert watcher.stats() == {'interval': 0.1, 'reloads': 1, 'failures': 0}
+    finally:
+        shutil.rmtree(model_dir)
+    print("   ✅ Watcher reloads changed files")
+
+
+def test_swap_under_concurrent_load():
+    """Requests running across a reload all succeed, each on one model set, without latency spikes"""
+    model_dir = make_model_dir()
+    original = api.predictor
+    try:
+        predictor = ExpiryPricePredictor(model_dir=model_dir)
+        api.predictor = predictor
+        batch = pd.DataFrame(ITEMS)
+        old_prices = predictor.predict_batch(batch)['predicted_price'].tolist()
+
+        stop = threading.Event()
+        results = []
+        lock = threading.Lock()
+
+        def client_loop():
+            client = api.app.test_client()
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = client.post('/predict/batch', json={'items': ITEMS})
+                elapsed = time.perf_counter() - start
+                prices = [item['predicted_price'] for item in response.get_json()['data']['predictions']] \
+                    if response.status_code == 200 else None
+                with lock:
+                    results.append((start, elapsed, response.status_code, prices))
+
+        threads = [threading.Thread(target=client_loop) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(1.0)
+        reload_started = time.perf_counter()
+        deploy_retrained_model(model_dir)
+        response = api.app.test_client().post('/model/reload')
+        reload_finished = time.perf_counter()
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        assert response.status_code == 200
+        new_prices = predictor.predict_batch(batch)['predicted_price'].tolist()
+        assert new_prices != old_prices
+
+        # Every request succeeded and saw exactly one model set
+        assert all(status == 200 for _, _, status, _ in results)
+        assert all(prices in (old_prices, new_prices) for _, _, _, prices in results)
+        assert any(prices == new_prices for _, _, _, prices in results)
+
+        steady = np.array([elapsed for start, elapsed, _, _ in results if start + elapsed < reload_started]) * 1000
+        during = np.array([elapsed for start, elapsed, _, _ in results
+                           if start < reload_finished and start + elapsed > reload_started]) * 1000
+        limit = max(RELOAD_P99_FLOOR_MS, RELOAD_P99_FACTOR * np.percentile(steady, 99))
+        assert np.percentile(during, 99) < limit, (np.percentile(during, 99), limit)
+        assert during.max() < RELOAD_MAX_MS
+        print(f"   ✅ {len(results)} requests across the swap, p99 {np.percentile(steady, 99):.1f} ms steady, "
+              f"{np.percentile(during, 99):.1f} ms during reload ({reload_finished - reload_started:.2f} s)")
+    finally:
+        api.predictor = original
+        shutil.rmtree(model_dir)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing hot model reload")
+    print("=" * 60)
+    test_reload_swaps_models_and_version()
+    test_failed_reload_keeps_current_models()
+    test_reload_endpoint_and_token()
+    test_watcher_reloads_changed_files()
+    test_swap_under_concurrent_load()
+    print("\n🎉 All model reload tests passed!")
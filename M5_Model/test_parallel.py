@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for parallel batch scoring
+Checks that pooled predictions match in-process ones in input order, that
+workers limit XGBoost's threads, follow model reloads, and that small or
+per-store batches stay in-process.
+"""
+
+import glob
+import json
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+import parallel
+from parallel import ParallelScorer
+from predict_expiry_price import ExpiryPricePredictor
+
+warnings.filterwarnings('ignore')
+
+
+def make_batch(n_rows, seed=0):
+    """Random batch with every department, an unknown one and optional features"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'days_to_expiry': rng.integers(0, 60, n_rows),
+        'dept_id': rng.choice(['FOODS_1', 'FOODS_2', 'FOODS_3', 'TOYS_1'], n_rows),
+        'date': rng.choice(['2024-01-15', '2024-02-29', '2024-07-04', '2024-12-31'], n_rows),
+        'sell_price': rng.uniform(1, 20, n_rows)
+    })
+
+
+def booster_threads():
+    """nthread of a worker's FOODS_1 booster (runs in the worker)"""
+    config = json.loads(parallel._worker.models['FOODS_1'].save_config())
+    return int(config['learner']['generic_param']['nthread'])
+
+
+def test_parallel_matches_serial():
+    """Pooled predictions equal in-process ones, in input order, NaN for unknown departments"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    batch = make_batch(5000)
+    expected = predictor.predict_batch(batch)['predicted_price'].to_numpy()
+
+    scorer = ParallelScorer(predictor, workers=2, min_rows=1000, chunk_rows=700)
+    predictor.parallel = scorer
+    try:
+        actual = predictor.predict_batch(batch)['predicted_price'].to_numpy()
+        np.testing.assert_allclose(actual, expected, rtol=1e-6)
+        assert np.isnan(actual[batch['dept_id'].to_numpy() == 'TOYS_1']).all()
+
+        # Integer department codes take the same path
+        codes = batch['dept_id'].map({'FOODS_1': 0, 'FOODS_2': 1, 'FOODS_3': 2}).fillna(0).astype(int).to_numpy()
+        dates = batch['date'].to_numpy().astype('datetime64[D]')
+        pooled = predictor.predict_columns(batch['days_to_expiry'].to_numpy(), codes, dates)
+        predictor.parallel = None
+        np.testing.assert_allclose(pooled, predictor.predict_columns(batch['days_to_expiry'].to_numpy(), codes, dates),
+                                   rtol=1e-6)
+
+        stats = scorer.stats()
+        assert (stats['batches'], stats['rows']) == (2, 10000)
+        assert stats['chunks'] >= 10
+    finally:
+        scorer.close()
+    print("   ✅ Parallel predictions match in-process ones")
+
+
+def test_workers_limit_threads():
+    """Each worker gives XGBoost its share of the cores"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    scorer = ParallelScorer(predictor, workers=2).start()
+    try:
+        threads = [future.result() for future in [scorer._pool.submit(booster_threads) for _ in range(4)]]
+        assert threads == [scorer.threads] * 4
+        assert scorer.threads == max(1, len(os.sched_getaffinity(0)) // 2)
+    finally:
+        scorer.close()
+    print("   ✅ Workers limit XGBoost threads")
+
+
+def test_workers_follow_reload():
+    """After the parent reloads changed model files, the pool scores with the new models"""
+    model_dir = tempfile.mkdtemp(prefix='m5_models_') + '/'
+    for path in glob.glob('Model/*_optimized.pkl'):
+        shutil.copy(path, model_dir)
+    try:
+        predictor = ExpiryPricePredictor(model_dir=model_dir, cache_size=0)
+        predictor.parallel = ParallelScorer(predictor, workers=1, min_rows=100)
+        batch = make_batch(500, seed=1)
+        before = predictor.predict_batch(batch)['predicted_price'].to_numpy()
+
+        for kind in ('model', 'scaler'):
+            shutil.copy(f"Model/{kind}_FOODS_3_optimized.pkl", f"{model_dir}{kind}_FOODS_1_optimized.pkl")
+        predictor.reload_models()
+        after = predictor.predict_batch(batch)['predicted_price'].to_numpy()
+
+        scorer, predictor.parallel = predictor.parallel, None
+        scorer.close()
+        np.testing.assert_allclose(after, predictor.predict_batch(batch)['predicted_price'].to_numpy(), rtol=1e-6)
+        foods_1 = batch['dept_id'].to_numpy() == 'FOODS_1'
+        assert not np.allclose(before[foods_1], after[foods_1])
+    finally:
+        shutil.rmtree(model_dir)
+    print("   ✅ Workers follow model reloads")
+
+
+def test_small_and_store_batches_stay_in_process():
+    """Batches under min_rows, or with a store column and store models, do not use the pool"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    scorer = ParallelScorer(predictor, workers=2, min_rows=1000)
+    predictor.parallel = scorer
+    predictor.predict_batch(make_batch(999))
+    assert predictor._use_parallel(1000, None)
+    predictor.store_models = object()
+    assert not predictor._use_parallel(1000, np.array(['CA_1'] * 1000))
+    assert predictor._use_parallel(1000, None)
+    assert scorer._pool is None and scorer.stats()['batches'] == 0
+    print("   ✅ Small and per-store batches stay in-process")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing parallel batch scoring")
+    print("=" * 60)
+    test_parallel_matches_serial()
+    test_workers_limit_threads()
+    test_workers_follow_reload()
+    test_small_and_store_batches_stay_in_process()
+    print("\n🎉 All parallel scoring tests passed!")
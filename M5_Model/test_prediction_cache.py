@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the prediction cache
+Checks LRU eviction, TTL expiry, counters and invalidation on model reload.
+"""
+
+import time
+import warnings
+from prediction_cache import PredictionCache
+from predict_expiry_price import ExpiryPricePredictor
+
+warnings.filterwarnings('ignore')
+
+
+def test_lru_eviction():
+    """The least recently used entry is evicted first"""
+    cache = PredictionCache(maxsize=2, ttl=None)
+    cache.put('a', 1.0)
+    cache.put('b', 2.0)
+    assert cache.get('a') == 1.0
+    cache.put('c', 3.0)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1.0
+    assert cache.get('c') == 3.0
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1
+    print("   ✅ LRU eviction")
+
+
+def test_ttl_expiry():
+    """Entries older than the TTL are treated as misses"""
+    cache = PredictionCache(maxsize=10, ttl=0.05)
+    cache.put('a', 1.0)
+    assert cache.get('a') == 1.0
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+    print("   ✅ TTL expiry")
+
+
+def test_predictor_cache_hits_and_reload():
+    """predict_price reuses entries for the same feature vector and forgets them on reload"""
+    predictor = ExpiryPricePredictor()
+    first = predictor.predict_price(5, 'FOODS_1', '2024-01-15')
+
+    # City and other ignored fields do not change the feature vector
+    second = predictor.predict_price(5, 'FOODS_1', '2024-01-15', city='CA_2', mrp=10.0)
+    assert second == first
+    assert predictor.cache.stats()['hits'] == 1
+
+    # A different feature value is a different entry
+    predictor.predict_price(5, 'FOODS_1', '2024-01-15', has_event=1)
+    assert predictor.cache.stats()['misses'] == 2
+
+    predictor._load_models()
+    assert predictor.cache.stats()['size'] == 0
+    assert predictor.predict_price(5, 'FOODS_1', '2024-01-15') == first
+    print("   ✅ Predictor cache hits and reload invalidation")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing prediction cache")
+    print("=" * 60)
+    test_lru_eviction()
+    test_ttl_expiry()
+    test_predictor_cache_hits_and_reload()
+    print("\n🎉 All prediction cache tests passed!")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Test script for the prediction history queries
+Runs against mongomock, so no MongoDB server is needed. Checks the filters,
+that keyset pages cover a collection exactly once while it is written to,
+the daily averages, and the endpoints in JSON and NDJSON.
+"""
+
+import json
+import warnings
+from datetime import datetime, timedelta
+import mongomock
+import numpy as np
+import pandas as pd
+import app as api
+from prediction_history import DailyAverages, HistoryPage, build_query, ensure_indexes, stream_json
+
+warnings.filterwarnings('ignore')
+
+
+def make_history(n_docs, seed=0):
+    """Saved predictions with repeated timestamps, some dates with a time part and some without a city"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 6, 1, 9, 0)
+    docs = []
+    for i in range(n_docs):
+        doc = {
+            'days_to_expiry': int(rng.integers(0, 30)),
+            'dept_id': str(rng.choice(['FOODS_1', 'FOODS_2', 'FOODS_3'])),
+            'date': f"2024-01-{int(rng.integers(10, 20))}" + ('T18:30:00' if i % 4 == 0 else ''),
+            'predicted_price': float(rng.uniform(0.1, 0.9)),
+            # Several documents share each timestamp
+            'timestamp': start + timedelta(seconds=i // 5)
+        }
+        if i % 7:
+            doc['city'] = str(rng.choice(['CA_1', 'TX_2']))
+        docs.append(doc)
+    return docs
+
+
+def read(result):
+    """Decode a streamed JSON result"""
+    return json.loads(b''.join(stream_json(result)))
+
+
+def test_query_filters():
+    """Each filter selects the documents it describes; bad values are rejected"""
+    collection = mongomock.MongoClient().db.predictions
+    docs = make_history(600)
+    collection.insert_many([dict(doc) for doc in docs])
+    frame = pd.DataFrame(docs)
+
+    query = build_query({'dept_id': 'FOODS_1, FOODS_3', 'city': 'CA_1', 'start_date': '2024-01-12',
+                         'end_date': '2024-01-15', 'min_days_to_expiry': '5', 'max_days_to_expiry': '20'})
+    day = frame['date'].str[:10]
+    expected = frame[frame['dept_id'].isin(['FOODS_1', 'FOODS_3']) & (frame['city'] == 'CA_1') &
+                     (day >= '2024-01-12') & (day <= '2024-01-15') & frame['days_to_expiry'].between(5, 20)]
+    assert collection.count_documents(query) == len(expected) > 0
+
+    query = build_query({'days_to_expiry': '3', 'since': '2024-06-01T09:00:10', 'until': '2024-06-01T09:00:50'})
+    expected = frame[(frame['days_to_expiry'] == 3) & (frame['timestamp'] >= datetime(2024, 6, 1, 9, 0, 10)) &
+                     (frame['timestamp'] < datetime(2024, 6, 1, 9, 0, 50))]
+    assert collection.count_documents(query) == len(expected) > 0
+    assert build_query({}) == {}
+
+    for args in ({'start_date': 'yesterday'}, {'until': '2024-13-01'}, {'days_to_expiry': 'five'}):
+        try:
+            build_query(args)
+            assert False, f"Expected {args} to be rejected"
+        except ValueError:
+            pass
+    print("   ✅ Filters select the right documents")
+
+
+def test_pages_cover_collection_once():
+    """Pages follow each other without gaps or repeats, even with new documents saved meanwhile"""
+    collection = mongomock.MongoClient().db.predictions
+    ensure_indexes(collection)
+    assert {'dept_city_recent', 'dept_city_date', 'recent'} <= set(collection.index_information())
+    docs = make_history(500, seed=1)
+    collection.insert_many([dict(doc) for doc in docs])
+
+    query = build_query({'dept_id': 'FOODS_2'})
+    seen = []
+    cursor = None
+    while True:
+        page = HistoryPage(collection, query, limit=30, cursor=cursor, batch_size=8)
+        chunks = list(stream_json(page))
+        data = json.loads(b''.join(chunks))
+        assert data['status'] == 'success' and data['count'] == len(data['data']) <= 30
+        if data['count'] > 8:
+            # One chunk per batch of documents, besides the opening and the summary
+            assert len(chunks) == 2 + -(-data['count'] // 8)
+        seen.extend(data['data'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+        # A newer prediction saved while paging belongs before the first page, not in a later one
+        collection.insert_one({'dept_id': 'FOODS_2', 'days_to_expiry': 1, 'date': '2024-01-15',
+                               'predicted_price': 0.5, 'timestamp': datetime(2024, 6, 2)})
+
+    expected = [doc for doc in docs if doc['dept_id'] == 'FOODS_2']
+    assert len(seen) == len({record['id'] for record in seen}) == len(expected)
+    keys = [(record['timestamp'], record['id']) for record in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert seen[0]['timestamp'] == max(doc['timestamp'] for doc in expected).isoformat()
+
+    try:
+        HistoryPage(collection, query, cursor='not-a-cursor')
+        assert False, "Expected an invalid cursor to be rejected"
+    except ValueError:
+        pass
+    print("   ✅ Pages cover the collection exactly once")
+
+
+def test_daily_averages():
+    """Averages per department and prediction day match pandas, ordered by day"""
+    collection = mongomock.MongoClient().db.predictions
+    docs = make_history(800, seed=2)
+    collection.insert_many([dict(doc) for doc in docs])
+
+    frame = pd.DataFrame(docs)
+    frame = frame[frame['city'] == 'TX_2']
+    expected = (frame.assign(day=frame['date'].str[:10])
+                .groupby(['day', 'dept_id'])['predicted_price'].agg(['mean', 'min', 'max', 'count']))
+
+    data = read(DailyAverages(collection, build_query({'city': 'TX_2'}), batch_size=7))
+    assert data['count'] == len(data['data']) == len(expected)
+    assert [(row['day'], row['dept_id']) for row in data['data']] == list(expected.index)
+    np.testing.assert_allclose([row['avg_price'] for row in data['data']], expected['mean'])
+    np.testing.assert_allclose([row['max_price'] for row in data['data']], expected['max'])
+    assert [row['count'] for row in data['data']] == list(expected['count'])
+    print("   ✅ Daily averages match pandas")
+
+
+class FailingCollection:
+    """Collection whose cursor fails after its first documents"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, query):
+        return FailingCursor(self.collection.find(query))
+
+
+class FailingCursor:
+    """Cursor stand-in raising a connection error on its sixth document"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args):
+        self.cursor = self.cursor.sort(*args)
+        return self
+
+    def limit(self, n):
+        self.cursor = self.cursor.limit(n)
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        for i, doc in enumerate(self.cursor):
+            if i == 5:
+                raise ConnectionError('connection reset')
+            yield doc
+
+
+def test_endpoints():
+    """The endpoints stream JSON or NDJSON, follow cursors and report bad parameters and failures"""
+    db = mongomock.MongoClient().db
+    original_db, original_buffer, original_batch_size = api.mongo.db, api.write_buffer, api.HISTORY_BATCH_SIZE
+    api.mongo.db, api.write_buffer = db, None
+    try:
+        client = api.app.test_client()
+        for days in (3, 5, 8):
+            for city in ('CA_1', 'WI_2'):
+                response = client.post('/save-prediction', json={
+                    'days_to_expiry': days, 'dept_id': 'FOODS_1', 'date': '2024-01-15', 'city': city})
+                assert response.status_code == 200
+        db.predictions.insert_many([dict(doc) for doc in make_history(300, seed=3)])
+
+        response = client.get('/predictions/history?dept_id=FOODS_1&city=CA_1&end_date=2024-01-15&limit=2')
+        assert response.status_code == 200 and response.mimetype == 'application/json'
+        first = response.get_json()
+        assert first['count'] == 2 and first['next_cursor']
+        # The saved predictions are the newest, most recent first
+        assert [record['days_to_expiry'] for record in first['data']] == [8, 5]
+        assert all(record['city'] == 'CA_1' and record['date'] == '2024-01-15' for record in first['data'])
+
+        response = client.get('/predictions/history?dept_id=FOODS_1&city=CA_1&end_date=2024-01-15&limit=2'
+                              f"&cursor={first['next_cursor']}", headers={'Accept': 'application/x-ndjson'})
+        assert response.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert lines[0]['days_to_expiry'] == 3 and 'timestamp' not in lines[-1]
+        assert lines[-1]['status'] == 'success' and lines[-1]['count'] == len(lines) - 1 == 2
+
+        response = client.get('/predictions/daily-average?dept_id=FOODS_1&start_date=2024-01-15&end_date=2024-01-15')
+        data = response.get_json()
+        prices = [doc['predicted_price'] for doc in db.predictions.find(
+            {'dept_id': 'FOODS_1', 'date': {'$gte': '2024-01-15', '$lt': '2024-01-16'}})]
+        assert data['count'] == 1 and data['data'][0]['count'] == len(prices) > 6
+        assert abs(data['data'][0]['avg_price'] - np.mean(prices)) < 1e-9
+
+        for query in ('limit=0', 'since=noon', 'cursor=abc'):
+            response = client.get(f'/predictions/history?{query}')
+            assert response.status_code == 400 and response.get_json()['status'] == 'error'
+
+        # A failure part way ends the stream, after the batches already sent, with an error status
+        api.mongo.db = type('Database', (), {'predictions': FailingCollection(db.predictions)})()
+        api.HISTORY_BATCH_SIZE = 2
+        data = client.get('/predictions/history').get_json()
+        assert data['status'] == 'error' and 'connection reset' in data['message'] and len(data['data']) == 4
+    finally:
+        api.mongo.db, api.write_buffer = original_db, original_buffer
+        api.HISTORY_BATCH_SIZE = original_batch_size
+    print("   ✅ Endpoints stream history")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing prediction history queries")
+    print("=" * 60)
+    test_query_filters()
+    test_pages_cover_collection_once()
+    test_daily_averages()
+    test_endpoints()
+    print("\n🎉 All prediction history tests passed!")
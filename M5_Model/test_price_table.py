@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for the precomputed price table
+Checks materialization, memory-mapped loading and the predictor's table/model fallback.
+"""
+
+import tempfile
+import warnings
+import numpy as np
+from datetime import date
+from predict_expiry_price import ExpiryPricePredictor
+from price_table import PriceTable, materialize, check
+
+warnings.filterwarnings('ignore')
+
+
+def build_table():
+    """Materialize a small table and load it back memory-mapped"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    table = materialize(predictor, date(2024, 1, 1), date(2024, 1, 21), max_days=30)
+    path = tempfile.mkdtemp() + '/price_table'
+    table.save(path)
+    return predictor, PriceTable.load(path)
+
+
+def test_table_matches_live_predictions():
+    """Every sampled table entry matches predict_price"""
+    predictor, table = build_table()
+    assert isinstance(table.prices, np.memmap)
+    assert table.info()['end_date'] == '2024-01-21'
+
+    result = check(predictor, table, samples=300)
+    assert result['mismatches'] == 0, result
+    print(f"   ✅ Table matches live predictions (max diff {result['max_abs_diff']:.2e})")
+
+
+def test_predictor_uses_table_and_falls_back():
+    """Default-feature items come from the table, anything else from the model"""
+    predictor, table = build_table()
+    live = {
+        'covered': predictor.predict_price(5, 'FOODS_2', '2024-01-10', city='CA_1'),
+        'promo': predictor.predict_price(5, 'FOODS_2', '2024-01-10', promo_impact=0.5),
+        'outside': predictor.predict_price(5, 'FOODS_2', '2024-03-01')
+    }
+
+    # Poison the table so table answers are recognizable
+    table.prices = np.full(table.prices.shape, -99.0, dtype=np.float32)
+    predictor.price_table = table
+
+    assert predictor.predict_price(5, 'FOODS_2', '2024-01-10', city='CA_1') == -99.0
+    assert predictor.predict_price(5, 'FOODS_2', '2024-01-10', has_event=1) == -99.0
+    assert predictor.predict_price(5, 'FOODS_2', '2024-01-10', promo_impact=0.5) == live['promo']
+    assert predictor.predict_price(5, 'FOODS_2', '2024-03-01') == live['outside']
+    assert predictor.predict_price(45, 'FOODS_2', '2024-01-10') != -99.0
+    assert live['covered'] != -99.0
+    print("   ✅ Predictor uses the table and falls back to the model")
+
+
+def test_load_refuses_other_model_versions():
+    """A table only loads for the model version it was computed with"""
+    predictor = ExpiryPricePredictor(cache_size=0)
+    table = materialize(predictor, date(2024, 1, 1), date(2024, 1, 7), max_days=10)
+    assert table.info()['model_version'] == predictor.model_version
+    path = tempfile.mkdtemp() + '/price_table'
+    table.save(path)
+
+    assert PriceTable.load(path, model_version=predictor.model_version).model_version == predictor.model_version
+    try:
+        PriceTable.load(path, model_version='0123456789ab')
+        assert False, "Expected a table from other models to be refused"
+    except ValueError as e:
+        assert 'materialize it again' in str(e)
+    print("   ✅ Tables from other model versions are refused")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing price lookup table")
+    print("=" * 60)
+    test_table_matches_live_predictions()
+    test_predictor_uses_table_and_falls_back()
+    test_load_refuses_other_model_versions()
+    print("\n🎉 All price table tests passed!")
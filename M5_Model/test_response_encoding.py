@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script for response encoding
+Checks the row and column orientations of batch and analysis responses, NaN
+handling, that the orjson and standard library encoders agree, and the
+?orient query parameter on both APIs.
+"""
+
+import json
+import warnings
+import numpy as np
+from starlette.testclient import TestClient
+import response_encoding
+from response_encoding import analysis_data, batch_data, dumps, parse_orient
+import app as flask_api
+import async_app
+
+warnings.filterwarnings('ignore')
+
+ITEMS = [{'days_to_expiry': d, 'dept_id': f'FOODS_{d % 3 + 1}', 'date': '2024-01-15'} for d in range(25)]
+
+
+def columns_to_rows(columns):
+    """Turn a columns payload back into row objects"""
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def test_rows_and_columns_equivalent():
+    """Both orientations carry the same values, with predicted_price after date"""
+    columns = {
+        'days_to_expiry': np.array([1, 5, 9]),
+        'dept_id': np.array(['FOODS_1', 'FOODS_2', 'FOODS_3'], dtype=object),
+        'date': ['2024-01-15'] * 3,
+        'city': ['CA_1', 'TX_2', 'WI_3']
+    }
+    prices = np.array([0.5, 0.25, 0.125])
+    rows = json.loads(dumps(batch_data(columns, prices, 'rows')))
+    cols = json.loads(dumps(batch_data(columns, prices, 'columns')))
+
+    assert rows['total_items'] == cols['total_items'] == 3
+    assert list(cols['columns']) == ['days_to_expiry', 'dept_id', 'date', 'predicted_price', 'city']
+    assert rows['predictions'] == columns_to_rows(cols['columns'])
+    assert rows['predictions'][1] == {'days_to_expiry': 5, 'dept_id': 'FOODS_2', 'date': '2024-01-15',
+                                      'predicted_price': 0.25, 'city': 'TX_2'}
+
+    analysis = json.loads(dumps(analysis_data('FOODS_1', '2024-01-15', np.arange(1, 4), prices, 'columns')))
+    assert analysis['columns'] == {'days_to_expiry': [1, 2, 3], 'predicted_price': [0.5, 0.25, 0.125]}
+    assert analysis['total_days'] == 3
+    print("   ✅ Row and column orientations are equivalent")
+
+
+def test_nan_encoded_as_null():
+    """Rows that could not be predicted come out as null in both orientations and both encoders"""
+    columns = {'days_to_expiry': np.array([1, 2]), 'dept_id': ['FOODS_1', 'FOODS_9'], 'date': ['2024-01-15'] * 2}
+    prices = np.array([0.5, np.nan])
+    original = response_encoding.orjson
+    try:
+        for backend in (original, None):
+            response_encoding.orjson = backend
+            for orient in ('rows', 'columns'):
+                encoded = dumps(batch_data(columns, prices, orient))
+                assert b'NaN' not in encoded
+                data = json.loads(encoded)
+                values = data['columns']['predicted_price'] if orient == 'columns' else \
+                    [item['predicted_price'] for item in data['predictions']]
+                assert values == [0.5, None]
+    finally:
+        response_encoding.orjson = original
+    print("   ✅ NaN is encoded as null")
+
+
+def test_backends_agree():
+    """orjson and the standard library encoder produce the same JSON"""
+    if response_encoding.orjson is None:
+        print("   ⚠️ orjson not installed, skipping")
+        return
+    rng = np.random.default_rng(0)
+    payload = {
+        'status': 'success',
+        'data': {
+            'prices': rng.random((2, 3, 4)),
+            'days': np.arange(4),
+            'codes': np.arange(3, dtype=np.uint8),
+            'scalar': np.float32(0.5),
+            'names': np.array(['FOODS_1', 'FOODS_2']),
+            'nested': {'values': [1, 2.5, None, 'x']}
+        }
+    }
+    fast = dumps(payload)
+    original = response_encoding.orjson
+    try:
+        response_encoding.orjson = None
+        slow = dumps(payload)
+    finally:
+        response_encoding.orjson = original
+    assert json.loads(fast) == json.loads(slow)
+    assert json.loads(fast)['data']['names'] == ['FOODS_1', 'FOODS_2']
+    print("   ✅ orjson and stdlib encoders agree")
+
+
+def test_orient_parameter():
+    """?orient selects the layout on /predict/batch and /predict/analysis; unknown values are rejected"""
+    assert parse_orient(None) == 'rows'
+    assert parse_orient('columns') == 'columns'
+
+    client = flask_api.app.test_client()
+    rows = client.post('/predict/batch', json={'items': ITEMS})
+    cols = client.post('/predict/batch?orient=columns', json={'items': ITEMS})
+    assert rows.status_code == cols.status_code == 200
+    assert rows.mimetype == 'application/json'
+    assert rows.get_json()['data']['predictions'] == columns_to_rows(cols.get_json()['data']['columns'])
+
+    body = {'dept_id': 'FOODS_2', 'date': '2024-01-15', 'max_days': 10}
+    analysis = client.post('/predict/analysis', json=body).get_json()['data']
+    columns = client.post('/predict/analysis?orient=columns', json=body).get_json()['data']
+    assert analysis['analysis'] == columns_to_rows(columns['columns'])
+
+    response = client.post('/predict/batch?orient=diagonal', json={'items': ITEMS})
+    assert response.status_code == 400
+    assert 'orient' in response.get_json()['message']
+    assert client.post('/predict/analysis?orient=diagonal', json=body).status_code == 400
+    print("   ✅ orient parameter")
+
+
+def test_async_orient_matches_flask():
+    """The asyncio API answers ?orient=columns like the Flask app"""
+    flask_client = flask_api.app.test_client()
+    items = ITEMS + [{'days_to_expiry': 3, 'dept_id': 'FOODS_1', 'date': '2024-01-15', 'city': 'CA_1'}]
+    with TestClient(async_app.app) as async_client:
+        for path, body in (('/predict/batch?orient=columns', {'items': items}),
+                           ('/predict/analysis?orient=columns', {'dept_id': 'FOODS_3', 'max_days': 5,
+                                                                 'date': '2024-01-15'}),
+                           ('/predict/batch?orient=diagonal', {'items': items})):
+            expected = flask_client.post(path, json=body)
+            got = async_client.post(path, json=body)
+            assert got.status_code == expected.status_code, path
+            assert got.json() == expected.get_json(), path
+    print("   ✅ Async API matches the Flask app")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing response encoding")
+    print("=" * 60)
+    test_rows_and_columns_equivalent()
+    test_nan_encoded_as_null()
+    test_backends_agree()
+    test_orient_parameter()
+    test_async_orient_matches_flask()
+    print("\n🎉 All response encoding tests passed!")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for in-batch deduplication
+Checks that distinct feature rows are found exactly (including after a hash
+collision) and that deduplicated batches score exactly like undeduplicated
+ones while reporting how many rows were duplicates.
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+import row_dedup
+from row_dedup import unique_rows
+from predict_expiry_price import ExpiryPricePredictor
+from metrics import metrics
+
+warnings.filterwarnings('ignore')
+
+
+def skewed_batch(n_rows, seed=0):
+    """Repricing-style batch: one date, a few expiry horizons, some promotions"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'days_to_expiry': rng.choice([1, 2, 3, 7, 14, 30], n_rows, p=[0.3, 0.2, 0.2, 0.15, 0.1, 0.05]),
+        'dept_id': rng.choice(['FOODS_1', 'FOODS_2', 'FOODS_3', 'TOYS_1'], n_rows),
+        'date': '2024-03-01',
+        'promo_impact': rng.choice([0.0, 0.0, 0.0, 0.1, 0.25], n_rows)
+    })
+
+
+def test_unique_rows_exact():
+    """Distinct rows in first-appearance order; bitwise comparison of NaN and -0.0"""
+    X = np.array([[1.0, 2.0], [3.0, 4.0], [1.0, 2.0], [np.nan, 0.0], [np.nan, 0.0], [np.nan, -0.0], [3.0, 4.0]])
+    first, inverse = unique_rows(X)
+    np.testing.assert_array_equal(first, [0, 1, 3, 5])
+    np.testing.assert_array_equal(inverse, [0, 1, 0, 2, 2, 3, 1])
+
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 4, (5000, 24)).astype(np.float64)
+    X[:, 3:] = 0
+    first, inverse = unique_rows(X)
+    np.testing.assert_array_equal(X[first][inverse], X)
+    assert len(first) == len(np.unique(X, axis=0))
+    assert (np.diff(first) > 0).all()
+    print("   ✅ Distinct rows found exactly")
+
+
+def test_hash_collision_falls_back():
+    """Rows that share a hash are still told apart"""
+    rng = np.random.default_rng(1)
+    X = rng.integers(0, 3, (1000, 5)).astype(np.float64)
+    expected = unique_rows(X)
+    original = row_dedup._row_hashes
+    row_dedup._row_hashes = lambda bits: np.zeros(len(bits), dtype=np.uint64)
+    try:
+        first, inverse = unique_rows(X)
+    finally:
+        row_dedup._row_hashes = original
+    np.testing.assert_array_equal(first, expected[0])
+    np.testing.assert_array_equal(inverse, expected[1])
+    print("   ✅ Hash collisions fall back to exact grouping")
+
+
+def test_dedup_matches_full_scoring():
+    """Deduplicated batches score like undeduplicated ones and report the duplicate rate"""
+    batch = skewed_batch(20000)
+    full = ExpiryPricePredictor(cache_size=0, dedup_rows=False)
+    dedup = ExpiryPricePredictor(cache_size=0)
+    expected = full.predict_batch(batch)['predicted_price'].to_numpy()
+
+    before = metrics.dedup_rows.snapshot().get(('FOODS_1', 'input'), 0)
+    actual = dedup.predict_batch(batch)['predicted_price'].to_numpy()
+    np.testing.assert_array_equal(actual, expected)
+    assert np.isnan(actual[batch['dept_id'].to_numpy() == 'TOYS_1']).all()
+
+    stats = dedup.get_model_info()['dedup']
+    known = int((batch['dept_id'] != 'TOYS_1').sum())
+    # 6 horizons x 3 promotion levels per department
+    assert (stats['rows'], stats['unique_rows']) == (known, 3 * 6 * 3)
+    assert stats['enabled'] and stats['duplicate_rate'] > 0.99
+    assert full.dedup_stats() == {'enabled': False, 'rows': 0, 'unique_rows': 0, 'duplicate_rate': 0.0}
+    if metrics.enabled:
+        foods_1 = int((batch['dept_id'] == 'FOODS_1').sum())
+        assert metrics.dedup_rows.snapshot()[('FOODS_1', 'input')] - before == foods_1
+
+    # The analysis grid and unique batches score the same either way
+    dates = np.array(['2024-01-15', '2024-01-22', '2025-01-13'], dtype='datetime64[D]')
+    np.testing.assert_array_equal(dedup.predict_grid(['FOODS_2'], dates, np.arange(60)),
+                                  full.predict_grid(['FOODS_2'], dates, np.arange(60)))
+    print("   ✅ Deduplicated scoring matches full scoring")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing in-batch deduplication")
+    print("=" * 60)
+    test_unique_rows_exact()
+    test_hash_collision_falls_back()
+    test_dedup_matches_full_scoring()
+    print("\n🎉 All deduplication tests passed!")
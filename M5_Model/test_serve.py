@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test script for the multi-worker production server
+Starts serve.py in a subprocess and checks keep-alive, graceful reload and shutdown.
+"""
+
+import glob
+import http.client
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from serve_process import start_server, worker_pids
+
+BODY = json.dumps({'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15'})
+
+
+def predict(connection):
+    """POST /predict/single on an open connection and return the price"""
+    connection.request('POST', '/predict/single', body=BODY, headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    assert response.status == 200
+    return json.loads(response.read())['data']['predicted_price']
+
+
+def test_workers_keepalive_reload_and_shutdown():
+    """Workers answer over keep-alive, SIGHUP replaces them without failed requests, SIGTERM exits cleanly"""
+    process, port = start_server(workers=2)
+    try:
+        old_workers = worker_pids(process.pid)
+        assert len(old_workers) == 2
+
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        expected = predict(connection)
+        assert predict(connection) == expected  # same connection reused
+
+        process.send_signal(signal.SIGHUP)
+        deadline = time.time() + 60
+        failures = 0
+        while time.time() < deadline:
+            try:
+                assert predict(http.client.HTTPConnection('127.0.0.1', port, timeout=10)) == expected
+            except (OSError, http.client.HTTPException):
+                failures += 1
+            workers = worker_pids(process.pid)
+            if len(workers) == 2 and not workers & old_workers:
+                break
+        assert not worker_pids(process.pid) & old_workers
+        assert failures == 0
+
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=30) == 0
+        print("   ✅ Keep-alive, graceful reload and shutdown")
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def test_metrics_cover_every_worker():
+    """/metrics on any worker counts the requests every worker answered"""
+    metrics_dir = tempfile.mkdtemp(prefix='m5_metrics_test_')
+    process, port = start_server(workers=2, env={'METRICS_MULTIPROC_DIR': metrics_dir})
+    series = 'm5_request_duration_seconds_count{endpoint="/predict/single",method="POST",status="200"}'
+
+    def answered_by_worker():
+        counts = []
+        for path in glob.glob(os.path.join(metrics_dir, 'metrics_*.json')):
+            with open(path) as f:
+                state = json.load(f)
+            counts.append(sum(sum(values[:-1]) for labels, values in state['m5_request_duration_seconds']
+                              if labels[0] == '/predict/single'))
+        return counts
+
+    try:
+        # New connections until both workers have answered some (and written their files)
+        sent = 0
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            for _ in range(20):
+                predict(http.client.HTTPConnection('127.0.0.1', port, timeout=10))
+                sent += 1
+            time.sleep(1.5)
+            if sum(count > 0 for count in answered_by_worker()) == 2:
+                break
+        assert sum(answered_by_worker()) == sent
+
+        for _ in range(6):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            connection.request('GET', '/metrics')
+            lines = connection.getresponse().read().decode().splitlines()
+            assert f'{series} {sent}' in lines
+        print(f"   ✅ /metrics counts the {sent} requests of both workers")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def test_reload_endpoint_restarts_workers():
+    """POST /model/reload on a worker makes the parent reload and replace every worker"""
+    process, port = start_server(workers=2)
+    try:
+        old_workers = worker_pids(process.pid)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        connection.request('POST', '/model/reload')
+        response = connection.getresponse()
+        assert response.status == 202
+        response.read()
+
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            workers = worker_pids(process.pid)
+            if len(workers) == 2 and not workers & old_workers:
+                break
+            time.sleep(0.2)
+        assert not worker_pids(process.pid) & old_workers
+        print("   ✅ /model/reload restarts the workers")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    print("🧪 Testing multi-worker server")
+    print("=" * 60)
+    if not hasattr(os, 'fork'):
+        print("⚠️ serve.py needs os.fork, skipping")
+        sys.exit(0)
+    test_workers_keepalive_reload_and_shutdown()
+    test_metrics_cover_every_worker()
+    test_reload_endpoint_restarts_workers()
+    print("\n🎉 All server tests passed!")
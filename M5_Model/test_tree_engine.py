@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test script for the flat-array tree engine
+Checks that FlatTreeEnsemble matches XGBRegressor.predict on the trained models.
+"""
+
+import pickle
+import warnings
+import numpy as np
+from tree_engine import FlatTreeEnsemble
+from predict_expiry_price import ExpiryPricePredictor
+
+warnings.filterwarnings('ignore')
+
+DEPARTMENTS = ['FOODS_1', 'FOODS_2', 'FOODS_3']
+
+
+def load_model(dept, model_dir='Model/'):
+    """Load a pickled XGBRegressor"""
+    with open(f"{model_dir}model_{dept}_optimized.pkl", 'rb') as f:
+        return pickle.load(f)
+
+
+def make_features(n_rows, seed=0):
+    """Random feature matrix in the scaled feature space, with missing values"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(scale=3.0, size=(n_rows, 24))
+    X[:, 0] = rng.integers(-1, 60, n_rows) / 5
+    X[:, 21:] = 0
+    X[np.arange(n_rows), 21 + rng.integers(0, 3, n_rows)] = 1
+    X[::7, 3] = np.nan
+    X[::11, 0] = np.nan
+    return X
+
+
+def test_engine_matches_xgboost():
+    """Engine predictions match model.predict within float32 tolerance"""
+    X = make_features(5000)
+    for dept in DEPARTMENTS:
+        model = load_model(dept)
+        engine = FlatTreeEnsemble.from_booster(model.get_booster())
+
+        expected = model.predict(X)
+        actual = engine.predict(X)
+
+        assert actual.dtype == np.float32
+        np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-5)
+        print(f"   ✅ {dept}: {engine.n_trees} trees, max diff {np.max(np.abs(actual - expected)):.2e}")
+
+
+def test_engine_single_row():
+    """A single 1-D row is scored like a one-row matrix"""
+    X = make_features(10, seed=1)
+    model = load_model('FOODS_1')
+    engine = FlatTreeEnsemble.from_booster(model.get_booster())
+
+    for row in X:
+        np.testing.assert_allclose(engine.predict(row), model.predict(row.reshape(1, -1)), rtol=1e-5, atol=1e-5)
+    print("   ✅ Single rows match")
+
+
+def test_predictor_engine_and_booster_paths_agree():
+    """Predictions are the same on both sides of engine_max_rows"""
+    predictor = ExpiryPricePredictor()
+    X = make_features(200, seed=2)
+    for dept in DEPARTMENTS:
+        engine_predictions = predictor.engines[dept].predict(X)
+        booster_predictions = predictor._predict_matrix(dept, X)
+        np.testing.assert_allclose(engine_predictions, booster_predictions, rtol=1e-5, atol=1e-5)
+    print("   ✅ Engine and booster paths agree")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing flat-array tree engine")
+    print("=" * 60)
+    test_engine_matches_xgboost()
+    test_engine_single_row()
+    test_predictor_engine_and_booster_paths_agree()
+    print("\n🎉 All tree engine tests passed!")
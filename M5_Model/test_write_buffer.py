@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Test script for the MongoDB write-behind buffer
+Runs against mongomock, so no MongoDB server is needed.
+"""
+
+import gc
+import threading
+import time
+import warnings
+import weakref
+import mongomock
+import app as api
+from write_buffer import WriteBehindBuffer, BufferFull
+
+warnings.filterwarnings('ignore')
+
+
+class SlowCollection:
+    """Collection stand-in whose inserts block until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.collection = mongomock.MongoClient().db.predictions
+
+    def insert_many(self, docs, ordered=True):
+        self.release.wait(5)
+        return self.collection.insert_many(docs, ordered=ordered)
+
+
+def test_batches_by_size_and_time():
+    """Full batches are written at once, partial ones after flush_interval"""
+    collection = mongomock.MongoClient().db.predictions
+    buffer = WriteBehindBuffer(collection, batch_size=10, flush_interval=0.2)
+
+    for i in range(25):
+        buffer.put({'n': i})
+    assert buffer.flush(timeout=5)
+    assert collection.count_documents({}) == 25
+    assert buffer.stats()['flushes'] >= 3
+
+    buffer.put({'n': 25})
+    time.sleep(0.6)
+    stats = buffer.stats()
+    assert collection.count_documents({}) == 26
+    assert stats['written'] == 26 and stats['queue_depth'] == 0 and stats['pending'] == 0
+    assert stats['flush_ms_max'] >= stats['flush_ms_avg'] > 0
+    buffer.close()
+    print("   ✅ Batches by size and time")
+
+
+def test_backpressure_when_full():
+    """put() raises BufferFull once the queue is full and recovers after a flush"""
+    slow = SlowCollection()
+    buffer = WriteBehindBuffer(slow, max_queue=5, batch_size=1, flush_interval=0.05)
+
+    buffer.put({'n': 0})
+    time.sleep(0.1)  # the worker is now blocked writing the first document
+    for i in range(1, 6):
+        buffer.put({'n': i})
+    try:
+        buffer.put({'n': 6})
+        assert False, 'expected BufferFull'
+    except BufferFull:
+        pass
+    assert buffer.stats()['rejected'] == 1
+
+    slow.release.set()
+    assert buffer.flush(timeout=5)
+    assert slow.collection.count_documents({}) == 6
+    buffer.put({'n': 7})
+    buffer.close()
+    assert slow.collection.count_documents({}) == 7
+    print("   ✅ Backpressure when full")
+
+
+class DroppedConnectionCollection:
+    """Collection stand-in that stores the first documents of a batch, then loses the connection"""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.calls = 0
+        self.collection = mongomock.MongoClient().db.predictions
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.calls == 1:
+            self.collection.insert_many(docs[:self.stored], ordered=ordered)
+            raise ConnectionError('connection reset')
+        return self.collection.insert_many(docs, ordered=ordered)
+
+
+def test_close_flushes_and_bulk_errors_are_counted():
+    """close() writes what is queued; documents rejected by the server are counted, not retried"""
+    collection = mongomock.MongoClient().db.predictions
+    collection.insert_one({'_id': 'dup'})
+    buffer = WriteBehindBuffer(collection, batch_size=100, flush_interval=10)
+
+    buffer.put({'_id': 'dup'})
+    buffer.put({'_id': 'new'})
+    buffer.close(timeout=5)
+
+    stats = buffer.stats()
+    assert collection.count_documents({}) == 2
+    assert stats['written'] == 1 and stats['failed'] == 1
+    try:
+        buffer.put({'n': 1})
+        assert False, 'expected BufferFull after close'
+    except BufferFull:
+        pass
+    print("   ✅ Close flushes, bulk errors counted")
+
+
+def test_retry_after_partial_insert():
+    """Documents stored before a connection error count as written when the retry finds them"""
+    collection = DroppedConnectionCollection(stored=3)
+    buffer = WriteBehindBuffer(collection, batch_size=100, flush_interval=10)
+    for i in range(5):
+        buffer.put({'n': i})
+    buffer.close(timeout=5)
+
+    stats = buffer.stats()
+    assert collection.calls == 2 and collection.collection.count_documents({}) == 5
+    assert stats['written'] == 5 and stats['failed'] == 0
+    print("   ✅ Retry after partial insert")
+
+
+def test_closed_buffers_are_released():
+    """close() drops the exit hook, so a closed buffer can be collected"""
+    buffer = WriteBehindBuffer(mongomock.MongoClient().db.predictions)
+    buffer.put({'n': 0})
+    buffer.close(timeout=5)
+    reference = weakref.ref(buffer)
+    del buffer
+    gc.collect()
+    assert reference() is None
+    print("   ✅ Closed buffers are released")
+
+
+def test_save_prediction_uses_buffer():
+    """/save-prediction queues the document and reports buffer metrics in /health"""
+    collection = mongomock.MongoClient().db.predictions
+    original_buffer = api.write_buffer
+    api.write_buffer = WriteBehindBuffer(collection, flush_interval=0.05)
+    try:
+        check_save_prediction(api.app.test_client(), collection)
+    finally:
+        api.write_buffer = original_buffer
+    print("   ✅ /save-prediction uses the write-behind buffer")
+
+
+def check_save_prediction(client, collection):
+    """Save through the endpoint, flush, and check the stored document and 503 after close"""
+    response = client.post('/save-prediction', json={
+        'days_to_expiry': 5, 'dept_id': 'FOODS_1', 'date': '2024-01-15', 'city': 'CA_1'
+    })
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert '_id' not in data and data['city'] == 'CA_1'
+
+    assert api.write_buffer.flush(timeout=5)
+    saved = collection.find_one({'dept_id': 'FOODS_1'})
+    assert saved['predicted_price'] == data['predicted_price']
+    assert client.get('/health').get_json()['write_buffer']['written'] == 1
+
+    api.write_buffer.close()
+    response = client.post('/save-prediction', json={'days_to_expiry': 5, 'dept_id': 'FOODS_1'})
+    assert response.status_code == 503
+
+
+if __name__ == "__main__":
+    print("🧪 Testing MongoDB write-behind buffer")
+    print("=" * 60)
+    test_batches_by_size_and_time()
+    test_backpressure_when_full()
+    test_close_flushes_and_bulk_errors_are_counted()
+    test_retry_after_partial_insert()
+    test_closed_buffers_are_released()
+    test_save_prediction_uses_buffer()
+    print("\n🎉 All write buffer tests passed!")
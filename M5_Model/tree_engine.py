@@ -0,0 +1,250 @@
+"""
+Flat-array tree engine for the M5 Expiry Price Predictor
+Exports the trees of an XGBoost booster into flat NumPy arrays and evaluates
+the whole ensemble over a feature matrix without the sklearn wrapper or a DMatrix.
+"""
+
+import json
+import numpy as np
+
+# Objectives whose prediction is the raw margin (identity link)
+IDENTITY_OBJECTIVES = {'reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror'}
+
+
+class FlatTreeEnsemble:
+    """
+    Tree ensemble stored as flat node arrays
+
+    All trees are concatenated into one node table. Every node has a split
+    feature, a threshold, left/right children, a default direction for missing
+    values and a leaf value. Leaves point to themselves, so a fixed number of
+    vectorized steps (the maximum tree depth) routes every row of every tree
+    to its leaf.
+    """
+
+    def __init__(self, split_feature, threshold, left_child, right_child,
+                 default_left, leaf_value, roots, base_score, max_depth):
+        """
+        Initialize the ensemble from flat node arrays
+
+        Args:
+            split_feature (np.ndarray): Feature index tested at each node
+            threshold (np.ndarray): Split threshold; rows go left when x < threshold
+            left_child (np.ndarray): Global index of the left child (self for leaves)
+            right_child (np.ndarray): Global index of the right child (self for leaves)
+            default_left (np.ndarray): Whether missing values go left at each node
+            leaf_value (np.ndarray): Leaf output (0 for split nodes)
+            roots (np.ndarray): Global index of each tree's root node
+            base_score (float): Global bias added to the sum of the leaves
+            max_depth (int): Maximum depth over all trees
+        """
+        self.split_feature = np.asarray(split_feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold)
+        self.left_child = np.asarray(left_child, dtype=np.int32)
+        self.right_child = np.asarray(right_child, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.leaf_value = np.asarray(leaf_value, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.base_score = float(base_score)
+        self.max_depth = int(max_depth)
+        self._compile()
+
+    def _compile(self):
+        """
+        Derive the arrays used during traversal
+
+        Each step needs the split feature and the left child of the current
+        node; they are packed into one integer so a single gather fetches both.
+        XGBoost stores the right child directly after the left one, so the
+        comparison result is added to the left child. Leaves get a NaN
+        threshold so the comparison is always False and rows stay put.
+        """
+        n_nodes = len(self.split_feature)
+        is_leaf = self.left_child == np.arange(n_nodes)
+        if not np.all(is_leaf | (self.right_child == self.left_child + 1)):
+            raise ValueError("Flat tree engine expects right children stored after left children")
+
+        self._shift = max(1, int(self.split_feature.max(initial=0)).bit_length())
+        index_dtype = np.int32 if (n_nodes << self._shift) < 2 ** 31 else np.int64
+        self._packed = (self.left_child.astype(index_dtype) << self._shift) | self.split_feature
+        self._feature_mask = (1 << self._shift) - 1
+        self._roots = self.roots.astype(index_dtype)
+        self._compare_threshold = np.where(is_leaf, np.nan, self.threshold).astype(self.threshold.dtype)
+        self.missing_child = np.where(self.default_left, self.left_child, self.right_child)
+        self.missing_child = np.where(is_leaf, self.left_child, self.missing_child).astype(index_dtype)
+
+    @classmethod
+    def from_booster(cls, booster):
+        """
+        Export the trees of an xgboost.Booster
+
+        Args:
+            booster (xgboost.Booster): Trained booster (e.g. XGBRegressor.get_booster())
+
+        Returns:
+            FlatTreeEnsemble: Flat-array copy of the booster's trees
+        """
+        model = json.loads(booster.save_raw(raw_format='json'))
+        learner = model['learner']
+
+        objective = learner['objective']['name']
+        if objective not in IDENTITY_OBJECTIVES:
+            raise ValueError(f"Unsupported objective for flat tree engine: {objective}")
+        params = learner['learner_model_param']
+        if int(params.get('num_class', 0)) > 1 or int(params.get('num_target', 1)) > 1:
+            raise ValueError("Flat tree engine only supports single-output models")
+
+        gbtree = learner['gradient_booster']
+        if gbtree.get('name') != 'gbtree':
+            raise ValueError(f"Unsupported booster for flat tree engine: {gbtree.get('name')}")
+        trees = gbtree['model']['trees']
+
+        # Honour early stopping the same way XGBRegressor.predict does
+        best_iteration = booster.attributes().get('best_iteration')
+        if best_iteration is not None:
+            indptr = gbtree['model']['iteration_indptr']
+            trees = trees[:indptr[int(best_iteration) + 1]]
+
+        split_feature, threshold, left_child, right_child = [], [], [], []
+        default_left, leaf_value, roots = [], [], []
+        max_depth = 0
+        offset = 0
+
+        for tree in trees:
+            if any(tree['split_type']):
+                raise ValueError("Flat tree engine does not support categorical splits")
+
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            right = np.asarray(tree['right_children'], dtype=np.int64)
+            conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+            is_leaf = left == -1
+            own_index = np.arange(len(left)) + offset
+
+            split_feature.append(np.where(is_leaf, 0, tree['split_indices']))
+            threshold.append(np.where(is_leaf, np.float32(0), conditions))
+            left_child.append(np.where(is_leaf, own_index, left + offset))
+            right_child.append(np.where(is_leaf, own_index, right + offset))
+            default_left.append(np.asarray(tree['default_left'], dtype=bool))
+            # Leaf outputs are stored in split_conditions for leaf nodes
+            leaf_value.append(np.where(is_leaf, conditions, np.float32(0)))
+            roots.append(offset)
+
+            max_depth = max(max_depth, _tree_depth(left, right))
+            offset += len(left)
+
+        return cls(
+            split_feature=np.concatenate(split_feature),
+            threshold=np.concatenate(threshold).astype(np.float32),
+            left_child=np.concatenate(left_child),
+            right_child=np.concatenate(right_child),
+            default_left=np.concatenate(default_left),
+            leaf_value=np.concatenate(leaf_value),
+            roots=np.asarray(roots),
+            base_score=_parse_base_score(params['base_score']),
+            max_depth=max_depth
+        )
+
+    def to_arrays(self):
+        """
+        Node arrays and scalars needed to rebuild the ensemble
+
+        Returns:
+            dict: Name -> np.ndarray (base_score and max_depth as 0-d arrays)
+        """
+        return {
+            'split_feature': self.split_feature,
+            'threshold': self.threshold,
+            'left_child': self.left_child,
+            'right_child': self.right_child,
+            'default_left': self.default_left,
+            'leaf_value': self.leaf_value,
+            'roots': self.roots,
+            'base_score': np.float64(self.base_score),
+            'max_depth': np.int64(self.max_depth)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Rebuild an ensemble from to_arrays() output
+
+        The node arrays are used as given (no copy when the dtype matches),
+        so read-only views such as memory-mapped buffers work.
+
+        Args:
+            arrays (Mapping): Name -> array, as returned by to_arrays()
+
+        Returns:
+            FlatTreeEnsemble: Ensemble over the given arrays
+        """
+        return cls(**{name: arrays[name] for name in (
+            'split_feature', 'threshold', 'left_child', 'right_child', 'default_left',
+            'leaf_value', 'roots', 'base_score', 'max_depth'
+        )})
+
+    @property
+    def n_trees(self):
+        """Number of trees in the ensemble"""
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        """Total number of nodes over all trees"""
+        return len(self.split_feature)
+
+    def predict(self, X, chunk_size=256):
+        """
+        Evaluate the ensemble over a feature matrix
+
+        Args:
+            X (np.ndarray): Feature matrix of shape (n_rows, n_features); NaN is missing
+            chunk_size (int): Rows traversed at once, bounds temporary memory
+
+        Returns:
+            np.ndarray: float32 predictions of shape (n_rows,)
+        """
+        # Compare in the threshold dtype (float32, as XGBoost does, unless fused)
+        X = np.ascontiguousarray(X, dtype=self.threshold.dtype)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        predictions = np.empty(len(X), dtype=np.float32)
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start:start + chunk_size]
+            predictions[start:start + len(chunk)] = self._predict_chunk(chunk)
+        return predictions
+
+    def _predict_chunk(self, X):
+        """Route every row of X through every tree and sum the leaves"""
+        n_features = X.shape[1]
+        flat = X.ravel()
+        row_offset = (np.arange(len(X), dtype=self._roots.dtype) * n_features)[:, None]
+        node = np.broadcast_to(self._roots, (len(X), self.n_trees))
+        has_missing = np.isnan(flat).any()
+
+        for _ in range(self.max_depth):
+            packed = self._packed[node]
+            values = flat[row_offset + (packed & self._feature_mask)]
+            next_node = (packed >> self._shift) + (values >= self._compare_threshold[node])
+            if has_missing:
+                next_node = np.where(np.isnan(values), self.missing_child[node], next_node)
+            node = next_node
+
+        margin = self.leaf_value[node].sum(axis=1, dtype=np.float64) + self.base_score
+        return margin.astype(np.float32)
+
+
+def _tree_depth(left, right):
+    """Depth (number of splits on the longest path) of one tree"""
+    depth = np.zeros(len(left), dtype=np.int64)
+    # Children always have larger ids than their parent in XGBoost trees
+    for node in range(len(left)):
+        if left[node] != -1:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def _parse_base_score(value):
+    """Parse base_score, stored as '5E-1' or '[5E-1]' depending on the XGBoost version"""
+    return float(str(value).strip('[]'))
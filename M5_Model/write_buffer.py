@@ -0,0 +1,255 @@
+"""
+Write-behind buffer for MongoDB inserts
+Documents are queued in process and written by a background thread with
+unordered insert_many calls, so request threads never wait on MongoDB.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    """Raised when a document cannot be queued because the buffer is full"""
+
+
+class WriteBehindBuffer:
+    """
+    Bounded queue of documents flushed to a collection in batches
+
+    A batch is written once it reaches `batch_size` documents or its first
+    document has waited `flush_interval` seconds. The worker thread starts
+    on the first put() and is restarted in a forked child, where the
+    parent's queued documents are dropped (the parent still writes them).
+    Remaining documents are flushed at interpreter exit.
+    """
+
+    def __init__(self, collection, max_queue=10000, batch_size=500, flush_interval=0.5,
+                 put_timeout=0.0, max_retries=3):
+        """
+        Initialize the buffer
+
+        Args:
+            collection: pymongo-compatible collection (anything with insert_many)
+            max_queue (int): Maximum number of queued documents
+            batch_size (int): Maximum documents per insert_many call
+            flush_interval (float): Longest a queued document waits for its batch, in seconds
+            put_timeout (float): Seconds put() waits for space before raising BufferFull
+            max_retries (int): Retries for a batch after a connection-level error
+        """
+        self.collection = collection
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._reset()
+        # Unregistered again by close(), so closed buffers can be collected
+        atexit.register(self.close)
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        self.last_flush_seconds = None
+
+    def _reset(self):
+        """Create the queue and worker state for the current process"""
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._pending = 0
+        self._worker = None
+        self._draining = threading.Event()
+        self._closed = False
+
+    def _check_fork(self):
+        """Drop the parent's queue, locks and worker when running in a forked child"""
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._idle = threading.Condition(self._lock)
+            self._reset()
+
+    def _ensure_worker(self):
+        """Start the worker thread if it is not running"""
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name='mongo-write-behind', daemon=True)
+                    self._worker.start()
+
+    def put(self, doc):
+        """
+        Queue a document for writing
+
+        Args:
+            doc (dict): Document to insert; the buffer owns it from now on
+
+        Raises:
+            BufferFull: If the queue stays full for put_timeout seconds
+        """
+        self._check_fork()
+        if self._closed:
+            raise BufferFull('Write buffer is closed')
+        self._ensure_worker()
+
+        with self._lock:
+            self._pending += 1
+        try:
+            if self.put_timeout:
+                self._queue.put(doc, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(doc)
+        except queue.Full:
+            with self._lock:
+                self._pending -= 1
+                self.rejected += 1
+            raise BufferFull(f'Write buffer is full ({self.max_queue} documents queued)')
+
+        with self._lock:
+            self.enqueued += 1
+
+    def flush(self, timeout=None):
+        """
+        Write everything queued so far and wait for it
+
+        Args:
+            timeout (float): Seconds to wait; None waits indefinitely
+
+        Returns:
+            bool: True if the buffer was drained within the timeout
+        """
+        self._check_fork()
+        if self._worker is None:
+            return self._pending == 0
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._draining.set()
+        try:
+            with self._idle:
+                while self._pending:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._idle.wait(remaining)
+            return True
+        finally:
+            if not self._closed:
+                self._draining.clear()
+
+    def close(self, timeout=5.0):
+        """
+        Flush queued documents and stop the worker
+
+        Args:
+            timeout (float): Seconds to wait for the final flush
+        """
+        if self._closed or self._pid != os.getpid():
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._draining.set()
+        if self._worker is not None and self._worker.is_alive():
+            if not self.flush(timeout):
+                logger.warning(f"⚠️ Write buffer closed with {self._pending} unwritten documents")
+            self._worker.join(timeout)
+
+    def _run(self):
+        """Worker loop: collect batches and write them until closed and drained"""
+        while not (self._closed and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def _take_batch(self):
+        """Collect up to batch_size documents, waiting at most flush_interval after the first"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or self._draining.is_set():
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        """Insert a batch with insert_many(ordered=False), retrying connection errors"""
+        start = time.perf_counter()
+        written, failed = 0, 0
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = self.collection.insert_many(batch, ordered=False)
+                written = len(result.inserted_ids)
+                break
+            except Exception as e:
+                details = getattr(e, 'details', None)
+                if isinstance(details, dict) and 'nInserted' in details:
+                    # Unordered bulk write: every document without an error was inserted
+                    written = details.get('nInserted', 0)
+                    if attempt:
+                        # insert_many gave the documents their _ids on the first attempt, so a
+                        # duplicate key on a retry is one the failed attempt already stored
+                        written += sum(1 for error in details.get('writeErrors', []) if error.get('code') == 11000)
+                    failed = len(batch) - written
+                    if failed:
+                        logger.error(f"❌ {failed} of {len(batch)} buffered documents were rejected: {str(e)}")
+                    break
+                if attempt == self.max_retries:
+                    failed = len(batch)
+                    logger.error(f"❌ Dropped {failed} buffered documents: {str(e)}")
+                    break
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+        elapsed = time.perf_counter() - start
+
+        with self._idle:
+            self.written += written
+            self.failed += failed
+            self.flushes += 1
+            self.flush_seconds_total += elapsed
+            self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+            self.last_flush_seconds = elapsed
+            self._pending -= len(batch)
+            if not self._pending:
+                self._idle.notify_all()
+
+    def stats(self):
+        """
+        Get buffer metrics
+
+        Returns:
+            dict: Queue depth, document counters and flush latency in milliseconds
+        """
+        self._check_fork()
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'pending': self._pending,
+                'enqueued': self.enqueued,
+                'rejected': self.rejected,
+                'written': self.written,
+                'failed': self.failed,
+                'flushes': self.flushes,
+                'flush_ms_avg': 1000 * self.flush_seconds_total / self.flushes if self.flushes else 0.0,
+                'flush_ms_max': 1000 * self.flush_seconds_max,
+                'flush_ms_last': None if self.last_flush_seconds is None else 1000 * self.last_flush_seconds,
+                'worker_alive': self._worker is not None and self._worker.is_alive()
+            }